@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Comparison of RPM (epoch, version, release) values.
+
+Each version or release is turned once into a sort key that orders the same
+way rpm's rpmvercmp does, so that a comparison is a plain tuple comparison:
+
+* The string is split into maximal runs of ASCII digits and ASCII letters.
+  Anything else separates runs and is otherwise ignored, except for "~".
+* A run of digits becomes (2, value), so leading zeroes don't matter and
+  numbers are newer than letters.
+* A run of letters becomes (1, letters), which compare as strings.
+* A "~" becomes (-1,), which makes it older than anything, including the
+  end of the string, so that 1.0~rc1 is older than 1.0.
+* The key ends with (0,), which makes a string that has more runs newer than
+  one that it starts with, so that 1.0.1 and 1.0a are newer than 1.0.
+
+Keys of whole (epoch, version, release) values are cached, since the same
+values are compared over and over by depsolving, applicability and sync.
+
+Resources:
+* http://fedoraproject.org/wiki/Archive:Tools/RPM/VersionComparison
+* http://rpm.org/api/4.4.2.2/rpmvercmp_8c-source.html
+"""
+
+import re
+
+
+# approximate maximum number of (epoch, version, release) keys that are cached
+CACHE_SIZE = 50000
+
+# matches the runs of a version or release that are significant for comparison
+SEGMENT_REGEX = re.compile(r'[0-9]+|[a-zA-Z]+|~')
+
+_TILDE = (-1,)
+_END = (0,)
+
+
+def label_key(label):
+    """
+    Turn a version or release into a key that sorts the way rpm compares them.
+    This is not cached; use evr_key to compare whole packages.
+
+    :param label:   version or release, or None, which is treated as an empty string
+    :type  label:   basestring
+
+    :return:    sort key
+    :rtype:     tuple
+    """
+    if not label:
+        return (_END,)
+    key = []
+    for segment in SEGMENT_REGEX.findall(label):
+        if segment.isdigit():
+            key.append((2, int(segment)))
+        elif segment == '~':
+            key.append(_TILDE)
+        else:
+            key.append((1, segment))
+    key.append(_END)
+    return tuple(key)
+
+
+def evr_key(epoch, version, release):
+    """
+    Return a key that sorts the way rpm compares packages with the given
+    epoch, version and release. Keys are cached.
+
+    :param epoch:   epoch of a package; None is treated as 0
+    :type  epoch:   basestring or int
+    :param version: version of a package
+    :type  version: basestring
+    :param release: release of a package; None is treated as an empty string
+    :type  release: basestring
+
+    :return:    sort key
+    :rtype:     tuple
+    """
+    return _cache.get((epoch, version, release))
+
+
+def compare(evr_a, evr_b):
+    """
+    Compare two packages' (epoch, version, release) tuples. This has the same
+    result as rpmUtils.miscutils.compareEVR.
+
+    :param evr_a:   epoch, version and release of a package
+    :type  evr_a:   tuple
+    :param evr_b:   epoch, version and release of another package
+    :type  evr_b:   tuple
+
+    :return:    1 if a is newer than b, 0 if they are the same, -1 if b is newer
+    :rtype:     int
+    """
+    return cmp(_cache.get(tuple(evr_a)), _cache.get(tuple(evr_b)))
+
+
+def unit_key_evr(unit_key):
+    """
+    :param unit_key:    unit key, or any other dict, with "epoch", "version"
+                        and "release" of a package
+    :type  unit_key:    dict
+
+    :return:    epoch, version and release
+    :rtype:     tuple
+    """
+    return unit_key.get('epoch'), unit_key['version'], unit_key.get('release')
+
+
+def newest(items, get_evr=unit_key_evr):
+    """
+    Return the newest of any number of packages, computing each package's
+    sort key only once.
+
+    :param items:   packages, in any form that get_evr accepts
+    :type  items:   iterable
+    :param get_evr: function that takes an item and returns its epoch,
+                    version and release. By default, items are unit keys.
+    :type  get_evr: callable
+
+    :return:    the newest item, or the first of the newest if several are the
+                same version, or None if there are no items
+    """
+    newest_item = None
+    newest_key = None
+    for item in items:
+        key = _cache.get(tuple(get_evr(item)))
+        if newest_key is None or key > newest_key:
+            newest_item = item
+            newest_key = key
+    return newest_item
+
+
+def _compute_evr_key(evr):
+    epoch, version, release = evr
+    if epoch is None or epoch == '':
+        epoch = 0
+    return label_key(str(epoch)), label_key(version), label_key(release)
+
+
+class _KeyCache(object):
+    """
+    Cache of evr keys, holding at most about `size` of them. Keys live in two
+    generations: hits in the old generation are moved to the new one, and when
+    the new generation is full, the old one is discarded with whatever keys
+    were not used since. That evicts the least recently used keys in bulk
+    without any bookkeeping on hits, and every operation is atomic under the
+    GIL, so no lock is needed.
+    """
+
+    def __init__(self, size, compute):
+        """
+        :param size:    approximate maximum number of cached keys
+        :type  size:    int
+        :param compute: function that computes the key of a value that is not cached
+        :type  compute: callable
+        """
+        self.generation_size = max(size // 2, 1)
+        self.compute = compute
+        self._new = {}
+        self._old = {}
+
+    def get(self, value):
+        try:
+            return self._new[value]
+        except KeyError:
+            pass
+        key = self._old.get(value)
+        if key is None:
+            key = self.compute(value)
+        new = self._new
+        if len(new) >= self.generation_size:
+            self._old = new
+            new = self._new = {}
+        new[value] = key
+        return key
+
+    def clear(self):
+        self._new = {}
+        self._old = {}
+
+
+_cache = _KeyCache(CACHE_SIZE, _compute_evr_key)
@@ -0,0 +1,195 @@
+"""
+Consumer RPM profiles and the deltas between them. A consumer that has sent its
+profile before only sends the packages added and removed since then, along with
+the hash of the profile it last sent. The server applies the delta to the
+profile it has stored, if that profile has the same hash.
+
+A profile is a list of dicts with the keys in PACKAGE_FIELDS, as collected by
+rhsm.profile.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+
+PACKAGE_FIELDS = ('name', 'epoch', 'version', 'release', 'arch', 'vendor')
+
+# Key that identifies a delta, instead of a full profile, and whose value is the
+# version of the delta's format
+DELTA_KEY = 'profile_delta'
+DELTA_VERSION = 1
+
+# Where a consumer keeps the profile it last sent
+SENT_PROFILE_PATH = '/var/cache/pulp/rpm-profile.json'
+
+# Seconds after which a consumer sends its full profile again, even if it has not
+# changed, in case the server's copy was lost or changed some other way
+SENT_PROFILE_MAX_AGE = 24 * 60 * 60
+
+
+class ProfileMismatch(ValueError):
+    """
+    Raised when a delta is not based on the profile it is applied to, in which case
+    the full profile needs to be sent.
+    """
+    pass
+
+
+def package_key(package):
+    """
+    :param package: package in a profile
+    :type  package: dict
+
+    :return:    values that identify the package, in an order that sorts packages
+    :rtype:     tuple
+    """
+    return tuple(package.get(field) for field in PACKAGE_FIELDS)
+
+
+def sort_profile(profile):
+    """
+    Sort a profile so that profiles with the same packages are the same list,
+    regardless of the order the packages were collected in.
+
+    :param profile: profile to sort
+    :type  profile: list
+
+    :return:    sorted copy of the profile
+    :rtype:     list
+    """
+    return sorted(profile, key=package_key)
+
+
+def profile_hash(profile):
+    """
+    :param profile: profile, in any order
+    :type  profile: list
+
+    :return:    hash of the packages in the profile, which is the same wherever it is
+                calculated, and however the packages are ordered
+    :rtype:     str
+    """
+    keys = sorted(package_key(package) for package in profile)
+    return hashlib.sha256(json.dumps(keys)).hexdigest()
+
+
+def create_delta(base_profile, profile):
+    """
+    :param base_profile:    profile that was last sent
+    :type  base_profile:    list
+    :param profile:         current profile
+    :type  profile:         list
+
+    :return:    delta that turns the base profile into the current profile
+    :rtype:     dict
+    """
+    base = dict((package_key(package), package) for package in base_profile)
+    current = dict((package_key(package), package) for package in profile)
+    return {
+        DELTA_KEY: DELTA_VERSION,
+        'base_hash': profile_hash(base_profile),
+        'added': [package for key, package in current.iteritems() if key not in base],
+        'removed': [package for key, package in base.iteritems() if key not in current],
+    }
+
+
+def is_delta(profile):
+    """
+    :param profile: profile or delta sent by a consumer
+    :type  profile: list or dict
+
+    :return:    True if it is a delta
+    :rtype:     bool
+    """
+    return isinstance(profile, dict) and DELTA_KEY in profile
+
+
+def apply_delta(base_profile, delta):
+    """
+    :param base_profile:    profile the delta should be based on
+    :type  base_profile:    list
+    :param delta:           delta created by create_delta
+    :type  delta:           dict
+
+    :return:    the profile with the delta applied, in no particular order
+    :rtype:     list
+
+    :raise ProfileMismatch: if the delta is not based on the profile, or is in an
+                            unknown format
+    """
+    if delta.get(DELTA_KEY) != DELTA_VERSION:
+        raise ProfileMismatch('unsupported profile delta version: %s' % delta.get(DELTA_KEY))
+    if profile_hash(base_profile) != delta.get('base_hash'):
+        raise ProfileMismatch('profile delta is not based on the stored profile')
+
+    removed = set(package_key(package) for package in delta.get('removed', []))
+    packages = dict((package_key(package), package) for package in base_profile
+                    if package_key(package) not in removed)
+    for package in delta.get('added', []):
+        packages[package_key(package)] = package
+    return packages.values()
+
+
+class SentProfile(object):
+    """
+    The profile a consumer last sent to the server, kept in a file so that the next
+    profile can be sent as a delta, or not at all if nothing changed.
+    """
+
+    def __init__(self, path=SENT_PROFILE_PATH, max_age=SENT_PROFILE_MAX_AGE):
+        """
+        :param path:    path to the file the profile is kept in
+        :type  path:    str
+        :param max_age: seconds after which the kept profile is ignored
+        :type  max_age: int
+        """
+        self.path = path
+        self.max_age = max_age
+
+    def load(self, consumer_id):
+        """
+        :param consumer_id: id of the consumer the profile was sent for
+        :type  consumer_id: str
+
+        :return:    the profile last sent for the consumer, or None if there is none,
+                    it was sent for another consumer, or it is too old
+        :rtype:     list
+        """
+        try:
+            with open(self.path) as f:
+                sent = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if sent.get('consumer_id') != consumer_id:
+            return None
+        if time.time() - sent.get('timestamp', 0) > self.max_age:
+            return None
+        return sent.get('profile')
+
+    def save(self, consumer_id, profile):
+        """
+        Keep a profile that was successfully sent to the server.
+
+        :param consumer_id: id of the consumer the profile was sent for
+        :type  consumer_id: str
+        :param profile:     profile that was sent
+        :type  profile:     list
+        """
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # write a new file and rename it, so that the kept profile is never partly written
+        tmp_path = '%s.tmp' % self.path
+        with open(tmp_path, 'w') as f:
+            json.dump({'consumer_id': consumer_id, 'timestamp': time.time(),
+                       'profile': profile}, f)
+        os.rename(tmp_path, self.path)
+
+    def clear(self):
+        """
+        Forget the kept profile, so that the full profile is sent next time.
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pulp_rpm.common import evr
+
+
+class CompareTests(unittest.TestCase):
+    """
+    Cases from rpm's own test suite for rpmvercmp, applied to the version.
+    """
+
+    def assert_compare(self, version_a, version_b, expected):
+        self.assertEqual(evr.compare(('0', version_a, '1'), ('0', version_b, '1')), expected)
+        self.assertEqual(evr.compare(('0', version_b, '1'), ('0', version_a, '1')), -expected)
+
+    def test_numbers(self):
+        self.assert_compare('1.0', '1.0', 0)
+        self.assert_compare('1.0', '2.0', -1)
+        self.assert_compare('2.0.1', '2.0.1', 0)
+        self.assert_compare('2.0', '2.0.1', -1)
+        self.assert_compare('2.0.1a', '2.0.1', 1)
+        self.assert_compare('5.5p10', '5.5p1', 1)
+        self.assert_compare('10xyz', '10.1xyz', -1)
+        self.assert_compare('xyz10.1', 'xyz10', 1)
+
+    def test_leading_zeroes(self):
+        self.assert_compare('1.001', '1.1', 0)
+        self.assert_compare('1.0010', '1.9', 1)
+
+    def test_letters(self):
+        self.assert_compare('5.5p1', '5.5p2', -1)
+        self.assert_compare('5.5p10', '5.5p1', 1)
+        self.assert_compare('xyz.4', '8', -1)
+        self.assert_compare('FC5', 'fc4', -1)
+
+    def test_separators(self):
+        self.assert_compare('2a', '2.a', 0)
+        self.assert_compare('1.0', '1_0', 0)
+        self.assert_compare('1+', '1', 0)
+        self.assert_compare('1.0', '1.0.', 0)
+
+    def test_tilde(self):
+        self.assert_compare('1.0~rc1', '1.0~rc1', 0)
+        self.assert_compare('1.0~rc1', '1.0', -1)
+        self.assert_compare('1.0~rc1', '1.0~rc2', -1)
+        self.assert_compare('1.0~rc1~git123', '1.0~rc1', -1)
+
+    def test_epoch(self):
+        self.assertEqual(evr.compare((1, '1.0', '1'), (0, '2.0', '1')), 1)
+        self.assertEqual(evr.compare((None, '1.0', '1'), ('0', '1.0', '1')), 0)
+        self.assertEqual(evr.compare(('', '1.0', '1'), (0, '1.0', '1')), 0)
+
+    def test_release(self):
+        self.assertEqual(evr.compare(('0', '1.0', '2.el6'), ('0', '1.0', '10.el6')), -1)
+        self.assertEqual(evr.compare(('0', '1.0', None), ('0', '1.0', '1')), -1)
+
+
+class NewestTests(unittest.TestCase):
+    def test_newest(self):
+        unit_keys = [{'epoch': '0', 'version': '1.9', 'release': '1'},
+                     {'epoch': '0', 'version': '1.10', 'release': '1'},
+                     {'epoch': '0', 'version': '1.10~rc1', 'release': '1'}]
+
+        self.assertTrue(evr.newest(unit_keys) is unit_keys[1])
+
+    def test_first_of_equals(self):
+        unit_keys = [{'epoch': '0', 'version': '1.01', 'release': '1'},
+                     {'epoch': None, 'version': '1.1', 'release': '1'}]
+
+        self.assertTrue(evr.newest(unit_keys) is unit_keys[0])
+
+    def test_get_evr(self):
+        packages = [('foo', ('0', '1', '1')), ('bar', ('0', '2', '1'))]
+
+        self.assertEqual(evr.newest(packages, lambda package: package[1]), packages[1])
+
+    def test_empty(self):
+        self.assertTrue(evr.newest([]) is None)
+
+
+class KeyCacheTests(unittest.TestCase):
+    def test_cached(self):
+        calls = []
+        cache = evr._KeyCache(4, lambda value: calls.append(value) or value.upper())
+
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertEqual(cache.get('a'), 'A')
+
+        self.assertEqual(calls, ['a'])
+
+    def test_least_recently_used_evicted(self):
+        calls = []
+        cache = evr._KeyCache(4, lambda value: calls.append(value) or value.upper())
+
+        for value in ('a', 'b', 'c', 'a', 'd', 'e', 'a', 'b'):
+            cache.get(value)
+
+        # "a" stayed in use, "b" was evicted
+        self.assertEqual(calls, ['a', 'b', 'c', 'd', 'e', 'b'])
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from pulp_rpm.common import rpm_profile
+
+
+def package(name, version='1.0', release='1.el6', epoch=0, arch='x86_64'):
+    return {'name': name, 'epoch': epoch, 'version': version, 'release': release,
+            'arch': arch, 'vendor': 'Red Hat, Inc.'}
+
+
+class ProfileTests(unittest.TestCase):
+    def test_sort_profile(self):
+        profile = [package('b'), package('a', version='2.0'), package('a')]
+
+        sorted_profile = rpm_profile.sort_profile(profile)
+
+        self.assertEqual(sorted_profile, [package('a'), package('a', version='2.0'), package('b')])
+
+    def test_profile_hash_order(self):
+        profile = [package('a'), package('b'), package('c')]
+
+        self.assertEqual(rpm_profile.profile_hash(profile),
+                         rpm_profile.profile_hash(list(reversed(profile))))
+
+    def test_profile_hash_unicode(self):
+        """
+        A profile that has been stored on the server has the same hash as when it was sent.
+        """
+        profile = [package('a')]
+        stored = [dict((unicode(k), unicode(v) if isinstance(v, str) else v)
+                       for k, v in p.items()) for p in profile]
+
+        self.assertEqual(rpm_profile.profile_hash(profile), rpm_profile.profile_hash(stored))
+
+    def test_profile_hash_different(self):
+        self.assertNotEqual(rpm_profile.profile_hash([package('a')]),
+                            rpm_profile.profile_hash([package('a', version='2.0')]))
+
+
+class DeltaTests(unittest.TestCase):
+    def setUp(self):
+        self.base = [package('a'), package('b'), package('c')]
+        self.profile = [package('a'), package('b', version='2.0'), package('c'), package('d')]
+
+    def test_create_delta(self):
+        delta = rpm_profile.create_delta(self.base, self.profile)
+
+        self.assertTrue(rpm_profile.is_delta(delta))
+        self.assertEqual(delta['base_hash'], rpm_profile.profile_hash(self.base))
+        self.assertEqual(rpm_profile.sort_profile(delta['added']),
+                         [package('b', version='2.0'), package('d')])
+        self.assertEqual(delta['removed'], [package('b')])
+
+    def test_apply_delta(self):
+        delta = rpm_profile.create_delta(self.base, self.profile)
+
+        profile = rpm_profile.apply_delta(self.base, delta)
+
+        self.assertEqual(rpm_profile.sort_profile(profile), rpm_profile.sort_profile(self.profile))
+
+    def test_apply_delta_mismatch(self):
+        delta = rpm_profile.create_delta(self.base, self.profile)
+
+        self.assertRaises(rpm_profile.ProfileMismatch, rpm_profile.apply_delta,
+                          self.base[:2], delta)
+
+    def test_apply_delta_version(self):
+        delta = rpm_profile.create_delta(self.base, self.profile)
+        delta[rpm_profile.DELTA_KEY] = rpm_profile.DELTA_VERSION + 1
+
+        self.assertRaises(rpm_profile.ProfileMismatch, rpm_profile.apply_delta,
+                          self.base, delta)
+
+    def test_is_delta(self):
+        self.assertFalse(rpm_profile.is_delta(self.profile))
+        self.assertFalse(rpm_profile.is_delta({}))
+
+
+class SentProfileTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sent_profile = rpm_profile.SentProfile(
+            os.path.join(self.tmp_dir, 'cache', 'rpm-profile.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_load(self):
+        profile = [package('a')]
+
+        self.sent_profile.save('consumer-1', profile)
+
+        self.assertEqual(self.sent_profile.load('consumer-1'), profile)
+
+    def test_load_missing(self):
+        self.assertTrue(self.sent_profile.load('consumer-1') is None)
+
+    def test_load_other_consumer(self):
+        self.sent_profile.save('consumer-1', [package('a')])
+
+        self.assertTrue(self.sent_profile.load('consumer-2') is None)
+
+    def test_load_too_old(self):
+        self.sent_profile.save('consumer-1', [package('a')])
+        self.sent_profile.max_age = 60
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertTrue(self.sent_profile.load('consumer-1') is None)
+
+    def test_load_corrupt(self):
+        self.sent_profile.save('consumer-1', [package('a')])
+        with open(self.sent_profile.path, 'w') as f:
+            f.write('{"consumer')
+
+        self.assertTrue(self.sent_profile.load('consumer-1') is None)
+
+    def test_clear(self):
+        self.sent_profile.save('consumer-1', [package('a')])
+
+        self.sent_profile.clear()
+        self.sent_profile.clear()
+
+        self.assertTrue(self.sent_profile.load('consumer-1') is None)
@@ -65,12 +65,18 @@ def get_sync_conduit(existing_units=None, pkg_dir=None, pulp_units=None):
                 if u.type_id == type_id:
                     if criteria['filters'] is None:
                         ret_val.append(u)
-                    else:
-                        for key, value in criteria['filter'].items():
-                            if key in u.unit_key and u.unit_key[key] == value:
-                                ret_val.append(u)
+                    elif _matches(u, criteria['filters']):
+                        ret_val.append(u)
         return ret_val
 
+    def _matches(unit, filters):
+        if '$or' in filters:
+            return any(_matches(unit, f) for f in filters['$or'])
+        for key, value in filters.items():
+            if key not in unit.unit_key or unit.unit_key[key] != value:
+                return False
+        return True
+
     sync_conduit = mock.Mock(spec=RepoSyncConduit)
     sync_conduit._added_count = sync_conduit._updated_count = sync_conduit._removed_count = 0
     sync_conduit.init_unit.side_effect = side_effect
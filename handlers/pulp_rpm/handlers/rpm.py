@@ -6,6 +6,7 @@ from rhsm.profile import get_profile
 from pulp.agent.lib.handler import ContentHandler
 from pulp.agent.lib.report import ProfileReport, ContentReport
 
+from pulp_rpm.common import rpm_profile
 from pulp_rpm.handlers.rpmtools import Package, PackageGroup, ProgressReport
 
 log = getLogger(__name__)
@@ -168,6 +169,12 @@ class PackageHandler(ContentHandler):
         report = ProfileReport()
         details = get_profile("rpm").collect()
         report.set_succeeded(details)
+        # The agent sends this profile in full, so the profile the yum plugin last
+        # sent is no longer the server's, and the plugin must send its next one in full.
+        try:
+            rpm_profile.SentProfile().clear()
+        except OSError, e:
+            log.warn('unable to clear the sent profile: %s', e)
         return report
 
     def __impl(self, conduit, options):
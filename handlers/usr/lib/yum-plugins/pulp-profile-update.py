@@ -7,6 +7,8 @@ from pulp.bindings.bindings import Bindings
 from pulp.common.bundle import Bundle as BundleImpl
 from pulp.client.consumer.config import read_config
 
+from pulp_rpm.common import rpm_profile
+
 
 requires_api_version = '2.5'
 plugin_type = (TYPE_CORE,)
@@ -49,6 +51,27 @@ class PulpBindings(Bindings):
 # yum plugin
 #
 
+def send_profile(conduit, bindings, myid, profile, sent_profile):
+    """
+    Send only what has changed since the profile that was last sent, if anything.
+    If the server rejects the delta, which it does if its profile is not the one
+    the delta is based on, the full profile is sent instead.
+
+    :return: the HTTP response, or None if the profile has not changed
+    """
+    base_profile = sent_profile.load(myid)
+    if base_profile is not None:
+        if rpm_profile.profile_hash(base_profile) == rpm_profile.profile_hash(profile):
+            return None
+        if conduit.confBool('main', 'delta', default=True):
+            delta = rpm_profile.create_delta(base_profile, profile)
+            try:
+                return bindings.profile.send(myid, 'rpm', delta)
+            except Exception, e:
+                conduit.info(2, 'pulp: profile delta not accepted, sending full profile: %s' % e)
+    return bindings.profile.send(myid, 'rpm', profile)
+
+
 def posttrans_hook(conduit):
     """
     Send content unit profile to Pulp.
@@ -60,7 +83,12 @@ def posttrans_hook(conduit):
             return  # not registered
         bindings = PulpBindings()
         profile = get_profile('rpm').collect()
-        http = bindings.profile.send(myid, 'rpm', profile)
+        sent_profile = rpm_profile.SentProfile()
+        http = send_profile(conduit, bindings, myid, profile, sent_profile)
+        if http is None:
+            conduit.info(2, 'pulp: profile unchanged, not sent')
+            return
+        sent_profile.save(myid, profile)
         msg = 'pulp: profile sent, status=%d' % http.response_code
         conduit.info(2, msg)
     except Exception, e:
@@ -0,0 +1,71 @@
+"""
+Micro-benchmarks for comparing RPM versions: encoding both sides with
+version_utils.encode for every comparison, as depsolve did, rpmUtils'
+compareEVR, as the profiler did, and the cached sort keys of
+pulp_rpm.common.evr. Also compares picking the newest of each package's
+versions.
+
+Usage: python evr_compare.py [number of comparisons]
+"""
+import random
+import sys
+import time
+
+from pulp_rpm.common import evr, version_utils
+
+try:
+    from rpmUtils.miscutils import compareEVR
+except ImportError:
+    compareEVR = None
+
+
+def make_evrs(count):
+    random.seed(0)
+    evrs = []
+    for i in xrange(count):
+        version = '.'.join(str(random.randint(0, 20)) for j in xrange(random.randint(1, 4)))
+        release = '%d.el%d' % (random.randint(1, 30), random.choice((5, 6, 7)))
+        evrs.append((str(random.choice((0, 0, 0, 1))), version, release))
+    return evrs
+
+
+def encode_compare(a, b):
+    return cmp([version_utils.encode(value) for value in a],
+               [version_utils.encode(value) for value in b])
+
+
+def encode_newest(evrs):
+    return max((tuple(version_utils.encode(value) for value in e), e) for e in evrs)[1]
+
+
+def evr_newest(evrs):
+    return evr.newest(evrs, lambda e: e)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    # a realistic number of distinct versions, compared over and over
+    evrs = make_evrs(5000)
+    pairs = [(random.choice(evrs), random.choice(evrs)) for i in xrange(count)]
+
+    print '%d comparisons of %d distinct versions' % (count, len(evrs))
+    compare_functions = [encode_compare, evr.compare]
+    if compareEVR is not None:
+        compare_functions.insert(1, compareEVR)
+    for func in compare_functions:
+        start = time.time()
+        for a, b in pairs:
+            func(a, b)
+        print '%-20s %8.2fs' % (func.__name__, time.time() - start)
+
+    groups = [random.sample(evrs, 50) for i in xrange(count / 50)]
+    print 'newest of 50, %d times' % len(groups)
+    for func in (encode_newest, evr_newest):
+        start = time.time()
+        for group in groups:
+            func(group)
+        print '%-20s %8.2fs' % (func.__name__, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the old two-pass handling of primary.xml during a sync with the
+single-pass handling that extracts only unit keys and spills each package
+element to a PackageModelIndex. Use a percentage of 0 to measure a no-op resync.
+
+Usage: python primary_single_pass.py [number of packages] [percent to download]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pulp_rpm.plugins.importers.yum.repomd import packages, primary
+
+import synthetic
+
+
+def _models(primary_path):
+    return packages.package_list_generator(open(primary_path), primary.PACKAGE_TAG,
+                                           primary.process_package_element)
+
+
+def _pick(wanted, percent):
+    step = max(1, int(100 / percent)) if percent else None
+    return set(w for i, w in enumerate(wanted) if step and i % step == 0)
+
+
+def two_pass(primary_path, working_dir, percent):
+    wanted = [model.as_named_tuple for model in _models(primary_path)]
+    to_download = _pick(wanted, percent)
+    return [model for model in _models(primary_path) if model.as_named_tuple in to_download]
+
+
+def single_pass(primary_path, working_dir, percent):
+    index = packages.PackageModelIndex(os.path.join(working_dir, 'primary_models.db'),
+                                       primary.process_package_element)
+    try:
+        elements = packages.package_list_generator(open(primary_path), primary.PACKAGE_TAG)
+        wanted = [model.as_named_tuple for model in
+                  index.tee(elements, primary.process_package_element_keys)]
+        to_download = _pick(wanted, percent)
+        return list(index.models(to_download))
+    finally:
+        index.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    percent = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    working_dir = tempfile.mkdtemp()
+    try:
+        primary_path = os.path.join(working_dir, 'primary.xml')
+        with open(primary_path, 'w') as primary_file:
+            synthetic.write_primary(primary_file, count)
+
+        print '%d packages, %.1f%% to download' % (count, percent)
+        for func in (two_pass, single_pass):
+            start = time.time()
+            downloaded = func(primary_path, working_dir, percent)
+            print '%-12s %8.2fs (%d models)' % (func.__name__, time.time() - start,
+                                                len(downloaded))
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Drive OidValidator.is_valid, as the repo auth handler does for every request,
+with URLs spread over many protected repos. Requests are timed with the
+per-process caches emptied before each one, which reads and parses every file
+as was done before they existed, and with the caches kept. Also compares
+finding the protected repo of a URL by scanning every listing with the trie.
+
+The certificates are the ones used by the repo_auth unit tests; the client
+certificate has no entitlements, so requests are denied after all of the work
+is done. The client certificate is verified, but if it has expired, it is
+never cached as verified.
+
+Usage: python repo_auth.py [repos] [requests]
+"""
+from ConfigParser import SafeConfigParser
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from pulp_rpm.repo_auth import file_cache, oid_validation, repo_cert_utils
+from pulp_rpm.repo_auth.protected_repo_utils import ProtectedPathTrie, ProtectedRepoListingFile
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '../../plugins/test/data/test_repo_cert_utils')
+
+
+def setup(tmp_dir, repo_count):
+    config = SafeConfigParser()
+    config.add_section('main')
+    config.set('main', 'log_failed_cert', 'false')
+    config.add_section('repos')
+    config.set('repos', 'cert_location', os.path.join(tmp_dir, 'repos'))
+    config.set('repos', 'global_cert_location', os.path.join(tmp_dir, 'global'))
+    config.set('repos', 'protected_repo_listing_file', os.path.join(tmp_dir, 'listings'))
+
+    ca = open(os.path.join(DATA_DIR, 'valid_ca.crt')).read()
+    cert_utils = repo_cert_utils.RepoCertUtils(config)
+    listings = ProtectedRepoListingFile(config.get('repos', 'protected_repo_listing_file'))
+    relative_paths = []
+    for i in xrange(repo_count):
+        repo_id = 'repo-%d' % i
+        relative_path = 'content/dist/rhel/server/%d/%d/x86_64/os' % (i % 7, i)
+        relative_paths.append(relative_path)
+        listings.add_protected_repo_path(relative_path, repo_id)
+        cert_utils.write_consumer_cert_bundle(repo_id, {'ca': ca, 'cert': None})
+    listings.save()
+    cert_utils.write_global_repo_cert_bundle({'ca': ca, 'cert': None})
+    return config, listings.listings, relative_paths
+
+
+def make_urls(relative_paths, count):
+    random.seed(0)
+    files = ['repodata/repomd.xml', 'repodata/primary.xml.gz',
+             'Packages/bash-4.1.2-15.el6_4.x86_64.rpm']
+    urls = []
+    for i in xrange(count):
+        urls.append('/pulp/repos/%s/%s' % (random.choice(relative_paths), random.choice(files)))
+    return urls
+
+
+def scan(listings, repo_url):
+    for relative_url in listings.keys():
+        if repo_url.find(relative_url) != -1:
+            return listings[relative_url]
+
+
+def ignore(message):
+    pass
+
+
+def main():
+    repo_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    request_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    cert_pem = open(os.path.join(DATA_DIR, 'cert.crt')).read()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        config, listings, relative_paths = setup(tmp_dir, repo_count)
+        urls = make_urls(relative_paths, request_count)
+
+        print '%d requests against %d protected repos' % (request_count, repo_count)
+        for name, clear in (('uncached', True), ('cached', False)):
+            file_cache.clear()
+            repo_cert_utils._ca_chains.clear()
+            oid_validation.clear_cert_caches()
+            start = time.time()
+            for url in urls:
+                if clear:
+                    file_cache.clear()
+                    repo_cert_utils._ca_chains.clear()
+                    oid_validation.clear_cert_caches()
+                validator = oid_validation.OidValidator(config)
+                validator.is_valid(url, cert_pem, ignore)
+            print '%-20s %8.2fs' % (name, time.time() - start)
+
+        repo_urls = [url[len(oid_validation.RELATIVE_URL):] for url in urls]
+        print 'finding the protected repo of %d urls' % len(repo_urls)
+        start = time.time()
+        for repo_url in repo_urls:
+            scan(listings, repo_url)
+        print '%-20s %8.2fs' % ('scan', time.time() - start)
+        start = time.time()
+        trie = ProtectedPathTrie(listings)
+        for repo_url in repo_urls:
+            trie.find(repo_url)
+        print '%-20s %8.2fs' % ('trie', time.time() - start)
+    finally:
+        shutil.rmtree(tmp_dir)
+        file_cache.clear()
+
+
+if __name__ == '__main__':
+    main()
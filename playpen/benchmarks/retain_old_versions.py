@@ -0,0 +1,67 @@
+"""
+Compare choosing which versions of each package to keep, as done for the
+"retain old count" setting during a sync and when purging old versions, using
+the old approach of sorting the kept versions for every package seen with
+the heap kept by NewestVersions.
+
+Usage: python retain_old_versions.py [names] [versions per name] [retain old count ...]
+"""
+import random
+import sys
+import time
+
+from pulp_rpm.common import version_utils
+from pulp_rpm.plugins.importers.yum.versions import NewestVersions
+
+
+def sorted_select(packages, number_old_versions_to_keep):
+    wanted = {}
+    for key, serialized_version in packages:
+        versions = wanted.setdefault(key, {})
+        number_to_keep = number_old_versions_to_keep + 1
+        if len(versions) < number_to_keep:
+            versions[serialized_version] = key
+        else:
+            smallest_version = sorted(versions.keys(), reverse=True)[:number_to_keep][-1]
+            if serialized_version > smallest_version:
+                del versions[smallest_version]
+                versions[serialized_version] = key
+    return sum(len(versions) for versions in wanted.itervalues())
+
+
+def heap_select(packages, number_old_versions_to_keep):
+    newest = NewestVersions(number_old_versions_to_keep + 1)
+    for key, serialized_version in packages:
+        newest.add(key, serialized_version, key)
+    return len(list(newest.items()))
+
+
+def make_packages(names, versions_per_name):
+    packages = []
+    for i in xrange(names):
+        for j in xrange(versions_per_name):
+            packages.append(('package-%d-x86_64' % i,
+                             ('0', version_utils.encode('1.%d' % j), '1.el6')))
+    # metadata is not ordered by version
+    random.seed(0)
+    random.shuffle(packages)
+    return packages
+
+
+def main():
+    names = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    versions_per_name = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    retain_counts = [int(arg) for arg in sys.argv[3:]] or [0, 5, 50]
+    packages = make_packages(names, versions_per_name)
+
+    print '%d names, %d versions each' % (names, versions_per_name)
+    for retain_count in retain_counts:
+        for func in (sorted_select, heap_select):
+            start = time.time()
+            kept = func(packages, retain_count)
+            print 'retain %-4d %-15s %8.2fs  %d kept' % (
+                retain_count, func.__name__, time.time() - start, kept)
+
+
+if __name__ == '__main__':
+    main()
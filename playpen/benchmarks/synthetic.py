@@ -0,0 +1,80 @@
+"""
+Helpers for generating synthetic repository metadata for the benchmarks in
+this directory.
+"""
+
+PRIMARY_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" \
+xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="%(count)d">
+"""
+
+PRIMARY_PACKAGE = """<package type="rpm">
+  <name>%(name)s</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="%(version)s" rel="1.el6"/>
+  <checksum type="sha256" pkgid="YES">%(checksum)s</checksum>
+  <summary>Synthetic package %(name)s</summary>
+  <description>A synthetic package used for benchmarking.</description>
+  <packager>Benchmark</packager>
+  <url>http://example.com/</url>
+  <time file="1354638418" build="1354638409"/>
+  <size package="%(size)d" installed="4096" archive="4400"/>
+  <location href="Packages/%(name)s-%(version)s-1.el6.x86_64.rpm"/>
+  <format>
+    <rpm:license>GPLv2</rpm:license>
+    <rpm:vendor/>
+    <rpm:group>Development/Tools</rpm:group>
+    <rpm:buildhost>builder.example.com</rpm:buildhost>
+    <rpm:sourcerpm>%(name)s-%(version)s-1.el6.src.rpm</rpm:sourcerpm>
+    <rpm:header-range start="880" end="3000"/>
+    <rpm:provides>
+      <rpm:entry name="%(name)s" flags="EQ" epoch="0" ver="%(version)s" rel="1.el6"/>
+      <rpm:entry name="%(name)s(x86-64)" flags="EQ" epoch="0" ver="%(version)s" rel="1.el6"/>
+    </rpm:provides>
+    <rpm:requires>
+      <rpm:entry name="libc.so.6()(64bit)"/>
+      <rpm:entry name="rtld(GNU_HASH)"/>
+    </rpm:requires>
+    <file>/usr/bin/%(name)s</file>
+  </format>
+</package>
+"""
+
+PRIMARY_FOOTER = '</metadata>\n'
+
+
+def package_nevras(names, versions_per_name):
+    """
+    :param names:               number of distinct package names
+    :type  names:               int
+    :param versions_per_name:   number of versions of each name
+    :type  versions_per_name:   int
+
+    :return:    generator of (name, version) tuples
+    :rtype:     generator
+    """
+    for i in xrange(names):
+        for j in xrange(versions_per_name):
+            yield 'package-%d' % i, '1.%d' % j
+
+
+def write_primary(file_handle, names, versions_per_name=1):
+    """
+    Write a primary.xml document with the given number of packages.
+
+    :param file_handle:         open file handle to write to
+    :type  file_handle:         file
+    :param names:               number of distinct package names
+    :type  names:               int
+    :param versions_per_name:   number of versions of each name
+    :type  versions_per_name:   int
+    """
+    file_handle.write(PRIMARY_HEADER % {'count': names * versions_per_name})
+    for i, (name, version) in enumerate(package_nevras(names, versions_per_name)):
+        file_handle.write(PRIMARY_PACKAGE % {
+            'name': name,
+            'version': version,
+            'checksum': '%064x' % i,
+            'size': 1024 + i,
+        })
+    file_handle.write(PRIMARY_FOOTER)
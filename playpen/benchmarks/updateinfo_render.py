@@ -0,0 +1,102 @@
+"""
+Compare rendering errata for updateinfo.xml by building an ElementTree and
+serializing it, as was done before, with render_erratum, which writes the XML
+directly, and with writing the snippet that is pre-rendered at sync time.
+
+Usage: python updateinfo_render.py [number of errata] [packages per erratum]
+"""
+import sys
+import time
+from xml.etree import ElementTree
+
+from pulp_rpm.plugins.distributors.yum.metadata.updateinfo import render_erratum
+
+
+def render_erratum_tree(erratum_id, metadata):
+    update_attributes = {'status': metadata['status'],
+                         'type': metadata['type'],
+                         'version': metadata['version'],
+                         'from': metadata.get('from', '') or ''}
+    update_element = ElementTree.Element('update', update_attributes)
+    ElementTree.SubElement(update_element, 'id').text = erratum_id
+    ElementTree.SubElement(update_element, 'issued', {'date': metadata['issued']})
+    ElementTree.SubElement(update_element, 'reboot_suggested').text = \
+        str(metadata['reboot_suggested'])
+    for key in ('title', 'release', 'rights', 'solution', 'severity', 'summary', 'pushcount'):
+        value = metadata.get(key)
+        if value:
+            ElementTree.SubElement(update_element, key).text = unicode(value)
+    ElementTree.SubElement(update_element, 'description').text = \
+        unicode(metadata.get('description') or '')
+    if metadata.get('updated'):
+        ElementTree.SubElement(update_element, 'updated', {'date': metadata['updated']})
+    references_element = ElementTree.SubElement(update_element, 'references')
+    for reference in metadata['references']:
+        ElementTree.SubElement(references_element, 'reference',
+                               {'id': reference['id'] or '', 'title': reference['title'] or '',
+                                'type': reference['type'], 'href': reference['href']})
+    for pkglist in metadata['pkglist']:
+        pkglist_element = ElementTree.SubElement(update_element, 'pkglist')
+        collection_element = ElementTree.SubElement(pkglist_element, 'collection',
+                                                    {'short': pkglist['short']})
+        ElementTree.SubElement(collection_element, 'name').text = pkglist['name']
+        for package in pkglist['packages']:
+            package_element = ElementTree.SubElement(
+                collection_element, 'package',
+                {'name': package['name'], 'version': package['version'],
+                 'release': package['release'], 'epoch': package['epoch'] or '0',
+                 'arch': package['arch'], 'src': package['src'] or ''})
+            ElementTree.SubElement(package_element, 'filename').text = package['filename']
+            checksum_type, checksum_value = package['sum']
+            ElementTree.SubElement(package_element, 'sum', {'type': checksum_type}).text = \
+                checksum_value
+            ElementTree.SubElement(package_element, 'reboot_suggested').text = 'False'
+    return ElementTree.tostring(update_element, 'utf-8')
+
+
+def make_errata(count, packages_per_erratum):
+    errata = []
+    for i in range(count):
+        packages = [{'name': 'package-%d' % j, 'version': '1.%d' % i, 'release': '1.el7',
+                     'epoch': None, 'arch': 'x86_64', 'src': 'package-%d.src.rpm' % j,
+                     'filename': 'package-%d-1.%d-1.el7.x86_64.rpm' % (j, i),
+                     'sum': ('sha256', '%064x' % (i * packages_per_erratum + j))}
+                    for j in range(packages_per_erratum)]
+        metadata = {'from': 'security@example.com', 'status': 'final', 'type': 'security',
+                    'version': '1', 'issued': '2015-01-01 00:00:00', 'updated': '',
+                    'reboot_suggested': False, 'title': 'Erratum %d & friends' % i,
+                    'release': '', 'rights': 'Copyright', 'solution': '', 'severity': 'Low',
+                    'summary': 'An <important> update', 'pushcount': '1',
+                    'description': 'Fixes "bugs".\n' * 20,
+                    'references': [{'id': 'CVE-2015-%04d' % i, 'title': None, 'type': 'cve',
+                                    'href': 'https://example.com/?id=%d&x=y' % i}],
+                    'pkglist': [{'name': 'collection', 'short': 'c', 'packages': packages}]}
+        errata.append(('ERRATUM-%d' % i, metadata))
+    return errata
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    packages_per_erratum = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    errata = make_errata(count, packages_per_erratum)
+
+    for erratum_id, metadata in errata[:100]:
+        assert render_erratum(erratum_id, metadata) == render_erratum_tree(erratum_id, metadata)
+
+    print '%d errata, %d packages each' % (count, packages_per_erratum)
+    for func in (render_erratum_tree, render_erratum):
+        start = time.time()
+        for erratum_id, metadata in errata:
+            func(erratum_id, metadata)
+        print '%-20s %8.2fs' % (func.__name__, time.time() - start)
+
+    snippets = [render_erratum(erratum_id, metadata).decode('utf-8')
+                for erratum_id, metadata in errata]
+    start = time.time()
+    for snippet in snippets:
+        snippet.encode('utf-8')
+    print '%-20s %8.2fs' % ('pre-rendered', time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
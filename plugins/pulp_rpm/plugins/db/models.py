@@ -408,7 +408,7 @@ class ISO(object):
         """
         return self._unit.storage_path
 
-    def validate(self, full_validation=True):
+    def validate(self, full_validation=True, actual_size=None, actual_checksum=None):
         """
         Validate that the name of the ISO is not the same as the manifest's name. Also, if
         full_validation is True, validate that the file found at self.storage_path matches the size
@@ -417,6 +417,11 @@ class ISO(object):
         :param full_validation: Whether or not to perform validation on the size and checksum of the
                                 ISO. Name validation is always performed.
         :type  full_validation: bool
+        :param actual_size:     The size of the file, if it is already known, for example because
+                                it was counted while the file was downloaded
+        :type  actual_size:     int
+        :param actual_checksum: The SHA-256 checksum of the file, if it is already known
+        :type  actual_checksum: basestring
         """
         # Don't allow PULP_MANIFEST to be the name
         if self.name == ISOManifest.FILENAME:
@@ -426,37 +431,36 @@ class ISO(object):
             raise ValueError(msg)
 
         if full_validation:
-
+            # The file is only read for what is not already known
+            destination_file = None
             try:
-                destination_file = open(self.storage_path)
-
-            except:
-                # Cannot have an else clause to the try without the except.
-                raise
-
-            else:
-                try:
-                    # Validate the size
+                # Validate the size
+                if actual_size is None:
+                    destination_file = open(self.storage_path)
                     actual_size = self.calculate_size(destination_file)
-                    if actual_size != self.size:
-                        raise ValueError(_('Downloading <%(name)s> failed validation. '
-                                           'The manifest specified that the file should be %('
-                                           'expected)s bytes, but '
-                                           'the downloaded file is %(found)s bytes.') % {
-                                         'name': self.name,
-                                         'expected': self.size,
-                                         'found': actual_size})
-
-                    # Validate the checksum
+                if actual_size != self.size:
+                    raise ValueError(_('Downloading <%(name)s> failed validation. '
+                                       'The manifest specified that the file should be %('
+                                       'expected)s bytes, but '
+                                       'the downloaded file is %(found)s bytes.') % {
+                                     'name': self.name,
+                                     'expected': self.size,
+                                     'found': actual_size})
+
+                # Validate the checksum
+                if actual_checksum is None:
+                    if destination_file is None:
+                        destination_file = open(self.storage_path)
                     actual_checksum = self.calculate_checksum(destination_file)
-                    if actual_checksum != self.checksum:
-                        raise ValueError(
-                            _('Downloading <%(name)s> failed checksum validation. The manifest '
-                              'specified the checksum to be %(c)s, but it was %(f)s.') % {
-                                'name': self.name, 'c': self.checksum,
-                                'f': actual_checksum})
-
-                finally:
+                if actual_checksum != self.checksum:
+                    raise ValueError(
+                        _('Downloading <%(name)s> failed checksum validation. The manifest '
+                          'specified the checksum to be %(c)s, but it was %(f)s.') % {
+                            'name': self.name, 'c': self.checksum,
+                            'f': actual_checksum})
+
+            finally:
+                if destination_file is not None:
                     destination_file.close()
 
     @staticmethod
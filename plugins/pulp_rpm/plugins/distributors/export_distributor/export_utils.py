@@ -93,6 +93,16 @@ def validate_export_config(config):
                 msg = _('iso_size is not a positive integer')
                 _logger.error(msg)
                 return False, msg
+        if key == constants.ISO_WORKERS_KEYWORD:
+            if int(value) < 1:
+                msg = _('iso_workers is not a positive integer')
+                _logger.error(msg)
+                return False, msg
+        if key == constants.ISO_FILL_KEYWORD:
+            if not isinstance(value, bool):
+                msg = _("iso_fill should be a boolean; got %s instead" % value)
+                _logger.error(msg)
+                return False, msg
         if key == constants.START_DATE_KEYWORD:
             try:
                 dateutils.parse_iso8601_datetime(str(value))
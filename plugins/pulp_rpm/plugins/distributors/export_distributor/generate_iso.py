@@ -4,8 +4,11 @@ import os
 import commands
 import datetime
 import tempfile
+from multiprocessing.pool import ThreadPool
 from stat import ST_SIZE
 
+from pulp.server.exceptions import PulpCodedException
+
 from pulp_rpm.yum_plugin.util import getLogger
 
 
@@ -16,8 +19,12 @@ DVD_ISO_SIZE = 4380
 
 MKISOFS_COMMAND_TEMPLATE = "mkisofs -r -D -graft-points -path-list %s -o %s"
 
+# Default number of images that are written at the same time
+MKISOFS_WORKERS = 2
+
 
-def create_iso(target_dir, output_dir, prefix, image_size=DVD_ISO_SIZE, progress_callback=None):
+def create_iso(target_dir, output_dir, prefix, image_size=DVD_ISO_SIZE, progress_callback=None,
+               workers=MKISOFS_WORKERS, fill_images=False):
     """
     Run the export process.
 
@@ -35,6 +42,13 @@ def create_iso(target_dir, output_dir, prefix, image_size=DVD_ISO_SIZE, progress
                                 take the following parameters: a string to use as the key in a
                                 dictionary, and the second parameter is assigned to it.
     :type  progress_callback:   function
+    :param workers:             The maximum number of images to write at the same time
+    :type  workers:             int
+    :param fill_images:         If True, files are packed into as few images as possible,
+                                largest first, instead of in the order they were found
+    :type  fill_images:         bool
+
+    :raise PulpCodedException: if mkisofs fails to write any of the images
     """
     # Validate the configuration
     image_size = _parse_image_size(image_size)
@@ -46,12 +60,36 @@ def create_iso(target_dir, output_dir, prefix, image_size=DVD_ISO_SIZE, progress
     file_list, total_dir_size = _get_dir_file_list_and_size(target_dir)
 
     # image_list is a list of the images to write. Each item in the list is a list of file paths.
-    image_list = _compute_image_files(file_list, image_size)
-    image_count = len(image_list)
+    if fill_images:
+        image_list = _compute_filled_image_files(file_list, image_size)
+    else:
+        image_list = _compute_image_files(file_list, image_size)
 
-    for i in range(image_count):
+    # Each image is written by a separate mkisofs process
+    image_args = []
+    for i, image_files in enumerate(image_list):
         name = "%s-%s-%02d.iso" % (prefix, start_time.strftime("%Y-%m-%dT%H.%M"), i + 1)
-        _make_iso(image_list[i], target_dir, output_dir, name)
+        image_args.append((image_files, target_dir, output_dir, name))
+
+    if workers is None or workers < 2 or len(image_args) < 2:
+        for args in image_args:
+            _make_iso(*args)
+        return
+
+    pool = ThreadPool(processes=min(workers, len(image_args)))
+    try:
+        # this raises the first error of any image, once all of them are done
+        pool.map(_make_iso_args, image_args)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _make_iso_args(args):
+    """
+    Call _make_iso with a tuple of its arguments, for use with a pool's map method.
+    """
+    return _make_iso(*args)
 
 
 def _make_iso(file_list, target_dir, output_dir, filename):
@@ -70,6 +108,8 @@ def _make_iso(file_list, target_dir, output_dir, filename):
     :param filename:    The filename to use for the ISO image. This should be relative to the output
                         directory.
     :type  filename:    str
+
+    :raise PulpCodedException: if mkisofs fails
     """
     file_path = os.path.join(output_dir, filename)
 
@@ -85,9 +125,10 @@ def _make_iso(file_list, target_dir, output_dir, filename):
     os.unlink(pathspec_file)
 
     if status != 0:
-        log.error("Error creating iso %s; status code: %d; output: %s" % (file_path, status, out))
-    else:
-        log.info('Successfully created iso %s' % file_path)
+        msg = "Error creating iso %s; status code: %d; output: %s" % (file_path, status, out)
+        log.error(msg)
+        raise PulpCodedException(message=msg)
+    log.info('Successfully created iso %s' % file_path)
 
 
 def _parse_image_size(image_size):
@@ -128,32 +169,62 @@ def _compute_image_files(file_list, max_image_size):
     :rtype: list of list of str
     """
     images = []
+    image = []
+    image_size = 0
+
+    # Fill each image with files in order, starting a new image when the next file doesn't fit
+    for file_path, file_size in file_list:
+        # An edge case, but if the file is too big to fit on a single ISO, we should stop
+        if file_size > max_image_size:
+            raise ValueError(
+                'The maximum ISO size is not large enough to contain %s' % file_path)
+
+        if image and image_size + file_size > max_image_size:
+            images.append(image)
+            image = []
+            image_size = 0
+
+        # Append the file path to the image and update the size of this image
+        image.append(file_path)
+        image_size += file_size
+
+    if image:
+        images.append(image)
 
-    # While we have files in the list, create images
-    while len(file_list) > 0:
-        image = []
-        image_size = 0
-        # Keep track of the last file written so we can trim the list
-        last_file_written = None
-
-        for file_path, file_size in file_list:
-            # An edge case, but if the file is too big to fit on a single ISO, we should stop
-            if file_size > max_image_size:
-                raise ValueError(
-                    'The maximum ISO size is not large enough to contain %s' % file_path)
-
-            if image_size + file_size > max_image_size:
-                # If adding this file exceeds image size, break out of the for loop
-                break
+    return images
 
-            # Append the file path to the image and update the size of this image
-            image.append(file_path)
-            image_size += file_size
-            last_file_written = (file_path, file_size)
 
-        # Trim the list to the last item written plus 1, then add the image and start again
-        file_list = file_list[file_list.index(last_file_written) + 1:]
-        images.append(image)
+def _compute_filled_image_files(file_list, max_image_size):
+    """
+    Compute file lists to be written to each media image, using as few images as practical. Files
+    are placed largest first, each into the first image that has room for it.
+
+    :param file_list:       A list of tuples, where each tuple is (file_path, file_size),
+                            usually the output of get_dir_file_list_and_size
+    :type  file_list:       [(str, int)]
+    :param max_image_size:  The maximum size of image in bytes
+    :type  max_image_size:  int
+
+    :return: list of images, which are themselves a list of file paths
+    :rtype: list of list of str
+    """
+    images = []
+    # free space left in each image, in the same order as images
+    free_space = []
+
+    for file_path, file_size in sorted(file_list, key=lambda f: f[1], reverse=True):
+        if file_size > max_image_size:
+            raise ValueError(
+                'The maximum ISO size is not large enough to contain %s' % file_path)
+
+        for i, free in enumerate(free_space):
+            if file_size <= free:
+                images[i].append(file_path)
+                free_space[i] -= file_size
+                break
+        else:
+            images.append([file_path])
+            free_space.append(max_image_size - file_size)
 
     return images
 
@@ -2,14 +2,15 @@ import os
 
 from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
 
-from pulp_rpm.plugins.distributors.yum.metadata.metadata import REPO_DATA_DIR_NAME
+from pulp_rpm.plugins.distributors.yum.metadata.metadata import (
+    REPO_DATA_DIR_NAME, ChecksumWriterMixin)
 
 
 FILE_LISTS_XML_FILE_NAME = 'filelists.xml.gz'
 FILE_LISTS_NAMESPACE = 'http://linux.duke.edu/metadata/filelists'
 
 
-class FilelistsXMLFileContext(FastForwardXmlFileContext):
+class FilelistsXMLFileContext(ChecksumWriterMixin, FastForwardXmlFileContext):
     """
     Context manager for generating the filelists.xml.gz file.
     """
@@ -3,6 +3,7 @@ import gzip
 import os
 import traceback
 from gettext import gettext as _
+from xml.sax.saxutils import XMLGenerator
 
 from pulp_rpm.yum_plugin import util
 
@@ -12,6 +13,9 @@ HASHLIB_ALGORITHMS = ('md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512')
 REPO_DATA_DIR_NAME = 'repodata'
 REPOMD_FILE_NAME = 'repomd.xml'
 
+# number of bytes read at a time when checksumming a file that already exists
+CHECKSUM_BUFFER_SIZE = 1024 * 1024
+
 
 class MetadataFileContext(object):
     """
@@ -31,7 +35,15 @@ class MetadataFileContext(object):
         self.metadata_file_path = metadata_file_path
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
+        self.checksum_constructor = None
+        # size and checksum of the file as written to disk, and if it is
+        # compressed, size and checksum of the uncompressed content
         self.checksum = None
+        self.size = None
+        self.open_checksum = None
+        self.open_size = None
+        self._checksum_writer = None
+        self._open_checksum_writer = None
         if self.checksum_type is not None:
             assert checksum_type in HASHLIB_ALGORITHMS
             self.checksum_constructor = getattr(hashlib, checksum_type)
@@ -91,12 +103,22 @@ class MetadataFileContext(object):
         except Exception, e:
             _LOG.exception(e)
 
+        # the checksums and sizes were calculated as the file was written
+        checksum = None
+        if self._checksum_writer is not None:
+            checksum = self._checksum_writer.checksum
+            self.size = self._checksum_writer.size
+        if self._open_checksum_writer is not None:
+            self.open_checksum = self._open_checksum_writer.checksum
+            self.open_size = self._open_checksum_writer.size
+
         # Add calculated checksum to the repodata filename except for repomd file.
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None and file_name != REPOMD_FILE_NAME:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
+            if checksum is None:
+                # the file handle was not opened by this context
+                with open(self.metadata_file_path, 'rb') as file_handle:
+                    checksum = checksum_file(file_handle, self.checksum_constructor)[0]
 
             self.checksum = checksum
             file_name_with_checksum = checksum + '-' + file_name
@@ -139,11 +161,17 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
+        file_handle = open(self.metadata_file_path, 'w')
+        self._checksum_writer = ChecksumWriter(file_handle, self.checksum_constructor)
+
         if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            gzip_handle = gzip.GzipFile(self.metadata_file_path, 'w',
+                                        fileobj=self._checksum_writer)
+            self._open_checksum_writer = ChecksumWriter(gzip_handle, self.checksum_constructor)
+            self.metadata_file_handle = self._open_checksum_writer
 
         else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+            self.metadata_file_handle = self._checksum_writer
 
     def _write_xml_header(self):
         """
@@ -177,6 +205,10 @@ class MetadataFileContext(object):
             self.metadata_file_handle.flush()
             self.metadata_file_handle.close()
 
+        # a gzip file does not close the file object it was given
+        if self._checksum_writer is not None and not self._checksum_writer.closed:
+            self._checksum_writer.close()
+
     @staticmethod
     def _is_closed(file_object):
         """
@@ -203,6 +235,138 @@ class MetadataFileContext(object):
                 raise
 
 
+class ChecksumWriter(object):
+    """
+    Wrapper for a writable file object that keeps a running checksum and size
+    of everything written through it, so that neither has to be calculated by
+    reading the file back once it is complete.
+    """
+
+    def __init__(self, file_object, checksum_constructor=None):
+        """
+        :param file_object: file object to write to
+        :type  file_object: file
+        :param checksum_constructor: hashlib constructor for the checksum to calculate;
+                                     if None, only the size is calculated
+        :type  checksum_constructor: callable or None
+        """
+        self.file_object = file_object
+        self.size = 0
+        self._closed = False
+        self._hash = None
+        if checksum_constructor is not None:
+            self._hash = checksum_constructor()
+
+    def write(self, data):
+        """
+        :param data: data to write to the file
+        :type  data: str
+        """
+        if self._hash is not None:
+            self._hash.update(data)
+        self.size += len(data)
+        self.file_object.write(data)
+
+    def flush(self):
+        self.file_object.flush()
+
+    def close(self):
+        self.file_object.close()
+        self._closed = True
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __getattr__(self, name):
+        return getattr(self.file_object, name)
+
+    @property
+    def checksum(self):
+        """
+        :return: hex digest of everything written so far, or None if no checksum
+                 type was given
+        :rtype:  str or None
+        """
+        if self._hash is None:
+            return None
+        return self._hash.hexdigest()
+
+
+class ChecksumWriterMixin(object):
+    """
+    Mixin for the platform's XML file contexts, such as FastForwardXmlFileContext,
+    that writes the uncompressed content of a gzipped metadata file through a
+    ChecksumWriter. Once the context is finalized, it has the same size,
+    open_size and open_checksum attributes as a MetadataFileContext, so the
+    file does not have to be read and decompressed again for repomd.xml.
+
+    This must come before the platform's context in the list of base classes.
+    """
+
+    size = None
+    open_size = None
+    open_checksum = None
+    _open_checksum_writer = None
+
+    def _open_metadata_file_handle(self):
+        """
+        Open the metadata file handle as the platform's context does, and wrap
+        it in a ChecksumWriter if the file is compressed.
+        """
+        super(ChecksumWriterMixin, self)._open_metadata_file_handle()
+
+        if not self.metadata_file_path.endswith('.gz'):
+            return
+
+        checksum_constructor = None
+        if self.checksum_type in HASHLIB_ALGORITHMS:
+            checksum_constructor = getattr(hashlib, self.checksum_type)
+        self._open_checksum_writer = ChecksumWriter(self.metadata_file_handle,
+                                                    checksum_constructor)
+        self.metadata_file_handle = self._open_checksum_writer
+        # the XML generator writes to the file object it was created with
+        if getattr(self, 'xml_generator', None) is not None:
+            self.xml_generator = XMLGenerator(self.metadata_file_handle, 'UTF-8')
+
+    def finalize(self):
+        """
+        Finalize the file as the platform's context does, keeping the sizes and
+        checksum calculated while it was written.
+        """
+        super(ChecksumWriterMixin, self).finalize()
+
+        if self._open_checksum_writer is not None and self._open_checksum_writer.closed:
+            self.open_checksum = self._open_checksum_writer.checksum
+            self.open_size = self._open_checksum_writer.size
+        if os.path.exists(self.metadata_file_path):
+            self.size = os.path.getsize(self.metadata_file_path)
+
+
+def checksum_file(file_handle, checksum_constructor):
+    """
+    Calculate the checksum and size of the content of a file, reading it a
+    piece at a time.
+
+    :param file_handle: file object open for reading
+    :type  file_handle: file
+    :param checksum_constructor: hashlib constructor for the checksum to calculate
+    :type  checksum_constructor: callable
+
+    :return: tuple of the hex digest and the number of bytes read
+    :rtype:  tuple
+    """
+    checksum = checksum_constructor()
+    size = 0
+    while True:
+        data = file_handle.read(CHECKSUM_BUFFER_SIZE)
+        if not data:
+            break
+        checksum.update(data)
+        size += len(data)
+    return checksum.hexdigest(), size
+
+
 # -- pre-generated metadata context --------------------------------------------
 
 class PreGeneratedMetadataContext(MetadataFileContext):
@@ -2,14 +2,15 @@ import os
 
 from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
 
-from pulp_rpm.plugins.distributors.yum.metadata.metadata import REPO_DATA_DIR_NAME
+from pulp_rpm.plugins.distributors.yum.metadata.metadata import (
+    REPO_DATA_DIR_NAME, ChecksumWriterMixin)
 
 
 OTHER_XML_FILE_NAME = 'other.xml.gz'
 OTHER_NAMESPACE = 'http://linux.duke.edu/metadata/other'
 
 
-class OtherXMLFileContext(FastForwardXmlFileContext):
+class OtherXMLFileContext(ChecksumWriterMixin, FastForwardXmlFileContext):
     """
     Context manager for generating the other.xml.gz file.
     """
@@ -0,0 +1,98 @@
+import Queue
+import sys
+import threading
+
+from pulp_rpm.yum_plugin import util
+
+
+_LOG = util.getLogger(__name__)
+
+# maximum number of units waiting to be written by each writer thread
+DEFAULT_QUEUE_SIZE = 1000
+
+# placed on a writer's queue to tell it that no more units are coming
+_DONE = object()
+
+
+class ContextWriterThread(threading.Thread):
+    """
+    Writes unit metadata into a metadata file context from a thread of its own.
+    Writing compressed metadata is dominated by compression, which releases the
+    GIL, so several of these can write several files at the same time from the
+    same stream of units.
+
+    Units are queued with add_unit_metadata, and finish must be called once
+    all units have been queued. The context itself must be initialized before
+    the thread is started, and finalized after finish returns.
+    """
+
+    def __init__(self, context, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param context: initialized context that units' metadata should be written to
+        :type  context: pulp.plugins.util.metadata_writer.MetadataFileContext
+        :param queue_size: maximum number of units waiting to be written
+        :type  queue_size: int
+        """
+        super(ContextWriterThread, self).__init__(name='metadata writer %s' %
+                                                  context.metadata_file_path)
+        # don't let a step that fails before calling finish keep the process alive
+        self.daemon = True
+        self.context = context
+        self.exc_info = None
+        self._queue = Queue.Queue(queue_size)
+
+    def run(self):
+        while True:
+            unit = self._queue.get()
+            if unit is _DONE:
+                return
+            if self.exc_info is not None:
+                # keep draining the queue so that the producer never blocks
+                continue
+            try:
+                self.context.add_unit_metadata(unit)
+            except Exception:
+                _LOG.exception('failed to write metadata to %s' % self.context.metadata_file_path)
+                self.exc_info = sys.exc_info()
+
+    def add_unit_metadata(self, unit):
+        """
+        Queue a unit to have its metadata written.
+
+        :param unit: unit whose metadata is to be written
+        :type  unit: pulp.plugins.model.Unit
+
+        :raises Exception: the error raised by the context for an earlier unit, if any
+        """
+        self._raise_error()
+        self._queue.put(unit)
+
+    def finish(self):
+        """
+        Wait for every queued unit to be written.
+
+        :raises Exception: the error raised by the context, if any
+        """
+        finish_all([self])
+
+    def _raise_error(self):
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+
+def finish_all(writers):
+    """
+    Wait for every queued unit to be written by each of the given writers,
+    letting all of them finish before raising the first error, if any.
+
+    :param writers: started writer threads
+    :type  writers: list of ContextWriterThread
+
+    :raises Exception: the first error raised by any of the writers' contexts
+    """
+    for writer in writers:
+        writer._queue.put(_DONE)
+    for writer in writers:
+        writer.join()
+    for writer in writers:
+        writer._raise_error()
@@ -2,7 +2,8 @@ import os
 
 from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
 
-from pulp_rpm.plugins.distributors.yum.metadata.metadata import REPO_DATA_DIR_NAME
+from pulp_rpm.plugins.distributors.yum.metadata.metadata import (
+    REPO_DATA_DIR_NAME, ChecksumWriterMixin)
 from pulp_rpm.yum_plugin import util
 
 
@@ -13,7 +14,7 @@ COMMON_NAMESPACE = 'http://linux.duke.edu/metadata/common'
 RPM_NAMESPACE = 'http://linux.duke.edu/metadata/rpm'
 
 
-class PrimaryXMLFileContext(FastForwardXmlFileContext):
+class PrimaryXMLFileContext(ChecksumWriterMixin, FastForwardXmlFileContext):
     """
     Context manager for generating the primary.xml.gz metadata file.
     """
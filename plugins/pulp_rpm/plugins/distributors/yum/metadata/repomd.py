@@ -5,7 +5,7 @@ from xml.etree import ElementTree
 
 from pulp_rpm.common.constants import CONFIG_DEFAULT_CHECKSUM
 from pulp_rpm.plugins.distributors.yum.metadata.metadata import (
-    MetadataFileContext, REPO_DATA_DIR_NAME, REPOMD_FILE_NAME)
+    MetadataFileContext, REPO_DATA_DIR_NAME, REPOMD_FILE_NAME, checksum_file)
 
 from pulp_rpm.yum_plugin import util
 
@@ -60,7 +60,19 @@ class RepomdXMLFileContext(MetadataFileContext):
         self._write_root_tag_close = _write_root_tag_close_closure
 
     def add_metadata_file_metadata(self, data_type, file_path, precalculated_checksum=None):
-
+        """
+        Add a data element for an existing metadata file. The file is read to
+        calculate its checksum and size, and if it is compressed, the checksum
+        and size of its uncompressed content. Files written by a metadata file
+        context should be added with add_metadata_file_context instead.
+
+        :param data_type: type of the metadata file, such as "primary"
+        :type  data_type: str
+        :param file_path: full path to the metadata file
+        :type  file_path: str
+        :param precalculated_checksum: checksum of the file, if it is already known
+        :type  precalculated_checksum: str or None
+        """
         file_name = os.path.basename(file_path)
 
         # If the file is a symbolic link, make sure we generate the the metadata
@@ -68,6 +80,75 @@ class RepomdXMLFileContext(MetadataFileContext):
         if os.path.islink(file_path):
             file_path = os.readlink(file_path)
 
+        size = os.path.getsize(file_path)
+
+        # if checksum is calculated in the individual repodata file's context, use it instead of
+        # calculating it again.
+        checksum = precalculated_checksum
+        if checksum is None:
+            with open(file_path, 'rb') as file_handle:
+                checksum = checksum_file(file_handle, self.checksum_constructor)[0]
+
+        open_checksum = open_size = None
+        if file_path.endswith('.gz'):
+            file_handle = gzip.open(file_path, 'r')
+            try:
+                open_checksum, open_size = checksum_file(file_handle, self.checksum_constructor)
+            finally:
+                file_handle.close()
+
+        self._write_data_element(data_type, file_name, file_path, size, checksum,
+                                 open_size, open_checksum)
+
+    def add_metadata_file_context(self, data_type, metadata_file_context):
+        """
+        Add a data element for a metadata file written by the given context,
+        using the checksums and sizes it calculated while writing the file.
+
+        :param data_type: type of the metadata file, such as "primary"
+        :type  data_type: str
+        :param metadata_file_context: finalized context that wrote the metadata file, which
+                                      is a MetadataFileContext or a context that uses
+                                      ChecksumWriterMixin
+        :type  metadata_file_context: pulp_rpm.plugins.distributors.yum.metadata.metadata.
+                                      MetadataFileContext
+        """
+        file_path = metadata_file_context.metadata_file_path
+
+        checksum = metadata_file_context.checksum
+        if metadata_file_context.checksum_type != self.checksum_type:
+            checksum = None
+        open_checksum = metadata_file_context.open_checksum
+
+        if checksum is None or (file_path.endswith('.gz') and open_checksum is None):
+            # the checksums were not calculated while writing, or are of another type
+            self.add_metadata_file_metadata(data_type, file_path, checksum)
+            return
+
+        self._write_data_element(data_type, os.path.basename(file_path), file_path,
+                                 metadata_file_context.size, checksum,
+                                 metadata_file_context.open_size, open_checksum)
+
+    def _write_data_element(self, data_type, file_name, file_path, size, checksum,
+                            open_size=None, open_checksum=None):
+        """
+        Write a data element describing a metadata file into repomd.xml.
+
+        :param data_type: type of the metadata file, such as "primary"
+        :type  data_type: str
+        :param file_name: name of the metadata file in the repodata directory
+        :type  file_name: str
+        :param file_path: full path to the metadata file, used for its timestamp
+        :type  file_path: str
+        :param size: size of the file in bytes
+        :type  size: int
+        :param checksum: checksum of the file
+        :type  checksum: str
+        :param open_size: size of the uncompressed content, if the file is compressed
+        :type  open_size: int or None
+        :param open_checksum: checksum of the uncompressed content, if the file is compressed
+        :type  open_checksum: str or None
+        """
         data_attributes = {'type': data_type}
         data_element = ElementTree.Element('data', data_attributes)
 
@@ -80,43 +161,21 @@ class RepomdXMLFileContext(MetadataFileContext):
         timestamp_element.text = str(int(os.path.getmtime(file_path)))
 
         size_element = ElementTree.SubElement(data_element, 'size')
-        size_element.text = str(os.path.getsize(file_path))
+        size_element.text = str(size)
 
         checksum_attributes = {'type': self.checksum_type}
         checksum_element = ElementTree.SubElement(data_element, 'checksum', checksum_attributes)
+        checksum_element.text = checksum
 
-        # if checksum is calculated in the individual repodata file's context, use it instead of
-        # calculating it again.
-        if precalculated_checksum is None:
-            with open(file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum_element.text = self.checksum_constructor(content).hexdigest()
-        else:
-            checksum_element.text = precalculated_checksum
-
-        if file_path.endswith('.gz'):
+        if open_checksum is not None:
 
             open_size_element = ElementTree.SubElement(data_element, 'open-size')
+            open_size_element.text = str(open_size)
 
             open_checksum_attributes = {'type': self.checksum_type}
             open_checksum_element = ElementTree.SubElement(data_element, 'open-checksum',
                                                            open_checksum_attributes)
-
-            try:
-                file_handle = gzip.open(file_path, 'r')
-
-            except:
-                # cannot have an else clause to the try without an except clause
-                raise
-
-            else:
-                try:
-                    content = file_handle.read()
-                    open_size_element.text = str(len(content))
-                    open_checksum_element.text = self.checksum_constructor(content).hexdigest()
-
-                finally:
-                    file_handle.close()
+            open_checksum_element.text = open_checksum
 
         # Write the metadata out as a utf-8 string
 
@@ -3,7 +3,7 @@ from xml.etree import ElementTree
 
 from pulp_rpm.plugins.distributors.yum.metadata.metadata import (
     MetadataFileContext, REPO_DATA_DIR_NAME)
-from pulp_rpm.yum_plugin import util
+from pulp_rpm.yum_plugin import updateinfo_xml, util
 
 
 _logger = util.getLogger(__name__)
@@ -37,105 +37,18 @@ class UpdateinfoXMLFileContext(MetadataFileContext):
     def add_unit_metadata(self, erratum_unit):
         """
         Write the XML representation of erratum_unit to self.metadata_file_handle
-        (updateinfo.xml.gx).
+        (updateinfo.xml.gx). The snippet rendered when the erratum was imported
+        is used if there is one.
 
         :param erratum_unit: The erratum unit that should be written to updateinfo.xml.
         :type  erratum_unit: pulp.plugins.model.AssociatedUnit
         """
-        update_attributes = {'status': erratum_unit.metadata['status'],
-                             'type': erratum_unit.metadata['type'],
-                             'version': erratum_unit.metadata['version'],
-                             'from': erratum_unit.metadata.get('from', '') or ''}
-        update_element = ElementTree.Element('update', update_attributes)
+        update_element_string = (erratum_unit.metadata.get('repodata') or {}).get('updateinfo')
 
-        id_element = ElementTree.SubElement(update_element, 'id')
-        id_element.text = erratum_unit.unit_key['id']
-
-        issued_attributes = {'date': erratum_unit.metadata['issued']}
-        ElementTree.SubElement(update_element, 'issued', issued_attributes)
-
-        reboot_element = ElementTree.SubElement(update_element, 'reboot_suggested')
-        reboot_element.text = str(erratum_unit.metadata['reboot_suggested'])
-
-        # these elements are optional
-        for key in ('title', 'release', 'rights', 'solution',
-                    'severity', 'summary', 'pushcount'):
-
-            value = erratum_unit.metadata.get(key)
-
-            if not value:
-                continue
-
-            sub_element = ElementTree.SubElement(update_element, key)
-            sub_element.text = unicode(value)
-
-        # these elements must be present even if text is empty
-        for key in ('description',):
-
-            value = erratum_unit.metadata.get(key)
-            if value is None:
-                value = ''
-
-            sub_element = ElementTree.SubElement(update_element, key)
-            sub_element.text = unicode(value)
-
-        updated = erratum_unit.metadata.get('updated')
-
-        if updated:
-            updated_attributes = {'date': updated}
-            ElementTree.SubElement(update_element, 'updated', updated_attributes)
-
-        references_element = ElementTree.SubElement(update_element, 'references')
-
-        for reference in erratum_unit.metadata.get('references'):
-            reference_attributes = {'id': reference['id'] or '',
-                                    'title': reference['title'] or '',
-                                    'type': reference['type'],
-                                    'href': reference['href']}
-            ElementTree.SubElement(references_element, 'reference', reference_attributes)
-
-        for pkglist in erratum_unit.metadata.get('pkglist', []):
-
-            pkglist_element = ElementTree.SubElement(update_element, 'pkglist')
-
-            collection_attributes = {}
-            short = pkglist.get('short')
-            if short is not None:
-                collection_attributes['short'] = short
-            collection_element = ElementTree.SubElement(pkglist_element, 'collection',
-                                                        collection_attributes)
-
-            name_element = ElementTree.SubElement(collection_element, 'name')
-            name_element.text = pkglist['name']
-
-            for package in pkglist['packages']:
-
-                package_attributes = {'name': package['name'],
-                                      'version': package['version'],
-                                      'release': package['release'],
-                                      'epoch': package['epoch'] or '0',
-                                      'arch': package['arch'],
-                                      'src': package.get('src', '') or ''}
-                package_element = ElementTree.SubElement(collection_element, 'package',
-                                                         package_attributes)
-
-                filename_element = ElementTree.SubElement(package_element, 'filename')
-                filename_element.text = package['filename']
-
-                checksum_tuple = package.get('sum', None)
-
-                if checksum_tuple is not None:
-                    checksum_type, checksum_value = checksum_tuple
-                    sum_attributes = {'type': checksum_type}
-                    sum_element = ElementTree.SubElement(package_element, 'sum', sum_attributes)
-                    sum_element.text = checksum_value
-
-                reboot_element = ElementTree.SubElement(package_element, 'reboot_suggested')
-                reboot_element.text = str(package.get('reboot_suggested', False))
-
-        # write the top-level XML element out to the file
-        update_element_string = ElementTree.tostring(update_element, 'utf-8')
-
-        _logger.debug('Writing updateinfo unit metadata:\n' + update_element_string)
+        if update_element_string is None:
+            update_element_string = updateinfo_xml.render_erratum(erratum_unit.unit_key['id'],
+                                                                  erratum_unit.metadata)
+        elif isinstance(update_element_string, unicode):
+            update_element_string = update_element_string.encode('utf-8')
 
         self.metadata_file_handle.write(update_element_string + '\n')
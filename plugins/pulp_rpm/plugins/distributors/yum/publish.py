@@ -32,6 +32,7 @@ from .metadata.primary import PrimaryXMLFileContext
 from .metadata.repomd import RepomdXMLFileContext
 from .metadata.updateinfo import UpdateinfoXMLFileContext
 from .metadata.package import PackageXMLFileContext
+from .metadata import pipeline
 
 
 logger = util.getLogger(__name__)
@@ -143,7 +144,11 @@ class ExportRepoPublisher(BaseYumRepoPublisher):
 
             # Create the steps to generate the ISO and publish them to their final location
             output_dir = os.path.join(working_directory, 'output')
-            self.add_child(CreateIsoStep(realized_dir, output_dir))
+            workers = int(config.get(constants.ISO_WORKERS_KEYWORD,
+                                     generate_iso.MKISOFS_WORKERS))
+            fill_images = config.get(constants.ISO_FILL_KEYWORD, False)
+            self.add_child(CreateIsoStep(realized_dir, output_dir, workers=workers,
+                                         fill_images=fill_images))
             publish_location = [('/', location)
                                 for location in configuration.get_export_repo_publish_dirs(repo,
                                                                                            config)]
@@ -209,7 +214,11 @@ class ExportRepoGroupPublisher(PublishStep):
         if not export_dir:
             # Create the steps to generate the ISO and publish them to their final location
             output_dir = os.path.join(working_dir, 'output')
-            self.add_child(CreateIsoStep(realized_dir, output_dir))
+            workers = int(config.get(constants.ISO_WORKERS_KEYWORD,
+                                     generate_iso.MKISOFS_WORKERS))
+            fill_images = config.get(constants.ISO_FILL_KEYWORD, False)
+            self.add_child(CreateIsoStep(realized_dir, output_dir, workers=workers,
+                                         fill_images=fill_images))
             export_dirs = configuration.get_export_repo_group_publish_dirs(repo_group, config)
             publish_location = [('/', location) for location in export_dirs]
 
@@ -385,6 +394,7 @@ class PublishRpmStep(UnitPublishStep):
         self.file_lists_context = None
         self.other_context = None
         self.primary_context = None
+        self.writers = []
         self.dist_step = dist_step
         self.fast_forward = False
 
@@ -402,26 +412,31 @@ class PublishRpmStep(UnitPublishStep):
         for context in (self.file_lists_context, self.other_context, self.primary_context):
             context.initialize()
 
+        # each file is written and compressed by its own thread
+        self.writers = [pipeline.ContextWriterThread(context) for context in
+                        (self.file_lists_context, self.other_context, self.primary_context)]
+        for writer in self.writers:
+            writer.start()
+
     def finalize(self):
         """
-        Close each context and write it to the repomd file
+        Wait for the writer threads, then close each context and write it to the repomd file
         """
+        writers, self.writers = self.writers, []
+        pipeline.finish_all(writers)
+
         repomd = self.parent.repomd_file_context
 
         if self.file_lists_context:
             self.file_lists_context.finalize()
-            repomd.add_metadata_file_metadata('filelists',
-                                              self.file_lists_context.metadata_file_path,
-                                              self.file_lists_context.checksum)
+            repomd.add_metadata_file_context('filelists', self.file_lists_context)
         if self.other_context:
             self.other_context.finalize()
-            repomd.add_metadata_file_metadata('other', self.other_context.metadata_file_path,
-                                              self.other_context.checksum)
+            repomd.add_metadata_file_context('other', self.other_context)
 
         if self.primary_context:
             self.primary_context.finalize()
-            repomd.add_metadata_file_metadata('primary', self.primary_context.metadata_file_path,
-                                              self.primary_context.checksum)
+            repomd.add_metadata_file_context('primary', self.primary_context)
 
     def process_unit(self, unit):
         """
@@ -438,8 +453,8 @@ class PublishRpmStep(UnitPublishStep):
             destination_path = os.path.join(package_dir, relative_path)
             self._create_symlink(source_path, destination_path)
 
-        for context in (self.file_lists_context, self.other_context, self.primary_context):
-            context.add_unit_metadata(unit)
+        for writer in self.writers:
+            writer.add_unit_metadata(unit)
 
 
 class PublishMetadataStep(UnitPublishStep):
@@ -528,8 +543,7 @@ class PublishDrpmStep(UnitPublishStep):
         if self.context:
             self.context.finalize()
             self.parent.repomd_file_context.\
-                add_metadata_file_metadata('prestodelta', self.context.metadata_file_path,
-                                           self.context.checksum)
+                add_metadata_file_context('prestodelta', self.context)
 
 
 class PublishErrataStep(UnitPublishStep):
@@ -562,8 +576,7 @@ class PublishErrataStep(UnitPublishStep):
         if self.context:
             self.context.finalize()
             self.parent.repomd_file_context.\
-                add_metadata_file_metadata('updateinfo', self.context.metadata_file_path,
-                                           self.context.checksum)
+                add_metadata_file_context('updateinfo', self.context)
 
 
 class PublishRpmAndDrpmStepIncremental(UnitPublishStep):
@@ -686,8 +699,7 @@ class PublishCompsStep(UnitPublishStep):
             self.comps_context.finalize()
             if self.parent.repomd_file_context:
                 self.parent.repomd_file_context.\
-                    add_metadata_file_metadata('group', self.comps_context.metadata_file_path,
-                                               self.comps_context.checksum)
+                    add_metadata_file_context('group', self.comps_context)
 
 
 class PublishDistributionStep(UnitPublishStep):
@@ -831,11 +843,25 @@ class CreateIsoStep(PublishStep):
     Export a directory to an ISO or a collection of ISO files
 
     """
-    def __init__(self, content_dir, output_dir):
+    def __init__(self, content_dir, output_dir, workers=generate_iso.MKISOFS_WORKERS,
+                 fill_images=False):
+        """
+        :param content_dir: The directory to be written to ISO images
+        :type content_dir: str
+        :param output_dir: The directory the ISO images are written to
+        :type output_dir: str
+        :param workers: The maximum number of ISO images to write at the same time
+        :type workers: int
+        :param fill_images: Whether to pack files into as few images as possible, largest first,
+                            instead of in the order they are found
+        :type fill_images: bool
+        """
         super(CreateIsoStep, self).__init__(constants.PUBLISH_STEP_ISO)
         self.description = _('Exporting ISO')
         self.content_dir = content_dir
         self.output_dir = output_dir
+        self.workers = workers
+        self.fill_images = fill_images
 
     def process_main(self):
         """
@@ -843,7 +869,8 @@ class CreateIsoStep(PublishStep):
         """
         image_size = self.get_config().get(constants.ISO_SIZE_KEYWORD)
         image_prefix = self.get_config().get(constants.ISO_PREFIX_KEYWORD) or self.get_repo().id
-        generate_iso.create_iso(self.content_dir, self.output_dir, image_prefix, image_size)
+        generate_iso.create_iso(self.content_dir, self.output_dir, image_prefix, image_size,
+                                workers=self.workers, fill_images=self.fill_images)
 
 
 class GenerateSqliteForRepoStep(PublishStep):
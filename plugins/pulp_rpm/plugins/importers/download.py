@@ -0,0 +1,218 @@
+"""
+Verification of downloaded files without reading them again. The files of
+download requests are wrapped so that their size and checksum are calculated
+while the downloader writes them, and they are compared with the expected
+values once the download succeeds.
+
+Files that were not written through a wrapper, for example because the
+downloader linked them instead of writing them, or wrote them more than once,
+are read again just as verification.verify_size and verify_checksum do.
+"""
+
+from nectar.request import DownloadRequest
+from pulp.plugins.util import verification
+
+
+class DigestFile(object):
+    """
+    File-like object that writes to a file and calculates the size and checksum
+    of what is written. Anything else is passed through to the file. If the
+    file is not written from start to end in one pass, the digest is marked
+    incomplete, since it would not match the file.
+    """
+
+    def __init__(self, file_handle, checksum_type):
+        """
+        :param file_handle:     file being downloaded to
+        :type  file_handle:     file
+        :param checksum_type:   type of checksum to calculate; one of
+                                verification.CHECKSUM_FUNCTIONS
+        :type  checksum_type:   str
+        """
+        self.file_handle = file_handle
+        self.checksum_type = checksum_type
+        self.size = 0
+        self._hasher = verification.CHECKSUM_FUNCTIONS[checksum_type]()
+        try:
+            self.complete = file_handle.tell() == 0
+        except (AttributeError, IOError):
+            self.complete = False
+
+    def write(self, data):
+        self.file_handle.write(data)
+        self._hasher.update(data)
+        self.size += len(data)
+
+    def seek(self, *args):
+        self.complete = False
+        return self.file_handle.seek(*args)
+
+    def truncate(self, *args):
+        self.complete = False
+        return self.file_handle.truncate(*args)
+
+    def hexdigest(self):
+        """
+        :return:    checksum of everything written so far
+        :rtype:     str
+        """
+        return self._hasher.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self.file_handle, name)
+
+
+class DigestDownloadRequest(DownloadRequest):
+    """
+    Download request whose file is wrapped in a DigestFile each time the
+    downloader opens it, and handed to a DownloadDigests.
+    """
+
+    def __init__(self, url, destination, data=None, headers=None, digests=None,
+                 checksum_type=verification.TYPE_SHA256):
+        """
+        :param digests:         keeps the DigestFile until the download is reported
+        :type  digests:         DownloadDigests
+        :param checksum_type:   type of checksum to calculate
+        :type  checksum_type:   str
+        """
+        super(DigestDownloadRequest, self).__init__(url, destination, data=data,
+                                                    headers=headers)
+        self.digests = digests
+        self.checksum_type = checksum_type
+
+    def initialize_file_handle(self):
+        file_handle = super(DigestDownloadRequest, self).initialize_file_handle()
+        digest_file = DigestFile(file_handle, self.checksum_type)
+        self.digests.opened(self.destination, digest_file)
+        return digest_file
+
+
+class DownloadDigests(object):
+    """
+    Keeps the digests of downloads, by destination path, from when the
+    downloader opens their files until their completion is reported. Requests
+    are wrapped for the checksum types that are expected for their
+    destinations.
+    """
+
+    def __init__(self):
+        # keys are destination paths, and values are checksum types
+        self._expected = {}
+        # keys are destination paths, and values are DigestFiles
+        self._files = {}
+
+    def expect(self, destination, checksum_type):
+        """
+        Calculate a checksum of the given type for the download to a path. If the
+        checksum type is not supported, the file is verified the usual way, so
+        that the error is reported the usual way.
+
+        :param destination:     path the file will be downloaded to
+        :type  destination:     str
+        :param checksum_type:   type of checksum to calculate
+        :type  checksum_type:   str
+        """
+        if checksum_type in verification.CHECKSUM_FUNCTIONS:
+            self._expected[destination] = checksum_type
+
+    def wrap(self, request):
+        """
+        :param request: download request
+        :type  request: nectar.request.DownloadRequest
+
+        :return:    a request whose file will be digested, if a checksum is
+                    expected for its destination, or else the same request
+        :rtype:     nectar.request.DownloadRequest
+        """
+        if not isinstance(request.destination, basestring) or \
+                request.destination not in self._expected:
+            return request
+        return DigestDownloadRequest(request.url, request.destination, data=request.data,
+                                     headers=request.headers, digests=self,
+                                     checksum_type=self._expected[request.destination])
+
+    def wrap_downloader(self, downloader):
+        """
+        Make a downloader wrap all requests it is given, for when the requests
+        are built by something else, such as a content container.
+
+        :param downloader:  downloader whose requests should be wrapped
+        :type  downloader:  nectar.downloaders.base.Downloader
+
+        :return:    the same downloader
+        :rtype:     nectar.downloaders.base.Downloader
+        """
+        download = downloader.download
+
+        def wrapping_download(requests):
+            return download(self.wrap(request) for request in requests)
+
+        downloader.download = wrapping_download
+        return downloader
+
+    def opened(self, destination, digest_file):
+        self._files[destination] = digest_file
+
+    def pop(self, destination):
+        """
+        Forget a download, which must be done once it is reported, whether it
+        succeeded or not.
+
+        :param destination: path the file was downloaded to
+        :type  destination: str
+
+        :return:    the complete digest of the file, or None if there is none
+        :rtype:     DigestFile
+        """
+        if not isinstance(destination, basestring):
+            return None
+        self._expected.pop(destination, None)
+        digest_file = self._files.pop(destination, None)
+        if digest_file is not None and digest_file.complete:
+            return digest_file
+
+
+def verify_size(digest_file, path, expected_size):
+    """
+    Verify the size of a downloaded file, like verification.verify_size.
+
+    :param digest_file:     digest of the file, or None to read the file
+    :type  digest_file:     DigestFile
+    :param path:            path of the downloaded file
+    :type  path:            str
+    :param expected_size:   size the file should have
+    :type  expected_size:   int
+
+    :raises verification.VerificationException: if the size is not the
+            expected size, with the actual size as its argument
+    """
+    if digest_file is None:
+        with open(path) as file_handle:
+            verification.verify_size(file_handle, expected_size)
+    elif digest_file.size != expected_size:
+        raise verification.VerificationException(digest_file.size)
+
+
+def verify_checksum(digest_file, path, checksum_type, checksum_value):
+    """
+    Verify the checksum of a downloaded file, like verification.verify_checksum.
+
+    :param digest_file:     digest of the file, or None to read the file
+    :type  digest_file:     DigestFile
+    :param path:            path of the downloaded file
+    :type  path:            str
+    :param checksum_type:   type of the expected checksum
+    :type  checksum_type:   str
+    :param checksum_value:  checksum the file should have
+    :type  checksum_value:  str
+
+    :raises verification.VerificationException: if the checksum is not the
+            expected checksum, with the actual checksum as its argument
+    :raises verification.InvalidChecksumType: if the checksum type is not supported
+    """
+    if digest_file is None or digest_file.checksum_type != checksum_type:
+        with open(path) as file_handle:
+            verification.verify_checksum(file_handle, checksum_type, checksum_value)
+    elif digest_file.hexdigest() != checksum_value:
+        raise verification.VerificationException(digest_file.hexdigest())
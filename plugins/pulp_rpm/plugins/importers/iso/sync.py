@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from cStringIO import StringIO
 from gettext import gettext as _
 from urlparse import urljoin
@@ -10,10 +11,13 @@ from nectar.downloaders.local import LocalFileDownloader
 from pulp.common.plugins import importer_constants
 from pulp.common.util import encode_unicode
 from pulp.plugins.conduits.mixins import Criteria, UnitAssociationCriteria
+from pulp.plugins.util import verification
+from pulp.plugins.util.misc import paginate
 
 from pulp_rpm.common import constants
 from pulp_rpm.common.progress import SyncProgressReport
 from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers import download
 
 
 logger = logging.getLogger(__name__)
@@ -81,6 +85,8 @@ class ISOSyncRun(listener.DownloadEventListener):
         else:
             self.downloader = HTTPThreadedDownloader(downloader_config, self)
         self.progress_report = SyncProgressReport(sync_conduit)
+        # The sizes and checksums of ISOs are calculated while they are downloaded
+        self._digests = download.DownloadDigests()
 
     def cancel_sync(self):
         """
@@ -102,6 +108,7 @@ class ISOSyncRun(listener.DownloadEventListener):
         msg = _('Failed to download %(url)s: %(error_msg)s.')
         msg = msg % {'url': report.url, 'error_msg': report.error_msg}
         logger.error(msg)
+        self._digests.pop(report.destination)
         if self.progress_report.state == self.progress_report.STATE_MANIFEST_IN_PROGRESS:
             self.progress_report.state = self.progress_report.STATE_MANIFEST_FAILED
             self.progress_report.error_message = report.error_report
@@ -140,8 +147,13 @@ class ISOSyncRun(listener.DownloadEventListener):
             # This will update our bytes downloaded
             self.download_progress(report)
             iso = report.data
+            digest_file = self._digests.pop(report.destination)
             try:
-                if self._validate_downloads:
+                if self._validate_downloads and digest_file is not None:
+                    # There is no need to read the file again
+                    iso.validate(actual_size=digest_file.size,
+                                 actual_checksum=digest_file.hexdigest())
+                elif self._validate_downloads:
                     iso.validate()
                 iso.save_unit(self.sync_conduit)
                 # We can drop this ISO from the url --> ISO map
@@ -209,8 +221,12 @@ class ISOSyncRun(listener.DownloadEventListener):
             self.progress_report.total_bytes += iso.size
         self.progress_report.update_progress()
         # We need to build a list of DownloadRequests
-        download_requests = [request.DownloadRequest(iso.url, iso.storage_path, iso) for
-                             iso in manifest]
+        download_requests = []
+        for iso in manifest:
+            if self._validate_downloads:
+                self._digests.expect(iso.storage_path, verification.TYPE_SHA256)
+            download_requests.append(
+                self._digests.wrap(request.DownloadRequest(iso.url, iso.storage_path, iso)))
         self.downloader.download(download_requests)
 
     def _download_manifest(self):
@@ -258,48 +274,36 @@ class ISOSyncRun(listener.DownloadEventListener):
         :rtype:          tuple
         """
 
-        def _unit_key_str(iso):
-            """
-            Return a simple string representation of the unit key of the ISO.
-
-            :param iso: The ISO for which we want a unit key string representation
-            :type  iso: pulp_rpm.plugins.db.models.ISO
-            """
-            return '%s-%s-%s' % (iso.name, iso.checksum, iso.size)
-
-        # A list of all the ISOs we have in Pulp
-        search_criteria = Criteria(fields=models.ISO.UNIT_KEY_ISO)
-        existing_units = self.sync_conduit.search_all_units(models.ISO.TYPE, search_criteria)
-        existing_units_by_key = dict([(_unit_key_str(models.ISO.from_unit(unit)), unit)
-                                      for unit in existing_units])
-        existing_unit_keys = set([_unit_key_str(models.ISO.from_unit(unit))
-                                  for unit in existing_units])
-
-        # A list of units currently associated with the repository
-        search_criteria = UnitAssociationCriteria(type_ids=[models.ISO.TYPE])
-        existing_repo_units = self.sync_conduit.get_units(search_criteria)
-        existing_repo_units_by_key = dict([(_unit_key_str(models.ISO.from_unit(unit)), unit)
-                                           for unit in existing_repo_units])
-        existing_repo_unit_keys = set([_unit_key_str(models.ISO.from_unit(unit))
-                                       for unit in existing_repo_units])
-
-        # A list of the ISOs in the remote repository
-        available_isos_by_key = dict([(_unit_key_str(iso), iso) for iso in manifest])
-        available_iso_keys = set([_unit_key_str(iso) for iso in manifest])
+        # The ISOs in the remote repository, by unit key
+        available_isos = OrderedDict(((iso.name, iso.checksum, iso.size), iso) for iso in manifest)
+
+        # The ISOs in Pulp that are in the manifest, found in batches of unit keys
+        existing_units = {}
+        for page in paginate(available_isos):
+            unit_filters = [{'name': name, 'checksum': checksum, 'size': size}
+                            for name, checksum, size in page]
+            search_criteria = Criteria(filters={'$or': unit_filters},
+                                       fields=models.ISO.UNIT_KEY_ISO)
+            for unit in self.sync_conduit.search_all_units(models.ISO.TYPE, search_criteria):
+                existing_units[_unit_key_tuple(unit)] = unit
+
+        # The units currently associated with the repository
+        search_criteria = UnitAssociationCriteria(type_ids=[models.ISO.TYPE],
+                                                  unit_fields=models.ISO.UNIT_KEY_ISO)
+        existing_repo_units = OrderedDict((_unit_key_tuple(unit), unit) for unit in
+                                          self.sync_conduit.get_units(search_criteria))
 
         # Content that is available locally and just needs to be associated with the repository
-        local_available_iso_keys = set([iso for iso in available_iso_keys
-                                        if iso in existing_unit_keys])
-        local_available_iso_keys = local_available_iso_keys - existing_repo_unit_keys
-        local_available_units = [existing_units_by_key[k] for k in local_available_iso_keys]
+        local_available_units = [unit for key, unit in existing_units.iteritems()
+                                 if key not in existing_repo_units]
 
         # Content that is missing locally and must be downloaded
-        local_missing_iso_keys = list(available_iso_keys - existing_unit_keys)
-        local_missing_isos = [available_isos_by_key[k] for k in local_missing_iso_keys]
+        local_missing_isos = [iso for key, iso in available_isos.iteritems()
+                              if key not in existing_units]
 
         # Content that is missing from the remote repository that is present locally
-        remote_missing_unit_keys = list(existing_repo_unit_keys - available_iso_keys)
-        remote_missing_units = [existing_repo_units_by_key[k] for k in remote_missing_unit_keys]
+        remote_missing_units = [unit for key, unit in existing_repo_units.iteritems()
+                                if key not in available_isos]
 
         return local_missing_isos, local_available_units, remote_missing_units
 
@@ -312,3 +316,14 @@ class ISOSyncRun(listener.DownloadEventListener):
         """
         for unit in units:
             self.sync_conduit.remove_unit(unit)
+
+
+def _unit_key_tuple(unit):
+    """
+    :param unit: an ISO unit
+    :type  unit: pulp.plugins.model.Unit
+
+    :return: the name, checksum and size of the ISO
+    :rtype:  tuple
+    """
+    return unit.unit_key['name'], unit.unit_key['checksum'], unit.unit_key['size']
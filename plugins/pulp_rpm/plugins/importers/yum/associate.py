@@ -5,14 +5,23 @@ import shutil
 
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 
-from pulp_rpm.common import constants
+from pulp_rpm.common import constants, evr
 from pulp_rpm.plugins.db import models
 from pulp_rpm.plugins.importers.yum import depsolve
 from pulp_rpm.plugins.importers.yum import existing
+from pulp_rpm.plugins.importers.yum import versions
 
 
 _LOGGER = logging.getLogger(__name__)
 
+# models of the types that are copied only by associating units with the
+# destination repository, so only their unit keys need to be loaded
+KEY_ONLY_MODELS = (models.RPM, models.SRPM, models.DRPM, models.Distribution)
+
+# types whose units may be needed with their metadata
+FULL_UNIT_TYPES = (models.Errata.TYPE, models.PackageGroup.TYPE, models.PackageCategory.TYPE,
+                   models.PackageEnvironment.TYPE, models.YumMetadataFile.TYPE)
+
 
 def associate(source_repo, dest_repo, import_conduit, config, units=None):
     """
@@ -35,9 +44,7 @@ def associate(source_repo, dest_repo, import_conduit, config, units=None):
     :return:
     """
     if units is None:
-        # this might use a lot of RAM since RPMs tend to have lots of metadata
-        # TODO: so we should probably do something about that
-        units = import_conduit.get_source_units()
+        units = get_source_units(import_conduit)
 
     # get config items that we care about
     recursive = config.get(constants.CONFIG_RECURSIVE)
@@ -80,6 +87,30 @@ def associate(source_repo, dest_repo, import_conduit, config, units=None):
     return list(associated_units)
 
 
+def get_source_units(import_conduit):
+    """
+    Get all units of the source repository. Units of the types in KEY_ONLY_MODELS
+    are loaded with only their unit keys, since RPMs tend to have lots of
+    metadata, and none of it is needed to associate them with another
+    repository.
+
+    :param import_conduit:  import conduit passed to the Importer
+    :type  import_conduit:  pulp.plugins.conduits.unit_import.ImportUnitConduit
+
+    :return:    generator of pulp.plugins.model.Unit
+    :rtype:     generator
+    """
+    for model in KEY_ONLY_MODELS:
+        criteria = UnitAssociationCriteria(type_ids=[model.TYPE],
+                                           unit_fields=list(model.UNIT_KEY_NAMES))
+        for unit in import_conduit.get_source_units(criteria):
+            yield unit
+
+    criteria = UnitAssociationCriteria(type_ids=list(FULL_UNIT_TYPES))
+    for unit in import_conduit.get_source_units(criteria):
+        yield unit
+
+
 def get_rpms_to_copy_by_key(rpm_search_dicts, import_conduit):
     """
     Errata specify NEVRA for the RPMs they reference. This method is useful for
@@ -172,8 +203,7 @@ def copy_rpms(units, import_conduit, copy_deps, solver=None):
                             that cannot be resolved within the source repo.
     :param solver:          an object that can be used for dependency solving.
                             this is useful so that data can be cached in the
-                            depsolving object and re-used by each iteration of
-                            this method.
+                            depsolving object and re-used by other calls.
     :type  solver:          pulp_rpm.plugins.importers.yum.depsolve.Solver
 
     :return:    set of pulp.plugins.models.Unit that were copied
@@ -187,16 +217,20 @@ def copy_rpms(units, import_conduit, copy_deps, solver=None):
 
     if copy_deps and unit_set:
         if solver is None:
-            solver = depsolve.Solver(import_conduit.get_source_units)
-        deps = solver.find_dependent_rpms(unit_set)
-        # remove rpms already in the destination repo
-        existing_units = set(existing.get_existing_units([dep.unit_key for dep in deps],
-                                                         models.RPM.UNIT_KEY_NAMES, models.RPM.TYPE,
-                                                         import_conduit.get_destination_units))
-        to_copy = deps - existing_units
+            solver = depsolve.Solver(import_conduit.get_source_units,
+                                     import_conduit.source_repo_id)
+
+        def existing_in_destination(deps):
+            # dependencies of rpms already in the destination repo are not copied
+            return existing.get_existing_units([dep.unit_key for dep in deps],
+                                               models.RPM.UNIT_KEY_NAMES, models.RPM.TYPE,
+                                               import_conduit.get_destination_units)
+
+        to_copy = solver.find_dependency_closure(unit_set, existing_in_destination)
         _LOGGER.debug('Copying deps: %s' % str(sorted([x.unit_key['name'] for x in to_copy])))
-        if to_copy:
-            unit_set |= copy_rpms(to_copy, import_conduit, copy_deps, solver)
+        for unit in to_copy:
+            import_conduit.associate_unit(unit)
+        unit_set |= to_copy
 
     return unit_set
 
@@ -238,22 +272,28 @@ def copy_rpms_by_name(names, import_conduit, copy_deps):
     :return:    set of pulp.plugins.model.Unit that were copied
     :rtype:     set
     """
-    to_copy = {}
+    # keys are the name and arch of each package, and values are lists of units
+    units_by_package = {}
 
     search_dicts = ({'name': name} for name in names)
     units = existing.get_existing_units(search_dicts, models.RPM.UNIT_KEY_NAMES,
                                         models.RPM.TYPE,
                                         import_conduit.get_source_units)
     for unit in units:
-        model = models.RPM.from_package_info(unit.unit_key)
-        previous = to_copy.get(model.key_string_without_version)
-        if previous is None:
-            to_copy[model.key_string_without_version] = (model.complete_version_serialized, unit)
-        else:
-            to_copy[model.key_string_without_version] = max(
-                ((model.complete_version_serialized, unit), previous))
+        key = versions.key_without_version(models.RPM, unit.unit_key)
+        units_by_package.setdefault(key, []).append(unit)
 
-    return copy_rpms((unit for v, unit in to_copy.itervalues()), import_conduit, copy_deps)
+    to_copy = (evr.newest(package_units, _unit_evr)
+               for package_units in units_by_package.itervalues())
+    return copy_rpms(to_copy, import_conduit, copy_deps)
+
+
+def _unit_evr(unit):
+    """
+    :return:    epoch, version and release of an RPM unit
+    :rtype:     tuple
+    """
+    return evr.unit_key_evr(unit.unit_key)
 
 
 def identify_children_to_copy(units):
@@ -333,8 +373,10 @@ def _associate_unit(dest_repo, import_conduit, unit):
 
 def _safe_copy_unit_without_file(unit):
     """
-    Makes a deep copy of the unit, removes its "id", and removes anything in
-    "metadata" whose key starts with a "_".
+    Makes a copy of the unit, removes its "id", and removes anything in
+    "metadata" whose key starts with a "_". The unit key and metadata are
+    copied, but values within them are shared with the original unit, since
+    they are only saved, never modified.
 
     :param unit:    unit to be copied
     :type  unit:    pulp.plugins.model.Unit
@@ -342,9 +384,9 @@ def _safe_copy_unit_without_file(unit):
     :return:        copy of the unit
     :rtype unit:    pulp.plugins.model.Unit
     """
-    new_unit = copy.deepcopy(unit)
+    new_unit = copy.copy(unit)
     new_unit.id = None
-    for key in new_unit.metadata.keys():
-        if key.startswith('_'):
-            del new_unit.metadata[key]
+    new_unit.unit_key = dict(unit.unit_key)
+    new_unit.metadata = dict((key, value) for key, value in unit.metadata.iteritems()
+                             if not key.startswith('_'))
     return new_unit
@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# default number of units whose existing units are looked up with one search
+DEFAULT_BATCH_SIZE = 100
+
+# default minimum number of seconds between two progress reports
+DEFAULT_PROGRESS_INTERVAL = 1
+
+
+class ProgressThrottle(object):
+    """
+    Rate limiter for progress reports, which are written to the database each
+    time they are set. A report is only sent if at least interval seconds have
+    passed since the last one, unless it is forced.
+    """
+
+    def __init__(self, set_progress, interval=DEFAULT_PROGRESS_INTERVAL):
+        """
+        :param set_progress:    function that takes no arguments and sends a
+                                progress report
+        :type  set_progress:    function
+        :param interval:        minimum number of seconds between two reports
+        :type  interval:        int or float
+        """
+        self.set_progress = set_progress
+        self.interval = interval
+        self._last = None
+        self._lock = threading.Lock()
+
+    def update(self, force=False):
+        """
+        Send a progress report if one is due.
+
+        :param force:   iff True, send a report regardless of when the last one was sent
+        :type  force:   bool
+        """
+        with self._lock:
+            now = time.time()
+            if force or self._last is None or now - self._last >= self.interval:
+                self._last = now
+                self.set_progress()
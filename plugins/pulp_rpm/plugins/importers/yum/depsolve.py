@@ -1,16 +1,28 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
 import logging
+import threading
 
+from pulp.plugins.model import Unit
 from pulp.plugins.util.misc import paginate
 from pulp.server.db.model.criteria import UnitAssociationCriteria
+from pulp.server.managers import factory as managers
 
-from pulp_rpm.common import version_utils
+from pulp_rpm.common import evr
 from pulp_rpm.plugins.db import models
 
 
 _LOGGER = logging.getLogger(__name__)
 
+# maximum number of repositories whose dependency indexes are kept in memory
+MAX_CACHED_INDEXES = 2
+
+# keys are repository ids, and values are tuples of the repository's content
+# version and its DependencyIndex, least recently used first
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
 
 class Requirement(object):
     """
@@ -75,18 +87,25 @@ class Requirement(object):
         if self.name != other.name:
             raise ValueError('Comparison of objects with different names is not supported.')
 
-        mine = [self.epoch, self.version, self.release]
-        theirs = [other.epoch, other.version, other.release]
-        # the encode function is rather picky about the type and length of its
-        # argument, so we only call it for values that we know it will accept
-        for i, value in enumerate(mine):
-            if value:
-                mine[i] = version_utils.encode(str(value))
-        for i, value in enumerate(theirs):
-            if value:
-                theirs[i] = version_utils.encode(str(value))
+        if self.release and other.release:
+            return cmp(evr.evr_key(self.epoch, self.version, self.release),
+                       evr.evr_key(other.epoch, other.version, other.release))
+
+        # a missing release is older than any release of the same version
+        return self._cmp_without_release(other) or cmp(bool(self.release), bool(other.release))
 
-        return cmp(mine, theirs)
+    def _cmp_without_release(self, other):
+        """
+        Compare only the epoch and version of self and other.
+
+        :param other: Any object that has the following attributes: epoch and version.
+        :type  other: object
+        :return:      A negative value if self is less than other, 0 if self is equal to other, and
+                      a positive value if self is greater than other.
+        :rtype:       int
+        """
+        return cmp(evr.evr_key(self.epoch, self.version, None),
+                   evr.evr_key(other.epoch, other.version, None))
 
     def __eq__(self, other):
         """
@@ -105,22 +124,12 @@ class Requirement(object):
         if self.name != other.name:
             return False
 
-        # Attempt to compare the version information
-        mine_version = version_utils.encode(self.version)
-        mine_release = version_utils.encode(self.release) if self.release else None
-        mine = [self.epoch, mine_version, mine_release]
-
-        theirs_version = version_utils.encode(other.version)
-        theirs_release = version_utils.encode(other.release) if other.release else None
-        theirs = [other.epoch, theirs_version, theirs_release]
-
         # Release is optional, so if it's omitted in either case, remove it entirely
         # from the check.
-        if mine[2] is None or theirs[2] is None:
-            mine = mine[:2]
-            theirs = theirs[:2]
+        if not self.release or not other.release:
+            return self._cmp_without_release(other) == 0
 
-        return mine == theirs
+        return self.__cmp__(other) == 0
 
     def __ne__(self, other):
         """
@@ -163,12 +172,24 @@ class Requirement(object):
         :return:        True if the unit satisfies the Requirement, False otherwise
         :rtype:         bool
         """
-        unit_key = unit.unit_key
-        if self.name != unit_key['name']:
+        if self.name != unit.unit_key['name']:
             return False
 
         # this is easier to use in the comparison than a full Unit object
-        unit_as_namedtuple = models.RPM.NAMEDTUPLE(**unit_key)
+        return self.fills_unit_key(models.RPM.NAMEDTUPLE(**unit.unit_key))
+
+    def fills_unit_key(self, unit_as_namedtuple):
+        """
+        Returns True if the package with the given unit key will meet the requirement, False
+        otherwise.
+
+        :param unit_as_namedtuple:  unit key of a package
+        :type  unit_as_namedtuple:  pulp_rpm.plugins.db.models.RPM.NAMEDTUPLE
+        :return:                    True if the package satisfies the Requirement, False otherwise
+        :rtype:                     bool
+        """
+        if self.name != unit_as_namedtuple.name:
+            return False
 
         if self.flags == self.EQ:
             if self.is_versioned:
@@ -191,23 +212,195 @@ class Requirement(object):
             return self <= unit_as_namedtuple
 
 
+class DependencyIndex(object):
+    """
+    Index of the packages in a repository for resolving dependencies, built from
+    a single query. Packages are identified by their position in parallel lists,
+    and every requirement is resolved at most once, no matter how many packages
+    declare it.
+
+    Only the unit key and id of each package are kept, so the "provides" and
+    "requires" metadata of the units can be freed once the index is built. Units
+    are created anew whenever they are asked for, so callers never share them.
+    """
+
+    def __init__(self, units):
+        """
+        :param units:   RPM units that include their "provides" and "requires"
+                        metadata
+        :type  units:   iterable of pulp.plugins.model.Unit
+        """
+        # lists indexed by position
+        self._keys = []
+        self._ids = []
+        self._evr_keys = []
+        self._requires = []
+        # keys are unit keys, and values are positions
+        self._positions = {}
+        # keys are package names, and values are lists of positions
+        self._names = {}
+        # keys are provided names, and values are dicts where keys are package
+        # names and values are the position of the newest package providing it
+        self._providers = {}
+        # keys are requirements as tuples, and values are tuples of positions
+        self._resolved = {}
+
+        # identical requirements are shared between packages
+        requirements = {}
+        for position, unit in enumerate(units):
+            unit_key = self._key_tuple(unit.unit_key)
+            name = unit_key.name
+            evr_key = evr.evr_key(unit_key.epoch, unit_key.version, unit_key.release)
+            self._keys.append(unit_key)
+            self._ids.append(unit.id)
+            self._evr_keys.append(evr_key)
+            self._positions[unit_key] = position
+            self._names.setdefault(name, []).append(position)
+
+            unit_requires = []
+            for require in unit.metadata.get('requires') or []:
+                requirement = self._requirement_tuple(require)
+                unit_requires.append(requirements.setdefault(requirement, requirement))
+            self._requires.append(tuple(unit_requires))
+
+            for provide in unit.metadata.get('provides') or []:
+                providers = self._providers.setdefault(provide['name'], {})
+                newest = providers.get(name)
+                if newest is None or evr_key > self._evr_keys[newest]:
+                    providers[name] = position
+
+    @staticmethod
+    def _key_tuple(unit_key):
+        return models.RPM.NAMEDTUPLE(*(unit_key.get(name) for name in models.RPM.UNIT_KEY_NAMES))
+
+    @staticmethod
+    def _requirement_tuple(require):
+        return (require['name'], require.get('epoch'), require.get('version'),
+                require.get('release'), require.get('flags') or Requirement.EQ)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def unit(self, position):
+        """
+        :param position:    position of a package in the index
+        :type  position:    int
+
+        :return:    a new unit with the package's unit key and id, but no metadata
+        :rtype:     pulp.plugins.model.Unit
+        """
+        unit_key = dict(zip(models.RPM.UNIT_KEY_NAMES, self._keys[position]))
+        unit = Unit(models.RPM.TYPE, unit_key, {}, None)
+        unit.id = self._ids[position]
+        return unit
+
+    def units(self, positions):
+        """
+        :param positions:   positions of packages in the index
+        :type  positions:   iterable of int
+
+        :return:    new units with the packages' unit keys and ids, but no metadata
+        :rtype:     set
+        """
+        return set(self.unit(position) for position in positions)
+
+    def position(self, unit):
+        """
+        :param unit:    an RPM unit
+        :type  unit:    pulp.plugins.model.Unit
+
+        :return:    position of the unit in the index, or None if it is not in the repository
+        :rtype:     int
+        """
+        return self._positions.get(self._key_tuple(unit.unit_key))
+
+    def requirements(self, position):
+        """
+        :param position:    position of a package in the index
+        :type  position:    int
+
+        :return:    Requirement instances for the package's "Requires" entries
+        :rtype:     generator
+        """
+        for requirement in self._requires[position]:
+            yield Requirement(*requirement)
+
+    def resolve(self, requirement):
+        """
+        Find the packages that satisfy a requirement: the newest package of each
+        name that provides it if it is not versioned, and the newest version of
+        the package with the required name that meets it.
+
+        :param requirement: a requirement of some package
+        :type  requirement: Requirement
+
+        :return:    positions of the packages that satisfy the requirement
+        :rtype:     tuple
+        """
+        key = (requirement.name, requirement.epoch, requirement.version, requirement.release,
+               requirement.flags)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+
+        positions = []
+        if not requirement.is_versioned:
+            positions.extend(self._providers.get(requirement.name, {}).itervalues())
+
+        newest = None
+        for position in self._names.get(requirement.name, []):
+            if requirement.fills_unit_key(self._keys[position]) and \
+                    (newest is None or self._evr_keys[position] > self._evr_keys[newest]):
+                newest = position
+        if newest is not None:
+            positions.append(newest)
+
+        positions = tuple(positions)
+        self._resolved[key] = positions
+        return positions
+
+    def resolve_positions(self, positions):
+        """
+        :param positions:   positions of packages in the index
+        :type  positions:   iterable of int
+
+        :return:    positions of the packages that satisfy the requirements of
+                    the given packages
+        :rtype:     set
+        """
+        resolved = set()
+        requires = self._requires
+        for position in positions:
+            for requirement in requires[position]:
+                try:
+                    resolved.update(self._resolved[requirement])
+                except KeyError:
+                    resolved.update(self.resolve(Requirement(*requirement)))
+        return resolved
+
+
 class Solver(object):
     """
     Resolves RPM dependencies within a pulp repository
     """
 
-    def __init__(self, search_method):
+    def __init__(self, search_method, repo_id=None):
         """
         :param search_method:   method that takes a UnitAssociationCriteria and
                                 performs a search within a repository. Usually this
                                 will be a method on a conduit such as "conduit.get_units"
         :type  search_method:   function
+        :param repo_id:         id of the repository searched by search_method. If
+                                given, the dependency index of the repository is
+                                shared with other solvers for as long as the
+                                repository's content does not change.
+        :type  repo_id:         basestring
         """
         super(Solver, self).__init__()
         self.search_method = search_method
-        self._cached_source_with_provides = None
-        self._cached_provides_tree = None
-        self._cached_packages_tree = None
+        self.repo_id = repo_id
+        self._cached_index = None
 
     def find_dependent_rpms(self, units):
         """
@@ -224,135 +417,130 @@ class Solver(object):
                         satisfy the passed-in requirements
         :rtype:         set
         """
-        reqs = self.get_requirements(units)
-        return self.match(reqs)
+        index = self._index
+        positions, unindexed = self._positions(units)
+        resolved = index.resolve_positions(positions)
+        for requirement in self.get_requirements(unindexed):
+            resolved.update(index.resolve(requirement))
+        return index.units(resolved)
 
-    @property
-    def _source_with_provides(self):
+    def find_dependency_closure(self, units, skip=None):
         """
-        Returns a list of available packages with Provides info, and caches
-        the result so it won't have to be re-generated.
+        Given an iterable of Units, return a set of units that satisfy their
+        dependencies, the dependencies of those, and so on. The given units are
+        not part of the result. Dependencies are resolved only within the
+        repository searched by "self.search_method", which is queried at most
+        once no matter how deep the dependencies go.
 
-        :return:    list of tuples (RPM namedtuple, "provides" list)
-        :rtype      list
-        """
-        if self._cached_source_with_provides is None:
-            self._cached_source_with_provides = self._build_source_with_provides()
-        return self._cached_source_with_provides
-
-    def _build_source_with_provides(self):
-        """
-        Get a list of all available packages with their "Provides" info.
+        :param units:   iterable of pulp.plugins.model.Unit
+        :type  units:   iterable
+        :param skip:    function that takes a set of newly found units and returns
+                        those that should neither be part of the result nor have
+                        their own dependencies resolved, such as units that already
+                        exist in a destination repository
+        :type  skip:    callable
 
-        :return:    list of (pulp.plugins.model.Unit, list of provides)
+        :return:        set of pulp.plugins.model.Unit instances which
+                        satisfy the dependencies of the given units
+        :rtype:         set
         """
-        fields = list(models.RPM.UNIT_KEY_NAMES)
-        fields.extend(['provides', 'id', 'version_sort_index', 'release_sort_index'])
-        criteria = UnitAssociationCriteria(type_ids=[models.RPM.TYPE], unit_fields=fields)
-        return list(self.search_method(criteria))
+        index = self._index
+        positions, unindexed = self._positions(units)
+        seen = set(positions)
+        closure = set()
 
-    @property
-    def _provides_tree(self):
-        """
-        Returns a tree of "Provides" data and handles caching of that data once
-        it's been created. See below for details on the data structure.
-
-        :return:    dictionary as defined below in _build_provides_tree
-        :rtype:     dict
-        """
-        if self._cached_provides_tree is None:
-            self._cached_provides_tree = self._build_provides_tree()
-            # if both trees have been created, remove the cached source list
-            # so it can be garbage-collected
-            if self._cached_packages_tree is not None:
-                self._cached_source_with_provides = None
-        return self._cached_provides_tree
-
-    def _build_provides_tree(self):
-        """
-        Creates a tree of "Provides" data so that for any given "Provides" name,
-        the newest version of each package that provides that capability can be
-        easily accessed.
-
-        In the example below, "provide_nameA" is the value of a "Provides" statement
-        such as "webserver". "package_name1" is the name of a package, such as "httpd".
-        "package1_as_unit" is an instance of pulp.plugins.model.Unit
-        for the newest version of that package which provides "provide_nameA".
-
-        {
-            'provide_nameA': {
-                'package_name1': package1_as_unit,
-                'package_name2': package2_as_unit,
-            },
-
-            'provide_nameB': {
-                'package_name3': package3_as_unit,
-            },
-        }
-
-        :return:    dictionary as defined above
-        :rtype:     dict
-        """
-        source_units = self._source_with_provides
-        tree = {}
-        for unit in source_units:
-            my_cmp_tuple = (unit.unit_key['epoch'], unit.metadata['version_sort_index'],
-                            unit.metadata['release_sort_index'])
-            for provide in unit.metadata.get('provides', []):
-                unit_dict = tree.setdefault(provide['name'], {})
-                newest_version = unit_dict.get(unit.unit_key['name'], None)
-                if newest_version:
-                    newest_cmp_tuple = (newest_version.unit_key['epoch'],
-                                        newest_version.metadata['version_sort_index'],
-                                        newest_version.metadata['release_sort_index'])
-                    if cmp(my_cmp_tuple, newest_cmp_tuple) == 1:
-                        unit_dict[unit.unit_key['name']] = unit
-                else:
-                    unit_dict[unit.unit_key['name']] = unit
-        return tree
+        found = index.resolve_positions(positions)
+        for requirement in self.get_requirements(unindexed):
+            found.update(index.resolve(requirement))
 
-    @property
-    def _packages_tree(self):
-        """
-        Returns a tree of package data and handles caching of that data once
-        it's been created. See below for details on the data structure.
+        while found:
+            found -= seen
+            seen |= found
+            if skip is not None and found:
+                skipped = set(index.position(unit) for unit in skip(index.units(found)))
+                found -= skipped
+            closure.update(found)
+            found = index.resolve_positions(found)
 
-        :return:    dictionary as defined below in _build_packages_tree
-        :rtype:     dict
-        """
-        if self._cached_packages_tree is None:
-            self._cached_packages_tree = self._build_packages_tree()
-            # if both trees have been created, remove the cached source list
-            # so it can be garbage-collected
-            if self._cached_provides_tree is not None:
-                self._cached_source_with_provides = None
-        return self._cached_packages_tree
+        return index.units(closure)
 
-    def _build_packages_tree(self):
+    def _positions(self, units):
         """
-        Creates a tree of package names, where values are lists of each version of
-        that package. This is useful for filling a dependency, where it is valuable
-        to consider each available version of a package name.
+        :param units:   iterable of pulp.plugins.model.Unit
+        :type  units:   iterable
 
-        {
-            'package_name_1': [
-                package1v1_as_unit,
-                package1v2_as_unit,
-            ],
-            'package_name_2': [
-                package2v1_as_unit,
-            ],
-        }
+        :return:    tuple of a list of the positions of units in the index, and a
+                    list of the units that are not in it
+        :rtype:     tuple
+        """
+        index = self._index
+        positions = []
+        unindexed = []
+        for unit in units:
+            position = index.position(unit)
+            if position is None:
+                unindexed.append(unit)
+            else:
+                positions.append(position)
+        return positions, unindexed
 
-        :return:    dictionary as defined above
-        :rtype:     dict
+    @property
+    def _index(self):
+        """
+        Returns the dependency index of the source repository, building it only
+        if neither this solver nor, when the repository's id is known, any other
+        solver has built one for the repository's current content.
+
+        :return:    index of the repository's RPMs
+        :rtype:     DependencyIndex
+        """
+        if self._cached_index is None:
+            version = self._content_version()
+            if version is not None:
+                with _index_cache_lock:
+                    cached = _index_cache.pop(self.repo_id, None)
+                    if cached is not None and cached[0] == version:
+                        _index_cache[self.repo_id] = cached
+                        self._cached_index = cached[1]
+                        return self._cached_index
+
+            self._cached_index = self._build_index()
+            if version is not None:
+                with _index_cache_lock:
+                    _index_cache[self.repo_id] = (version, self._cached_index)
+                    while len(_index_cache) > MAX_CACHED_INDEXES:
+                        _index_cache.popitem(last=False)
+        return self._cached_index
+
+    def _content_version(self):
+        """
+        :return:    value that changes whenever units are added to or removed from
+                    the source repository, or None if that cannot be determined
+        :rtype:     tuple
+        """
+        if self.repo_id is None:
+            return None
+        repo = managers.repo_query_manager().find_by_id(self.repo_id)
+        if repo is None:
+            return None
+        version = (repo.get('last_unit_added'), repo.get('last_unit_removed'))
+        if version == (None, None):
+            # there is no way to tell whether the content has changed
+            return None
+        return version
+
+    def _build_index(self):
+        """
+        Query all available packages with their "Provides" and "Requires" info
+        and index them.
+
+        :return:    index of the repository's RPMs
+        :rtype:     DependencyIndex
         """
-        tree = {}
-        for unit in self._source_with_provides:
-            version_list = tree.setdefault(unit.unit_key['name'], [])
-            version_list.append(unit)
-
-        return tree
+        fields = list(models.RPM.UNIT_KEY_NAMES)
+        fields.extend(['provides', 'requires', 'id'])
+        criteria = UnitAssociationCriteria(type_ids=[models.RPM.TYPE], unit_fields=fields)
+        return DependencyIndex(self.search_method(criteria))
 
     def match(self, reqs):
         """
@@ -365,29 +553,11 @@ class Solver(object):
                         satisfy the passed-in requirements
         :rtype:         set
         """
-        provides_tree = self._provides_tree
-        packages_tree = self._packages_tree
-        deps = set()
-
+        index = self._index
+        positions = set()
         for req in reqs:
-            # in order for a Requires: line to match a Provides, the requirement must
-            # not specify a version
-            if not req.is_versioned:
-                providing_units = provides_tree.get(req.name, {})
-                for unit in providing_units.itervalues():
-                    deps.add(unit)
-
-            # find in package names
-            unit_list = packages_tree.get(req.name, [])
-            applicable_units = filter(req.fills_requirement, unit_list)
-            rpms_with_units = [
-                (models.RPM.from_package_info(unit.unit_key), unit) for unit in applicable_units
-            ]
-            if rpms_with_units:
-                newest_rpm, newest_unit = max(rpms_with_units)
-                deps.add(newest_unit)
-
-        return deps
+            positions.update(index.resolve(req))
+        return index.units(positions)
 
     def get_requirements(self, units):
         """
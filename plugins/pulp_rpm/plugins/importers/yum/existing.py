@@ -1,4 +1,6 @@
+from itertools import izip
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 
 from pulp.plugins.util.misc import paginate
@@ -11,6 +13,13 @@ from pulp_rpm.yum_plugin.util import get_relpath_from_unit
 _LOGGER = logging.getLogger(__name__)
 
 
+# unit types whose existing units are looked up by checksum, and whose files must be on disk
+PACKAGE_TYPES = (models.RPM.TYPE, models.SRPM.TYPE, models.DRPM.TYPE)
+
+# maximum number of threads used to check that existing units' files are on disk
+FILE_CHECK_THREADS = 8
+
+
 def check_repo(wanted, unit_search_method):
     """
     Given an iterable of units as namedtuples, this function will search for them
@@ -39,17 +48,12 @@ def check_repo(wanted, unit_search_method):
     for unit_type, values in sorted_units.iteritems():
         model = models.TYPE_MAP[unit_type]
         fields = model.UNIT_KEY_NAMES + ('_storage_path',)
-        rpm_srpm_drpm = unit_type in (models.RPM.TYPE, models.SRPM.TYPE, models.DRPM.TYPE)
-        unit_keys_generator = (unit._asdict() for unit in values.copy())
-
-        for unit in get_existing_units(unit_keys_generator, fields, unit_type, unit_search_method):
-            if rpm_srpm_drpm:
-                # For RPMs, SRPMs and DRPMs, also check if the file exists on the filesystem.
-                # If not, we do not want to skip downloading the unit.
-                if unit.storage_path is None or not os.path.isfile(unit.storage_path):
-                    continue
-            named_tuple = model(metadata=unit.metadata, **unit.unit_key).as_named_tuple
-            values.discard(named_tuple)
+
+        for unit_filters in _search_filters(unit_type, values):
+            criteria = UnitAssociationCriteria([unit_type], unit_filters=unit_filters,
+                                               unit_fields=fields, association_fields=[])
+            for unit, named_tuple in _wanted_units(unit_search_method(criteria), model, values):
+                values.discard(named_tuple)
 
     ret = set()
     ret.update(*sorted_units.values())
@@ -95,39 +99,33 @@ def check_all_and_associate(wanted, sync_conduit):
     for unit_type, values in sorted_units.iteritems():
         model = models.TYPE_MAP[unit_type]
         unit_fields = model.UNIT_KEY_NAMES + ('_storage_path', 'filename')
-        rpm_srpm_drpm = unit_type in (models.RPM.TYPE, models.SRPM.TYPE, models.DRPM.TYPE)
         rpm_or_srpm = unit_type in (models.RPM.TYPE, models.SRPM.TYPE)
 
-        unit_keys_generator = (unit._asdict() for unit in values.copy())
-        for unit in get_all_existing_units(unit_keys_generator, unit_fields, unit_type,
-                                           sync_conduit.search_all_units):
-            # For RPMs, SRPMs and DRPMs, also check if the file exists on the filesystem.
-            # If not, we do not want to skip downloading the unit.
-            if rpm_srpm_drpm:
-                if unit.storage_path is None or not os.path.isfile(unit.storage_path):
-                    continue
-
-            # Since the unit is already downloaded, call respective sync_conduit calls to import
-            # the unit in given repository.
-            if rpm_or_srpm:
-                unit_key = unit.unit_key
-                rpm_or_srpm_unit = model(unit_key['name'], unit_key['epoch'], unit_key['version'],
-                                         unit_key['release'], unit_key['arch'],
-                                         unit_key['checksumtype'], unit_key['checksum'],
-                                         unit.metadata)
-                relative_path = rpm_or_srpm_unit.relative_path
-            else:
-                relative_path = get_relpath_from_unit(unit)
-            downloaded_unit = sync_conduit.init_unit(unit_type, unit.unit_key,
-                                                     unit.metadata, relative_path)
-
-            # 1125388 - make sure we keep storage_path on the new unit model obj
-            downloaded_unit.storage_path = unit.storage_path
-            sync_conduit.save_unit(downloaded_unit)
-
-            # Discard already downloaded unit from the return value.
-            named_tuple = model(metadata=unit.metadata, **unit.unit_key).as_named_tuple
-            values.discard(named_tuple)
+        for unit_filters in _search_filters(unit_type, values):
+            criteria = Criteria(filters=unit_filters, fields=unit_fields)
+            found = _wanted_units(sync_conduit.search_all_units(unit_type, criteria), model,
+                                  values)
+            for unit, named_tuple in found:
+                # Since the unit is already downloaded, call respective sync_conduit calls to
+                # import the unit in given repository.
+                if rpm_or_srpm:
+                    unit_key = unit.unit_key
+                    rpm_or_srpm_unit = model(unit_key['name'], unit_key['epoch'],
+                                             unit_key['version'], unit_key['release'],
+                                             unit_key['arch'], unit_key['checksumtype'],
+                                             unit_key['checksum'], unit.metadata)
+                    relative_path = rpm_or_srpm_unit.relative_path
+                else:
+                    relative_path = get_relpath_from_unit(unit)
+                downloaded_unit = sync_conduit.init_unit(unit_type, unit.unit_key,
+                                                         unit.metadata, relative_path)
+
+                # 1125388 - make sure we keep storage_path on the new unit model obj
+                downloaded_unit.storage_path = unit.storage_path
+                sync_conduit.save_unit(downloaded_unit)
+
+                # Discard already downloaded unit from the return value.
+                values.discard(named_tuple)
 
     ret = set()
     ret.update(*sorted_units.values())
@@ -160,6 +158,87 @@ def get_all_existing_units(search_dicts, unit_fields, unit_type, search_method):
             yield result
 
 
+def _search_filters(unit_type, wanted):
+    """
+    Build the filters needed to search for a collection of wanted units, one
+    page at a time. Packages are searched for by checksum alone, which is
+    indexed and much cheaper for the database than matching whole unit keys.
+    The results must be matched against the wanted unit keys afterward, which
+    _wanted_units does.
+
+    :param unit_type:   type of the wanted units
+    :type  unit_type:   basestring
+    :param wanted:      collection of units as namedtuples, all of type unit_type
+    :type  wanted:      iterable
+
+    :return:    list of filter documents, one for each page of wanted units
+    :rtype:     list
+    """
+    # this is built up front, because callers discard from "wanted" while searching
+    if unit_type in PACKAGE_TYPES:
+        return [{'checksum': {'$in': list(segment)}}
+                for segment in paginate(set(unit.checksum for unit in wanted))]
+    return [{'$or': list(segment)} for segment in paginate(unit._asdict() for unit in wanted)]
+
+
+def _wanted_units(units, model, wanted):
+    """
+    Filter search results down to the units that are wanted. For package types,
+    only units whose file is present on the filesystem are kept; if the file is
+    missing, we do not want to skip downloading the unit. Files are checked in
+    parallel.
+
+    :param units:   search results
+    :type  units:   iterable of pulp.plugins.model.Unit
+    :param model:   model class of the units
+    :type  model:   class
+    :param wanted:  collection (preferably a set) of wanted units as namedtuples
+    :type  wanted:  set
+
+    :return:    list of (unit, unit as namedtuple) for each wanted unit that exists
+    :rtype:     list
+    """
+    found = []
+    for unit in units:
+        named_tuple = model.NAMEDTUPLE(**unit.unit_key)
+        if named_tuple in wanted:
+            found.append((unit, named_tuple))
+
+    if model.TYPE in PACKAGE_TYPES and found:
+        files_exist = _files_exist([pair[0].storage_path for pair in found])
+        found = [pair for pair, file_exists in izip(found, files_exist) if file_exists]
+    return found
+
+
+def _files_exist(paths):
+    """
+    Check in a pool of threads whether each of the given paths is a file.
+
+    :param paths:   list of paths, any of which may be None
+    :type  paths:   list
+
+    :return:    list of booleans in the same order as paths
+    :rtype:     list
+    """
+    pool = ThreadPool(processes=min(FILE_CHECK_THREADS, len(paths)))
+    try:
+        return pool.map(_is_file, paths)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _is_file(path):
+    """
+    :param path:    path to check, or None
+    :type  path:    basestring
+
+    :return:    True iff path is not None and is a file
+    :rtype:     bool
+    """
+    return path is not None and os.path.isfile(path)
+
+
 def _sort_by_type(wanted):
     ret = {}
     for unit in wanted:
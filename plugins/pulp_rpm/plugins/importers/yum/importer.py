@@ -48,6 +48,9 @@ class YumImporter(Importer):
     def upload_unit(self, repo, type_id, unit_key, metadata, file_path, conduit, config):
         return upload.upload(repo, type_id, unit_key, metadata, file_path, conduit, config)
 
+    def upload_units(self, repo, uploads, conduit, config):
+        return upload.upload_units(repo, uploads, conduit, config)
+
     def sync_repo(self, repo, sync_conduit, call_config):
         """
         :param repo: metadata describing the repository
@@ -1,3 +1,4 @@
+import functools
 import logging
 import shutil
 
@@ -7,6 +8,8 @@ from pulp.plugins.util import verification
 
 from pulp_rpm.common import constants
 from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers import download
+from pulp_rpm.plugins.importers.yum import batch
 
 
 _logger = logging.getLogger(__name__)
@@ -53,6 +56,20 @@ class ContentListener(DownloadEventListener):
         self.progress_report = progress_report
         self.sync_call_config = sync_call_config
         self.metadata_files = metadata_files
+        # progress reports are each a database write, so they are rate limited
+        self.progress = batch.ProgressThrottle(
+            functools.partial(sync_conduit.set_progress, progress_report))
+        # if downloads are verified, their sizes and checksums are calculated
+        # while they are written, so they do not have to be read again
+        self.digests = None
+        if sync_call_config.get(importer_constants.KEY_VALIDATE):
+            self.digests = download.DownloadDigests()
+
+    def flush(self):
+        """
+        Send a final progress report. This must be called once downloading is done.
+        """
+        self.progress.update(force=True)
 
     def download_succeeded(self, report):
         """
@@ -61,10 +78,11 @@ class ContentListener(DownloadEventListener):
         :return:
         """
         model = report.data
+        digest_file = self._pop_digest(report)
 
         try:
-            self._verify_size(model, report)
-            self._verify_checksum(model, report)
+            self._verify_size(model, report, digest_file)
+            self._verify_checksum(model, report, digest_file)
         except verification.VerificationException:
             # The verify methods populates the error details of the progress report.
             # There is also no need to clean up the bad file as the sync will blow away
@@ -85,7 +103,7 @@ class ContentListener(DownloadEventListener):
         # save unit
         self.sync_conduit.save_unit(unit)
         self.progress_report['content'].success(model)
-        self.sync_conduit.set_progress(self.progress_report)
+        self.progress.update()
 
     def download_failed(self, report):
         """
@@ -95,11 +113,24 @@ class ContentListener(DownloadEventListener):
         :return:
         """
         model = report.data
+        self._pop_digest(report)
         report.error_report['url'] = report.url
         self.progress_report['content'].failure(model, report.error_report)
-        self.sync_conduit.set_progress(self.progress_report)
+        self.progress.update()
+
+    def _pop_digest(self, report):
+        """
+        :param report: report handed to this listener by the downloader
+        :type  report: nectar.report.DownloadReport
+
+        :return: digest calculated while the file was downloaded, or None
+        :rtype:  pulp_rpm.plugins.importers.download.DigestFile
+        """
+        if self.digests is None:
+            return None
+        return self.digests.pop(report.destination)
 
-    def _verify_size(self, model, report):
+    def _verify_size(self, model, report, digest_file=None):
         """
         Verifies the size of the given unit if the sync is configured to do so. If the verification
         fails, the error is noted in this instance's progress report and the error is re-raised.
@@ -108,6 +139,9 @@ class ContentListener(DownloadEventListener):
         :type  model: pulp_rpm.plugins.db.models.RPM
         :param report: report handed to this listener by the downloader
         :type  report: nectar.report.DownloadReport
+        :param digest_file: digest calculated while the file was downloaded, if any, so that
+                            the file does not need to be read
+        :type  digest_file: pulp_rpm.plugins.importers.download.DigestFile
 
         :raises verification.VerificationException: if the size of the content is incorrect
         """
@@ -116,8 +150,7 @@ class ContentListener(DownloadEventListener):
             return
 
         try:
-            with open(report.destination) as dest_file:
-                verification.verify_size(dest_file, model.metadata['size'])
+            download.verify_size(digest_file, report.destination, model.metadata['size'])
 
         except verification.VerificationException, e:
             error_report = {
@@ -129,7 +162,7 @@ class ContentListener(DownloadEventListener):
             self.progress_report['content'].failure(model, error_report)
             raise
 
-    def _verify_checksum(self, model, report):
+    def _verify_checksum(self, model, report, digest_file=None):
         """
         Verifies the checksum of the given unit if the sync is configured to do so. If the
         verification
@@ -139,6 +172,9 @@ class ContentListener(DownloadEventListener):
         :type  model: pulp_rpm.plugins.db.models.RPM
         :param report: report handed to this listener by the downloader
         :type  report: nectar.report.DownloadReport
+        :param digest_file: digest calculated while the file was downloaded, if any, so that
+                            the file does not need to be read
+        :type  digest_file: pulp_rpm.plugins.importers.download.DigestFile
 
         :raises verification.VerificationException: if the checksum of the content is incorrect
         """
@@ -147,9 +183,8 @@ class ContentListener(DownloadEventListener):
             return
 
         try:
-            with open(report.destination) as dest_file:
-                verification.verify_checksum(dest_file, model.unit_key['checksumtype'],
-                                             model.unit_key['checksum'])
+            download.verify_checksum(digest_file, report.destination,
+                                     model.unit_key['checksumtype'], model.unit_key['checksum'])
 
         except verification.VerificationException, e:
             error_report = {
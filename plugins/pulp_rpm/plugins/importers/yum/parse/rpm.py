@@ -26,6 +26,55 @@ def get_package_xml(pkg_path, sumtype=verification.TYPE_SHA256):
     :return:    rpm metadata dictionary or empty if rpm path doesnt exist
     :rtype:     dict
     """
+    po = _create_package(pkg_path, sumtype)
+    if po is None:
+        return {}
+    return _package_xml(po, pkg_path)
+
+
+def get_package_metadata(pkg_path, sumtype=verification.TYPE_SHA256, checksum=None,
+                         location=None):
+    """
+    Generate the repo xmls for a given rpm, along with its provides and requires,
+    from a single read of the rpm's header. The provides and requires are the
+    same as those in the primary xml, without having to parse it.
+
+    :param pkg_path: rpm package path on the filesystem
+    :type  pkg_path: str
+
+    :param sumtype: The type of checksum to use for creating the package xml
+    :type  sumtype: str
+
+    :param checksum: checksum of the package of type sumtype, if it is already
+                     known, so that the whole package does not have to be read
+                     again to calculate it
+    :type  checksum: str
+
+    :param location: path whose file name is used in the location tag of the
+                     primary xml, if it is not pkg_path
+    :type  location: str
+
+    :return:    dictionary with the keys "repodata", whose value is the same as
+                get_package_xml returns, and "provides" and "requires", whose
+                values are lists of rpm entry dictionaries; or empty if the rpm
+                could not be read
+    :rtype:     dict
+    """
+    po = _create_package(pkg_path, sumtype, checksum)
+    if po is None:
+        return {}
+    return {
+        'repodata': _package_xml(po, location or pkg_path),
+        'provides': [_rpm_entry(*provide[:3]) for provide in sorted(po.provides)],
+        'requires': _package_requires(po),
+    }
+
+
+def _create_package(pkg_path, sumtype, checksum=None):
+    """
+    :return:    createrepo's representation of the rpm, or None if it could not be read
+    :rtype:     createrepo.yumbased.CreateRepoPackage
+    """
     ts = rpmUtils.transaction.initReadOnlyTransaction()
     try:
         po = yumbased.CreateRepoPackage(ts, pkg_path, sumtype=sumtype)
@@ -33,9 +82,17 @@ def get_package_xml(pkg_path, sumtype=verification.TYPE_SHA256):
         # I hate this, but yum doesn't use reasonable exceptions like IOError
         # and ValueError.
         _LOGGER.error(str(e))
-        return {}
+        return None
     # RHEL6 createrepo throws a ValueError if _cachedir is not set
     po._cachedir = None
+    if checksum is not None:
+        # createrepo calculates the checksum only if it isn't already set
+        po._checksum = checksum
+        po._checksums = [(sumtype, checksum, 1)]
+    return po
+
+
+def _package_xml(po, pkg_path):
     primary_xml_snippet = change_location_tag(po.xml_dump_primary_metadata(), pkg_path)
     metadata = {
         'primary': primary_xml_snippet,
@@ -45,6 +102,56 @@ def get_package_xml(pkg_path, sumtype=verification.TYPE_SHA256):
     return metadata
 
 
+def _package_requires(po):
+    """
+    Return the requires of a package that yum includes in primary xml, which
+    leaves out rpmlib features and anything the package provides for itself.
+
+    :param po: createrepo's representation of the rpm
+    :type  po: createrepo.yumbased.CreateRepoPackage
+
+    :return:    list of rpm entry dictionaries
+    :rtype:     list
+    """
+    requires = []
+    for name, flags, evr, pre in sorted(po._requires_with_pre()):
+        if name.startswith('rpmlib('):
+            continue
+        if name in po.provides_names or \
+                (name.startswith('/') and
+                 (name in po.filelist or name in po.dirlist or name in po.ghostlist)):
+            if not flags or po.checkPrco('provides', (name, flags, evr)):
+                continue
+        requires.append(_rpm_entry(name, flags, evr))
+    return requires
+
+
+def _rpm_entry(name, flags, evr):
+    """
+    Turn one of yum's provides or requires tuples into the same dictionary that
+    is parsed from an entry in primary xml, which only has a version if it has
+    flags.
+
+    :param name:    name of the capability
+    :type  name:    str
+    :param flags:   comparison such as "EQ" or "GE", or None
+    :type  flags:   str
+    :param evr:     epoch, version and release
+    :type  evr:     tuple
+
+    :return:    rpm entry dictionary
+    :rtype:     dict
+    """
+    entry = {'name': string_to_unicode(name), 'version': None, 'release': None,
+             'epoch': None, 'flags': None}
+    if flags:
+        entry['flags'] = flags
+        for key, value in zip(('epoch', 'version', 'release'), evr):
+            if value:
+                entry[key] = string_to_unicode(value)
+    return entry
+
+
 def change_location_tag(primary_xml_snippet, relpath):
     """
     Transform the <location> tag to strip out leading directories so it
@@ -1,4 +1,5 @@
 import ConfigParser
+import errno
 import logging
 import os
 import shutil
@@ -6,6 +7,7 @@ import tempfile
 
 from lxml import etree as ET
 from nectar.listener import AggregatingEventListener
+from nectar.report import DownloadReport
 from nectar.request import DownloadRequest
 from pulp.plugins.util import verification
 from pulp.server.exceptions import PulpCodedValidationException
@@ -67,6 +69,13 @@ def sync(sync_conduit, feed, working_dir, nectar_config, report, progress_callba
         dist_files = process_distribution(feed, tmp_dir, nectar_config, model, report)
         files.extend(dist_files)
 
+        # files that have not changed since a distribution was last synced are
+        # linked from that distribution's unit instead of being downloaded again
+        distribution_type_criteria = UnitAssociationCriteria(type_ids=[ids.TYPE_ID_DISTRO])
+        existing_units = sync_conduit.get_units(criteria=distribution_type_criteria)
+        files, linked_reports = link_existing_files(files, find_existing_files(existing_units),
+                                                    feed, tmp_dir)
+
         report.set_initial_values(len(files))
         listener = DistroFileListener(report, progress_callback)
         downloader = nectar_factory.create_downloader(feed, nectar_config, listener)
@@ -75,7 +84,7 @@ def sync(sync_conduit, feed, working_dir, nectar_config, report, progress_callba
         if len(listener.failed_reports) == 0:
             unit = sync_conduit.init_unit(ids.TYPE_ID_DISTRO, model.unit_key, model.metadata,
                                           model.relative_path)
-            model.process_download_reports(listener.succeeded_reports)
+            model.process_download_reports(linked_reports + listener.succeeded_reports)
             # remove pre-existing dir
             shutil.rmtree(unit.storage_path, ignore_errors=True)
             shutil.move(tmp_dir, unit.storage_path)
@@ -83,8 +92,6 @@ def sync(sync_conduit, feed, working_dir, nectar_config, report, progress_callba
             os.chmod(unit.storage_path, 0o775)
             sync_conduit.save_unit(unit)
             # find any old distribution units and remove them. See BZ #1150714
-            distribution_type_criteria = UnitAssociationCriteria(type_ids=[ids.TYPE_ID_DISTRO])
-            existing_units = sync_conduit.get_units(criteria=distribution_type_criteria)
             for existing_unit in existing_units:
                 if existing_unit != unit:
                     _LOGGER.info("Removing out-of-date distribution unit %s for repo %s" %
@@ -130,6 +137,112 @@ def file_to_download_request(file_dict, feed, storage_path):
     )
 
 
+def find_existing_files(existing_units):
+    """
+    Find the files of existing distribution units that have checksums, so
+    that files with the same checksums do not have to be downloaded again.
+
+    :param existing_units:  distribution units in the repository
+    :type  existing_units:  list of pulp.plugins.model.Unit
+
+    :return:    dict whose keys are (checksumtype, checksum) tuples, and whose
+                values are tuples of the full path to a file and its size
+    :rtype:     dict
+    """
+    existing_files = {}
+    for unit in existing_units:
+        for file_dict in unit.metadata.get('files', []):
+            if not file_dict.get('checksum') or not file_dict.get('checksumtype'):
+                continue
+            checksumtype = verification.sanitize_checksum_type(file_dict['checksumtype'])
+            path = os.path.join(unit.storage_path, file_dict['relativepath'])
+            existing_files[(checksumtype, file_dict['checksum'])] = (path, file_dict.get('size'))
+    return existing_files
+
+
+def link_existing_files(files, existing_files, feed, storage_path):
+    """
+    Hard link files described in a treeinfo file from existing distribution
+    units whose files have the same checksums. The existing files are verified
+    against the checksums first. Files are copied instead if they cannot be
+    linked because they are on another filesystem.
+
+    :param files:           dicts containing keys 'relativepath', 'checksum',
+                            and 'checksumtype'
+    :type  files:           list of dict
+    :param existing_files:  files of existing units, as returned by find_existing_files
+    :type  existing_files:  dict
+    :param feed:            URL to the base of a repository
+    :type  feed:            basestring
+    :param storage_path:    full filesystem path to where the files should be saved
+    :type  storage_path:    basestring
+
+    :return:    list of the files that still need to be downloaded, and a list
+                of download reports for the files that were linked, as if they
+                had been downloaded
+    :rtype:     (list of dict, list of nectar.report.DownloadReport)
+    """
+    if not existing_files:
+        return files, []
+
+    to_download = []
+    linked_reports = []
+    for file_dict in files:
+        existing = None
+        if file_dict['checksum']:
+            existing = existing_files.get((file_dict['checksumtype'], file_dict['checksum']))
+        if existing is None:
+            to_download.append(file_dict)
+            continue
+
+        request = file_to_download_request(file_dict, feed, storage_path)
+        if not _link_file(existing[0], existing[1], file_dict['checksumtype'],
+                          file_dict['checksum'], request.destination):
+            to_download.append(file_dict)
+            continue
+        report = DownloadReport(request.url, request.destination, request.data)
+        report.total_bytes = os.path.getsize(request.destination)
+        linked_reports.append(report)
+
+    _LOGGER.debug('linked %d unchanged distribution files' % len(linked_reports))
+    return to_download, linked_reports
+
+
+def _link_file(source, size, checksumtype, checksum, destination):
+    """
+    :param source:          full path to an existing file
+    :type  source:          basestring
+    :param size:            size the existing file should have, or None if unknown
+    :type  size:            int
+    :param checksumtype:    type of the checksum the existing file should have
+    :type  checksumtype:    basestring
+    :param checksum:        checksum the existing file should have
+    :type  checksum:        basestring
+    :param destination:     full path to where the file should be linked
+    :type  destination:     basestring
+
+    :return:    True if the file was linked or copied, or False if the existing file
+                is missing, does not have the expected size or checksum, or could
+                not be linked
+    :rtype:     bool
+    """
+    try:
+        if size is not None and os.path.getsize(source) != size:
+            return False
+        with open(source, 'rb') as source_file:
+            verification.verify_checksum(source_file, checksumtype, checksum)
+        try:
+            os.link(source, destination)
+        except OSError, e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.copyfile(source, destination)
+    except (IOError, OSError, verification.VerificationException), e:
+        _LOGGER.debug('could not link distribution file %s: %s' % (source, e))
+        return False
+    return True
+
+
 def strip_treeinfo_repomd(treeinfo_path):
     """
     strip repomd checksums from the treeinfo. These cause two issues:
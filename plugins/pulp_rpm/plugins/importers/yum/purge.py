@@ -7,13 +7,14 @@ from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.managers.repo.unit_association import OWNER_TYPE_IMPORTER
 
 from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers.yum import versions
 from pulp_rpm.plugins.importers.yum.repomd import packages, primary, presto, updateinfo, group
 
 
 _logger = logging.getLogger(__name__)
 
 
-def purge_unwanted_units(metadata_files, conduit, config):
+def purge_unwanted_units(metadata_files, conduit, config, remote_unit_keys=None):
     """
     START HERE - this is probably the method you want to call in this module
 
@@ -29,15 +30,25 @@ def purge_unwanted_units(metadata_files, conduit, config):
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
     :param config:          config object for this plugin
     :type  config:          pulp.plugins.config.PluginCallConfiguration
+    :param remote_unit_keys: dict where keys are type IDs, and values are sets of
+                             named tuples of every unit of that type in the remote
+                             repository, as collected while syncing. The metadata
+                             is only parsed again for types that are not present.
+    :type  remote_unit_keys: dict
     """
     if config.get_boolean(importer_constants.KEY_UNITS_REMOVE_MISSING) is True:
         _logger.info(_('Removing missing units.'))
-        remove_missing_rpms(metadata_files, conduit)
-        remove_missing_drpms(metadata_files, conduit)
-        remove_missing_errata(metadata_files, conduit)
-        remove_missing_groups(metadata_files, conduit)
-        remove_missing_categories(metadata_files, conduit)
-        remove_missing_environments(metadata_files, conduit)
+        remote_unit_keys = remote_unit_keys or {}
+        remove_missing_rpms(metadata_files, conduit, remote_unit_keys.get(models.RPM.TYPE))
+        remove_missing_drpms(metadata_files, conduit, remote_unit_keys.get(models.DRPM.TYPE))
+        remove_missing_errata(metadata_files, conduit,
+                              remote_unit_keys.get(models.Errata.TYPE))
+        remove_missing_groups(metadata_files, conduit,
+                              remote_unit_keys.get(models.PackageGroup.TYPE))
+        remove_missing_categories(metadata_files, conduit,
+                                  remote_unit_keys.get(models.PackageCategory.TYPE))
+        remove_missing_environments(metadata_files, conduit,
+                                    remote_unit_keys.get(models.PackageEnvironment.TYPE))
 
     retain_old_count = config.get(importer_constants.KEY_UNITS_RETAIN_OLD_COUNT)
     if retain_old_count is not None:
@@ -60,21 +71,15 @@ def remove_old_versions(num_to_keep, conduit):
     :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
     """
     for model in (models.RPM, models.SRPM, models.DRPM):
-        units = {}
+        newest = versions.NewestVersions(num_to_keep)
         for unit in get_existing_units(model, conduit.get_units):
-            model_instance = model(metadata=unit.metadata, **unit.unit_key)
-            key = model_instance.key_string_without_version
-            serialized_version = model_instance.complete_version_serialized
-            versions = units.setdefault(key, {})
-            versions[serialized_version] = unit
+            old_unit = newest.add(versions.key_without_version(model, unit.unit_key),
+                                  versions.version_key(unit.unit_key), unit)
+            if old_unit is not None:
+                conduit.remove_unit(old_unit)
 
-            # if we are over the limit, evict the oldest
-            if len(versions) > num_to_keep:
-                oldest_version = min(versions)
-                conduit.remove_unit(versions.pop(oldest_version))
 
-
-def remove_missing_rpms(metadata_files, conduit):
+def remove_missing_rpms(metadata_files, conduit, remote_named_tuples=None):
     """
     Remove RPMs from the local repository which do not exist in the remote
     repository.
@@ -84,15 +89,20 @@ def remove_missing_rpms(metadata_files, conduit):
     :param conduit:         a conduit from the platform containing the get_units
                             and remove_unit methods.
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param remote_named_tuples: set of named tuples representing units in the
+                                remote repository. If None, they are read from
+                                the metadata.
+    :type  remote_named_tuples: set
     """
-    file_function = functools.partial(metadata_files.get_metadata_file_handle,
-                                      primary.METADATA_FILE_NAME)
-    remote_named_tuples = get_remote_units(file_function, primary.PACKAGE_TAG,
-                                           primary.process_package_element)
+    if remote_named_tuples is None:
+        file_function = functools.partial(metadata_files.get_metadata_file_handle,
+                                          primary.METADATA_FILE_NAME)
+        remote_named_tuples = get_remote_units(file_function, primary.PACKAGE_TAG,
+                                               primary.process_package_element)
     remove_missing_units(conduit, models.RPM, remote_named_tuples)
 
 
-def remove_missing_drpms(metadata_files, conduit):
+def remove_missing_drpms(metadata_files, conduit, remote_named_tuples=None):
     """
     Remove DRPMs from the local repository which do not exist in the remote
     repository.
@@ -102,15 +112,20 @@ def remove_missing_drpms(metadata_files, conduit):
     :param conduit:         a conduit from the platform containing the get_units
                             and remove_unit methods.
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param remote_named_tuples: set of named tuples representing units in the
+                                remote repository. If None, they are read from
+                                the metadata.
+    :type  remote_named_tuples: set
     """
-    file_function = functools.partial(metadata_files.get_metadata_file_handle,
-                                      presto.METADATA_FILE_NAME)
-    remote_named_tuples = get_remote_units(file_function, presto.PACKAGE_TAG,
-                                           presto.process_package_element)
+    if remote_named_tuples is None:
+        file_function = functools.partial(metadata_files.get_metadata_file_handle,
+                                          presto.METADATA_FILE_NAME)
+        remote_named_tuples = get_remote_units(file_function, presto.PACKAGE_TAG,
+                                               presto.process_package_element)
     remove_missing_units(conduit, models.DRPM, remote_named_tuples)
 
 
-def remove_missing_errata(metadata_files, conduit):
+def remove_missing_errata(metadata_files, conduit, remote_named_tuples=None):
     """
     Remove Errata from the local repository which do not exist in the remote
     repository.
@@ -120,15 +135,20 @@ def remove_missing_errata(metadata_files, conduit):
     :param conduit:         a conduit from the platform containing the get_units
                             and remove_unit methods.
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param remote_named_tuples: set of named tuples representing units in the
+                                remote repository. If None, they are read from
+                                the metadata.
+    :type  remote_named_tuples: set
     """
-    file_function = functools.partial(metadata_files.get_metadata_file_handle,
-                                      updateinfo.METADATA_FILE_NAME)
-    remote_named_tuples = get_remote_units(file_function, updateinfo.PACKAGE_TAG,
-                                           updateinfo.process_package_element)
+    if remote_named_tuples is None:
+        file_function = functools.partial(metadata_files.get_metadata_file_handle,
+                                          updateinfo.METADATA_FILE_NAME)
+        remote_named_tuples = get_remote_units(file_function, updateinfo.PACKAGE_TAG,
+                                               updateinfo.process_package_element)
     remove_missing_units(conduit, models.Errata, remote_named_tuples)
 
 
-def remove_missing_groups(metadata_files, conduit):
+def remove_missing_groups(metadata_files, conduit, remote_named_tuples=None):
     """
     Remove Groups from the local repository which do not exist in the remote
     repository.
@@ -138,14 +158,19 @@ def remove_missing_groups(metadata_files, conduit):
     :param conduit:         a conduit from the platform containing the get_units
                             and remove_unit methods.
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param remote_named_tuples: set of named tuples representing units in the
+                                remote repository. If None, they are read from
+                                the metadata.
+    :type  remote_named_tuples: set
     """
-    file_function = metadata_files.get_group_file_handle
-    process_func = functools.partial(group.process_group_element, conduit.repo_id)
-    remote_named_tuples = get_remote_units(file_function, group.GROUP_TAG, process_func)
+    if remote_named_tuples is None:
+        file_function = metadata_files.get_group_file_handle
+        process_func = functools.partial(group.process_group_element, conduit.repo_id)
+        remote_named_tuples = get_remote_units(file_function, group.GROUP_TAG, process_func)
     remove_missing_units(conduit, models.PackageGroup, remote_named_tuples)
 
 
-def remove_missing_categories(metadata_files, conduit):
+def remove_missing_categories(metadata_files, conduit, remote_named_tuples=None):
     """
     Remove Categories from the local repository which do not exist in the remote
     repository.
@@ -155,14 +180,19 @@ def remove_missing_categories(metadata_files, conduit):
     :param conduit:         a conduit from the platform containing the get_units
                             and remove_unit methods.
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param remote_named_tuples: set of named tuples representing units in the
+                                remote repository. If None, they are read from
+                                the metadata.
+    :type  remote_named_tuples: set
     """
-    file_function = metadata_files.get_group_file_handle
-    process_func = functools.partial(group.process_category_element, conduit.repo_id)
-    remote_named_tuples = get_remote_units(file_function, group.CATEGORY_TAG, process_func)
+    if remote_named_tuples is None:
+        file_function = metadata_files.get_group_file_handle
+        process_func = functools.partial(group.process_category_element, conduit.repo_id)
+        remote_named_tuples = get_remote_units(file_function, group.CATEGORY_TAG, process_func)
     remove_missing_units(conduit, models.PackageCategory, remote_named_tuples)
 
 
-def remove_missing_environments(metadata_files, conduit):
+def remove_missing_environments(metadata_files, conduit, remote_named_tuples=None):
     """
     Remove Categories from the local repository which do not exist in the remote
     repository.
@@ -172,10 +202,15 @@ def remove_missing_environments(metadata_files, conduit):
     :param conduit:         a conduit from the platform containing the get_units
                             and remove_unit methods.
     :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param remote_named_tuples: set of named tuples representing units in the
+                                remote repository. If None, they are read from
+                                the metadata.
+    :type  remote_named_tuples: set
     """
-    file_function = metadata_files.get_group_file_handle
-    process_func = functools.partial(group.process_environment_element, conduit.repo_id)
-    remote_named_tuples = get_remote_units(file_function, group.ENVIRONMENT_TAG, process_func)
+    if remote_named_tuples is None:
+        file_function = metadata_files.get_group_file_handle
+        process_func = functools.partial(group.process_environment_element, conduit.repo_id)
+        remote_named_tuples = get_remote_units(file_function, group.ENVIRONMENT_TAG, process_func)
     remove_missing_units(conduit, models.PackageEnvironment, remote_named_tuples)
 
 
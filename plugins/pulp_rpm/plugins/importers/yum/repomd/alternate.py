@@ -35,9 +35,11 @@ class Packages(object):
     :type container: ContentContainer
     :ivar canceled: An event that signals the running download has been canceled.
     :type canceled: threading.Event
+    :ivar digests: Digests of the downloaded files, or None.
+    :type digests: pulp_rpm.plugins.importers.download.DownloadDigests
     """
 
-    def __init__(self, base_url, nectar_conf, units, dst_dir, listener):
+    def __init__(self, base_url, nectar_conf, units, dst_dir, listener, digests=None):
         """
         :param base_url: The repository base url.
         :type base_url: str
@@ -47,12 +49,18 @@ class Packages(object):
         :type dst_dir: str
         :param listener: A nectar listener.
         :type listener: nectar.listener.DownloadListener
+        :param digests: If given, the files downloaded from the primary source are
+                        digested with the checksum types of their units.
+        :type digests: pulp_rpm.plugins.importers.download.DownloadDigests
         """
         self.base_url = base_url
         self.units = units
         self.dst_dir = dst_dir
         self.listener = ContainerListener(listener)
         self.primary = create_downloader(base_url, nectar_conf)
+        self.digests = digests
+        if digests is not None:
+            digests.wrap_downloader(self.primary)
         self.container = ContentContainer()
         self.canceled = Event()
 
@@ -77,6 +85,8 @@ class Packages(object):
                 url = urljoin(self.base_url, unit.download_path)
             file_name = os.path.basename(unit.relative_path)
             destination = os.path.join(self.dst_dir, file_name)
+            if self.digests is not None:
+                self.digests.expect(destination, unit.unit_key.get('checksumtype'))
             request = Request(
                 type_id=unit.TYPE,
                 unit_key=unit.unit_key,
@@ -7,10 +7,12 @@ import gzip
 import hashlib
 import logging
 import lzma
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import os
+import threading
 from urlparse import urljoin
-from xml.etree import ElementTree
-from xml.etree.cElementTree import iterparse
+from xml.etree.cElementTree import fromstring, iterparse
 
 from nectar.listener import AggregatingEventListener
 from nectar.request import DownloadRequest
@@ -52,6 +54,13 @@ FILE_INFO_SKEL = {'name': None,
                   'open_checksum': {'algorithm': None, 'hex_digest': None},
                   'open_size': None}
 
+# metadata files whose contents get indexed into a database by generate_dbs, along with the
+# tag of each package element and the function that finds each package's unit key
+DB_METADATA_FILES = (
+    (filelists.METADATA_FILE_NAME, filelists.PACKAGE_TAG, filelists.process_package_element),
+    (other.METADATA_FILE_NAME, other.PACKAGE_TAG, other.process_package_element),
+)
+
 # metadata files downloader, parser, and validator -----------------------------
 
 
@@ -90,6 +99,8 @@ class MetadataFiles(object):
     :ivar downloader: nectar.downloaders.base.DownloaderBackend instance
     :ivar revision: revision number of the metadata, set during the `parse_repomd` call
     :ivar metadata: dictionary of the main metadata type keys to the corresponding file paths
+    :ivar dbs: dictionary of metadata type keys to the paths of the databases built by
+               `generate_dbs`
     """
 
     # These are metadata file types listed in "repomd" that we do not want to store as units.
@@ -123,6 +134,16 @@ class MetadataFiles(object):
         self.revision = None
         self.metadata = {}
         self.dbs = {}
+        # read-only handles to the databases in self.dbs, kept open until close_dbs
+        self._db_handles = {}
+        self._db_handles_lock = threading.Lock()
+        # raw XML snippets read ahead of time by prefetch_repodata, keyed by
+        # (metadata file name, db key)
+        self._prefetched = {}
+        # worker pool and pending results of a generate_dbs call that has not
+        # been waited on yet
+        self._db_pool = None
+        self._db_results = {}
 
     def download_repomd(self):
         """
@@ -243,15 +264,7 @@ class MetadataFiles(object):
         except KeyError:
             return
 
-        if file_path.endswith('.gz'):
-            file_handle = gzip.open(file_path, 'r')
-        elif file_path.endswith('.xz'):
-            file_handle = lzma.LZMAFile(file_path, 'r')
-        elif file_path.endswith('.bz2'):
-            file_handle = bz2.BZ2File(file_path, 'r')
-        else:
-            file_handle = open(file_path, 'r')
-        return file_handle
+        return open_metadata_file(file_path)
 
     def get_group_file_handle(self):
         """
@@ -265,36 +278,53 @@ class MetadataFiles(object):
             group_file_handle = self.get_metadata_file_handle('group')
         return group_file_handle
 
-    def generate_dbs(self):
+    def generate_dbs(self, wait=True):
         """
         For repo data files that contain data we need to access later for each
         unit in the repo, generate a local db file that gives us quick read
         access to each unit's data.
+
+        The files are independent of each other, so each one is indexed in its
+        own worker process. If processes cannot be started, for example
+        because this is already a daemonic process, threads are used instead.
+
+        :param wait:    iff True, block until every db has been generated. Otherwise
+                        return immediately, and let the caller do other work before
+                        calling `wait_for_dbs`.
+        :type  wait:    bool
         """
-        for filename, tag, process_func in (
-                (filelists.METADATA_FILE_NAME, filelists.PACKAGE_TAG,
-                 filelists.process_package_element),
-                (other.METADATA_FILE_NAME, other.PACKAGE_TAG, other.process_package_element),
-        ):
-            xml_file_handle = self.get_metadata_file_handle(filename)
-            try:
-                generator = package_list_generator(xml_file_handle, tag)
-                db_filename = os.path.join(self.dst_dir, '%s.db' % filename)
-                # always a New file, and open with Fast writing mode.
-                db_file_handle = gdbm.open(db_filename, 'nf')
-                try:
-                    for element in generator:
-                        utils.strip_ns(element)
-                        raw_xml = utils.element_to_raw_xml(element)
-                        unit_key, _ = process_func(element)
-                        db_key = self.generate_db_key(unit_key)
-                        db_file_handle[db_key] = raw_xml
-                    db_file_handle.sync()
-                finally:
-                    db_file_handle.close()
-            finally:
-                xml_file_handle.close()
-            self.dbs[filename] = db_filename
+        # handles to previously generated databases would be stale
+        self.close_dbs()
+        try:
+            self._db_pool = multiprocessing.Pool(processes=len(DB_METADATA_FILES))
+        except (AssertionError, OSError):
+            _LOGGER.debug('could not start worker processes, generating dbs in threads')
+            self._db_pool = ThreadPool(processes=len(DB_METADATA_FILES))
+
+        for filename, tag, process_func in DB_METADATA_FILES:
+            file_path = self.metadata[filename]['local_path']
+            db_filename = os.path.join(self.dst_dir, '%s.db' % filename)
+            self._db_results[filename] = self._db_pool.apply_async(
+                generate_db, (file_path, db_filename, tag, process_func))
+        self._db_pool.close()
+
+        if wait:
+            self.wait_for_dbs()
+
+    def wait_for_dbs(self):
+        """
+        Block until every db started by `generate_dbs` has been generated. This
+        is a no-op if there are none pending.
+
+        :raises Exception: whatever exception was raised while generating a db
+        """
+        try:
+            for filename in self._db_results.keys():
+                self.dbs[filename] = self._db_results.pop(filename).get()
+        finally:
+            if not self._db_results and self._db_pool is not None:
+                self._db_pool.join()
+                self._db_pool = None
 
     @staticmethod
     def generate_db_key(unit_key):
@@ -314,6 +344,65 @@ class MetadataFiles(object):
         sorted_key_names = sorted(unit_key.keys())
         return '::'.join('%s:%s' % (name, unit_key[name]) for name in sorted_key_names)
 
+    def _get_db_handle(self, filename):
+        """
+        Return a read-only handle to the database generated for the given
+        metadata file, opening it the first time it is needed. The handle stays
+        open until `close_dbs` is called.
+
+        :param filename:    name of a metadata file, as used as a key in self.dbs
+        :type  filename:    basestring
+
+        :return:    open database handle
+        :rtype:     gdbm.gdbm
+        """
+        with self._db_handles_lock:
+            db_file = self._db_handles.get(filename)
+            if db_file is None:
+                self.wait_for_dbs()
+                db_file = gdbm.open(self.dbs[filename], 'r')
+                self._db_handles[filename] = db_file
+            return db_file
+
+    def close_dbs(self):
+        """
+        Close any database handles opened by `add_repodata` or
+        `prefetch_repodata`, and drop any prefetched snippets that were not used.
+        Databases are re-opened on demand if they are needed again. Any db
+        generation that has not been waited on is abandoned.
+        """
+        if self._db_pool is not None:
+            self._db_pool.terminate()
+            self._db_pool.join()
+            self._db_pool = None
+            self._db_results.clear()
+        with self._db_handles_lock:
+            for db_file in self._db_handles.itervalues():
+                db_file.close()
+            self._db_handles.clear()
+        self._prefetched.clear()
+
+    def prefetch_repodata(self, models):
+        """
+        Read the raw filelists and other XML snippets for a batch of models
+        ahead of time, so that a later call to `add_repodata` for each of them
+        does not need to touch the databases. Each prefetched snippet is
+        discarded once `add_repodata` has used it. Snippets that are missing
+        are skipped, so that `add_repodata` fails for only the model they
+        belong to.
+
+        :param models:  iterable of model instances whose repodata will be added
+        :type  models:  iterable of pulp_rpm.plugins.db.models.RPM
+        """
+        db_keys = [self.generate_db_key(model.unit_key) for model in models]
+        for filename in (filelists.METADATA_FILE_NAME, other.METADATA_FILE_NAME):
+            db_file = self._get_db_handle(filename)
+            for db_key in db_keys:
+                try:
+                    self._prefetched[(filename, db_key)] = db_file[db_key]
+                except KeyError:
+                    continue
+
     def add_repodata(self, model):
         """
         Given a model, add the "repodata" attribute to it (which includes raw
@@ -329,13 +418,11 @@ class MetadataFiles(object):
                 (filelists.METADATA_FILE_NAME, 'files', filelists.process_package_element),
                 (other.METADATA_FILE_NAME, 'changelog', other.process_package_element)
         ):
-            try:
-                db_file = gdbm.open(self.dbs[filename], 'r')
-                raw_xml = db_file[db_key]
-            finally:
-                db_file.close()
+            raw_xml = self._prefetched.pop((filename, db_key), None)
+            if raw_xml is None:
+                raw_xml = self._get_db_handle(filename)[db_key]
             repodata[filename] = raw_xml
-            element = ElementTree.fromstring(raw_xml)
+            element = fromstring(raw_xml)
             unit_key, items = process_func(element)
             model.metadata[metadata_key] = items
 
@@ -345,6 +432,72 @@ class MetadataFiles(object):
 
 # utilities --------------------------------------------------------------------
 
+def open_metadata_file(file_path):
+    """
+    Open a metadata file for reading, decompressing it based on its extension.
+
+    :param file_path:   full path to a metadata file
+    :type  file_path:   basestring
+
+    :return: open file handle to a file containing XML
+    :rtype:  file
+    """
+    if file_path.endswith('.gz'):
+        file_handle = gzip.open(file_path, 'r')
+    elif file_path.endswith('.xz'):
+        file_handle = lzma.LZMAFile(file_path, 'r')
+    elif file_path.endswith('.bz2'):
+        file_handle = bz2.BZ2File(file_path, 'r')
+    else:
+        file_handle = open(file_path, 'r')
+    return file_handle
+
+
+def generate_db(file_path, db_filename, tag, process_func):
+    """
+    Index each package element of a metadata file into a new gdbm database,
+    keyed by the package's unit key as returned by MetadataFiles.generate_db_key.
+
+    This is a module-level function so that it can be run in a worker process.
+
+    :param file_path:       full path to the metadata file to index
+    :type  file_path:       basestring
+    :param db_filename:     full path to the database file to create
+    :type  db_filename:     basestring
+    :param tag:             XML tag that identifies each package element
+    :type  tag:             basestring
+    :param process_func:    function that takes a package element and returns
+                            a tuple of (unit key, parsed data)
+    :type  process_func:    function
+
+    :return:    db_filename
+    :rtype:     basestring
+
+    :raises ValueError: if the metadata file cannot be parsed
+    """
+    xml_file_handle = open_metadata_file(file_path)
+    try:
+        generator = package_list_generator(xml_file_handle, tag)
+        # always a New file, and open with Fast writing mode.
+        db_file_handle = gdbm.open(db_filename, 'nf')
+        try:
+            for element in generator:
+                utils.strip_ns(element)
+                raw_xml = utils.element_to_raw_xml(element)
+                unit_key, _ = process_func(element)
+                db_key = MetadataFiles.generate_db_key(unit_key)
+                db_file_handle[db_key] = raw_xml
+            db_file_handle.sync()
+        finally:
+            db_file_handle.close()
+    except SyntaxError, e:
+        # cElementTree's ParseError cannot be pickled back to the parent process
+        raise ValueError('could not parse %s: %s' % (file_path, e))
+    finally:
+        xml_file_handle.close()
+    return db_filename
+
+
 def process_repomd_data_element(data_element):
     """
     Process the data elements of the repomd.xml file.
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import gdbm
 import logging
 import os
 import re
 from urlparse import urljoin
-from xml.etree.cElementTree import iterparse
+from xml.etree.cElementTree import fromstring, iterparse, tostring
 
 from nectar.request import DownloadRequest
 
@@ -64,6 +65,113 @@ def package_list_generator(xml_handle, package_tag, process_func=None):
         yield package_info
 
 
+class PackageModelIndex(object):
+    """
+    On-disk index of parsed package elements, keyed by each package's unit key.
+    This lets a sync parse a metadata file once, cheaply extracting only the
+    unit keys it needs to decide what to download, while spilling each raw
+    element to disk. Full models are then built only for the packages that are
+    read back.
+
+    The index is backed by a gdbm database in the sync's working directory, so
+    memory use does not grow with the size of the repository.
+
+    :ivar path:         full path to the database file
+    :ivar process_func: function that builds a full model from an element
+    """
+
+    def __init__(self, path, process_func):
+        """
+        :param path:            full path to a database file, which will be
+                                created, or truncated if it already exists
+        :type  path:            basestring
+        :param process_func:    function that takes one argument, of type
+                                xml.etree.ElementTree.Element, and returns a
+                                full model of the package it describes
+        :type  process_func:    function
+        """
+        self.path = path
+        self.process_func = process_func
+        # always a New file, and open with Fast writing mode.
+        self._db = gdbm.open(path, 'nf')
+
+    @staticmethod
+    def _db_key(named_tuple):
+        """
+        :param named_tuple: a model's unit key as a named tuple
+        :type  named_tuple: collections.namedtuple
+
+        :return:    a string that is a suitable key for the database
+        :rtype:     str
+        """
+        return u'\x00'.join(unicode(value) for value in named_tuple).encode('utf-8')
+
+    def add(self, named_tuple, element):
+        """
+        Store a package element in the index, replacing any element stored
+        under the same unit key.
+
+        :param named_tuple: the package's unit key as a named tuple
+        :type  named_tuple: collections.namedtuple
+        :param element:     parsed package element
+        :type  element:     xml.etree.ElementTree.Element
+        """
+        self._db[self._db_key(named_tuple)] = tostring(element)
+
+    def tee(self, element_iterator, key_func):
+        """
+        Store each element from the given iterator in the index, yielding the
+        model that key_func builds from it.
+
+        :param element_iterator:    iterator of parsed package elements
+        :type  element_iterator:    iterator
+        :param key_func:            function that takes one argument, of type
+                                    xml.etree.ElementTree.Element, and returns a
+                                    model that at least carries the unit key
+        :type  key_func:            function
+
+        :return:    generator of the models built by key_func
+        :rtype:     generator
+        """
+        for element in element_iterator:
+            model = key_func(element)
+            self.add(model.as_named_tuple, element)
+            yield model
+
+    def get(self, named_tuple):
+        """
+        :param named_tuple: a model's unit key as a named tuple
+        :type  named_tuple: collections.namedtuple
+
+        :return:    full model built by process_func from the stored element
+        :rtype:     pulp_rpm.plugins.db.models.Package
+
+        :raises KeyError: if no element with that unit key has been stored
+        """
+        return self.process_func(fromstring(self._db[self._db_key(named_tuple)]))
+
+    def models(self, named_tuples):
+        """
+        Build full models for a collection of unit keys.
+
+        :param named_tuples:    iterable of unit keys as named tuples
+        :type  named_tuples:    iterable
+
+        :return:    generator of pulp_rpm.plugins.db.models.Package instances
+        :rtype:     generator
+        """
+        for named_tuple in named_tuples:
+            yield self.get(named_tuple)
+
+    def close(self):
+        """
+        Close the underlying database. Closing more than once is harmless.
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
 # TODO: maybe this class shouldn't be a class
 class Packages(object):
     """
@@ -77,13 +185,16 @@ class Packages(object):
     :ivar dst_dir: Directory to store downloaded packages in
     :ivar event_listener: nectar.listener.DownloadEventListener instance
     :ivar downloader: nectar.downloaders.base.Downloader instance
+    :ivar digests: pulp_rpm.plugins.importers.download.DownloadDigests instance
+                   that digests the downloaded files, or None
     """
 
     def __init__(self, repo_url, nectar_config, package_model_iterator, dst_dir,
-                 event_listener=None):
+                 event_listener=None, digests=None):
         self.repo_url = repo_url
         self.package_model_iterator = package_model_iterator
         self.dst_dir = dst_dir
+        self.digests = digests
 
         self.downloader = nectar_factory.create_downloader(repo_url, nectar_config,
                                                            event_listener)
@@ -109,4 +220,7 @@ class Packages(object):
             destination = os.path.join(self.dst_dir, file_name)
 
             request = DownloadRequest(url, destination, model)
+            if self.digests is not None:
+                self.digests.expect(destination, model.unit_key.get('checksumtype'))
+                request = self.digests.wrap(request)
             yield request
@@ -182,6 +182,48 @@ def process_package_element(package_element):
     return model
 
 
+def process_package_element_keys(package_element):
+    """
+    Process a parsed primary.xml package element into a model that carries
+    only the unit key and the package size. This is much cheaper than
+    process_package_element, and is enough to decide which packages need to
+    be downloaded. The element is not modified.
+
+    :param package_element: parsed primary.xml package element
+    :return: model with only the unit key and "size" metadata populated
+    :rtype: pulp_rpm.plugins.db.models.RPM
+    """
+    unit_key = dict.fromkeys(models.RPM.UNIT_KEY_NAMES)
+
+    name_element = package_element.find(NAME_TAG)
+    if name_element is not None:
+        unit_key['name'] = name_element.text
+
+    arch_element = package_element.find(ARCH_TAG)
+    if arch_element is not None:
+        unit_key['arch'] = arch_element.text
+
+    version_element = package_element.find(VERSION_TAG)
+    if version_element is not None:
+        unit_key['version'] = version_element.attrib['ver']
+        unit_key['release'] = version_element.attrib.get('rel', None)
+        unit_key['epoch'] = version_element.attrib.get('epoch', None)
+
+    checksum_element = package_element.find(CHECKSUM_TAG)
+    if checksum_element is not None:
+        unit_key['checksumtype'] = checksum_element.attrib['type']
+        unit_key['checksum'] = checksum_element.text
+
+    metadata = {'size': None}
+    size_element = package_element.find(SIZE_TAG)
+    if size_element is not None:
+        metadata['size'] = int(size_element.attrib['package'])
+
+    if unit_key['arch'].lower() == 'src':
+        return models.SRPM(metadata=metadata, **unit_key)
+    return models.RPM(metadata=metadata, **unit_key)
+
+
 def _process_format_element(format_element):
     """
     Process a parsed primary.xml package format element (child element of
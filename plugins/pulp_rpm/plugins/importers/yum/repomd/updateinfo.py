@@ -4,6 +4,7 @@
 import logging
 
 from pulp_rpm.plugins.db import models
+from pulp_rpm.yum_plugin import updateinfo_xml
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -65,6 +66,28 @@ def process_package_element(element):
     return models.Errata.from_package_info(package_info)
 
 
+def add_repodata(unit):
+    """
+    Render the updateinfo.xml snippet for an erratum and store it on the unit
+    under "repodata", as is done for packages' primary.xml snippets, so that it
+    does not have to be rendered again each time the erratum is published. Any
+    snippet stored earlier is replaced, since the erratum may have changed.
+
+    :param unit:    erratum unit that is about to be saved
+    :type  unit:    pulp.plugins.model.Unit
+    """
+    repodata = unit.metadata.get('repodata') or {}
+    unit.metadata['repodata'] = repodata
+    try:
+        snippet = updateinfo_xml.render_erratum(unit.unit_key['id'], unit.metadata)
+    except (KeyError, TypeError), e:
+        # the same error will be reported if the erratum is ever published
+        _LOGGER.debug('could not render erratum %s: %s' % (unit.unit_key['id'], e))
+        repodata.pop('updateinfo', None)
+    else:
+        repodata['updateinfo'] = snippet.decode('utf-8')
+
+
 def _parse_reference(element):
     return {
         # evidence shows that the "id" attribute is sometimes missing, such as
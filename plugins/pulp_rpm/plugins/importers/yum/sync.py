@@ -7,11 +7,13 @@ from gettext import gettext as _
 
 from pulp.common.plugins import importer_constants
 from pulp.plugins.util import nectar_config as nectar_utils, verification
+from pulp.plugins.util.misc import paginate
+from pulp.server.db.model.criteria import Criteria
 from pulp.server.exceptions import PulpCodedException
 
 from pulp_rpm.common import constants, ids
 from pulp_rpm.plugins.db import models
-from pulp_rpm.plugins.importers.yum import existing, purge
+from pulp_rpm.plugins.importers.yum import batch, existing, purge, versions
 from pulp_rpm.plugins.importers.yum.repomd import (
     metadata, primary, packages, updateinfo, presto, group, alternate)
 from pulp_rpm.plugins.importers.yum.listener import ContentListener
@@ -21,6 +23,11 @@ from pulp_rpm.plugins.importers.yum.report import ContentReport, DistributionRep
 
 _logger = logging.getLogger(__name__)
 
+# name of the file in the sync's working directory that holds the parsed primary.xml models
+PRIMARY_INDEX_FILE_NAME = 'primary_models.db'
+# number of RPMs whose filelists and other snippets are read ahead of their download
+REPODATA_PREFETCH_BATCH_SIZE = 100
+
 
 class CancelException(Exception):
     pass
@@ -58,6 +65,17 @@ class RepoSync(object):
         self.repo = repo
 
         self.call_config = call_config
+        # populated while deciding which RPMs to download, so that primary.xml
+        # does not need to be parsed again to build the download requests
+        self.rpm_index = None
+        # dict where keys are type IDs, and values are sets of named tuples of
+        # every unit of that type seen in the remote metadata. They are only
+        # collected when missing units will be removed, so that purging does
+        # not need to parse the metadata again.
+        if call_config.get_boolean(importer_constants.KEY_UNITS_REMOVE_MISSING) is True:
+            self.remote_unit_keys = {}
+        else:
+            self.remote_unit_keys = None
 
         flat_call_config = call_config.flatten()
         self.nectar_config = nectar_utils.importer_config_to_nectar_config(flat_call_config)
@@ -145,6 +163,10 @@ class RepoSync(object):
             self.progress_status['comps']['state'] = constants.STATE_COMPLETE
             self.set_progress()
 
+            # removes unwanted units according to the config settings
+            purge.purge_unwanted_units(metadata_files, self.sync_conduit, self.call_config,
+                                       self.remote_unit_keys)
+
         except CancelException:
             report = self.sync_conduit.build_cancel_report(self._progress_summary,
                                                            self.progress_status)
@@ -164,6 +186,9 @@ class RepoSync(object):
 
         finally:
             # clean up whatever we may have left behind
+            if self.rpm_index is not None:
+                self.rpm_index.close()
+                self.rpm_index = None
             shutil.rmtree(self.tmp_dir, ignore_errors=True)
 
         _logger.info(_('Sync complete.'))
@@ -210,7 +235,9 @@ class RepoSync(object):
         metadata_files.download_metadata_files()
         self.downloader = None
         _logger.info(_('Generating metadata databases.'))
-        metadata_files.generate_dbs()
+        # the databases are only needed once packages are downloaded, so let them
+        # be generated in the background while deciding what to download
+        metadata_files.generate_dbs(wait=False)
         self.import_unknown_metadata_files(metadata_files)
         # TODO: verify metadata
         # metadata_files.verify_metadata_files()
@@ -272,10 +299,13 @@ class RepoSync(object):
         :param metadata_files:  instance of MetadataFiles
         :type  metadata_files:  pulp_rpm.plugins.importers.yum.repomd.metadata.MetadataFiles
         """
-        rpms_to_download, drpms_to_download = self._decide_what_to_download(metadata_files)
-        self.download(metadata_files, rpms_to_download, drpms_to_download)
-        # removes unwanted units according to the config settings
-        purge.purge_unwanted_units(metadata_files, self.sync_conduit, self.call_config)
+        try:
+            rpms_to_download, drpms_to_download = self._decide_what_to_download(metadata_files)
+            metadata_files.wait_for_dbs()
+            self.download(metadata_files, rpms_to_download, drpms_to_download)
+        finally:
+            # the filelists and other databases are only needed while downloading
+            metadata_files.close_dbs()
 
     def _decide_what_to_download(self, metadata_files):
         """
@@ -320,9 +350,15 @@ class RepoSync(object):
             return set(), 0, 0
         primary_file_handle = metadata_files.get_metadata_file_handle(primary.METADATA_FILE_NAME)
         try:
-            # scan through all the metadata to decide which packages to download
-            package_info_generator = packages.package_list_generator(
-                primary_file_handle, primary.PACKAGE_TAG, primary.process_package_element)
+            # scan through all the metadata to decide which packages to download.
+            # only the unit keys are extracted here; each package element is kept
+            # in an index so the download step can build full models from it.
+            self.rpm_index = packages.PackageModelIndex(
+                os.path.join(self.tmp_dir, PRIMARY_INDEX_FILE_NAME),
+                primary.process_package_element)
+            package_info_generator = self._record_remote_keys(self.rpm_index.tee(
+                packages.package_list_generator(primary_file_handle, primary.PACKAGE_TAG),
+                primary.process_package_element_keys))
             wanted = self._identify_wanted_versions(package_info_generator)
             # check for the units that are already in the repo
             not_found_in_the_repo = existing.check_repo(wanted.iterkeys(),
@@ -356,8 +392,8 @@ class RepoSync(object):
         presto_file_handle = metadata_files.get_metadata_file_handle(presto.METADATA_FILE_NAME)
         if presto_file_handle:
             try:
-                package_info_generator = packages.package_list_generator(
-                    presto_file_handle, presto.PACKAGE_TAG, presto.process_package_element)
+                package_info_generator = self._record_remote_keys(packages.package_list_generator(
+                    presto_file_handle, presto.PACKAGE_TAG, presto.process_package_element))
                 wanted = self._identify_wanted_versions(package_info_generator)
                 # check for the units that are already in the repo
                 not_found_in_the_repo = existing.check_repo(wanted.iterkeys(),
@@ -382,9 +418,11 @@ class RepoSync(object):
         """
         Actually download the requested RPMs and DRPMs. This method iterates over
         the appropriate metadata file and downloads those items which are present
-        in the corresponding set. It also checks for the RPMs and DRPMs which exist
-        in other repositories before downloading them. If they are already downloaded,
-        we skip the download and just associate them to the given repository.
+        in the corresponding set. RPMs are read back from the index that was built
+        while deciding what to download, if there is one. It also checks for the
+        RPMs and DRPMs which exist in other repositories before downloading them.
+        If they are already downloaded, we skip the download and just associate
+        them to the given repository.
 
         :param metadata_files:      populated instance of MetadataFiles
         :type  metadata_files:      pulp_rpm.plugins.importers.yum.repomd.metadata.MetadataFiles
@@ -398,22 +436,57 @@ class RepoSync(object):
         # TODO: probably should make this more generic
         event_listener = ContentListener(self.sync_conduit, self.progress_status, self.call_config,
                                          metadata_files)
-        primary_file_handle = metadata_files.get_metadata_file_handle(primary.METADATA_FILE_NAME)
         try:
-            package_model_generator = packages.package_list_generator(
-                primary_file_handle, primary.PACKAGE_TAG, primary.process_package_element)
-            units_to_download = self._filtered_unit_generator(package_model_generator,
-                                                              rpms_to_download)
+            self._download_with_listener(metadata_files, rpms_to_download, drpms_to_download,
+                                         event_listener)
+        finally:
+            # the last progress report may have been held back
+            event_listener.flush()
+
+        report = self.sync_conduit.build_success_report({}, {})
+        return report
+
+    def _download_with_listener(self, metadata_files, rpms_to_download, drpms_to_download,
+                                event_listener):
+        """
+        Download the requested RPMs and DRPMs, reporting each download to the
+        given listener. This is the body of `download`.
+
+        :param metadata_files:      populated instance of MetadataFiles
+        :type  metadata_files:      pulp_rpm.plugins.importers.yum.repomd.metadata.MetadataFiles
+        :param rpms_to_download:    set of RPM.NAMEDTUPLEs
+        :type  rpms_to_download:    set
+        :param drpms_to_download:   set of DRPM.NAMEDTUPLEs
+        :type  drpms_to_download:   set
+        :param event_listener:      listener that saves each downloaded unit
+        :type  event_listener:      pulp_rpm.plugins.importers.yum.listener.ContentListener
+        """
+        primary_file_handle = None
+        try:
+            if self.rpm_index is not None:
+                # primary.xml was already parsed while deciding what to download
+                units_to_download = self.rpm_index.models(rpms_to_download)
+            else:
+                primary_file_handle = metadata_files.get_metadata_file_handle(
+                    primary.METADATA_FILE_NAME)
+                package_model_generator = packages.package_list_generator(
+                    primary_file_handle, primary.PACKAGE_TAG, primary.process_package_element)
+                units_to_download = self._filtered_unit_generator(package_model_generator,
+                                                                  rpms_to_download)
+            units_to_download = self._repodata_prefetch_generator(metadata_files,
+                                                                  units_to_download)
 
             download_wrapper = alternate.Packages(self.sync_feed, self.nectar_config,
-                                                  units_to_download, self.tmp_dir, event_listener)
+                                                  units_to_download, self.tmp_dir, event_listener,
+                                                  event_listener.digests)
             # allow the downloader to be accessed by the cancel method if necessary
             self.downloader = download_wrapper.downloader
             _logger.info(_('Downloading %(num)s RPMs.') % {'num': len(rpms_to_download)})
             download_wrapper.download_packages()
             self.downloader = None
         finally:
-            primary_file_handle.close()
+            if primary_file_handle is not None:
+                primary_file_handle.close()
 
         # download DRPMs
         presto_file_handle = metadata_files.get_metadata_file_handle(presto.METADATA_FILE_NAME)
@@ -426,7 +499,7 @@ class RepoSync(object):
 
                 download_wrapper = packages.Packages(self.sync_feed, self.nectar_config,
                                                      units_to_download, self.tmp_dir,
-                                                     event_listener)
+                                                     event_listener, event_listener.digests)
                 # allow the downloader to be accessed by the cancel method if necessary
                 self.downloader = download_wrapper.downloader
                 _logger.info(_('Downloading %(num)s DRPMs.') % {'num': len(drpms_to_download)})
@@ -435,9 +508,6 @@ class RepoSync(object):
             finally:
                 presto_file_handle.close()
 
-        report = self.sync_conduit.build_success_report({}, {})
-        return report
-
     def cancel(self):
         """
         Cancels the current sync. Looks for a "downloader" object and calls its
@@ -536,9 +606,8 @@ class RepoSync(object):
                                              "this method are mutually exclusive.")
 
         # iterate through the file and determine what we want to have
-        package_info_generator = packages.package_list_generator(file_handle,
-                                                                 tag,
-                                                                 process_func)
+        package_info_generator = self._record_remote_keys(
+            packages.package_list_generator(file_handle, tag, process_func))
         # if units aren't mutable, we don't need to attempt saving units that
         # we already have
         if not mutable_type and not additive_type:
@@ -554,14 +623,47 @@ class RepoSync(object):
             package_info_generator = (model for model in all_packages if
                                       model.as_named_tuple in to_save)
 
-        for model in package_info_generator:
-            unit = self.sync_conduit.init_unit(model.TYPE, model.unit_key, model.metadata, None)
+        for models_batch in paginate(package_info_generator, batch.DEFAULT_BATCH_SIZE):
             if additive_type:
-                existing_unit = self.sync_conduit.find_unit_by_unit_key(model.TYPE, model.unit_key)
-                if existing_unit:
-                    unit = self._concatenate_units(existing_unit, unit)
+                existing_units = self._find_units_by_unit_key(models_batch)
+            for model in models_batch:
+                unit = self.sync_conduit.init_unit(model.TYPE, model.unit_key, model.metadata,
+                                                   None)
+                if additive_type:
+                    existing_unit = existing_units.get(model.as_named_tuple)
+                    if existing_unit:
+                        unit = self._concatenate_units(existing_unit, unit)
+                    # the same unit may appear again later in this batch
+                    existing_units[model.as_named_tuple] = unit
+
+                if unit.type_id == models.Errata.TYPE:
+                    updateinfo.add_repodata(unit)
 
-            self.sync_conduit.save_unit(unit)
+                self.sync_conduit.save_unit(unit)
+
+    def _find_units_by_unit_key(self, models_batch):
+        """
+        Find the units on the server that have the same unit keys as a batch of
+        models, using one search per unit type.
+
+        :param models_batch:    models to search for
+        :type  models_batch:    iterable of pulp_rpm.plugins.db.models.Package
+
+        :return:    dict where keys are models as named tuples, and values are the
+                    corresponding units that were found
+        :rtype:     dict
+        """
+        unit_keys_by_type = {}
+        for model in models_batch:
+            unit_keys_by_type.setdefault(model.TYPE, []).append(model.unit_key)
+
+        ret = {}
+        for unit_type, unit_keys in unit_keys_by_type.iteritems():
+            named_tuple_class = models.TYPE_MAP[unit_type].NAMEDTUPLE
+            criteria = Criteria(filters={'$or': unit_keys})
+            for unit in self.sync_conduit.search_all_units(unit_type, criteria):
+                ret[named_tuple_class(**unit.unit_key)] = unit
+        return ret
 
     def _concatenate_units(self, existing_unit, new_unit):
         """
@@ -615,36 +717,58 @@ class RepoSync(object):
                     are the size of each package
         :rtype:     dict
         """
-        # keys are a model's key string minus any version info
-        # values are dicts where keys are serialized versions, and values are
-        # a tuple of (model as named tuple, size in bytes)
-        wanted = {}
-
         number_old_versions_to_keep = self.call_config.get(
             importer_constants.KEY_UNITS_RETAIN_OLD_COUNT)
+        if number_old_versions_to_keep is not None:
+            number_old_versions_to_keep += 1
+        # keeps a tuple of (model as named tuple, size in bytes) for each wanted version
+        wanted = versions.NewestVersions(number_old_versions_to_keep)
+
         for model in package_info_generator:
-            versions = wanted.setdefault(model.key_string_without_version, {})
-            serialized_version = model.complete_version_serialized
-            size = model.metadata['size']
-
-            # if we are limited on the number of old versions we can have,
-            if number_old_versions_to_keep is not None:
-                number_to_keep = number_old_versions_to_keep + 1
-                if len(versions) < number_to_keep:
-                    versions[serialized_version] = (model.as_named_tuple, size)
-                else:
-                    smallest_version = sorted(versions.keys(), reverse=True)[:number_to_keep][-1]
-                    if serialized_version > smallest_version:
-                        del versions[smallest_version]
-                        versions[serialized_version] = (model.as_named_tuple, size)
-            else:
-                versions[serialized_version] = (model.as_named_tuple, size)
-        ret = {}
-        for units in wanted.itervalues():
-            for unit, size in units.itervalues():
-                ret[unit] = size
+            wanted.add(model.key_string_without_version, versions.version_key(model.unit_key),
+                       (model.as_named_tuple, model.metadata['size']))
 
-        return ret
+        return dict(wanted.items())
+
+    def _record_remote_keys(self, models_generator):
+        """
+        Pass models through unchanged while adding each one's named tuple to
+        self.remote_unit_keys, if remote unit keys are being collected.
+
+        :param models_generator:    iterator of models parsed from the remote metadata
+        :type  models_generator:    iterator
+
+        :return:    iterator of the same models
+        :rtype:     iterator
+        """
+        if self.remote_unit_keys is None:
+            return models_generator
+        return self._record_remote_keys_generator(models_generator)
+
+    def _record_remote_keys_generator(self, models_generator):
+        for model in models_generator:
+            self.remote_unit_keys.setdefault(model.TYPE, set()).add(model.as_named_tuple)
+            yield model
+
+    def _repodata_prefetch_generator(self, metadata_files, units):
+        """
+        Pass through an iterator of RPM models, reading ahead the filelists and
+        other snippets for each batch of them. This keeps those database reads
+        out of the download listener, which otherwise does them one unit at a
+        time as each download finishes.
+
+        :param metadata_files:  populated instance of MetadataFiles
+        :type  metadata_files:  pulp_rpm.plugins.importers.yum.repomd.metadata.MetadataFiles
+        :param units:           iterator of pulp_rpm.plugins.db.models.RPM instances
+        :type  units:           iterator
+
+        :return:    generator of the same pulp_rpm.plugins.db.models.RPM instances
+        :rtype:     generator
+        """
+        for page in paginate(units, REPODATA_PREFETCH_BATCH_SIZE):
+            metadata_files.prefetch_repodata(page)
+            for unit in page:
+                yield unit
 
     def _filtered_unit_generator(self, units, to_download=None):
         """
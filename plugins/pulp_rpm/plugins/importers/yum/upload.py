@@ -2,23 +2,18 @@ import hashlib
 import logging
 import os
 import shutil
-from xml.etree import cElementTree as ET
 
 import rpm
 from pulp.plugins.util import verification
+from pulp.plugins.util.misc import paginate
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.exceptions import PulpCodedValidationException, PulpCodedException
+from pulp.server.managers import factory as manager_factory
 
 from pulp_rpm.plugins.db import models
 from pulp_rpm.plugins import error_codes
-from pulp_rpm.plugins.importers.yum import utils
 from pulp_rpm.plugins.importers.yum.parse import rpm as rpm_parse
-from pulp_rpm.plugins.importers.yum.repomd import primary
-
-# this is required because some of the pre-migration XML tags use the "rpm"
-# namespace, which causes a parse error if that namespace isn't declared.
-FAKE_XML = '<?xml version="1.0" encoding="%(encoding)s"?><faketag ' \
-           'xmlns:rpm="http://pulpproject.org">%(xml)s</faketag>'
+from pulp_rpm.plugins.importers.yum.repomd import updateinfo
 
 # Used when extracting metadata from an RPM
 RPMTAG_NOSOURCE = 1051
@@ -79,7 +74,90 @@ def upload(repo, type_id, unit_key, metadata, file_path, conduit, config):
     """
 
     # Dispatch to process the upload by type
-    handlers = {
+    handlers = _handlers()
+
+    if type_id not in handlers:
+        return _fail_report('%s is not a supported type for upload' % type_id)
+
+    try:
+        handlers[type_id](type_id, unit_key, metadata, file_path, conduit, config)
+    except Exception, e:
+        return _exception_report(e)
+
+    return _success_report()
+
+
+def upload_units(repo, uploads, conduit, config):
+    """
+    Handles many uploads at once, one after another. Every erratum is linked
+    to RPMs at the end, so that it is linked to the RPMs uploaded along with
+    it, and the RPMs of all errata are searched for together.
+
+    :param repo: metadata describing the repository
+    :type  repo: pulp.plugins.model.Repository
+
+    :param uploads: uploads to handle, each of which is a dict with the keys
+                    "type_id", "unit_key", "metadata" and "file_path", whose
+                    values are the same as the arguments of upload()
+    :type  uploads: list of dict
+
+    :param conduit: provides access to relevant Pulp functionality
+    :type  conduit: pulp.plugins.conduits.upload.UploadConduit
+
+    :param config: plugin configuration for the repository
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+
+    :return: reports of the details of each upload, in the same order as the uploads
+    :rtype:  list of dict
+    """
+    handlers = _handlers()
+    reports = []
+    # errata are linked at the end, so keys are indexes of uploads, and values
+    # are tuples of their models and saved units
+    errata = {}
+    for i, u in enumerate(uploads):
+        if u['type_id'] in (models.RPM.TYPE, models.SRPM.TYPE):
+            report, package = _extract_package_report(u['type_id'], u['unit_key'],
+                                                      u['metadata'], u['file_path'])
+            if report is None:
+                try:
+                    _store_package(package, u['file_path'], conduit)
+                except Exception, e:
+                    report = _exception_report(e)
+                else:
+                    report = _success_report()
+            reports.append(report)
+            continue
+        try:
+            if u['type_id'] not in handlers:
+                reports.append(_fail_report('%s is not a supported type for upload' %
+                                            u['type_id']))
+                continue
+            elif u['type_id'] == models.Errata.TYPE:
+                errata[i] = _save_erratum(u['type_id'], u['unit_key'], u['metadata'], conduit)
+            else:
+                handlers[u['type_id']](u['type_id'], u['unit_key'], u['metadata'],
+                                       u['file_path'], conduit, config)
+        except Exception, e:
+            reports.append(_exception_report(e))
+        else:
+            reports.append(_success_report())
+
+    if errata and not config.get_boolean(CONFIG_SKIP_ERRATUM_LINK):
+        failures = _link_all_errata_to_rpms(conduit, errata)
+        for i, report in failures.iteritems():
+            reports[i] = report
+
+    return reports
+
+
+def _handlers():
+    """
+    :return: dict where keys are the supported type IDs, and values are the
+             functions that process uploads of them
+    :rtype:  dict
+    """
+    return {
         models.RPM.TYPE: _handle_package,
         models.SRPM.TYPE: _handle_package,
         models.PackageGroup.TYPE: _handle_group_category,
@@ -88,33 +166,31 @@ def upload(repo, type_id, unit_key, metadata, file_path, conduit, config):
         models.YumMetadataFile.TYPE: _handle_yum_metadata_file,
     }
 
-    if type_id not in handlers:
-        return _fail_report('%s is not a supported type for upload' % type_id)
 
-    try:
-        handlers[type_id](type_id, unit_key, metadata, file_path, conduit, config)
-    except ModelInstantiationError:
+def _exception_report(e):
+    """
+    Log an exception raised while handling an upload, and return the failure
+    report for it. This must be called while the exception is being handled.
+
+    :param e: exception raised while handling an upload
+    :type  e: Exception
+
+    :return: report of the failure
+    :rtype:  dict
+    """
+    if isinstance(e, ModelInstantiationError):
         msg = 'metadata for the uploaded file was invalid'
-        _LOGGER.exception(msg)
-        return _fail_report(msg)
-    except StoreFileError:
+    elif isinstance(e, StoreFileError):
         msg = 'file could not be deployed into Pulp\'s storage'
-        _LOGGER.exception(msg)
-        return _fail_report(msg)
-    except PackageMetadataError:
+    elif isinstance(e, PackageMetadataError):
         msg = 'metadata for the given package could not be extracted'
-        _LOGGER.exception(msg)
-        return _fail_report(msg)
-    except PulpCodedException, e:
+    elif isinstance(e, PulpCodedException):
         _LOGGER.exception(e)
         return _fail_report(str(e))
-    except:
+    else:
         msg = 'unexpected error occurred importing uploaded file'
-        _LOGGER.exception(msg)
-        return _fail_report(msg)
-
-    report = {'success_flag': True, 'summary': '', 'details': {}}
-    return report
+    _LOGGER.exception(msg)
+    return _fail_report(msg)
 
 
 def _handle_erratum(type_id, unit_key, metadata, file_path, conduit, config):
@@ -131,6 +207,26 @@ def _handle_erratum(type_id, unit_key, metadata, file_path, conduit, config):
     :type  config: pulp.plugins.config.PluginCallConfiguration
     """
 
+    # this save must happen before the link is created, because the link logic
+    # requires the unit to have an "id".
+    model, saved_unit = _save_erratum(type_id, unit_key, metadata, conduit)
+
+    if not config.get_boolean(CONFIG_SKIP_ERRATUM_LINK):
+        _link_errata_to_rpms(conduit, model, saved_unit)
+
+
+def _save_erratum(type_id, unit_key, metadata, conduit):
+    """
+    Saves an uploaded erratum.
+
+    :type  type_id: str
+    :type  unit_key: dict
+    :type  metadata: dict or None
+    :type  conduit: pulp.plugins.conduits.upload.UploadConduit
+
+    :return: tuple of the erratum's model and saved unit
+    :rtype:  tuple
+    """
     # Validate the user specified data by instantiating the model
     try:
         model_class = models.TYPE_MAP[type_id]
@@ -139,13 +235,8 @@ def _handle_erratum(type_id, unit_key, metadata, file_path, conduit, config):
         raise ModelInstantiationError()
 
     unit = conduit.init_unit(model.TYPE, model.unit_key, model.metadata, None)
-
-    # this save must happen before the link is created, because the link logic
-    # requires the unit to have an "id".
-    saved_unit = conduit.save_unit(unit)
-
-    if not config.get_boolean(CONFIG_SKIP_ERRATUM_LINK):
-        _link_errata_to_rpms(conduit, model, saved_unit)
+    updateinfo.add_repodata(unit)
+    return model, conduit.save_unit(unit)
 
 
 def _link_errata_to_rpms(conduit, errata_model, errata_unit):
@@ -169,6 +260,69 @@ def _link_errata_to_rpms(conduit, errata_model, errata_unit):
             conduit.link_unit(errata_unit, unit, bidirectional=True)
 
 
+def _link_all_errata_to_rpms(conduit, errata):
+    """
+    Creates links in the Pulp data model between errata and their RPMs. The
+    RPMs of all of the errata are searched for together, and each erratum is
+    linked to all of its RPMs of a type at once.
+
+    :param conduit: provides access to relevant Pulp functionality
+    :type  conduit: pulp.plugins.conduits.unit_add.UnitAddConduit
+    :param errata:  dict where keys identify errata, and values are tuples of
+                    models and saved units of errata
+    :type  errata:  dict
+
+    :return: dict where keys identify errata that could not be linked, and
+             values are reports of the failures
+    :rtype:  dict
+    """
+    # keys are tuples of the name, version, release and arch of RPMs, and
+    # values are lists of units
+    rpms = {}
+    fields = list(models.RPM.UNIT_KEY_NAMES)
+    search_dicts = [search_dict for errata_model, errata_unit in errata.itervalues()
+                    for search_dict in errata_model.rpm_search_dicts]
+    for segment in paginate(search_dicts):
+        for model_type in (models.RPM.TYPE, models.SRPM.TYPE):
+            criteria = UnitAssociationCriteria(type_ids=[model_type], unit_fields=fields,
+                                               unit_filters={'$or': list(segment)})
+            for unit in conduit.get_units(criteria):
+                rpms.setdefault(_rpm_search_key(unit.unit_key), []).append(unit)
+
+    content_manager = manager_factory.content_manager()
+    failures = {}
+    # keys are tuples of RPM types and ids, and values are lists of the ids of
+    # errata linked to them
+    links_to_errata = {}
+    for key, (errata_model, errata_unit) in errata.iteritems():
+        # keys are RPM types, and values are sets of RPM ids
+        rpm_ids = {}
+        for search_dict in errata_model.rpm_search_dicts:
+            for unit in rpms.get(_rpm_search_key(search_dict), []):
+                if all(unit.unit_key.get(name) == value
+                       for name, value in search_dict.iteritems()):
+                    rpm_ids.setdefault(unit.type_id, set()).add(unit.id)
+        try:
+            for type_id, ids in rpm_ids.iteritems():
+                content_manager.link_referenced_content_units(
+                    errata_unit.type_id, errata_unit.id, type_id, sorted(ids))
+        except Exception, e:
+            failures[key] = _exception_report(e)
+            continue
+        for type_id, ids in rpm_ids.iteritems():
+            for rpm_id in ids:
+                links_to_errata.setdefault((type_id, rpm_id), []).append(errata_unit.id)
+
+    for (type_id, rpm_id), errata_ids in links_to_errata.iteritems():
+        content_manager.link_referenced_content_units(type_id, rpm_id, models.Errata.TYPE,
+                                                      errata_ids)
+    return failures
+
+
+def _rpm_search_key(unit_key):
+    return unit_key['name'], unit_key['version'], unit_key['release'], unit_key['arch']
+
+
 def _handle_yum_metadata_file(type_id, unit_key, metadata, file_path, conduit, config):
     """
     Handles the upload for a yum repository metadata file.
@@ -240,6 +394,24 @@ def _handle_package(type_id, unit_key, metadata, file_path, conduit, config):
     :type  conduit: pulp.plugins.conduits.upload.UploadConduit
     :type  config: pulp.plugins.config.PluginCallConfiguration
     """
+    model = _extract_package(type_id, unit_key, metadata, file_path)
+    _store_package(model, file_path, conduit)
+
+
+def _extract_package(type_id, unit_key, metadata, file_path):
+    """
+    Extracts the unit key and all metadata of an uploaded RPM or SRPM,
+    including its repodata. The file is not modified, so this can happen
+    in another thread.
+
+    :type  type_id: str
+    :type  unit_key: dict
+    :type  metadata: dict or None
+    :type  file_path: str
+
+    :return: model of the package
+    :rtype:  pulp_rpm.plugins.db.models.RPM
+    """
     # Extract the RPM key and metadata
     try:
         new_unit_key, new_unit_metadata = _generate_rpm_data(type_id, file_path, metadata)
@@ -247,9 +419,16 @@ def _handle_package(type_id, unit_key, metadata, file_path, conduit, config):
         _LOGGER.exception('Error extracting RPM metadata for [%s]' % file_path)
         raise
 
+    # The checksum of the file, which was calculated along with the rest of
+    # the extracted data, is reused for the repodata
+    checksumtype = new_unit_key.get('checksumtype')
+    checksum = new_unit_key.get('checksum')
+
     # Update the RPM-extracted data with anything additional the user specified.
     # Allow the user-specified values to override the extracted ones.
     new_unit_key.update(unit_key or {})
+    if new_unit_key.get('checksumtype') != checksumtype:
+        checksum = None
     new_unit_metadata.update(metadata or {})
 
     # Validate the user specified data by instantiating the model
@@ -259,6 +438,41 @@ def _handle_package(type_id, unit_key, metadata, file_path, conduit, config):
     except TypeError:
         raise ModelInstantiationError()
 
+    # Extract the repodata snippets, provides and requires. The location in
+    # the repodata is that of the file once it is in Pulp's storage.
+    package_metadata = rpm_parse.get_package_metadata(file_path,
+                                                      sumtype=new_unit_key['checksumtype'],
+                                                      checksum=checksum,
+                                                      location=model.relative_path)
+    if not package_metadata:
+        raise PackageMetadataError()
+    model.metadata.update(package_metadata)
+    return model
+
+
+def _extract_package_report(type_id, unit_key, metadata, file_path):
+    """
+    Calls _extract_package, and returns the failure report instead of raising
+    an exception, so that the exception is logged by the thread that handled it.
+
+    :return: tuple of a failure report and None, or None and the package's model
+    :rtype:  tuple
+    """
+    try:
+        return None, _extract_package(type_id, unit_key, metadata, file_path)
+    except Exception, e:
+        return _exception_report(e), None
+
+
+def _store_package(model, file_path, conduit):
+    """
+    Moves an uploaded RPM or SRPM to its storage location and saves it.
+
+    :param model:     model of the package, as returned by _extract_package
+    :type  model:     pulp_rpm.plugins.db.models.RPM
+    :type  file_path: str
+    :type  conduit:   pulp.plugins.conduits.upload.UploadConduit
+    """
     # Move the file to its final storage location in Pulp
     try:
         unit = conduit.init_unit(model.TYPE, model.unit_key,
@@ -267,47 +481,10 @@ def _handle_package(type_id, unit_key, metadata, file_path, conduit, config):
     except IOError:
         raise StoreFileError()
 
-    # Extract the repodata snippets
-    unit.metadata['repodata'] = rpm_parse.get_package_xml(unit.storage_path,
-                                                          sumtype=new_unit_key['checksumtype'])
-    _update_provides_requires(unit)
-
     # Save the unit in Pulp
     conduit.save_unit(unit)
 
 
-def _update_provides_requires(unit):
-    """
-    Determines the provides and requires fields based on the RPM's XML snippet and updates
-    the model instance.
-
-    :param unit: the unit being added to Pulp; the metadata attribute must already have
-                 a key called 'repodata'
-    :type  unit: pulp.plugins.model.Unit
-    """
-
-    try:
-        # make a guess at the encoding
-        codec = 'UTF-8'
-        unit.metadata['repodata']['primary'].encode(codec)
-    except UnicodeEncodeError:
-        # best second guess we have, and it will never fail due to the nature
-        # of the encoding.
-        codec = 'ISO-8859-1'
-        unit.metadata['repodata']['primary'].encode(codec)
-    fake_xml = FAKE_XML % {'encoding': codec, 'xml': unit.metadata['repodata']['primary']}
-    fake_element = ET.fromstring(fake_xml.encode(codec))
-    utils.strip_ns(fake_element)
-    primary_element = fake_element.find('package')
-    format_element = primary_element.find('format')
-    provides_element = format_element.find('provides')
-    requires_element = format_element.find('requires')
-    unit.metadata['provides'] = map(primary._process_rpm_entry_element,
-                                    provides_element.findall('entry')) if provides_element else []
-    unit.metadata['requires'] = map(primary._process_rpm_entry_element,
-                                    requires_element.findall('entry')) if requires_element else []
-
-
 def _generate_rpm_data(type_id, rpm_filename, user_metadata=None):
     """
     For the given RPM, analyzes its metadata to generate the appropriate unit
@@ -334,18 +511,6 @@ def _generate_rpm_data(type_id, rpm_filename, user_metadata=None):
     unit_key = dict()
     metadata = dict()
 
-    # Read the RPM header attributes for use later
-    ts = rpm.TransactionSet()
-    ts.setVSFlags(rpm._RPMVSF_NOSIGNATURES)
-    fd = os.open(rpm_filename, os.O_RDONLY)
-    try:
-        headers = ts.hdrFromFdno(fd)
-        os.close(fd)
-    except rpm.error:
-        # Raised if the headers cannot be read
-        os.close(fd)
-        raise
-
     # -- Unit Key -----------------------
     # Checksum
     if user_metadata and user_metadata.get('checksum_type'):
@@ -354,7 +519,19 @@ def _generate_rpm_data(type_id, rpm_filename, user_metadata=None):
         unit_key['checksumtype'] = user_checksum_type
     else:
         unit_key['checksumtype'] = verification.TYPE_SHA256
-    unit_key['checksum'] = _calculate_checksum(unit_key['checksumtype'], rpm_filename)
+
+    # Read the RPM header attributes for use later, and calculate the checksum
+    # while the file is open
+    fd = os.open(rpm_filename, os.O_RDONLY)
+    try:
+        ts = rpm.TransactionSet()
+        ts.setVSFlags(rpm._RPMVSF_NOSIGNATURES)
+        # Raises rpm.error if the headers cannot be read
+        headers = ts.hdrFromFdno(fd)
+        os.lseek(fd, 0, os.SEEK_SET)
+        unit_key['checksum'] = _calculate_fd_checksum(unit_key['checksumtype'], fd)
+    finally:
+        os.close(fd)
 
     # Name, Version, Release, Epoch
     for k in ['name', 'version', 'release', 'epoch']:
@@ -411,18 +588,20 @@ def _generate_rpm_data(type_id, rpm_filename, user_metadata=None):
     return unit_key, metadata
 
 
-def _calculate_checksum(checksum_type, filename):
+def _calculate_fd_checksum(checksum_type, fd):
     m = hashlib.new(checksum_type)
-    f = open(filename, 'r')
     while 1:
-        file_buffer = f.read(CHECKSUM_READ_BUFFER_SIZE)
+        file_buffer = os.read(fd, CHECKSUM_READ_BUFFER_SIZE)
         if not file_buffer:
             break
         m.update(file_buffer)
-    f.close()
     return m.hexdigest()
 
 
+def _success_report():
+    return {'success_flag': True, 'summary': '', 'details': {}}
+
+
 def _fail_report(message):
     # this is the format returned by the original importer. I'm not sure if
     # anything is actually parsing it
@@ -0,0 +1,106 @@
+import heapq
+
+from pulp_rpm.common import evr
+
+
+# unit key fields that are ignored when deciding whether two units are
+# versions of the same package
+NON_IDENTIFYING_FIELDS = ('epoch', 'version', 'release', 'checksum', 'checksumtype')
+
+
+class NewestVersions(object):
+    """
+    Keeps track of the newest versions of each package, up to a maximum number
+    of versions per package. The versions of each package are kept in a heap
+    with the oldest version at its root, so deciding whether a version should
+    be kept costs O(log n) regardless of how many versions are seen.
+
+    Items are added one at a time with `add`, which returns whatever item is
+    no longer wanted as a result, and the kept items can be iterated with
+    `items`.
+    """
+
+    def __init__(self, num_to_keep=None):
+        """
+        :param num_to_keep: maximum number of versions to keep of each package,
+                            or None to keep all of them
+        :type  num_to_keep: int
+        """
+        self.num_to_keep = num_to_keep
+        # keys are packages, and values are dicts where keys are versions
+        # and values are items
+        self._versions = {}
+        # keys are packages, and values are heaps of the versions in _versions
+        self._heaps = {}
+
+    def add(self, key, version, item):
+        """
+        Add a version of a package. If the same version of the package was
+        added before, the new item replaces the earlier one.
+
+        :param key:     identifies the package, regardless of version
+        :type  key:     hashable
+        :param version: comparable version, such as a pulp_rpm.common.evr sort key
+        :type  version: tuple
+        :param item:    anything that should be kept for this version
+
+        :return:    the item that is not wanted because the package now has too
+                    many versions, which may be the given item if its version
+                    is older than all of the kept ones, or None
+        """
+        versions = self._versions.setdefault(key, {})
+        if version in versions or self.num_to_keep is None:
+            versions[version] = item
+            return None
+
+        heap = self._heaps.setdefault(key, [])
+        if len(heap) < self.num_to_keep:
+            versions[version] = item
+            heapq.heappush(heap, version)
+            return None
+
+        if version < heap[0]:
+            return item
+        versions[version] = item
+        return versions.pop(heapq.heapreplace(heap, version))
+
+    def items(self):
+        """
+        :return:    iterator of the items of every kept version
+        :rtype:     iterator
+        """
+        for versions in self._versions.itervalues():
+            for item in versions.itervalues():
+                yield item
+
+
+def key_without_version(model_class, unit_key):
+    """
+    Identify a package regardless of its version, directly from a unit key so
+    that a model does not need to be instantiated. Two unit keys have the same
+    result iff their models have the same key_string_without_version.
+
+    :param model_class: subclass of pulp_rpm.plugins.db.models.Package
+    :type  model_class: class
+    :param unit_key:    unit key of a package
+    :type  unit_key:    dict
+
+    :return:    values of the unit key that are not part of the version
+    :rtype:     tuple
+    """
+    return tuple(unit_key[name] for name in model_class.UNIT_KEY_NAMES
+                 if name not in NON_IDENTIFYING_FIELDS)
+
+
+def version_key(unit_key):
+    """
+    Return a key that sorts packages by version directly from a unit key, so
+    that a model does not need to be instantiated.
+
+    :param unit_key:    unit key of a package with an epoch, version and release
+    :type  unit_key:    dict
+
+    :return:    sort key from pulp_rpm.common.evr
+    :rtype:     tuple
+    """
+    return evr.evr_key(*evr.unit_key_evr(unit_key))
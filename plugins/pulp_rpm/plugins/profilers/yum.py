@@ -1,13 +1,37 @@
+from collections import OrderedDict
 from gettext import gettext as _
+import copy
+import datetime
+import threading
 
+from pulp.common import dateutils
 from pulp.plugins.conduits.mixins import UnitAssociationCriteria
 from pulp.plugins.profiler import Profiler, InvalidUnitsRequested
+from pulp.server.exceptions import InvalidValue, MissingResource
+from pulp.server.managers import factory as managers
 
+from pulp_rpm.common import evr, rpm_profile
 from pulp_rpm.common.ids import TYPE_ID_ERRATA, TYPE_ID_RPM
+from pulp_rpm.plugins.db import models
 from pulp_rpm.yum_plugin import util
 
 _logger = util.getLogger(__name__)
 
+# number of repositories whose applicability indexes are kept in memory
+MAX_CACHED_INDEXES = 8
+
+# number of profiles whose applicability is kept with each index, so that it only has to be
+# recalculated for the packages that units were added for
+MAX_CACHED_RESULTS = 1000
+
+# seconds before the time units were last added to a repository from which units are looked
+# for when adding them to an index, in case the clocks of the processes that added them differ
+ADDED_UNITS_MARGIN = 60
+
+# repo id -> (repo content version, ApplicabilityIndex), least recently used first
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
 
 def entry_point():
     """
@@ -54,12 +78,9 @@ class YumProfiler(Profiler):
         # Form a lookup table for consumer unit profile so that package lookups are constant time
         profile_lookup_table = YumProfiler._form_lookup_table(unit_profile)
 
-        return {
-            TYPE_ID_RPM: YumProfiler._calculate_applicable_units(TYPE_ID_RPM, profile_lookup_table,
-                                                                 bound_repo_id, config, conduit),
-            TYPE_ID_ERRATA: YumProfiler._calculate_applicable_units(TYPE_ID_ERRATA,
-                                                                    profile_lookup_table,
-                                                                    bound_repo_id, config, conduit)}
+        index = YumProfiler._get_applicability_index(bound_repo_id, conduit)
+        return index.applicable_units(profile_lookup_table,
+                                      profile_hash=rpm_profile.profile_hash(unit_profile))
 
     @staticmethod
     def install_units(consumer, units, options, config, conduit):
@@ -113,6 +134,11 @@ class YumProfiler(Profiler):
         correspond to these keys, and use the sorting of that list to determine a repeatable sort
         for the profile itself.
 
+        Consumers that have sent an RPM profile before may send a delta instead, with only the
+        packages added and removed since then. The delta is applied to the stored profile if that
+        is the profile the delta is based on, and is otherwise rejected, so that the consumer
+        sends its full profile.
+
         :param consumer:     A consumer.
         :type  consumer:     pulp.plugins.model.Consumer
         :param content_type: The content type id that the profile represents
@@ -123,62 +149,179 @@ class YumProfiler(Profiler):
         :type  config:       pulp.plugins.config.PluginCallConfiguration
         :return:             The sorted profile.
         :rtype:              list
+        :raises InvalidValue: if the profile is a delta that cannot be applied
         """
         if content_type == TYPE_ID_RPM:
-            profile = [
-                ((p['name'], p['epoch'], p['version'], p['release'], p['arch'], p['vendor']), p)
-                for p in profile]
-            profile.sort()
-            return [p[1] for p in profile]
+            if rpm_profile.is_delta(profile):
+                profile = YumProfiler._apply_profile_delta(consumer, profile)
+            return rpm_profile.sort_profile(profile)
         else:
             return profile
 
     @staticmethod
-    def _calculate_applicable_units(content_type, profile_lookup_table, bound_repo_id, config,
-                                    conduit):
+    def _apply_profile_delta(consumer, delta):
         """
-        Calculate and return a list of unit ids of given content_type applicable to a unit profile
-        represented by given profile_lookup_table. Applicability is calculated against all units
-        belonging to the given bound repository.
+        Apply a delta sent by a consumer to its stored RPM profile.
 
-        :param content_type:  The content type id that the profile represents
-        :type  content_type:  basestring
-        :param profile_lookup_table: lookup table of a unit profile keyed by "name arch"
-        :type profile_lookup_table: dict
-        :param bound_repo_id: repo id of a repository to be used to calculate applicability
-                              against the given consumer profile
-        :type  bound_repo_id: str
-        :param config:        plugin configuration
-        :type  config:        pulp.server.plugins.config.PluginCallConfiguration
-        :param conduit:       provides access to relevant Pulp functionality
-        :type  conduit:       pulp.plugins.conduits.profile.ProfilerConduit
-        :return:              a list of errata unit ids
-        :rtype:               list
+        :param consumer: A consumer.
+        :type  consumer: pulp.plugins.model.Consumer or dict
+        :param delta:    delta created by pulp_rpm.common.rpm_profile.create_delta
+        :type  delta:    dict
+        :return:         The consumer's new profile, unsorted.
+        :rtype:          list
+        :raises InvalidValue: if there is no stored profile, or it is not the one the delta is
+                              based on
         """
-        # Get all units associated with given repository of content_type
-        additional_unit_fields = ['pkglist'] if content_type == TYPE_ID_ERRATA else []
-        units = conduit.get_repo_units(bound_repo_id, content_type, additional_unit_fields)
-
-        # this needs to be fetched outside of the units loop :)
-        if content_type == TYPE_ID_ERRATA:
-            available_rpm_nevras = [YumProfiler._create_nevra(r.unit_key) for r in
-                                    conduit.get_repo_units(bound_repo_id, TYPE_ID_RPM)]
+        consumer_id = consumer['id'] if isinstance(consumer, dict) else consumer.id
+        try:
+            stored = managers.consumer_profile_manager().get_profile(consumer_id, TYPE_ID_RPM)
+            return rpm_profile.apply_delta(stored['profile'], delta)
+        except (MissingResource, rpm_profile.ProfileMismatch), e:
+            _logger.debug('Profile delta rejected for consumer %s: %s' % (consumer_id, e))
+            raise InvalidValue(['profile'])
 
-        applicable_unit_ids = []
-        # Check applicability for each unit
-        for unit in units:
-            if content_type == TYPE_ID_RPM:
-                applicable = YumProfiler._is_rpm_applicable(unit.unit_key, profile_lookup_table)
-            elif content_type == TYPE_ID_ERRATA:
-                applicable = YumProfiler._is_errata_applicable(
-                    unit, profile_lookup_table, available_rpm_nevras)
+    @staticmethod
+    def _get_applicability_index(repo_id, conduit):
+        """
+        Return the applicability index for a repository, building it only if
+        there is no cached index for the repository's current content. The
+        platform calculates applicability for every consumer profile bound to
+        a repository in turn, so one index serves all of them.
+
+        The content version of a repository is when units were last added to
+        and removed from it, and when its errata were last updated. Errata are
+        updated in place by syncs of any repository they are in, which does
+        not change when units were added to the other repositories.
+
+        If units have only been added to the repository since the cached index
+        was built, only the added units are queried, and a copy of the index is
+        extended with them.
+
+        :param repo_id: id of the repository
+        :type  repo_id: str
+        :param conduit: provides access to relevant Pulp functionality
+        :type  conduit: pulp.plugins.conduits.profile.ProfilerConduit
+        :return:        index of the repository's RPMs and errata
+        :rtype:         ApplicabilityIndex
+        """
+        repo = managers.repo_query_manager().find_by_id(repo_id)
+        version = None
+        if repo is not None:
+            version = (repo.get('last_unit_added'), repo.get('last_unit_removed'))
+            if version == (None, None):
+                # there is no way to tell whether the content has changed
+                version = None
             else:
-                applicable = False
+                version += (YumProfiler._errata_last_updated(repo_id, conduit),)
+
+        with _index_cache_lock:
+            cached = _index_cache.pop(repo_id, None)
+            if cached is not None and version is None:
+                cached = None
+            if cached is not None and cached[0] == version:
+                _index_cache[repo_id] = cached
+                return cached[1]
+
+        index = None
+        if cached is not None and YumProfiler._only_units_added(cached[0], version):
+            try:
+                rpm_units, errata_units, updated_errata = YumProfiler._get_added_units(
+                    repo_id, cached[0], version, conduit)
+            except Exception:
+                _logger.exception('Unable to find the units added to repository [%s]' % repo_id)
+            else:
+                # errata that are already in the index and were updated in place can only
+                # be indexed again by building the index again
+                if not [e for e in updated_errata if _unit_id(e) in cached[1].positions]:
+                    index = cached[1].extended(rpm_units, errata_units + updated_errata)
+
+        if index is None:
+            index = ApplicabilityIndex(conduit.get_repo_units(repo_id, TYPE_ID_RPM),
+                                       conduit.get_repo_units(repo_id, TYPE_ID_ERRATA,
+                                                              ['pkglist']))
+
+        if version is not None:
+            with _index_cache_lock:
+                _index_cache[repo_id] = (version, index)
+                while len(_index_cache) > MAX_CACHED_INDEXES:
+                    _index_cache.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _errata_last_updated(repo_id, conduit):
+        """
+        :param repo_id: id of the repository
+        :type  repo_id: str
+        :param conduit: provides access to relevant Pulp functionality
+        :type  conduit: pulp.plugins.conduits.profile.ProfilerConduit
+        :return:        when the most recently updated erratum in the repository was last
+                        updated, or None if there are no errata in it
+        :rtype:         int
+        """
+        criteria = UnitAssociationCriteria(type_ids=[TYPE_ID_ERRATA],
+                                           unit_fields=['_last_updated'],
+                                           unit_sort=[('_last_updated', -1)], limit=1)
+        units = conduit.get_units(repo_id, criteria)
+        if not units:
+            return None
+        return units[0].metadata.get('_last_updated')
 
-            if applicable:
-                applicable_unit_ids.append(unit.metadata['unit_id'])
+    @staticmethod
+    def _only_units_added(cached_version, version):
+        """
+        :param cached_version: content version of a repository when an index was built
+        :type  cached_version: tuple
+        :param version:        content version of the repository now
+        :type  version:        tuple
+        :return:               True if units can only have been added or errata updated
+                               since the index was built
+        :rtype:                bool
+        """
+        errata_updated = version[2] == cached_version[2] or \
+            (cached_version[2] is not None and version[2] > cached_version[2])
+        return version[1] == cached_version[1] and errata_updated and \
+            isinstance(cached_version[0], datetime.datetime) and \
+            isinstance(version[0], datetime.datetime) and version[0] > cached_version[0]
 
-        return applicable_unit_ids
+    @staticmethod
+    def _get_added_units(repo_id, cached_version, version, conduit):
+        """
+        Query the RPMs and errata associated with a repository since an index was built, the
+        same way incremental publishes query the units associated since they last published,
+        and the errata updated since. Some of the units may already be in the index, which
+        ignores them.
+
+        :param repo_id:        id of the repository
+        :type  repo_id:        str
+        :param cached_version: content version of the repository when the index was built
+        :type  cached_version: tuple
+        :param version:        content version of the repository now
+        :type  version:        tuple
+        :param conduit:        provides access to relevant Pulp functionality
+        :type  conduit:        pulp.plugins.conduits.profile.ProfilerConduit
+        :return:               tuple of lists of the added RPM units, the added errata units,
+                               and the errata units updated since the index was built
+        :rtype:                tuple
+        """
+        start = cached_version[0] - datetime.timedelta(seconds=ADDED_UNITS_MARGIN)
+        date_filter = {'created': {'$gte': dateutils.format_iso8601_datetime(start)}}
+        rpm_criteria = UnitAssociationCriteria(type_ids=[TYPE_ID_RPM],
+                                               association_filters=date_filter,
+                                               unit_fields=list(models.RPM.UNIT_KEY_NAMES))
+        errata_criteria = UnitAssociationCriteria(type_ids=[TYPE_ID_ERRATA],
+                                                  association_filters=date_filter,
+                                                  unit_fields=['id', 'pkglist'])
+        rpm_units = conduit.get_units(repo_id, rpm_criteria)
+        errata_units = conduit.get_units(repo_id, errata_criteria)
+
+        updated_errata = []
+        if version[2] != cached_version[2]:
+            updated_criteria = UnitAssociationCriteria(
+                type_ids=[TYPE_ID_ERRATA],
+                unit_filters={'_last_updated': {'$gt': cached_version[2]}},
+                unit_fields=['id', 'pkglist'])
+            updated_errata = conduit.get_units(repo_id, updated_criteria)
+        return rpm_units, errata_units, updated_errata
 
     @staticmethod
     def _find_unit_associated_to_repos(unit_type, unit_key, repo_ids, conduit):
@@ -252,39 +395,6 @@ class YumProfiler(Profiler):
                 rpms.append(rpm)
         return rpms
 
-    @staticmethod
-    def _is_errata_applicable(errata, profile_lookup_table, available_rpm_nevras):
-        """
-        Checks whether given errata is applicable to the consumer.
-
-        :param errata: Errata unit for which the applicability is being checked
-        :type errata: pulp.plugins.model.Unit
-
-        :param profile_lookup_table: lookup table of a unit profile keyed by "name arch"
-        :type profile_lookup_table: dict
-
-        :return: true if applicable, false otherwise
-        :rtype: boolean
-        """
-        # Get rpms from errata
-        errata_rpms = YumProfiler._get_rpms_from_errata(errata)
-
-        # RHBZ #1171280: ensure we are only checking applicability against RPMs
-        # we have access to in the repo. This is to prevent a RHEL6 machine
-        # from finding RHEL7 packages, for example.
-        available_errata_rpms = []
-        for errata_rpm in errata_rpms:
-            if YumProfiler._create_nevra(errata_rpm) in available_rpm_nevras:
-                available_errata_rpms.append(errata_rpm)
-
-        # Check if any rpm from errata is applicable to the consumer
-        for errata_rpm in available_errata_rpms:
-            if YumProfiler._is_rpm_applicable(errata_rpm, profile_lookup_table):
-                return True
-
-        # Return false if none of the errata rpms are applicable
-        return False
-
     @staticmethod
     def _is_rpm_applicable(rpm_unit_key, profile_lookup_table):
         """
@@ -422,3 +532,267 @@ class YumProfiler(Profiler):
                  'version': str(r['version']), 'release': str(r['release']),
                  'arch': str(r['arch'])}
         return nevra
+
+    @staticmethod
+    def _create_nevra_tuple(r):
+        """
+        Like _create_nevra, but return a hashable tuple of name, epoch,
+        version, release and arch, so that NEVRAs can be kept in a set.
+        """
+        return (str(r['name']), str(r['epoch']), str(r['version']), str(r['release']),
+                str(r['arch']))
+
+
+class ApplicabilityIndex(object):
+    """
+    Everything about a repository's RPMs and errata that is needed to
+    calculate applicability, arranged by "name arch" so that a consumer
+    profile only has to be compared with the packages it has installed.
+
+    An index is not changed once it has been built, so that it can be shared
+    by threads, apart from the applicability of profiles it keeps. Adding
+    units makes an extended copy, which keeps track of the "name arch" keys
+    the units were added for, so that the applicability kept for a profile
+    only has to be recalculated for those keys.
+    """
+
+    def __init__(self, rpm_units, errata_units):
+        """
+        :param rpm_units:    the repository's RPM units, with "unit_id" in their metadata
+        :type  rpm_units:    list of pulp.plugins.model.Unit
+        :param errata_units: the repository's errata units, with "unit_id" and "pkglist"
+                             in their metadata
+        :type  errata_units: list of pulp.plugins.model.Unit
+        """
+        # versions are kept as pulp_rpm.common.evr sort keys, so that they are
+        # only parsed once however many profiles they are compared with
+        # "name arch" -> tuple of (RPM version, unit id)
+        self.rpms = {}
+        # "name arch" -> tuple of (erratum package version, erratum unit id), only
+        # for packages that are in the repository
+        self.errata_rpms = {}
+        # "name arch" -> version of the newest RPM in the repository
+        self.newest = {}
+        # unit id -> position, so that ids are returned in the order the units were found
+        self.positions = {}
+        # NEVRA tuples of the repository's RPMs
+        self.nevras = set()
+        # NEVRA tuple -> tuple of ("name arch", erratum package version, erratum unit id) for
+        # errata packages that are not in the repository, in case they are added later
+        self.missing_errata_rpms = {}
+        # number of times units have been added to the index since it was built
+        self.generation = 0
+        # list of (generation, set of "name arch" keys that units were added for)
+        self.changes = []
+        # profile hash -> (generation, applicability by key), least recently used first
+        self.results = OrderedDict()
+        self._results_lock = threading.Lock()
+
+        self._add(rpm_units, errata_units)
+
+    def extended(self, rpm_units, errata_units):
+        """
+        Return a copy of this index with more units, without changing this index.
+
+        :param rpm_units:    RPM units added to the repository, with unit key fields
+        :type  rpm_units:    list of pulp.plugins.model.Unit
+        :param errata_units: errata units added to the repository, with "pkglist" in their
+                             metadata
+        :type  errata_units: list of pulp.plugins.model.Unit
+        :return:             the extended index
+        :rtype:              ApplicabilityIndex
+        """
+        index = copy.copy(self)
+        # the values of these are tuples, so the dicts are the only things that change
+        index.rpms = dict(self.rpms)
+        index.errata_rpms = dict(self.errata_rpms)
+        index.newest = dict(self.newest)
+        index.positions = dict(self.positions)
+        index.nevras = set(self.nevras)
+        index.missing_errata_rpms = dict(self.missing_errata_rpms)
+        with self._results_lock:
+            index.results = OrderedDict(self.results)
+        index._results_lock = threading.Lock()
+
+        index.generation = self.generation + 1
+        changed = index._add(rpm_units, errata_units)
+        index.changes = self.changes + [(index.generation, changed)]
+        return index
+
+    def _add(self, rpm_units, errata_units):
+        """
+        Add units that are not already in the index.
+
+        :return: the "name arch" keys that units were added for
+        :rtype:  set
+        """
+        changed = set()
+        for unit in rpm_units:
+            unit_id = _unit_id(unit)
+            if unit_id in self.positions:
+                continue
+            key = YumProfiler._form_lookup_key(unit.unit_key)
+            version = evr.evr_key(*evr.unit_key_evr(unit.unit_key))
+            self.rpms[key] = self.rpms.get(key, ()) + ((version, unit_id),)
+            self.positions[unit_id] = len(self.positions)
+            changed.add(key)
+            newest = self.newest.get(key)
+            if newest is None or version > newest:
+                self.newest[key] = version
+
+            nevra = YumProfiler._create_nevra_tuple(unit.unit_key)
+            self.nevras.add(nevra)
+            # errata added earlier may have been waiting for this package
+            for errata_key, errata_version, errata_id in self.missing_errata_rpms.pop(nevra, ()):
+                self.errata_rpms[errata_key] = self.errata_rpms.get(errata_key, ()) + (
+                    (errata_version, errata_id),)
+
+        for erratum in errata_units:
+            unit_id = _unit_id(erratum)
+            if unit_id in self.positions:
+                continue
+            self.positions[unit_id] = len(self.positions)
+            for errata_rpm in YumProfiler._get_rpms_from_errata(erratum):
+                key = YumProfiler._form_lookup_key(errata_rpm)
+                item = (evr.evr_key(*evr.unit_key_evr(errata_rpm)), unit_id)
+                nevra = YumProfiler._create_nevra_tuple(errata_rpm)
+                # RHBZ #1171280: ensure we are only checking applicability against RPMs
+                # we have access to in the repo. This is to prevent a RHEL6 machine
+                # from finding RHEL7 packages, for example.
+                if nevra in self.nevras:
+                    self.errata_rpms[key] = self.errata_rpms.get(key, ()) + (item,)
+                    changed.add(key)
+                else:
+                    self.missing_errata_rpms[nevra] = \
+                        self.missing_errata_rpms.get(nevra, ()) + ((key,) + item,)
+        return changed
+
+    def keys_changed_since(self, generation):
+        """
+        :param generation: generation of this index, or of one it was extended from
+        :type  generation: int
+        :return:           the "name arch" keys that units have been added for since
+        :rtype:            set
+        """
+        changed = set()
+        for change_generation, keys in self.changes:
+            if change_generation > generation:
+                changed.update(keys)
+        return changed
+
+    def calculate(self, profile_lookup_table, keys=None):
+        """
+        Calculate which of the repository's RPMs and errata are applicable to
+        a consumer profile, by installed package. An RPM is applicable if it is
+        newer than an installed package with the same name and arch, and an
+        erratum is applicable if any of its packages in the repository is.
+
+        :param profile_lookup_table: lookup table of a unit profile keyed by "name arch"
+        :type  profile_lookup_table: dict
+        :param keys:                 "name arch" keys to calculate applicability for, or
+                                     None for every key in the profile
+        :type  keys:                 iterable
+        :return:                     "name arch" -> tuple of the ids of the applicable RPMs
+                                     and the ids of the applicable errata, for keys that have
+                                     any applicable units
+        :rtype:                      dict
+        """
+        if keys is None:
+            keys = profile_lookup_table.iterkeys()
+        applicability = {}
+        for key in keys:
+            newest = self.newest.get(key)
+            if newest is None or key not in profile_lookup_table:
+                continue
+            installed_version = evr.evr_key(*evr.unit_key_evr(profile_lookup_table[key]))
+            # nothing in the repository can upgrade this package
+            if newest <= installed_version:
+                continue
+            rpm_ids = tuple(unit_id for version, unit_id in self.rpms[key]
+                            if version > installed_version)
+            errata_ids = tuple(unit_id for version, unit_id in self.errata_rpms.get(key, ())
+                               if version > installed_version)
+            applicability[key] = (rpm_ids, errata_ids)
+        return applicability
+
+    def update(self, applicability, profile_lookup_table, changed_keys):
+        """
+        Update applicability calculated earlier, after packages were installed or removed on
+        the consumer, or units were added to the repository.
+
+        :param applicability:        applicability returned by calculate or update
+        :type  applicability:        dict
+        :param profile_lookup_table: lookup table of the current unit profile
+        :type  profile_lookup_table: dict
+        :param changed_keys:         "name arch" keys of the installed packages that changed,
+                                     or that units were added for
+        :type  changed_keys:         set
+        :return:                     the updated applicability
+        :rtype:                      dict
+        """
+        updated = dict((key, ids) for key, ids in applicability.iteritems()
+                       if key not in changed_keys)
+        updated.update(self.calculate(profile_lookup_table, changed_keys))
+        return updated
+
+    def units(self, applicability):
+        """
+        :param applicability: applicability returned by calculate or update
+        :type  applicability: dict
+        :return:              a dictionary mapping content_type_ids to lists of content
+                              unit ids
+        :rtype:               dict
+        """
+        rpm_ids = set()
+        errata_ids = set()
+        for key_rpm_ids, key_errata_ids in applicability.itervalues():
+            rpm_ids.update(key_rpm_ids)
+            errata_ids.update(key_errata_ids)
+        return {TYPE_ID_RPM: sorted(rpm_ids, key=self.positions.get),
+                TYPE_ID_ERRATA: sorted(errata_ids, key=self.positions.get)}
+
+    def applicable_units(self, profile_lookup_table, profile_hash=None):
+        """
+        Calculate which of the repository's RPMs and errata are applicable to
+        a consumer profile. If a hash of the profile is given, its applicability
+        is kept, and is only recalculated for the packages that units are added
+        for later.
+
+        :param profile_lookup_table: lookup table of a unit profile keyed by "name arch"
+        :type  profile_lookup_table: dict
+        :param profile_hash:         hash of the unit profile
+        :type  profile_hash:         str
+        :return:                     a dictionary mapping content_type_ids to lists of
+                                     content unit ids
+        :rtype:                      dict
+        """
+        kept = None
+        if profile_hash is not None:
+            with self._results_lock:
+                kept = self.results.pop(profile_hash, None)
+
+        if kept is None:
+            applicability = self.calculate(profile_lookup_table)
+        elif kept[0] == self.generation:
+            applicability = kept[1]
+        else:
+            applicability = self.update(kept[1], profile_lookup_table,
+                                        self.keys_changed_since(kept[0]))
+
+        if profile_hash is not None:
+            with self._results_lock:
+                self.results[profile_hash] = (self.generation, applicability)
+                while len(self.results) > MAX_CACHED_RESULTS:
+                    self.results.popitem(last=False)
+        return self.units(applicability)
+
+
+def _unit_id(unit):
+    """
+    :param unit: unit from ProfilerConduit.get_repo_units, which has its id in its metadata,
+                 or from ProfilerConduit.get_units, which has it as its id attribute
+    :type  unit: pulp.plugins.model.Unit
+    :return:     id of the unit
+    :rtype:      str
+    """
+    return unit.metadata.get('unit_id') or unit.id
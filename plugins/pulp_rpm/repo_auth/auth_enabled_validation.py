@@ -5,7 +5,7 @@ to prevent the more costly tests from being run in the case the Pulp server
 doesn't care at all about repo authentication.
 '''
 
-from ConfigParser import SafeConfigParser
+from pulp_rpm.repo_auth import file_cache
 
 # This needs to be accessible on both Pulp and the CDS instances, so a
 # separate config file for repo auth purposes is used.
@@ -27,6 +27,4 @@ def authenticate(environ):
 
 
 def _config():
-    config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
-    return config
+    return file_cache.read_config(CONFIG_FILENAME)
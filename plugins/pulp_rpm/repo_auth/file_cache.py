@@ -0,0 +1,117 @@
+'''
+Per-process caching of the files read while authenticating requests. The
+configuration, protected repo listings and certificates rarely change, but are
+needed for every request, so each is read and parsed once and only read again
+when its modification time, size or inode has changed.
+
+Files are written by the Pulp server and read by the web server's processes,
+so the stat call is the only thing that keeps a process from serving stale
+values; nothing needs to be notified when a file changes.
+'''
+
+from ConfigParser import SafeConfigParser
+import os
+
+
+class FileCache:
+    def __init__(self, load):
+        '''
+        @param load: called with the path of a file to load its value whenever the
+                     file is new or has changed
+        @type  load: callable
+        '''
+        self.load = load
+        # mapping of path to a tuple of the file's (mtime, size, inode) and its value
+        self._entries = {}
+
+    def get(self, path):
+        '''
+        Returns the value of a file, loading it only if it has changed since it was
+        last loaded. Values are shared by every caller and must not be modified.
+
+        @param path: absolute path to the file
+        @type  path: str
+
+        @return: value returned by the load function, or None if the file does not exist
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._entries.pop(path, None)
+            return None
+
+        stamp = (stat.st_mtime, stat.st_size, stat.st_ino)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        # If the file changes while it is loaded, the value is stored with the earlier
+        # stamp and is simply loaded again on the next call.
+        value = self.load(path)
+        self._entries[path] = (stamp, value)
+        return value
+
+    def invalidate(self, path=None):
+        '''
+        Forgets the value of a file, so that it is loaded on the next call to get even
+        if it was rewritten too quickly for its stamp to change. This process's own
+        writes call this; other processes rely on the stamp.
+
+        @param path: absolute path to the file; if None, all files are forgotten
+        @type  path: str
+        '''
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
+
+
+def _read_contents(path):
+    f = open(path, 'r')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def _read_config(path):
+    config = SafeConfigParser()
+    config.read(path)
+    return config
+
+
+# Contents of certificate and listing files
+CONTENTS = FileCache(_read_contents)
+
+# Parsed configuration files
+CONFIGS = FileCache(_read_config)
+
+
+def read_contents(path):
+    '''
+    @return: contents of the file, or None if it does not exist
+    @rtype:  str
+    '''
+    return CONTENTS.get(path)
+
+
+def read_config(path):
+    '''
+    Reads a configuration file the way SafeConfigParser.read does, including
+    returning an empty configuration if the file does not exist. The returned
+    configuration is shared and must not be modified.
+
+    @rtype: SafeConfigParser
+    '''
+    config = CONFIGS.get(path)
+    if config is None:
+        config = SafeConfigParser()
+    return config
+
+
+def clear():
+    '''
+    Forgets everything that has been read, in every cache of this module.
+    '''
+    CONTENTS.invalidate()
+    CONFIGS.invalidate()
@@ -13,10 +13,17 @@ The OID structure follows the Red Hat model. Download URLs are found at:
 The * represents the product ID and is not used as part of this calculation.
 '''
 
-from ConfigParser import NoOptionError, SafeConfigParser
-
+from collections import OrderedDict
+from ConfigParser import NoOptionError
+from threading import Lock
+import calendar
+import hashlib
+import time
+
+from M2Crypto import X509
 from rhsm import certificate
 
+from pulp_rpm.repo_auth import file_cache
 from pulp_rpm.repo_auth.protected_repo_utils import ProtectedRepoUtils
 from pulp_rpm.repo_auth.repo_cert_utils import RepoCertUtils
 
@@ -31,6 +38,13 @@ CONFIG_FILENAME = '/etc/pulp/repo_auth.conf'
 # hardcoded until we actually get a use case to make it variable.
 RELATIVE_URL = '/pulp/repos'  # no trailing backslash; we take care of normalizing it later
 
+# Maximum number of client certificates whose verification and entitlements are cached
+MAX_CACHED_CERTS = 1000
+
+# Maximum number of seconds a successful verification is trusted before the client
+# certificate is verified again, even if neither it nor its CA have expired
+VERIFIED_CERT_MAX_AGE = 300
+
 
 def authenticate(environ, config=None):
     '''
@@ -48,9 +62,73 @@ def authenticate(environ, config=None):
 
 
 def _config():
-    config = SafeConfigParser()
-    config.read(CONFIG_FILENAME)
-    return config
+    return file_cache.read_config(CONFIG_FILENAME)
+
+
+def _fingerprint(pem):
+    '''
+    Identifies a PEM encoded certificate, or chain of certificates, without parsing it.
+    '''
+    return hashlib.sha256(pem).hexdigest()
+
+
+def _not_after(x509_cert):
+    '''
+    @return: the time the certificate expires, in seconds since the epoch
+    @rtype:  int
+    '''
+    return calendar.timegm(x509_cert.get_not_after().get_datetime().utctimetuple())
+
+
+class LRUCache:
+    '''
+    Thread-safe mapping that holds at most a maximum number of items, discarding
+    the least recently used item to make room for a new one.
+    '''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        '''
+        @return: the value for the key, or None if it is not cached
+        '''
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            if len(self._items) >= self.max_size:
+                self._items.popitem(last=False)
+            self._items[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Mapping of (client certificate fingerprint, CA fingerprint) to the time until which
+# the client certificate is considered to be signed by that CA. Only successful
+# verifications are cached, so that a failure is always logged in full.
+VERIFIED_CERTS = LRUCache(MAX_CACHED_CERTS)
+
+# Mapping of client certificate fingerprint to its parsed certificate, whose
+# entitled paths are checked for each request
+ENTITLEMENT_CERTS = LRUCache(MAX_CACHED_CERTS)
+
+
+def clear_cert_caches():
+    '''
+    Forgets every verified client certificate and parsed entitlement certificate.
+    '''
+    VERIFIED_CERTS.clear()
+    ENTITLEMENT_CERTS.clear()
 
 
 class OidValidator:
@@ -94,8 +172,7 @@ class OidValidator:
                     return False
 
                 # Make sure the client cert is signed by the correct CA
-                is_valid = self.repo_cert_utils.validate_certificate_pem(
-                    cert_pem, repo_bundle['ca'], log_func=log_func)
+                is_valid = self._verify_certificate(cert_pem, repo_bundle['ca'], log_func)
                 if not is_valid:
                     log_func('Client certificate did not match the repo consumer CA certificate')
                     return False
@@ -111,8 +188,7 @@ class OidValidator:
                     return False
 
                 # Make sure the client cert is signed by the correct CA
-                is_valid = self.repo_cert_utils.validate_certificate_pem(
-                    cert_pem, global_bundle['ca'], log_func=log_func)
+                is_valid = self._verify_certificate(cert_pem, global_bundle['ca'], log_func)
                 if not is_valid:
                     log_func('Client certificate did not match the global repo auth CA certificate')
                     return False
@@ -125,25 +201,16 @@ class OidValidator:
 
     def _matching_repo_bundle(self, dest):
 
-        # Load the path -> repo ID mappings
-        prot_repos = self.protected_repo_utils.read_protected_repo_listings()
-
         # Extract the repo portion of the URL
         # Example URL: https://guardian/pulp/repos/my-repo/pulp/fedora-13/i386/repodata/repomd.xml
         #   Repo Portion: /my-repo/pulp/fedora-13/i386/repodata/repomd.xml
         repo_url = dest[dest.find(RELATIVE_URL) + len(RELATIVE_URL):]
 
-        # If the repo portion of the URL starts with any of the protected relative URLs,
-        # it is considered to be a request against that protected repo
-        repo_id = None
-        for relative_url in prot_repos.keys():
-
-            # Relative URL is inconsistent in Pulp, so a simple "startswith" tends to
-            # break. Changing this to a find helps remove issues where the leading /
-            # is missing, present, or duplicated.
-            if repo_url.find(relative_url) != -1:
-                repo_id = prot_repos[relative_url]
-                break
+        # If the repo portion of the URL contains any of the protected relative URLs,
+        # it is considered to be a request against that protected repo. Relative URL is
+        # inconsistent in Pulp, so a simple "startswith" tends to break; the lookup
+        # ignores whether the leading / is missing, present, or duplicated.
+        repo_id = self.protected_repo_utils.find_protected_repo(repo_url)
 
         if not repo_id:
             return None
@@ -151,6 +218,52 @@ class OidValidator:
         bundle = self.repo_cert_utils.read_consumer_cert_bundle(repo_id, ['ca'])
         return bundle
 
+    def _verify_certificate(self, cert_pem, ca_pem, log_func):
+        """
+        Verifies that the client certificate is signed by the CA, unless it already
+        has been within the last VERIFIED_CERT_MAX_AGE seconds and neither the
+        certificate nor the CA have expired since.
+
+        :param cert_pem: PEM encoded client certificate
+        :type  cert_pem: str
+        :param ca_pem: PEM encoded CA certificates
+        :type  ca_pem: str
+        :param log_func: function used for logging
+        :type  log_func: callable taking 1 argument of type basestring
+        :return: True iff the certificate is signed by the CA
+        :rtype:  bool
+        """
+        key = (_fingerprint(cert_pem), _fingerprint(ca_pem))
+        now = time.time()
+        verified_until = VERIFIED_CERTS.get(key)
+        if verified_until is not None and now < verified_until:
+            return True
+
+        is_valid = self.repo_cert_utils.validate_certificate_pem(cert_pem, ca_pem,
+                                                                 log_func=log_func)
+        if is_valid:
+            ca_chain = self.repo_cert_utils.get_ca_chain(ca_pem)
+            expirations = [_not_after(c) for c in ca_chain]
+            expirations.append(_not_after(X509.load_cert_string(cert_pem)))
+            verified_until = min(expirations + [now + VERIFIED_CERT_MAX_AGE])
+            if verified_until > now:
+                VERIFIED_CERTS.put(key, verified_until)
+        return is_valid
+
+    def _entitlement_certificate(self, cert_pem):
+        """
+        :param cert_pem: PEM encoded client certificate
+        :type  cert_pem: str
+        :return: the parsed certificate, which is only parsed once while it is cached
+        :rtype:  rhsm.certificate2.Certificate
+        """
+        key = _fingerprint(cert_pem)
+        cert = ENTITLEMENT_CERTS.get(key)
+        if cert is None:
+            cert = certificate.create_from_pem(cert_pem)
+            ENTITLEMENT_CERTS.put(key, cert)
+        return cert
+
     def _check_extensions(self, cert_pem, dest, log_func):
         """
         Checks the requested destination path against the entitlement cert.
@@ -164,7 +277,7 @@ class OidValidator:
         :return: True iff request is authorized, else False
         :rtype:  bool
         """
-        cert = certificate.create_from_pem(cert_pem)
+        cert = self._entitlement_certificate(cert_pem)
 
         # Extract the repo portion of the URL
         repo_dest = dest[dest.find(RELATIVE_URL) + len(RELATIVE_URL):]
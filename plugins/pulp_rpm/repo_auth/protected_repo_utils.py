@@ -6,11 +6,26 @@ repo information.
 import os
 from threading import RLock
 
+from pulp_rpm.repo_auth.file_cache import FileCache
+
 # -- constants ----------------------------------------------------------------------
 
 WRITE_LOCK = RLock()
 
 
+def _load_listings(filename):
+    f = ProtectedRepoListingFile(filename)
+    f.load()
+    return f.listings
+
+
+# Listings by filename, read again only when the file changes
+LISTINGS_CACHE = FileCache(_load_listings)
+
+# The most recently built trie and the listings it was built from
+_last_trie = (None, None)
+
+
 class ProtectedRepoUtils:
     def __init__(self, config):
         self.config = config
@@ -39,6 +54,7 @@ class ProtectedRepoUtils:
             f.load()
             f.add_protected_repo_path(repo_relative_path, repo_id)
             f.save()
+            LISTINGS_CACHE.invalidate(f.filename)
         finally:
             WRITE_LOCK.release()
 
@@ -61,6 +77,7 @@ class ProtectedRepoUtils:
             f.load()
             f.remove_protected_repo_path(repo_relative_path)
             f.save()
+            LISTINGS_CACHE.invalidate(f.filename)
         finally:
             WRITE_LOCK.release()
 
@@ -71,16 +88,91 @@ class ProtectedRepoUtils:
         @param filename: absolute path to the listings file
         @type  filename: str
 
+        The listings are cached for as long as the file does not change, and are
+        shared by every caller, so they must not be modified.
+
         @return: mapping of relative path URL to repo ID
         @rtype:  dict {str, str}
         '''
-        f = ProtectedRepoListingFile(self.config.get('repos', 'protected_repo_listing_file'))
-        f.load()
-        return f.listings
+        filename = self.config.get('repos', 'protected_repo_listing_file')
+        if filename is None:
+            raise ValueError('Filename must be specified when creating a ProtectedRepoListingFile')
+        return LISTINGS_CACHE.get(filename) or {}
+
+    def find_protected_repo(self, path):
+        '''
+        Finds the protected repo that a path is in. Relative paths are matched against
+        whole components of the path, wherever they occur in it, and regardless of
+        leading, trailing or duplicated slashes. If more than one matches, the longest
+        is used.
+
+        @param path: path being requested, relative to where repos are served
+        @type  path: str
+
+        @return: ID of the protected repo, or None if the path is not protected
+        @rtype:  str
+        '''
+        global _last_trie
+
+        listings = self.read_protected_repo_listings()
+        built_from, trie = _last_trie
+        if built_from is not listings:
+            trie = ProtectedPathTrie(listings)
+            _last_trie = (listings, trie)
+        return trie.find(path)
 
 
 # -- classes -------------------------------------------------------------------------
 
+class ProtectedPathTrie:
+    '''
+    Trie of the components of protected relative paths, so that finding the repo
+    of a path costs the same however many repos are protected.
+    '''
+
+    # key in a node that holds the repo ID of the path ending at that node
+    REPO_ID = None
+
+    def __init__(self, listings):
+        '''
+        @param listings: mapping of relative path URL to repo ID
+        @type  listings: dict {str, str}
+        '''
+        self.root = {}
+        for relative_path, repo_id in listings.items():
+            node = self.root
+            for part in _path_parts(relative_path):
+                node = node.setdefault(part, {})
+            node[self.REPO_ID] = repo_id
+
+    def find(self, path):
+        '''
+        @param path: path being requested
+        @type  path: str
+
+        @return: repo ID of the longest relative path whose components appear
+                 consecutively in the path, or None if there is none
+        @rtype:  str
+        '''
+        parts = _path_parts(path)
+        repo_id = self.root.get(self.REPO_ID)
+        longest = 0
+        for start in range(len(parts)):
+            node = self.root
+            for depth, part in enumerate(parts[start:]):
+                node = node.get(part)
+                if node is None:
+                    break
+                if depth + 1 > longest and self.REPO_ID in node:
+                    repo_id = node[self.REPO_ID]
+                    longest = depth + 1
+        return repo_id
+
+
+def _path_parts(path):
+    return [part for part in path.split('/') if part]
+
+
 class ProtectedRepoListingFile:
     def __init__(self, filename):
         '''
@@ -40,6 +40,8 @@ from M2Crypto import X509, BIO
 from pulp.common.util import encode_unicode
 from pulp.server.common.openssl import Certificate
 
+from pulp_rpm.repo_auth import file_cache
+
 
 LOG = logging.getLogger(__name__)
 
@@ -55,6 +57,12 @@ WRITE_LOCK = RLock()
 
 GLOBAL_BUNDLE_PREFIX = 'pulp-global-repo'
 
+# Parsed CA chains, keyed by their PEM encoded contents and the maximum number of
+# certificates read from them. There are only as many as there are distinct CAs,
+# but the cache is emptied if it grows past this size.
+MAX_CACHED_CA_CHAINS = 100
+_ca_chains = {}
+
 
 class RepoCertUtils:
     def __init__(self, config):
@@ -123,10 +131,8 @@ class RepoCertUtils:
         for suffix in pieces:
             filename = os.path.join(cert_dir, '%s.%s' % (GLOBAL_BUNDLE_PREFIX, suffix))
 
-            if os.path.exists(filename):
-                f = open(filename, 'r')
-                contents = f.read()
-                f.close()
+            contents = file_cache.read_contents(filename)
+            if contents is not None:
                 result = result or {}
                 result[suffix] = contents
 
@@ -174,10 +180,8 @@ class RepoCertUtils:
         for suffix in pieces:
             filename = os.path.join(cert_dir, 'consumer-%s.%s' % (repo_id, suffix))
 
-            if os.path.exists(filename):
-                f = open(filename, 'r')
-                contents = f.read()
-                f.close()
+            contents = file_cache.read_contents(filename)
+            if contents is not None:
                 result = result or {}
                 result[suffix] = contents
 
@@ -284,7 +288,7 @@ class RepoCertUtils:
         if not log_func:
             log_func = LOG.info
         cert = X509.load_cert_string(cert_pem)
-        ca_chain = self.get_certs_from_string(ca_pem, log_func)
+        ca_chain = self.get_ca_chain(ca_pem, log_func)
         return self.x509_verify_cert(cert, ca_chain, log_func=log_func)
 
     def x509_verify_cert(self, cert, ca_certs, log_func=None):
@@ -339,6 +343,26 @@ class RepoCertUtils:
         if len(extra_keys) > 0:
             raise ValueError('Unexpected items in cert bundle [%s]' % ', '.join(extra_keys))
 
+    def get_ca_chain(self, ca_pem, log_func=None):
+        """
+        Same as get_certs_from_string, but each distinct chain is only parsed once per
+        process. The returned list is shared and must not be modified.
+
+        @param ca_pem: PEM encoded CA certificates, concatenated together
+        @type  ca_pem: str
+
+        @return list of X509 Certificates
+        @rtype: [M2Crypto.X509.X509]
+        """
+        key = (ca_pem, self.max_num_certs_in_chain)
+        ca_chain = _ca_chains.get(key)
+        if ca_chain is None:
+            ca_chain = self.get_certs_from_string(ca_pem, log_func)
+            if len(_ca_chains) >= MAX_CACHED_CA_CHAINS:
+                _ca_chains.clear()
+            _ca_chains[key] = ca_chain
+        return ca_chain
+
     def get_certs_from_string(self, data, log_func=None):
         """
         @param data: A single string of concatenated X509 Certificates in PEM format
@@ -486,6 +510,7 @@ class RepoCertUtils:
                         f.write(value)
                         f.close()
                         cert_files[key] = str(filename)
+                    file_cache.CONTENTS.invalidate(filename)
                 except:
                     LOG.exception('Error storing certificate file [%s]' % filename)
                     raise Exception('Error storing certificate file [%s]' % filename)
@@ -0,0 +1,148 @@
+from xml.sax.saxutils import escape, quoteattr
+
+
+def render_erratum(erratum_id, metadata):
+    """
+    Render the <update> element for an erratum in updateinfo.xml.
+
+    The XML is written directly rather than built as an ElementTree and then
+    serialized, which is much faster for errata with large package lists.
+    Attributes are written in sorted order and empty elements as "<tag />",
+    as ElementTree.tostring does.
+
+    :param erratum_id: ID of the erratum
+    :type  erratum_id: basestring
+    :param metadata: metadata of the erratum unit
+    :type  metadata: dict
+
+    :return: utf-8 encoded XML for the erratum
+    :rtype:  str
+    """
+    parts = []
+    write = parts.append
+
+    update_attributes = {'status': metadata['status'],
+                         'type': metadata['type'],
+                         'version': metadata['version'],
+                         'from': metadata.get('from', '') or ''}
+    write(_start_tag('update', update_attributes) + '>')
+
+    write(_element('id', text=erratum_id))
+    write(_element('issued', {'date': metadata['issued']}))
+    write(_element('reboot_suggested', text=str(metadata['reboot_suggested'])))
+
+    # these elements are optional
+    for key in ('title', 'release', 'rights', 'solution',
+                'severity', 'summary', 'pushcount'):
+
+        value = metadata.get(key)
+
+        if not value:
+            continue
+
+        write(_element(key, text=unicode(value)))
+
+    # these elements must be present even if text is empty
+    for key in ('description',):
+
+        value = metadata.get(key)
+        if value is None:
+            value = ''
+
+        write(_element(key, text=unicode(value)))
+
+    updated = metadata.get('updated')
+
+    if updated:
+        write(_element('updated', {'date': updated}))
+
+    references = []
+    for reference in metadata.get('references'):
+        reference_attributes = {'id': reference['id'] or '',
+                                'title': reference['title'] or '',
+                                'type': reference['type'],
+                                'href': reference['href']}
+        references.append(_element('reference', reference_attributes))
+    write(_parent_element('references', references))
+
+    for pkglist in metadata.get('pkglist', []):
+
+        collection_attributes = {}
+        short = pkglist.get('short')
+        if short is not None:
+            collection_attributes['short'] = short
+
+        collection = [_element('name', text=pkglist['name'])]
+
+        for package in pkglist['packages']:
+
+            package_attributes = {'name': package['name'],
+                                  'version': package['version'],
+                                  'release': package['release'],
+                                  'epoch': package['epoch'] or '0',
+                                  'arch': package['arch'],
+                                  'src': package.get('src', '') or ''}
+
+            package_children = [_element('filename', text=package['filename'])]
+
+            checksum_tuple = package.get('sum', None)
+
+            if checksum_tuple is not None:
+                checksum_type, checksum_value = checksum_tuple
+                package_children.append(_element('sum', {'type': checksum_type},
+                                                 checksum_value))
+
+            package_children.append(_element('reboot_suggested',
+                                             text=str(package.get('reboot_suggested', False))))
+            collection.append(_parent_element('package', package_children, package_attributes))
+
+        write(_parent_element('pkglist', [_parent_element('collection', collection,
+                                                          collection_attributes)]))
+
+    write('</update>')
+
+    return ''.join(parts)
+
+
+def _start_tag(tag, attributes):
+    """
+    :return: the start tag, without its closing ">"
+    :rtype:  str
+    """
+    if not attributes:
+        return '<' + tag
+    return '<%s %s' % (tag, ' '.join('%s=%s' % (key, quoteattr(_encode(value)))
+                                     for key, value in sorted(attributes.iteritems())))
+
+
+def _element(tag, attributes=None, text=None):
+    """
+    :return: XML for an element without children
+    :rtype:  str
+    """
+    if not text:
+        return _start_tag(tag, attributes) + ' />'
+    return '%s>%s</%s>' % (_start_tag(tag, attributes), escape(_encode(text)), tag)
+
+
+def _parent_element(tag, children, attributes=None):
+    """
+    :param children: XML for each child element
+    :type  children: list of str
+
+    :return: XML for an element without text
+    :rtype:  str
+    """
+    if not children:
+        return _start_tag(tag, attributes) + ' />'
+    return '%s>%s</%s>' % (_start_tag(tag, attributes), ''.join(children), tag)
+
+
+def _encode(value):
+    """
+    :return: value encoded as utf-8 if it is unicode, otherwise value itself
+    :rtype:  str
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
@@ -5,9 +5,10 @@ import logging
 import gettext
 
 import yum
-import rpmUtils
 from M2Crypto import X509
 
+from pulp_rpm.common import evr
+
 _ = gettext.gettext
 
 LOG_PREFIX_NAME = "pulp.plugins"
@@ -108,12 +109,8 @@ def is_rpm_newer(a, b):
         return False
     if a["arch"] != b["arch"]:
         return False
-    value = rpmUtils.miscutils.compareEVR(
-        (a["epoch"], a["version"], a["release"]),
-        (b["epoch"], b["version"], b["release"]))
-    if value > 0:
-        return True
-    return False
+    return evr.evr_key(a["epoch"], a["version"], a["release"]) > \
+        evr.evr_key(b["epoch"], b["version"], b["release"])
 
 
 ENCODING_LIST = ('utf8', 'iso-8859-1')
@@ -65,6 +65,8 @@ class TestValidateExportConfig(unittest.TestCase):
         self.repo_config[constants.SKIP_KEYWORD] = []
         self.repo_config[constants.ISO_PREFIX_KEYWORD] = 'prefix'
         self.repo_config[constants.ISO_SIZE_KEYWORD] = 630
+        self.repo_config[constants.ISO_WORKERS_KEYWORD] = 4
+        self.repo_config[constants.ISO_FILL_KEYWORD] = True
         self.repo_config[constants.EXPORT_DIRECTORY_KEYWORD] = '/path/to/dir'
         self.repo_config[constants.START_DATE_KEYWORD] = '2013-07-18T11:22:00'
         self.repo_config[constants.END_DATE_KEYWORD] = '2013-07-18T11:23:00'
@@ -97,6 +99,18 @@ class TestValidateExportConfig(unittest.TestCase):
         result = export_utils.validate_export_config(PluginCallConfiguration({}, self.repo_config))
         self.assertFalse(result[0])
 
+    def test_bad_iso_workers_config(self):
+        self.repo_config[constants.ISO_WORKERS_KEYWORD] = 0
+
+        result = export_utils.validate_export_config(PluginCallConfiguration({}, self.repo_config))
+        self.assertFalse(result[0])
+
+    def test_non_bool_iso_fill_config(self):
+        self.repo_config[constants.ISO_FILL_KEYWORD] = 'potato'
+
+        result = export_utils.validate_export_config(PluginCallConfiguration({}, self.repo_config))
+        self.assertFalse(result[0])
+
     def test_bad_start_date(self):
         # Setup
         self.repo_config[constants.START_DATE_KEYWORD] = 'malformed date'
@@ -4,6 +4,7 @@ import unittest
 import datetime
 
 import mock
+from pulp.server.exceptions import PulpCodedException
 
 from pulp_rpm.plugins.distributors.export_distributor import generate_iso
 
@@ -41,6 +42,44 @@ class TestCreateIso(unittest.TestCase):
         self.assertEqual('/target/dir', generate_iso._make_iso.call_args[0][1])
         self.assertEqual('/output/dir', generate_iso._make_iso.call_args[0][2])
 
+    def test_create_iso_workers(self):
+        """
+        Test that several images are written concurrently, and still named in order
+        """
+        generate_iso._compute_image_files.return_value = [['a'], ['b'], ['c']]
+
+        generate_iso.create_iso('/target/dir', '/output/dir', 'prefix', workers=2)
+
+        self.assertEqual(3, generate_iso._make_iso.call_count)
+        calls = sorted(generate_iso._make_iso.call_args_list, key=lambda c: c[0][3])
+        self.assertEqual([c[0][0] for c in calls], [['a'], ['b'], ['c']])
+        for i, c in enumerate(calls):
+            self.assertTrue(c[0][3].endswith('-%02d.iso' % (i + 1)))
+
+    def test_create_iso_failure(self):
+        """
+        Test that the failure to write any image is raised, once all of them are done
+        """
+        generate_iso._compute_image_files.return_value = [['a'], ['b'], ['c']]
+
+        def make_iso(file_list, target_dir, output_dir, filename):
+            if file_list == ['b']:
+                raise PulpCodedException(message='mkisofs failed')
+        generate_iso._make_iso.side_effect = make_iso
+
+        self.assertRaises(PulpCodedException, generate_iso.create_iso, '/target/dir',
+                          '/output/dir', 'prefix', workers=2)
+        self.assertEqual(3, generate_iso._make_iso.call_count)
+
+    @mock.patch.object(generate_iso, '_compute_filled_image_files', return_value=['list'])
+    def test_create_iso_fill_images(self, mock_compute_filled):
+        generate_iso.create_iso('/target/dir', '/output/dir', 'prefix', fill_images=True)
+
+        mock_compute_filled.assert_called_once_with(['files'],
+                                                    generate_iso.DVD_ISO_SIZE * 1024 * 1024)
+        self.assertEqual(0, generate_iso._compute_image_files.call_count)
+        self.assertEqual('list', generate_iso._make_iso.call_args[0][0])
+
 
 class TestMakeIso(unittest.TestCase):
     """
@@ -90,6 +129,17 @@ class TestMakeIso(unittest.TestCase):
         self.assertEqual(1, mock_close.call_count)
         self.assertEqual(1, mock_isdir.call_count)
 
+    @mock.patch('os.path.isdir', autospec=True, return_value=True)
+    @mock.patch('os.close', autospec=True)
+    @mock.patch('os.unlink', autospec=True)
+    @mock.patch('commands.getstatusoutput', autospec=True, return_value=(1, 'no space'))
+    @mock.patch('tempfile.mkstemp', autospec=True, return_value=('file_descriptor', 'spec_file'))
+    def test_mkisofs_failure(self, mock_mkstemp, mock_cmd, mock_unlink, mock_close, mock_isdir):
+        self.assertRaises(PulpCodedException, generate_iso._make_iso, [], '/target/dir',
+                          '/output/dir', 'prefix-01.iso')
+        # the pathspec file is still cleaned up
+        mock_unlink.assert_called_once_with('spec_file')
+
 
 class TestParseImageSize(unittest.TestCase):
     """
@@ -140,6 +190,32 @@ class TestComputeImageFiles(unittest.TestCase):
         self.assertEqual(images[1], [file_list[3][0]])
         self.assertEqual(images[2], [file_list[4][0]])
 
+    def test_empty(self):
+        self.assertEqual([], generate_iso._compute_image_files([], 5))
+
+    def test_filled(self):
+        # Setup
+        image_size = 5
+        file_list = [('path1', 1), ('path2', 2), ('path3', 2), ('path4', 4), ('path5', 3)]
+
+        # Test
+        images = generate_iso._compute_filled_image_files(file_list, image_size)
+
+        # Files are placed largest first, each into the first image with room for it
+        self.assertEqual(images, [['path4', 'path1'], ['path5', 'path2'], ['path3']])
+
+    def test_filled_fewer_images(self):
+        file_list = [('path1', 3), ('path2', 3), ('path3', 2), ('path4', 2)]
+
+        self.assertEqual(3, len(generate_iso._compute_image_files(file_list, 5)))
+        self.assertEqual(generate_iso._compute_filled_image_files(file_list, 5),
+                         [['path1', 'path3'], ['path2', 'path4']])
+
+    def test_filled_file_larger_than_image(self):
+        file_list = [('path1', 1), ('path2', 1000)]
+
+        self.assertRaises(ValueError, generate_iso._compute_filled_image_files, file_list, 5)
+
 
 class TestGetGraft(unittest.TestCase):
     """
@@ -11,9 +11,11 @@ from pulp.plugins.model import Unit
 
 from pulp_rpm.common.ids import TYPE_ID_RPM
 from pulp_rpm.plugins.distributors.yum.metadata.metadata import (
-    MetadataFileContext, PreGeneratedMetadataContext, REPO_DATA_DIR_NAME)
+    CHECKSUM_BUFFER_SIZE, MetadataFileContext, PreGeneratedMetadataContext, REPO_DATA_DIR_NAME,
+    checksum_file)
 from pulp_rpm.plugins.distributors.yum.metadata.prestodelta import (
     PrestodeltaXMLFileContext, PRESTO_DELTA_FILE_NAME)
+from pulp_rpm.plugins.distributors.yum.metadata.primary import PrimaryXMLFileContext
 from pulp_rpm.plugins.distributors.yum.metadata.repomd import (
     RepomdXMLFileContext, REPO_XML_NAME_SPACE, RPM_XML_NAME_SPACE, REPOMD_FILE_NAME)
 from pulp_rpm.plugins.distributors.yum.metadata.updateinfo import (
@@ -260,6 +262,57 @@ class YumDistributorMetadataTests(unittest.TestCase):
 
         self.assertEqual(context.metadata_file_path, path)
 
+    def test_finalize_checksums_calculated_while_writing(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, 'sha256')
+
+        context._open_metadata_file_handle()
+        context._write_xml_header()
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as file_handle:
+            content = file_handle.read()
+        self.assertEqual(context.checksum, hashlib.sha256(content).hexdigest())
+        self.assertEqual(context.size, len(content))
+        self.assertEqual(context.open_checksum, None)
+        self.assertEqual(context.open_size, None)
+
+    def test_finalize_checksums_calculated_while_writing_gzip(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, 'sha256')
+
+        context._open_metadata_file_handle()
+        context._write_xml_header()
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as file_handle:
+            content = file_handle.read()
+        self.assertEqual(context.checksum, hashlib.sha256(content).hexdigest())
+        self.assertEqual(context.size, len(content))
+        self.assertEqual(context.metadata_file_path,
+                         os.path.join(self.metadata_file_dir, context.checksum + '-test.xml.gz'))
+
+        file_handle = gzip.open(context.metadata_file_path)
+        open_content = file_handle.read()
+        file_handle.close()
+        self.assertEqual(open_content, '<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.assertEqual(context.open_checksum, hashlib.sha256(open_content).hexdigest())
+        self.assertEqual(context.open_size, len(open_content))
+
+    def test_checksum_file(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.txt')
+        content = 'a' * (CHECKSUM_BUFFER_SIZE + 10)
+        with open(path, 'wb') as file_handle:
+            file_handle.write(content)
+
+        with open(path, 'rb') as file_handle:
+            ret = checksum_file(file_handle, hashlib.sha1)
+
+        self.assertEqual(ret, (hashlib.sha1(content).hexdigest(), len(content)))
+
     # -- pre-generated metadata context tests ----------------------------------
 
     def test_pre_generated_metadata(self):
@@ -578,3 +631,77 @@ class YumDistributorMetadataTests(unittest.TestCase):
             self.assertEqual(
                 content.count('<open-size>%s</open-size>' % len(test_metadata_content)), 1)
             self.assertEqual(content.count('<open-checksum type="sha256">'), 1)
+
+    @patch('gzip.open')
+    def test_repomd_metadata_file_context(self, mock_gzip_open):
+
+        path = os.path.join(self.metadata_file_dir, REPO_DATA_DIR_NAME, REPOMD_FILE_NAME)
+        metadata_path = os.path.join(self.metadata_file_dir, REPO_DATA_DIR_NAME, 'other.xml.gz')
+        metadata_context = MetadataFileContext(metadata_path, 'sha256')
+        metadata_context._open_metadata_file_handle()
+        metadata_context._write_xml_header()
+        metadata_context.finalize()
+
+        context = RepomdXMLFileContext(self.metadata_file_dir)
+        context._open_metadata_file_handle()
+        with patch('__builtin__.open') as mock_open:
+            context.add_metadata_file_context('other', metadata_context)
+        context._close_metadata_file_handle()
+
+        # the metadata file was not read again
+        self.assertEqual(mock_open.call_count, 0)
+        self.assertEqual(mock_gzip_open.call_count, 0)
+
+        with open(path, 'r') as repomd_handle:
+            data_element = et.fromstring(repomd_handle.read())
+        self.assertEqual(data_element.find('checksum').text, metadata_context.checksum)
+        self.assertEqual(data_element.find('size').text, str(metadata_context.size))
+        self.assertEqual(data_element.find('open-checksum').text, metadata_context.open_checksum)
+        self.assertEqual(data_element.find('open-size').text, str(metadata_context.open_size))
+
+    @patch('pulp_rpm.plugins.distributors.yum.metadata.repomd.RepomdXMLFileContext.'
+           'add_metadata_file_metadata')
+    def test_repomd_metadata_file_context_other_checksum_type(self, mock_add):
+
+        metadata_path = os.path.join(self.metadata_file_dir, REPO_DATA_DIR_NAME, 'other.xml.gz')
+        metadata_context = MetadataFileContext(metadata_path, 'sha1')
+        metadata_context._open_metadata_file_handle()
+        metadata_context.finalize()
+
+        context = RepomdXMLFileContext(self.metadata_file_dir, 'sha256')
+        context.add_metadata_file_context('other', metadata_context)
+
+        # the checksums must be calculated again with the right type
+        mock_add.assert_called_once_with('other', metadata_context.metadata_file_path, None)
+
+    def test_repomd_metadata_file_context_fast_forward(self):
+        path = os.path.join(self.metadata_file_dir, REPO_DATA_DIR_NAME, REPOMD_FILE_NAME)
+        primary_context = PrimaryXMLFileContext(self.metadata_file_dir, 1, 'sha256')
+        primary_context.initialize()
+        primary_context.add_unit_metadata(Unit(TYPE_ID_RPM, {}, {'repodata': {
+            'primary': '<package type="rpm"><name>foo</name></package>'}}, ''))
+        primary_context.finalize()
+
+        context = RepomdXMLFileContext(self.metadata_file_dir, 'sha256')
+        context._open_metadata_file_handle()
+        with patch('__builtin__.open') as mock_open:
+            with patch('gzip.open') as mock_gzip_open:
+                with patch.object(context, 'add_metadata_file_metadata') as mock_add:
+                    context.add_metadata_file_context('primary', primary_context)
+        context._close_metadata_file_handle()
+
+        # the primary file was not read again
+        self.assertEqual(mock_add.call_count, 0)
+        self.assertEqual(mock_open.call_count, 0)
+        self.assertEqual(mock_gzip_open.call_count, 0)
+
+        with gzip.open(primary_context.metadata_file_path) as primary_handle:
+            content = primary_handle.read()
+        with open(path, 'r') as repomd_handle:
+            data_element = et.fromstring(repomd_handle.read())
+        self.assertEqual(data_element.find('checksum').text, primary_context.checksum)
+        self.assertEqual(data_element.find('size').text,
+                         str(os.path.getsize(primary_context.metadata_file_path)))
+        self.assertEqual(data_element.find('open-checksum').text,
+                         hashlib.sha256(content).hexdigest())
+        self.assertEqual(data_element.find('open-size').text, str(len(content)))
@@ -0,0 +1,68 @@
+import time
+import unittest
+
+import mock
+
+from pulp_rpm.plugins.distributors.yum.metadata import pipeline
+
+
+class TestContextWriterThread(unittest.TestCase):
+    def setUp(self):
+        self.context = mock.MagicMock(metadata_file_path='/a/b.xml.gz')
+
+    def test_writes_in_order(self):
+        writer = pipeline.ContextWriterThread(self.context, queue_size=2)
+        writer.start()
+
+        for unit in range(10):
+            writer.add_unit_metadata(unit)
+        writer.finish()
+
+        self.assertFalse(writer.is_alive())
+        self.assertEqual([c[0][0] for c in self.context.add_unit_metadata.call_args_list],
+                         range(10))
+
+    def test_error_raised_by_finish(self):
+        self.context.add_unit_metadata.side_effect = ValueError('bad unit')
+        writer = pipeline.ContextWriterThread(self.context, queue_size=1)
+        writer.start()
+
+        # the producer is never blocked by a writer that has failed
+        for unit in range(10):
+            try:
+                writer.add_unit_metadata(unit)
+            except ValueError:
+                pass
+
+        self.assertRaises(ValueError, writer.finish)
+        self.assertEqual(self.context.add_unit_metadata.call_count, 1)
+
+    def test_error_raised_by_add(self):
+        self.context.add_unit_metadata.side_effect = ValueError('bad unit')
+        writer = pipeline.ContextWriterThread(self.context)
+        writer.start()
+        writer.add_unit_metadata('a')
+        # wait for the first unit to be processed
+        while writer.exc_info is None:
+            time.sleep(0.01)
+
+        self.assertRaises(ValueError, writer.add_unit_metadata, 'b')
+        self.assertRaises(ValueError, writer.finish)
+
+
+class TestFinishAll(unittest.TestCase):
+    def test_all_finished_before_raising(self):
+        good_context = mock.MagicMock(metadata_file_path='/a/good.xml.gz')
+        bad_context = mock.MagicMock(metadata_file_path='/a/bad.xml.gz')
+        bad_context.add_unit_metadata.side_effect = ValueError('bad unit')
+        writers = [pipeline.ContextWriterThread(bad_context),
+                   pipeline.ContextWriterThread(good_context)]
+        for writer in writers:
+            writer.start()
+            writer.add_unit_metadata('a')
+
+        self.assertRaises(ValueError, pipeline.finish_all, writers)
+
+        for writer in writers:
+            self.assertFalse(writer.is_alive())
+        good_context.add_unit_metadata.assert_called_once_with('a')
@@ -115,3 +115,12 @@ class AddUnitMetadataTests(UpdateinfoXMLFileContextTests):
         self.assertEqual(self.updateinfo_xml_file_context.metadata_file_handle.write.call_count, 1)
         xml = self.updateinfo_xml_file_context.metadata_file_handle.write.mock_calls[0][1][0]
         self.assertTrue(re.search('<description */>', xml) is not None)
+
+    def test_uses_pre_rendered_snippet(self):
+        metadata = {'repodata': {'updateinfo': u'<update>\xfc</update>'}}
+        erratum_unit = model.Unit(ids.TYPE_ID_ERRATA, {'id': 'RHSA-2014:0042'}, metadata, None)
+
+        self.updateinfo_xml_file_context.add_unit_metadata(erratum_unit)
+
+        self.updateinfo_xml_file_context.metadata_file_handle.write.assert_called_once_with(
+            '<update>\xc3\xbc</update>\n')
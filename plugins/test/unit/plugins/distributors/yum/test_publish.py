@@ -22,6 +22,7 @@ from pulp_rpm.common import constants
 from pulp_rpm.common.ids import (
     TYPE_ID_PKG_GROUP, TYPE_ID_PKG_CATEGORY, TYPE_ID_DISTRO, TYPE_ID_DRPM, TYPE_ID_RPM,
     TYPE_ID_YUM_REPO_METADATA_FILE, YUM_DISTRIBUTOR_ID, EXPORT_DISTRIBUTOR_ID)
+from pulp_rpm.plugins.distributors.export_distributor import generate_iso
 from pulp_rpm.plugins.distributors.yum import configuration, publish
 
 
@@ -207,10 +208,23 @@ class ExportRepoPublisherTests(BaseYumDistributorPublishStepTests):
         self.assertTrue(isinstance(step.children[-3], publish.GenerateListingFileStep))
         self.assertTrue(isinstance(step.children[-2], publish.CreateIsoStep))
         self.assertTrue(isinstance(step.children[-1], publish.AtomicDirectoryPublishStep))
+        self.assertEquals(step.children[-2].workers, generate_iso.MKISOFS_WORKERS)
+        self.assertFalse(step.children[-2].fill_images)
 
         self.assertEquals(step.children[0].association_filters, 'foo')
         self.assertEquals(step.children[1].association_filters, 'foo')
 
+    def test_init_with_iso_config(self):
+        config = PluginCallConfiguration(None, {constants.ISO_WORKERS_KEYWORD: '4',
+                                                constants.ISO_FILL_KEYWORD: True})
+        step = publish.ExportRepoPublisher(self.publisher.get_repo(),
+                                           self.publisher.get_conduit(),
+                                           config,
+                                           YUM_DISTRIBUTOR_ID)
+        self.assertTrue(isinstance(step.children[-2], publish.CreateIsoStep))
+        self.assertEquals(step.children[-2].workers, 4)
+        self.assertTrue(step.children[-2].fill_images)
+
 
 class ExportRepoGroupPublisherTests(BaseYumDistributorPublishStepTests):
 
@@ -265,7 +279,8 @@ class ExportRepoGroupPublisherTests(BaseYumDistributorPublishStepTests):
 
     @mock.patch('pulp_rpm.plugins.distributors.yum.publish.RepoQueryManager')
     def test_init_with_empty_repos_iso(self, mock_query_manager):
-        config = PluginCallConfiguration(None, {})
+        config = PluginCallConfiguration(None, {constants.ISO_WORKERS_KEYWORD: 3,
+                                                constants.ISO_FILL_KEYWORD: True})
         repo_group = mock.Mock(repo_ids=[],
                                working_dir=self.working_dir)
         mock_query_manager.return_value.find_by_id_list.return_value = []
@@ -277,6 +292,8 @@ class ExportRepoGroupPublisherTests(BaseYumDistributorPublishStepTests):
         self.assertTrue(isinstance(step.children[1], publish.CreateIsoStep))
         self.assertTrue(isinstance(step.children[2], publish.AtomicDirectoryPublishStep))
         self.assertEquals(len(step.children), 3)
+        self.assertEquals(step.children[1].workers, 3)
+        self.assertTrue(step.children[1].fill_images)
 
     @mock.patch('pulp_rpm.plugins.distributors.yum.publish.RepoQueryManager')
     @mock.patch('pulp_rpm.plugins.distributors.yum.publish.export_utils.create_date_range_filter')
@@ -460,7 +477,19 @@ class CreateIsoStepTests(BaseYumDistributorPublishStepTests):
             constants.ISO_PREFIX_KEYWORD: 'flux'
         })
         step.process_main()
-        mock_create.assert_called_once_with('foo', 'bar', 'flux', 5)
+        mock_create.assert_called_once_with('foo', 'bar', 'flux', 5,
+                                            workers=generate_iso.MKISOFS_WORKERS,
+                                            fill_images=False)
+
+    @mock.patch('pulp_rpm.plugins.distributors.yum.publish.generate_iso.create_iso')
+    def test_process_main_workers(self, mock_create):
+        step = publish.CreateIsoStep('foo', 'bar', workers=4, fill_images=True)
+        step.config = PluginCallConfiguration(None, {
+            constants.ISO_SIZE_KEYWORD: 5,
+            constants.ISO_PREFIX_KEYWORD: 'flux'
+        })
+        step.process_main()
+        mock_create.assert_called_once_with('foo', 'bar', 'flux', 5, workers=4, fill_images=True)
 
 
 class GenerateListingsFilesStep(BaseYumDistributorPublishStepTests):
@@ -518,7 +547,7 @@ class PublishCompsStepTests(BaseYumDistributorPublishStepTests):
         step.finalize()
         step.comps_context.finalize.assert_called_once_with()
         step.parent.repomd_file_context. \
-            add_metadata_file_metadata.assert_called_once_with('group', mock.ANY, mock.ANY)
+            add_metadata_file_context.assert_called_once_with('group', step.comps_context)
 
     def test_finalize_no_initialization(self):
         """
@@ -894,6 +923,30 @@ class PublishRpmStepTests(BaseYumDistributorPublishStepTests):
         unit_path = os.path.join(package_dir, unit.unit_key['name'])
         self.assertTrue(os.path.exists(unit_path))
 
+    @mock.patch('pulp_rpm.plugins.distributors.yum.publish.PrimaryXMLFileContext')
+    @mock.patch('pulp_rpm.plugins.distributors.yum.publish.OtherXMLFileContext')
+    @mock.patch('pulp_rpm.plugins.distributors.yum.publish.FilelistsXMLFileContext')
+    def test_metadata_written_by_threads(self, mock_filelists, mock_other, mock_primary):
+        unit = self._generate_rpm('one')
+        step = publish.PublishRpmStep(mock.Mock(package_dirs=[]))
+        step.parent = self.publisher
+        step.parent.repomd_file_context = mock.Mock()
+        step._get_total = mock.Mock(return_value=1)
+
+        step.initialize()
+        threads = list(step.writers)
+        step.process_unit(unit)
+        step.finalize()
+
+        self.assertEqual(len(threads), 3)
+        for thread in threads:
+            self.assertFalse(thread.is_alive())
+        for mock_context in (mock_filelists, mock_other, mock_primary):
+            context = mock_context.return_value
+            context.add_unit_metadata.assert_called_once_with(unit)
+            context.finalize.assert_called_once_with()
+        self.assertEqual(step.writers, [])
+
     def test_finalize_no_initialization(self):
         """
         Test to ensure that calling finalize before initialize_metadata() doesn't
@@ -925,7 +978,7 @@ class PublishErrataStepTests(BaseYumDistributorPublishStepTests):
         step.finalize()
         step.context.finalize.assert_called_once_with()
         step.parent.repomd_file_context. \
-            add_metadata_file_metadata.assert_called_once_with('updateinfo', mock.ANY, mock.ANY)
+            add_metadata_file_context.assert_called_once_with('updateinfo', step.context)
 
     def test_finalize_no_initialization(self):
         """
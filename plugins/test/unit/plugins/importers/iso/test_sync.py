@@ -247,6 +247,56 @@ class TestISOSyncRun(PulpRPMTests):
         # The download should not fail
         self.assertEqual(download_failed.call_count, 0)
 
+    @patch('pulp_rpm.plugins.importers.iso.sync.ISOSyncRun.download_failed')
+    def test_download_succeeded_digested(self, download_failed):
+        """
+        Assert that an ISO whose size and checksum were calculated while it was downloaded is
+        validated with them, without reading the file again.
+        """
+        # the file does not even exist
+        destination = os.path.join(self.temp_dir, 'test.iso')
+        unit = MagicMock()
+        unit.storage_path = destination
+        iso = models.ISO('test.iso', 16,
+                         'f02d5a72cd2d57fa802840a76b44c6c6920a8b8e6b90b20e26c03876275069e0',
+                         unit)
+        iso.url = 'http://fake.com/test.iso'
+        iso.bytes_downloaded = iso.size
+        report = DownloadReport(iso.url, destination, iso)
+        report.bytes_downloaded = iso.size
+        digest_file = MagicMock(complete=True, size=16)
+        digest_file.hexdigest.return_value = iso.checksum
+        self.iso_sync_run._digests.opened(destination, digest_file)
+        self.iso_sync_run.progress_report._state = SyncProgressReport.STATE_ISOS_IN_PROGRESS
+
+        self.iso_sync_run.download_succeeded(report)
+
+        self.sync_conduit.save_unit.assert_any_call(unit)
+        self.assertEqual(download_failed.call_count, 0)
+        self.assertTrue(self.iso_sync_run._digests.pop(destination) is None)
+
+    @patch('pulp_rpm.plugins.importers.iso.sync.ISOSyncRun.download_failed')
+    def test_download_succeeded_digest_fails_checksum(self, download_failed):
+        destination = os.path.join(self.temp_dir, 'test.iso')
+        unit = MagicMock()
+        unit.storage_path = destination
+        iso = models.ISO('test.iso', 16,
+                         'f02d5a72cd2d57fa802840a76b44c6c6920a8b8e6b90b20e26c03876275069e0',
+                         unit)
+        iso.url = 'http://fake.com/test.iso'
+        iso.bytes_downloaded = iso.size
+        report = DownloadReport(iso.url, destination, iso)
+        report.bytes_downloaded = iso.size
+        digest_file = MagicMock(complete=True, size=16)
+        digest_file.hexdigest.return_value = 'wrong checksum'
+        self.iso_sync_run._digests.opened(destination, digest_file)
+        self.iso_sync_run.progress_report._state = SyncProgressReport.STATE_ISOS_IN_PROGRESS
+
+        self.iso_sync_run.download_succeeded(report)
+
+        self.assertEqual(self.sync_conduit.save_unit.call_count, 0)
+        download_failed.assert_called_once_with(report)
+
     @patch('pulp_rpm.plugins.importers.iso.sync.ISOSyncRun.download_failed')
     def test_download_succeeded_honors_validate_units_set_false(self, download_failed):
         """
@@ -705,6 +755,30 @@ class TestISOSyncRun(PulpRPMTests):
         self.assertEqual(remote_missing_iso.unit_key,
                          {'name': 'test4.iso', 'size': 4, 'checksum': 'sum4'})
 
+    def test__filter_missing_isos_scoped_search(self):
+        """
+        Assert that only the units in the manifest are searched for among all of the units in Pulp.
+        """
+        manifest = StringIO('test.iso,%s,16\ntest3.iso,sum3,34' %
+                            self.existing_units[0].unit_key['checksum'])
+        manifest = models.ISOManifest(manifest, 'http://test.com')
+        sync_conduit = importer_mocks.get_sync_conduit(pkg_dir=self.pkg_dir, existing_units=[],
+                                                       pulp_units=self.existing_units)
+        iso_sync_run = ISOSyncRun(sync_conduit, self.config)
+
+        local_missing_isos, local_available_isos, remote_missing_isos = \
+            iso_sync_run._filter_missing_isos(manifest)
+
+        self.assertEqual(sync_conduit.search_all_units.call_count, 1)
+        criteria = sync_conduit.search_all_units.call_args[0][1]
+        self.assertEqual(criteria['filters'], {'$or': [
+            {'name': 'test.iso', 'checksum': self.existing_units[0].unit_key['checksum'],
+             'size': 16},
+            {'name': 'test3.iso', 'checksum': 'sum3', 'size': 34}]})
+        self.assertEqual([iso.name for iso in local_missing_isos], ['test3.iso'])
+        self.assertEqual(local_available_isos, [self.existing_units[0]])
+        self.assertEqual(remote_missing_isos, [])
+
     def test__filter_missing_isos_available_isos(self):
         """
         Test that when there are units in Pulp that match those in the manifest, but that are
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+import mock
+from nectar.request import DownloadRequest
+from pulp.plugins.util import verification
+
+from pulp_rpm.plugins.importers import download
+
+
+DATA = 'some data that was downloaded'
+
+
+class TestDigestFile(unittest.TestCase):
+    def test_write(self):
+        file_handle = StringIO()
+        digest_file = download.DigestFile(file_handle, verification.TYPE_SHA256)
+
+        digest_file.write(DATA[:10])
+        digest_file.write(DATA[10:])
+
+        self.assertEqual(file_handle.getvalue(), DATA)
+        self.assertEqual(digest_file.size, len(DATA))
+        self.assertEqual(digest_file.hexdigest(), hashlib.sha256(DATA).hexdigest())
+        self.assertTrue(digest_file.complete)
+
+    def test_seek(self):
+        digest_file = download.DigestFile(StringIO(), verification.TYPE_SHA256)
+        digest_file.write(DATA)
+
+        digest_file.seek(0)
+
+        self.assertFalse(digest_file.complete)
+
+    def test_not_at_start(self):
+        file_handle = StringIO()
+        file_handle.write(DATA)
+
+        digest_file = download.DigestFile(file_handle, verification.TYPE_SHA256)
+
+        self.assertFalse(digest_file.complete)
+
+    def test_passes_through(self):
+        file_handle = mock.MagicMock()
+        file_handle.tell.return_value = 0
+        digest_file = download.DigestFile(file_handle, verification.TYPE_MD5)
+
+        digest_file.close()
+
+        file_handle.close.assert_called_once_with()
+
+
+class TestDownloadDigests(unittest.TestCase):
+    def setUp(self):
+        self.digests = download.DownloadDigests()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.tmp_dir, 'foo.rpm')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_wrap_not_expected(self):
+        request = DownloadRequest('http://fake.com/foo.rpm', self.destination, 'data')
+
+        self.assertTrue(self.digests.wrap(request) is request)
+
+    def test_wrap_unsupported_checksum_type(self):
+        self.digests.expect(self.destination, 'crc32')
+        request = DownloadRequest('http://fake.com/foo.rpm', self.destination, 'data')
+
+        self.assertTrue(self.digests.wrap(request) is request)
+
+    def test_wrap_file_object(self):
+        request = DownloadRequest('http://fake.com/foo.rpm', StringIO(), 'data')
+
+        self.assertTrue(self.digests.wrap(request) is request)
+
+    def test_download(self):
+        self.digests.expect(self.destination, verification.TYPE_SHA1)
+        request = self.digests.wrap(
+            DownloadRequest('http://fake.com/foo.rpm', self.destination, 'data'))
+
+        # this is what a downloader does
+        file_handle = request.initialize_file_handle()
+        file_handle.write(DATA)
+        file_handle.close()
+
+        self.assertEqual(request.url, 'http://fake.com/foo.rpm')
+        self.assertEqual(request.data, 'data')
+        with open(self.destination) as f:
+            self.assertEqual(f.read(), DATA)
+        digest_file = self.digests.pop(self.destination)
+        self.assertEqual(digest_file.checksum_type, verification.TYPE_SHA1)
+        self.assertEqual(digest_file.hexdigest(), hashlib.sha1(DATA).hexdigest())
+        # the download is forgotten
+        self.assertTrue(self.digests.pop(self.destination) is None)
+
+    def test_pop_incomplete(self):
+        digest_file = mock.MagicMock(complete=False)
+        self.digests.opened(self.destination, digest_file)
+
+        self.assertTrue(self.digests.pop(self.destination) is None)
+
+    def test_wrap_downloader(self):
+        downloader = mock.MagicMock()
+        download_method = downloader.download
+        self.digests.expect(self.destination, verification.TYPE_SHA256)
+        requests = [DownloadRequest('http://fake.com/foo.rpm', self.destination),
+                    DownloadRequest('http://fake.com/bar.rpm', 'bar.rpm')]
+
+        self.digests.wrap_downloader(downloader)
+        downloader.download(requests)
+
+        wrapped = list(download_method.call_args[0][0])
+        self.assertTrue(isinstance(wrapped[0], download.DigestDownloadRequest))
+        self.assertTrue(wrapped[1] is requests[1])
+
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+        self.digest_file = download.DigestFile(StringIO(), verification.TYPE_SHA256)
+        self.digest_file.write(DATA)
+
+    def test_verify_size(self):
+        download.verify_size(self.digest_file, 'foo.rpm', len(DATA))
+
+    def test_verify_size_wrong(self):
+        try:
+            download.verify_size(self.digest_file, 'foo.rpm', 3)
+        except verification.VerificationException, e:
+            self.assertEqual(e[0], len(DATA))
+        else:
+            self.fail('size should not have been verified')
+
+    @mock.patch('__builtin__.open', autospec=True)
+    @mock.patch('pulp.plugins.util.verification.verify_size')
+    def test_verify_size_without_digest(self, mock_verify_size, mock_open):
+        download.verify_size(None, 'foo.rpm', 3)
+
+        mock_open.assert_called_once_with('foo.rpm')
+        mock_verify_size.assert_called_once_with(mock_open.return_value.__enter__.return_value,
+                                                 3)
+
+    def test_verify_checksum(self):
+        download.verify_checksum(self.digest_file, 'foo.rpm', verification.TYPE_SHA256,
+                                 hashlib.sha256(DATA).hexdigest())
+
+    def test_verify_checksum_wrong(self):
+        try:
+            download.verify_checksum(self.digest_file, 'foo.rpm', verification.TYPE_SHA256,
+                                     'abc')
+        except verification.VerificationException, e:
+            self.assertEqual(e[0], hashlib.sha256(DATA).hexdigest())
+        else:
+            self.fail('checksum should not have been verified')
+
+    @mock.patch('__builtin__.open', autospec=True)
+    @mock.patch('pulp.plugins.util.verification.verify_checksum')
+    def test_verify_checksum_other_type(self, mock_verify_checksum, mock_open):
+        download.verify_checksum(self.digest_file, 'foo.rpm', verification.TYPE_SHA1, 'abc')
+
+        # the file is read for a checksum of another type
+        mock_open.assert_called_once_with('foo.rpm')
+        mock_verify_checksum.assert_called_once_with(
+            mock_open.return_value.__enter__.return_value, verification.TYPE_SHA1, 'abc')
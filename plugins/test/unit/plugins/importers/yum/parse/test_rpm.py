@@ -20,6 +20,66 @@ class TesGetPackageXml(unittest.TestCase):
         util.compare_dict(result, {})
 
 
+class TestGetPackageMetadata(unittest.TestCase):
+    """
+    tests for the get_package_metadata method
+    """
+
+    def setUp(self):
+        self.po = Mock()
+        self.po.xml_dump_primary_metadata.return_value = '<location href="a/b.rpm"/>'
+        self.po.provides = [('foo', 'EQ', ('0', '1.0', '2')), ('bar', None, (None, None, None))]
+        self.po.provides_names = ['foo', 'bar']
+        self.po.filelist = ['/usr/bin/foo']
+        self.po.dirlist = []
+        self.po.ghostlist = []
+        self.po._requires_with_pre.return_value = [
+            ('rpmlib(CompressedFileNames)', 'LE', ('0', '3.0.4', '1'), 0),
+            ('/usr/bin/foo', None, (None, None, None), 0),
+            ('foo', 'GE', (None, '2.0', None), 0),
+            ('bash', 'GE', ('0', '4.1', None), 1),
+            ('baz', None, (None, None, None), 0),
+        ]
+        # the package's own foo does not satisfy its requirement for foo
+        self.po.checkPrco.return_value = False
+
+    @patch('pulp_rpm.plugins.importers.yum.parse.rpm.yumbased')
+    def test_get_package_metadata_yum_exception(self, mock_yumbased):
+        mock_yumbased.CreateRepoPackage.side_effect = Exception()
+        result = rpm.get_package_metadata("/bad/package/path")
+        util.compare_dict(result, {})
+
+    @patch('pulp_rpm.plugins.importers.yum.parse.rpm.yumbased')
+    def test_provides_and_requires(self, mock_yumbased):
+        mock_yumbased.CreateRepoPackage.return_value = self.po
+
+        result = rpm.get_package_metadata('/a/b.rpm')
+
+        self.assertEqual(result['provides'], [
+            {'name': 'bar', 'epoch': None, 'version': None, 'release': None, 'flags': None},
+            {'name': 'foo', 'epoch': '0', 'version': '1.0', 'release': '2', 'flags': 'EQ'},
+        ])
+        # rpmlib features and unversioned requires the package provides are left out
+        self.assertEqual(result['requires'], [
+            {'name': 'bash', 'epoch': '0', 'version': '4.1', 'release': None, 'flags': 'GE'},
+            {'name': 'baz', 'epoch': None, 'version': None, 'release': None, 'flags': None},
+            {'name': 'foo', 'epoch': None, 'version': '2.0', 'release': None, 'flags': 'GE'},
+        ])
+        self.po.checkPrco.assert_called_once_with('provides', ('foo', 'GE', (None, '2.0', None)))
+        self.assertEqual(result['repodata']['primary'], '<location href="b.rpm"/>')
+
+    @patch('pulp_rpm.plugins.importers.yum.parse.rpm.yumbased')
+    def test_checksum(self, mock_yumbased):
+        mock_yumbased.CreateRepoPackage.return_value = self.po
+
+        rpm.get_package_metadata('/a/b.rpm', 'sha1', 'abc')
+
+        self.assertEqual(mock_yumbased.CreateRepoPackage.call_args[0][1], '/a/b.rpm')
+        self.assertEqual(mock_yumbased.CreateRepoPackage.call_args[1], {'sumtype': 'sha1'})
+        self.assertEqual(self.po._checksum, 'abc')
+        self.assertEqual(self.po._checksums, [('sha1', 'abc', 1)])
+
+
 class TestStringToUnicode(unittest.TestCase):
     """
     tests for the string_to_unicode
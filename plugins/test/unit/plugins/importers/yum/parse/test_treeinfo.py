@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import errno
+import hashlib
 import os
+import shutil
+import tempfile
 import unittest
 
 from mock import patch, MagicMock, Mock
 
-from pulp_rpm.common import constants
+from pulp.plugins.model import Unit
+from pulp_rpm.common import constants, ids
 from pulp.server.exceptions import PulpCodedValidationException
 from pulp_rpm.plugins.db import models
 from pulp_rpm.plugins.importers.yum.parse import treeinfo
@@ -19,6 +24,9 @@ DISTRIBUTION_BAD_SYNTAX_FILE = os.path.join(DISTRIBUTION_DATA_PATH,
 DISTRIBUTION_BAD_SCHEMA_VALIDATION_FILE = os.path.join(DISTRIBUTION_DATA_PATH,
                                                        'distribution_bad_schema_validation.xml')
 
+# checksum of the existing boot.iso in TestLinkExistingFiles
+BOOT_CHECKSUM = hashlib.sha1('boot').hexdigest()
+
 
 class TestRealData(unittest.TestCase):
     def test_rhel5(self):
@@ -150,3 +158,119 @@ class TestParseTreefile(unittest.TestCase):
         model, files = treeinfo.parse_treefile('/some/path')
 
         self.assertEqual(files[0]['checksumtype'], 'sha1')
+
+
+class TestLinkExistingFiles(unittest.TestCase):
+    """
+    This class contains tests for the find_existing_files() and link_existing_files() functions.
+    """
+
+    def setUp(self):
+        self.existing_dir = tempfile.mkdtemp()
+        self.storage_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.existing_dir, 'images'))
+        with open(os.path.join(self.existing_dir, 'images', 'boot.iso'), 'w') as boot_iso:
+            boot_iso.write('boot')
+        self.existing_unit = Unit(ids.TYPE_ID_DISTRO, {'id': 'ks-foo'}, {'files': [
+            {'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM, 'checksumtype': 'sha',
+             'size': 4},
+            {'relativepath': 'images/install.img', 'checksum': None, 'checksumtype': None,
+             'size': 7},
+        ]}, self.existing_dir)
+        self.feed = 'http://www.foo.bar/flux/'
+
+    def tearDown(self):
+        shutil.rmtree(self.existing_dir)
+        shutil.rmtree(self.storage_path)
+
+    def test_find_existing_files(self):
+        existing_files = treeinfo.find_existing_files([self.existing_unit])
+
+        # files without checksums cannot be matched
+        self.assertEqual(existing_files, {
+            ('sha1', BOOT_CHECKSUM): (os.path.join(self.existing_dir, 'images/boot.iso'), 4)})
+
+    def test_link_unchanged(self):
+        files = [{'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM,
+                  'checksumtype': 'sha1'},
+                 {'relativepath': 'images/install.img', 'checksum': 'def',
+                  'checksumtype': 'sha1'},
+                 {'relativepath': 'images/pxeboot/vmlinuz', 'checksum': None,
+                  'checksumtype': None}]
+        existing_files = treeinfo.find_existing_files([self.existing_unit])
+
+        to_download, reports = treeinfo.link_existing_files(files, existing_files, self.feed,
+                                                            self.storage_path)
+
+        self.assertEqual(to_download, files[1:])
+        self.assertEqual(len(reports), 1)
+        destination = os.path.join(self.storage_path, 'images/boot.iso')
+        self.assertEqual(reports[0].url, os.path.join(self.feed, 'images/boot.iso'))
+        self.assertEqual(reports[0].destination, destination)
+        self.assertTrue(reports[0].data is files[0])
+        self.assertEqual(reports[0].total_bytes, 4)
+        self.assertEqual(os.stat(destination).st_ino,
+                         os.stat(os.path.join(self.existing_dir, 'images/boot.iso')).st_ino)
+
+    def test_existing_file_missing(self):
+        os.remove(os.path.join(self.existing_dir, 'images', 'boot.iso'))
+        files = [{'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM,
+                  'checksumtype': 'sha1'}]
+        existing_files = treeinfo.find_existing_files([self.existing_unit])
+
+        to_download, reports = treeinfo.link_existing_files(files, existing_files, self.feed,
+                                                            self.storage_path)
+
+        self.assertEqual(to_download, files)
+        self.assertEqual(reports, [])
+
+    def test_existing_file_wrong_size(self):
+        with open(os.path.join(self.existing_dir, 'images', 'boot.iso'), 'w') as boot_iso:
+            boot_iso.write('truncated')
+        files = [{'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM,
+                  'checksumtype': 'sha1'}]
+        existing_files = treeinfo.find_existing_files([self.existing_unit])
+
+        to_download, reports = treeinfo.link_existing_files(files, existing_files, self.feed,
+                                                            self.storage_path)
+
+        self.assertEqual(to_download, files)
+        self.assertEqual(reports, [])
+
+    def test_existing_file_wrong_checksum(self):
+        with open(os.path.join(self.existing_dir, 'images', 'boot.iso'), 'w') as boot_iso:
+            boot_iso.write('BOOT')
+        files = [{'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM,
+                  'checksumtype': 'sha1'}]
+        existing_files = treeinfo.find_existing_files([self.existing_unit])
+
+        to_download, reports = treeinfo.link_existing_files(files, existing_files, self.feed,
+                                                            self.storage_path)
+
+        self.assertEqual(to_download, files)
+        self.assertEqual(reports, [])
+        self.assertFalse(os.path.exists(os.path.join(self.storage_path, 'images/boot.iso')))
+
+    @patch('os.link', autospec=True)
+    def test_copied_across_filesystems(self, mock_link):
+        mock_link.side_effect = OSError(errno.EXDEV, 'Invalid cross-device link')
+        files = [{'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM,
+                  'checksumtype': 'sha1'}]
+        existing_files = treeinfo.find_existing_files([self.existing_unit])
+
+        to_download, reports = treeinfo.link_existing_files(files, existing_files, self.feed,
+                                                            self.storage_path)
+
+        self.assertEqual(to_download, [])
+        with open(os.path.join(self.storage_path, 'images/boot.iso')) as boot_iso:
+            self.assertEqual(boot_iso.read(), 'boot')
+
+    def test_no_existing_files(self):
+        files = [{'relativepath': 'images/boot.iso', 'checksum': BOOT_CHECKSUM,
+                  'checksumtype': 'sha1'}]
+
+        to_download, reports = treeinfo.link_existing_files(files, {}, self.feed,
+                                                            self.storage_path)
+
+        self.assertTrue(to_download is files)
+        self.assertEqual(reports, [])
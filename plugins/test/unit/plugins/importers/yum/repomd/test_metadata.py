@@ -9,6 +9,7 @@ import unittest
 import mock
 from nectar.config import DownloaderConfig
 
+from pulp_rpm.plugins.db import models
 from pulp_rpm.plugins.importers.yum.repomd import metadata
 
 
@@ -98,6 +99,127 @@ class TestMetadataFiles(unittest.TestCase):
         mock_change_location_tag.assert_called_once_with(raw_xml, model.relative_path)
         self.assertEquals('baz', model.metadata['repodata']['primary'])
 
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.metadata.gdbm.open')
+    def test_add_repodata_keeps_dbs_open(self, mock_open):
+        self.metadata_files.dbs = {'filelists': '/a/filelists.db', 'other': '/a/other.db'}
+        mock_open.side_effect = lambda path, mode: {
+            '/a/filelists.db': {FOO_DB_KEY: FOO_FILELISTS_XML},
+            '/a/other.db': {FOO_DB_KEY: FOO_OTHER_XML},
+        }[path]
+
+        for i in range(3):
+            model = _foo_model()
+            self.metadata_files.add_repodata(model)
+            self.assertEqual(model.metadata['files'], {'file': ['/usr/bin/foo'], 'dir': []})
+            self.assertEqual(model.metadata['changelog'], [[1234, 'me', 'initial']])
+            self.assertEqual(model.metadata['repodata']['filelists'], FOO_FILELISTS_XML)
+            self.assertEqual(model.metadata['repodata']['other'], FOO_OTHER_XML)
+
+        # each database was only opened once, for reading
+        self.assertEqual(mock_open.call_count, 2)
+        mock_open.assert_any_call('/a/filelists.db', 'r')
+        mock_open.assert_any_call('/a/other.db', 'r')
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.metadata.gdbm.open')
+    def test_prefetch_repodata(self, mock_open):
+        self.metadata_files.dbs = {'filelists': '/a/filelists.db', 'other': '/a/other.db'}
+        dbs = {
+            '/a/filelists.db': mock.MagicMock(),
+            '/a/other.db': mock.MagicMock(),
+        }
+        dbs['/a/filelists.db'].__getitem__.return_value = FOO_FILELISTS_XML
+        dbs['/a/other.db'].__getitem__.return_value = FOO_OTHER_XML
+        mock_open.side_effect = lambda path, mode: dbs[path]
+
+        self.metadata_files.prefetch_repodata([_foo_model()])
+        model = _foo_model()
+        self.metadata_files.add_repodata(model)
+
+        # each snippet was read once, by the prefetch
+        dbs['/a/filelists.db'].__getitem__.assert_called_once_with(FOO_DB_KEY)
+        dbs['/a/other.db'].__getitem__.assert_called_once_with(FOO_DB_KEY)
+        self.assertEqual(model.metadata['changelog'], [[1234, 'me', 'initial']])
+
+        # a prefetched snippet is only used once
+        self.metadata_files.add_repodata(_foo_model())
+        self.assertEqual(dbs['/a/other.db'].__getitem__.call_count, 2)
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.metadata.gdbm.open')
+    def test_prefetch_repodata_missing(self, mock_open):
+        self.metadata_files.dbs = {'filelists': '/a/filelists.db', 'other': '/a/other.db'}
+        mock_open.side_effect = lambda path, mode: {
+            '/a/filelists.db': {FOO_DB_KEY: FOO_FILELISTS_XML},
+            '/a/other.db': {},
+        }[path]
+
+        # a package missing from other.xml does not stop the prefetch
+        self.metadata_files.prefetch_repodata([_foo_model()])
+
+        self.assertEqual(self.metadata_files._prefetched.keys(), [('filelists', FOO_DB_KEY)])
+        # it is reported for that package only, when its repodata is added
+        self.assertRaises(KeyError, self.metadata_files.add_repodata, _foo_model())
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.metadata.gdbm.open')
+    def test_close_dbs(self, mock_open):
+        self.metadata_files.dbs = {'filelists': '/a/filelists.db', 'other': '/a/other.db'}
+        self.metadata_files.prefetch_repodata([_foo_model()])
+
+        self.metadata_files.close_dbs()
+
+        self.assertEqual(mock_open.return_value.close.call_count, 2)
+        self.assertEqual(self.metadata_files._prefetched, {})
+        self.assertEqual(self.metadata_files._db_handles, {})
+
+    def _write_db_sources(self):
+        for name, xml in (('filelists', FOO_FILELISTS_XML), ('other', FOO_OTHER_XML)):
+            path = os.path.join(self.working_dir, '%s.xml' % name)
+            with open(path, 'w') as xml_file:
+                xml_file.write('<metadata>%s</metadata>' % xml)
+            self.metadata_files.metadata[name] = {'local_path': path}
+        self.metadata_files.dst_dir = self.working_dir
+
+    def test_generate_dbs(self):
+        self._write_db_sources()
+
+        self.metadata_files.generate_dbs()
+
+        self.assertEqual(self.metadata_files.dbs, {
+            'filelists': os.path.join(self.working_dir, 'filelists.db'),
+            'other': os.path.join(self.working_dir, 'other.db'),
+        })
+        model = _foo_model()
+        self.metadata_files.add_repodata(model)
+        self.metadata_files.close_dbs()
+        self.assertEqual(model.metadata['files'], {'file': ['/usr/bin/foo'], 'dir': []})
+        self.assertEqual(model.metadata['changelog'], [[1234, 'me', 'initial']])
+
+    def test_generate_dbs_no_wait(self):
+        self._write_db_sources()
+
+        self.metadata_files.generate_dbs(wait=False)
+        self.metadata_files.wait_for_dbs()
+
+        self.assertEqual(sorted(self.metadata_files.dbs.keys()), ['filelists', 'other'])
+        self.assertTrue(self.metadata_files._db_pool is None)
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.metadata.multiprocessing.Pool',
+                side_effect=AssertionError)
+    def test_generate_dbs_thread_fallback(self, mock_pool):
+        self._write_db_sources()
+
+        self.metadata_files.generate_dbs()
+
+        self.assertEqual(sorted(self.metadata_files.dbs.keys()), ['filelists', 'other'])
+
+    def test_generate_dbs_failure(self):
+        self._write_db_sources()
+        with open(self.metadata_files.metadata['other']['local_path'], 'w') as xml_file:
+            xml_file.write('<metadata><package')
+
+        self.assertRaises(ValueError, self.metadata_files.generate_dbs)
+        self.metadata_files.close_dbs()
+        self.assertTrue(self.metadata_files._db_pool is None)
+
     def test_get_metadata_file_bz(self):
 
         # create the test file
@@ -128,6 +250,26 @@ class TestMetadataFiles(unittest.TestCase):
         handle.close()
 
 
+FOO_DB_KEY = 'arch:x86_64::epoch:0::name:foo::release:1::version:1.0'
+
+FOO_FILELISTS_XML = """<package arch="x86_64" name="foo" pkgid="abc">
+  <version epoch="0" rel="1" ver="1.0" />
+  <file>/usr/bin/foo</file>
+</package>"""
+
+FOO_OTHER_XML = """<package arch="x86_64" name="foo" pkgid="abc">
+  <version epoch="0" rel="1" ver="1.0" />
+  <changelog author="me" date="1234">initial</changelog>
+</package>"""
+
+
+def _foo_model():
+    model = models.RPM('foo', '0', '1.0', '1', 'x86_64', 'sha256', 'abc',
+                       {'filename': 'foo-1.0-1.x86_64.rpm'})
+    model.raw_xml = '<package><location href="foo-1.0-1.x86_64.rpm"/></package>'
+    return model
+
+
 class TestProcessRepomdDataElement(unittest.TestCase):
     """
     This class contains tests for the process_repomd_data_element() function.
@@ -0,0 +1,96 @@
+from cStringIO import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers.yum.repomd import packages, primary
+
+
+PRIMARY_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common"
+xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="3">
+%s
+</metadata>
+"""
+
+PACKAGE_XML = """<package type="rpm">
+  <name>%(name)s</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="1.0" rel="1"/>
+  <checksum type="sha256" pkgid="YES">hash-%(name)s</checksum>
+  <size package="1024" installed="2048" archive="2048"/>
+  <location href="Packages/%(name)s-1.0-1.x86_64.rpm"/>
+  <format>
+    <rpm:license>GPLv2</rpm:license>
+    <rpm:provides>
+      <rpm:entry name="%(name)s" flags="EQ" epoch="0" ver="1.0" rel="1"/>
+    </rpm:provides>
+  </format>
+</package>"""
+
+
+def _elements(*names):
+    xml = PRIMARY_XML % '\n'.join(PACKAGE_XML % {'name': name} for name in names)
+    return packages.package_list_generator(StringIO(xml.encode('utf-8')), primary.PACKAGE_TAG)
+
+
+class TestPackageModelIndex(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.index = packages.PackageModelIndex(os.path.join(self.working_dir, 'index.db'),
+                                                primary.process_package_element)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_add_and_get(self):
+        element = list(_elements('foo'))[0]
+        key_model = primary.process_package_element_keys(element)
+
+        self.index.add(key_model.as_named_tuple, element)
+        ret = self.index.get(key_model.as_named_tuple)
+
+        # the full model is built from the stored element
+        self.assertTrue(isinstance(ret, models.RPM))
+        self.assertEqual(ret.unit_key, key_model.unit_key)
+        self.assertEqual(ret.metadata['filename'], 'foo-1.0-1.x86_64.rpm')
+        self.assertEqual(ret.metadata['provides'][0]['name'], 'foo')
+        self.assertTrue(ret.raw_xml)
+
+    def test_get_missing(self):
+        key_model = primary.process_package_element_keys(list(_elements('foo'))[0])
+
+        self.assertRaises(KeyError, self.index.get, key_model.as_named_tuple)
+
+    def test_unicode_key(self):
+        element = list(_elements(u'f\xf6\xf6'))[0]
+        key_model = primary.process_package_element_keys(element)
+
+        self.index.add(key_model.as_named_tuple, element)
+
+        self.assertEqual(self.index.get(key_model.as_named_tuple).name, u'f\xf6\xf6')
+
+    def test_tee(self):
+        ret = list(self.index.tee(_elements('foo', 'bar'), primary.process_package_element_keys))
+
+        # the cheap models are yielded, and each element has been stored
+        self.assertEqual([model.name for model in ret], ['foo', 'bar'])
+        for model in ret:
+            self.assertTrue('filename' not in model.metadata)
+            self.assertEqual(self.index.get(model.as_named_tuple).unit_key, model.unit_key)
+
+    def test_models(self):
+        key_models = list(self.index.tee(_elements('foo', 'bar', 'baz'),
+                                         primary.process_package_element_keys))
+
+        ret = list(self.index.models([key_models[0].as_named_tuple,
+                                      key_models[2].as_named_tuple]))
+
+        self.assertEqual([model.name for model in ret], ['foo', 'baz'])
+
+    def test_close_twice(self):
+        self.index.close()
+        self.index.close()
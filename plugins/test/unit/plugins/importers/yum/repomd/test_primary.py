@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from copy import deepcopy
 from cStringIO import StringIO
 import unittest
 
@@ -87,6 +88,38 @@ class TestProcessRPMElement(unittest.TestCase):
         self.assertEqual(model.metadata['base_url'], 'http://www.foo.com/repo')
 
 
+class TestProcessPackageElementKeys(unittest.TestCase):
+    def test_fedora18_real_data(self):
+        elements = list(packages.package_list_generator(StringIO(F18_XML), primary.PACKAGE_TAG))
+        full_model = primary.process_package_element(deepcopy(elements[0]))
+
+        model = primary.process_package_element_keys(elements[0])
+
+        self.assertTrue(isinstance(model, models.RPM))
+        self.assertEqual(model.unit_key, full_model.unit_key)
+        self.assertEqual(model.as_named_tuple, full_model.as_named_tuple)
+        self.assertEqual(model.metadata['size'], 62796)
+        self.assertEqual(model.metadata['size'], full_model.metadata['size'])
+        self.assertTrue('files' not in model.metadata)
+
+    def test_source(self):
+        elements = packages.package_list_generator(StringIO(F18_SOURCE_XML), primary.PACKAGE_TAG)
+
+        model = primary.process_package_element_keys(list(elements)[0])
+
+        self.assertTrue(isinstance(model, models.SRPM))
+        self.assertEqual(model.name, 'openhpi-subagent')
+
+    def test_element_unmodified(self):
+        elements = packages.package_list_generator(StringIO(F18_XML), primary.PACKAGE_TAG)
+        element = list(elements)[0]
+
+        primary.process_package_element_keys(element)
+
+        location = element.find(primary.LOCATION_TAG)
+        self.assertEqual(location.attrib['href'], 'Packages/o/opensm-libs-3.3.15-3.fc18.x86_64.rpm')
+
+
 F18_SOURCE_XML = """<?xml version="1.0" encoding="UTF-8"?>
 <metadata xmlns="http://linux.duke.edu/metadata/common"
 xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="1">
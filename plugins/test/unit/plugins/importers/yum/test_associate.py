@@ -30,7 +30,8 @@ class TestAssociate(unittest.TestCase):
 
     @mock.patch.object(associate, '_associate_unit', autospec=True)
     def test_no_units_provided(self, mock_associate):
-        self.conduit.get_source_units.return_value = self.group_units
+        self.conduit.get_source_units.side_effect = lambda criteria: \
+            self.group_units if models.PackageGroup.TYPE in criteria.type_ids else []
 
         associate.associate(self.source_repo, self.dest_repo, self.conduit, self.config)
 
@@ -103,6 +104,28 @@ class TestAssociate(unittest.TestCase):
         mock_associate_unit.assert_any_call(self.dest_repo, self.conduit, groups_to_copy[1])
 
 
+class TestGetSourceUnits(unittest.TestCase):
+    def test_key_fields_only(self):
+        conduit = mock.MagicMock()
+        rpms = model_factory.rpm_units(2)
+        groups = model_factory.group_units(1)
+        conduit.get_source_units.side_effect = lambda criteria: \
+            rpms if criteria.type_ids == [models.RPM.TYPE] else \
+            groups if models.PackageGroup.TYPE in criteria.type_ids else []
+
+        ret = list(associate.get_source_units(conduit))
+
+        self.assertEqual(ret, rpms + groups)
+        for call in conduit.get_source_units.call_args_list:
+            criteria = call[0][0]
+            if criteria.type_ids == [models.RPM.TYPE]:
+                self.assertEqual(criteria.unit_fields, list(models.RPM.UNIT_KEY_NAMES))
+            elif models.PackageGroup.TYPE in criteria.type_ids:
+                # groups are copied with all of their metadata
+                self.assertTrue(criteria.unit_fields is None)
+                self.assertTrue(models.RPM.TYPE not in criteria.type_ids)
+
+
 class TestCopyRPMs(unittest.TestCase):
     def test_without_deps(self):
         conduit = mock.MagicMock()
@@ -115,12 +138,13 @@ class TestCopyRPMs(unittest.TestCase):
             conduit.associate_unit.assert_any_call(rpm)
 
     @mock.patch('pulp_rpm.plugins.importers.yum.existing.get_existing_units', autospec=True)
-    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver.find_dependent_rpms', autospec=True)
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver.find_dependency_closure',
+                autospec=True)
     def test_with_existing_deps(self, mock_find, mock_get_existing):
         conduit = mock.MagicMock()
         rpms = model_factory.rpm_units(1)
         deps = model_factory.rpm_units(2)
-        mock_find.return_value = set(deps)
+        mock_find.return_value = set()
         mock_get_existing.return_value = deps
 
         associate.copy_rpms(rpms, conduit, True)
@@ -128,10 +152,17 @@ class TestCopyRPMs(unittest.TestCase):
         self.assertEqual(conduit.associate_unit.call_count, 1)
         self.assertEqual(mock_find.call_count, 1)
         self.assertEqual(mock_find.call_args[0][1], set(rpms))
+        self.assertEqual(mock_find.call_args[0][0].repo_id, conduit.source_repo_id)
+
+        # the closure skips dependencies that exist in the destination repository
+        skip = mock_find.call_args[0][2]
+        self.assertEqual(skip(set(deps)), deps)
         self.assertEqual(mock_get_existing.call_count, 1)
+        self.assertEqual(mock_get_existing.call_args[0][3], conduit.get_destination_units)
 
     @mock.patch('pulp_rpm.plugins.importers.yum.existing.get_existing_units', autospec=True)
-    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver.find_dependent_rpms', autospec=True)
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver.find_dependency_closure',
+                autospec=True)
     def test_with_recursive_deps(self, mock_find, mock_get_existing):
         """
         Test getting dependencies that do not exist in the repository already
@@ -142,15 +173,14 @@ class TestCopyRPMs(unittest.TestCase):
 
         # Create the recursive dependencies that we want to copy
         deps = model_factory.rpm_units(2)
-        mock_find.side_effect = iter([set(deps), set()])
+        mock_find.return_value = set(deps)
 
-        # The get existing units always assumes there are no units in the target repository
-        mock_get_existing.return_value = []
         unit_set = associate.copy_rpms(rpms, conduit, True)
 
         merged_set = set(deps)
         merged_set.update(rpms)
         self.assertEquals(unit_set, merged_set)
+        self.assertEqual(conduit.associate_unit.call_count, 3)
 
 
 class TestNoChecksumCleanUnitKey(unittest.TestCase):
@@ -399,3 +429,16 @@ class TestSafeCopyWithoutFile(unittest.TestCase):
         unit.metadata['_foo'] = 'value'
         copied_unit = associate._safe_copy_unit_without_file(unit)
         self.assertEquals(None, copied_unit.metadata.get('_foo'))
+
+    def test_original_unchanged(self):
+        unit = model_factory.group_units(1)[0]
+        unit.id = 'group_id'
+        unit.metadata['_foo'] = 'value'
+
+        copied_unit = associate._safe_copy_unit_without_file(unit)
+        copied_unit.unit_key['repo_id'] = 'other_repo'
+
+        self.assertTrue(copied_unit.id is None)
+        self.assertEqual(unit.id, 'group_id')
+        self.assertEqual(unit.metadata['_foo'], 'value')
+        self.assertNotEqual(unit.unit_key.get('repo_id'), 'other_repo')
@@ -0,0 +1,33 @@
+import unittest
+
+import mock
+
+from pulp_rpm.plugins.importers.yum import batch
+
+
+class TestProgressThrottle(unittest.TestCase):
+    @mock.patch('time.time', autospec=True)
+    def test_update(self, mock_time):
+        mock_time.side_effect = [100, 100.5, 101, 101.2]
+        set_progress = mock.MagicMock()
+        throttle = batch.ProgressThrottle(set_progress, interval=1)
+
+        # the first report is always sent
+        throttle.update()
+        self.assertEqual(set_progress.call_count, 1)
+        # too soon
+        throttle.update()
+        self.assertEqual(set_progress.call_count, 1)
+        throttle.update()
+        self.assertEqual(set_progress.call_count, 2)
+
+    @mock.patch('time.time', autospec=True)
+    def test_force(self, mock_time):
+        mock_time.return_value = 100
+        set_progress = mock.MagicMock()
+        throttle = batch.ProgressThrottle(set_progress)
+
+        throttle.update()
+        throttle.update(force=True)
+
+        self.assertEqual(set_progress.call_count, 2)
@@ -69,105 +69,154 @@ class DepsolveTestCase(unittest.TestCase):
         self.solver = depsolve.Solver(self.mock_search)
 
 
-class TestBuildProvidesTree(DepsolveTestCase):
+class TestDependencyIndex(DepsolveTestCase):
     """
-    Test the _build_provides_tree() function.
+    Test the DependencyIndex class.
     """
 
     def test_empty_provides(self):
         """
-        Make sure the function can handle RPMs without provides data.
+        Make sure the index can handle RPMs without provides data.
         """
         for u in self.units:
             u.metadata['provides'] = []
-        self.mock_search.return_value = self.units
 
-        tree = self.solver._build_provides_tree()
+        index = depsolve.DependencyIndex(self.units)
 
-        self.assertEqual(tree, {})
+        self.assertEqual(index.resolve(depsolve.Requirement('webbrowser')), ())
+        self.assertEqual(len(index), 7)
 
     def test_no_source_packages(self):
         """
-        Test when source_packages is the empty list.
+        Test when there are no source packages.
         """
-        self.mock_search.return_value = []
+        index = depsolve.DependencyIndex([])
 
-        tree = self.solver._build_provides_tree()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.resolve(depsolve.Requirement('firefox')), ())
 
-        self.assertEqual(tree, {})
+    def test_newest_provider_of_each_name(self):
+        index = depsolve.DependencyIndex(self.units)
 
-    def test_with_provides(self):
-        self.mock_search.return_value = self.units
+        self.assertEqual(index.resolve(depsolve.Requirement('webbrowser')), (1,))
+        self.assertEqual(set(index.resolve(depsolve.Requirement('calculator'))), set([4, 6]))
+
+    def test_newest_filling_version(self):
+        index = depsolve.DependencyIndex(self.units)
+
+        requirement = depsolve.Requirement('firefox', '0', '23.0.2', flags='LT')
+        self.assertEqual(index.resolve(requirement), (0,))
+        self.assertEqual(index.resolve(depsolve.Requirement('firefox')), (1,))
+        self.assertEqual(index.resolve(depsolve.Requirement('firefox', '0', '24')), ())
+
+    def test_resolved_once(self):
+        """
+        Make sure each requirement is only resolved once.
+        """
+        index = depsolve.DependencyIndex(self.units)
+
+        with mock.patch.object(depsolve.Requirement, 'fills_unit_key') as mock_fills:
+            mock_fills.return_value = True
+            index.resolve_positions([0, 1])
+
+        # both firefox packages require the same xulrunner, which has one version
+        self.assertEqual(mock_fills.call_count, 1)
+
+    def test_position(self):
+        index = depsolve.DependencyIndex(self.units)
+
+        self.assertEqual(index.position(self.unit_3), 3)
+        self.assertEqual(index.unit(3), self.unit_3)
+        missing = Unit(models.RPM.TYPE, dict(self.unit_3.unit_key, version='1'), {}, '')
+        self.assertTrue(index.position(missing) is None)
+
+    def test_unit(self):
+        """
+        Make sure units are new, and only have their unit key and id.
+        """
+        self.unit_3.id = 'unit_3_id'
+        index = depsolve.DependencyIndex(self.units)
+
+        unit = index.unit(3)
+
+        self.assertEqual(unit, self.unit_3)
+        self.assertTrue(unit is not self.unit_3)
+        self.assertEqual(unit.id, 'unit_3_id')
+        self.assertEqual(unit.metadata, {})
+        self.assertTrue(index.unit(3) is not unit)
 
-        tree = self.solver._build_provides_tree()
+    def test_requirements(self):
+        index = depsolve.DependencyIndex(self.units)
 
-        expected_tree = {
-            'webbrowser': {
-                'firefox': self.unit_1,
-            },
-            'calculator': {
-                'gnome-calculator': self.unit_4,
-                'gcalctool': self.unit_6
-            }
-        }
+        requirements = list(index.requirements(2))
 
-        self.assertEqual(tree, expected_tree)
+        self.assertEqual(requirements, [depsolve.Requirement('sqlite', None, '3.7.17')])
+        self.assertEqual(requirements[0].flags, depsolve.Requirement.GE)
 
 
-class TestProvidesTree(DepsolveTestCase):
-    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver._build_provides_tree')
-    def test_returns_tree(self, mock_build):
-        ret = self.solver._provides_tree
+class TestIndex(DepsolveTestCase):
+    """
+    Test that the index is built once, and shared between solvers of a repository.
+    """
 
-        mock_build.assert_called_once_with()
-        self.assertEqual(ret, mock_build.return_value)
+    def setUp(self):
+        super(TestIndex, self).setUp()
+        depsolve._index_cache.clear()
+        self.mock_search.return_value = self.units
 
-    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver._build_provides_tree')
-    def test_cache(self, mock_build):
-        rets = [self.solver._provides_tree for x in range(5)]
+    def tearDown(self):
+        super(TestIndex, self).tearDown()
+        depsolve._index_cache.clear()
 
-        mock_build.assert_called_once_with()
-        # make sure they are all the same
-        self.assertTrue(reduce(lambda x, y: x if x is y else False, rets))
+    def test_cache(self):
+        indexes = [self.solver._index for x in range(5)]
 
-    def test_clear_source_cache(self):
-        self.solver._packages_tree
+        self.assertEqual(self.mock_search.call_count, 1)
+        self.assertTrue(all(index is indexes[0] for index in indexes))
+        # without a repository id, the index is not shared
+        self.assertEqual(len(depsolve._index_cache), 0)
 
-        # the source list should be cached
-        self.assertTrue(self.solver._cached_source_with_provides is not None)
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.managers')
+    def test_shared_for_unchanged_repo(self, mock_managers):
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {
+            'id': 'repo1', 'last_unit_added': 'yesterday', 'last_unit_removed': None}
 
-        self.solver._provides_tree
+        index = depsolve.Solver(self.mock_search, 'repo1')._index
 
-        # the source list should have been cleared
-        self.assertTrue(self.solver._cached_source_with_provides is None)
+        self.assertTrue(depsolve.Solver(self.mock_search, 'repo1')._index is index)
+        self.assertEqual(self.mock_search.call_count, 1)
 
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.managers')
+    def test_rebuilt_for_changed_repo(self, mock_managers):
+        find_by_id = mock_managers.repo_query_manager.return_value.find_by_id
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': 'yesterday'}
+        depsolve.Solver(self.mock_search, 'repo1')._index
 
-class TestPackagesTree(DepsolveTestCase):
-    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver._build_packages_tree')
-    def test_returns_tree(self, mock_build):
-        ret = self.solver._packages_tree
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': 'today'}
+        depsolve.Solver(self.mock_search, 'repo1')._index
 
-        mock_build.assert_called_once_with()
-        self.assertEqual(ret, mock_build.return_value)
+        self.assertEqual(self.mock_search.call_count, 2)
 
-    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.Solver._build_packages_tree')
-    def test_cache(self, mock_build):
-        rets = [self.solver._packages_tree for x in range(5)]
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.managers')
+    def test_not_shared_without_content_version(self, mock_managers):
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {'id': 'repo1'}
 
-        mock_build.assert_called_once_with()
-        # make sure they are all the same
-        self.assertTrue(reduce(lambda x, y: x if x is y else False, rets))
+        depsolve.Solver(self.mock_search, 'repo1')._index
+        depsolve.Solver(self.mock_search, 'repo1')._index
 
-    def test_clear_source_cache(self):
-        self.solver._provides_tree
+        self.assertEqual(self.mock_search.call_count, 2)
+        self.assertEqual(len(depsolve._index_cache), 0)
 
-        # the source list should be cached
-        self.assertTrue(self.solver._cached_source_with_provides is not None)
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.MAX_CACHED_INDEXES', 2)
+    @mock.patch('pulp_rpm.plugins.importers.yum.depsolve.managers')
+    def test_least_recently_used_evicted(self, mock_managers):
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {
+            'last_unit_added': 'yesterday'}
 
-        self.solver._packages_tree
+        for repo_id in ('repo1', 'repo2', 'repo1', 'repo3'):
+            depsolve.Solver(self.mock_search, repo_id)._index
 
-        # the source list should have been cleared
-        self.assertTrue(self.solver._cached_source_with_provides is None)
+        self.assertEqual(depsolve._index_cache.keys(), ['repo1', 'repo3'])
 
 
 class TestFindDependentRPMs(DepsolveTestCase):
@@ -238,6 +287,59 @@ class TestFindDependentRPMs(DepsolveTestCase):
         self.assertEqual(dependent_rpms, expected_rpms)
 
 
+class TestFindDependencyClosure(DepsolveTestCase):
+    """
+    Test the find_dependency_closure() function.
+    """
+
+    def setUp(self):
+        super(TestFindDependencyClosure, self).setUp()
+        self.mock_search.return_value = self.units
+
+    def test_recursive(self):
+        """
+        Firefox needs xulrunner, which needs sqlite.
+        """
+        closure = self.solver.find_dependency_closure([self.unit_1])
+
+        self.assertEqual(closure, set([self.unit_2, self.unit_3]))
+        # the source repository is only searched once
+        self.assertEqual(self.mock_search.call_count, 1)
+
+    def test_skip(self):
+        """
+        Skipped units, and the dependencies only they have, are left out.
+        """
+        skip = mock.MagicMock(return_value=[self.unit_2])
+
+        closure = self.solver.find_dependency_closure([self.unit_1, self.unit_4], skip)
+
+        self.assertEqual(closure, set([self.unit_5]))
+        skip.assert_called_once_with(set([self.unit_2, self.unit_5]))
+
+    def test_given_units_excluded(self):
+        closure = self.solver.find_dependency_closure([self.unit_1, self.unit_2])
+
+        self.assertEqual(closure, set([self.unit_3]))
+
+    def test_unit_not_in_index(self):
+        """
+        The requirements of a unit that is not in the source repository are queried.
+        """
+        self.mock_search.side_effect = [self.units, [self.unit_2]]
+        unit = Unit(models.RPM.TYPE, dict(self.unit_2.unit_key, version='1'), {}, '')
+
+        closure = self.solver.find_dependency_closure([unit])
+
+        self.assertEqual(closure, set([self.unit_3]))
+        self.assertEqual(self.mock_search.call_count, 2)
+
+    def test_with_no_units(self):
+        closure = self.solver.find_dependency_closure([])
+
+        self.assertEqual(closure, set())
+
+
 class TestMatch(DepsolveTestCase):
     """
     Test the match() function.
@@ -359,6 +461,38 @@ class TestRequirement(unittest.TestCase):
         # This should return a negative value
         self.assertTrue(r_1.__cmp__(r_2) > 0)
 
+    def test___cmp___release_missing_on_one_side(self):
+        """
+        Test that a missing release is older than any release of the same version, while
+        __eq__ leaves it out of the check.
+        """
+        r_1 = depsolve.Requirement('test', 0, '1.0.1')
+        r_2 = depsolve.Requirement('test', 0, '1.0.1', '3')
+
+        self.assertTrue(r_1.__cmp__(r_2) < 0)
+        self.assertTrue(r_2.__cmp__(r_1) > 0)
+        self.assertTrue(r_1 == r_2)
+
+    def test___cmp___missing_release_newer_version(self):
+        """
+        Test that the version still decides the comparison when a release is missing.
+        """
+        r_1 = depsolve.Requirement('test', 0, '1.0.2')
+        r_2 = depsolve.Requirement('test', 0, '1.0.1', '3')
+
+        self.assertTrue(r_1.__cmp__(r_2) > 0)
+        self.assertTrue(r_2.__cmp__(r_1) < 0)
+
+    def test___cmp___missing_epoch(self):
+        """
+        Test that a missing epoch is the same as epoch 0, as it is for rpm.
+        """
+        r_1 = depsolve.Requirement('test', None, '1.0.1', '1')
+        r_2 = depsolve.Requirement('test', '0', '1.0.1', '1')
+
+        self.assertEqual(r_1.__cmp__(r_2), 0)
+        self.assertTrue(r_1 == r_2)
+
     def test___eq___false(self):
         """
         Test the __eq__ method with dissimilar Requirements.
@@ -0,0 +1,103 @@
+import unittest
+
+import mock
+from pulp.plugins.model import Unit
+
+from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers.yum import existing
+import model_factory
+
+
+def _as_unit(model, storage_path=None):
+    unit = Unit(model.TYPE, model.unit_key, model.metadata, storage_path)
+    return unit
+
+
+class TestCheckRepo(unittest.TestCase):
+    @mock.patch('os.path.isfile', autospec=True)
+    def test_rpms_searched_by_checksum(self, mock_isfile):
+        mock_isfile.return_value = True
+        rpms = model_factory.rpm_models(3)
+        search_method = mock.MagicMock(return_value=[_as_unit(rpms[0], '/a/b')])
+
+        ret = existing.check_repo(set(rpm.as_named_tuple for rpm in rpms), search_method)
+
+        self.assertEqual(ret, set(rpm.as_named_tuple for rpm in rpms[1:]))
+        self.assertEqual(search_method.call_count, 1)
+        criteria = search_method.call_args[0][0]
+        self.assertEqual(criteria.unit_filters.keys(), ['checksum'])
+        self.assertEqual(sorted(criteria.unit_filters['checksum']['$in']),
+                         sorted(rpm.checksum for rpm in rpms))
+        self.assertEqual(criteria.unit_fields, models.RPM.UNIT_KEY_NAMES + ('_storage_path',))
+        mock_isfile.assert_called_once_with('/a/b')
+
+    @mock.patch('os.path.isfile', autospec=True)
+    def test_same_checksum_different_key(self, mock_isfile):
+        mock_isfile.return_value = True
+        rpm = model_factory.rpm_models(1)[0]
+        other = models.RPM('other-name', rpm.epoch, rpm.version, rpm.release, rpm.arch,
+                           rpm.checksumtype, rpm.checksum, {})
+        search_method = mock.MagicMock(return_value=[_as_unit(other, '/a/b')])
+
+        ret = existing.check_repo(set([rpm.as_named_tuple]), search_method)
+
+        # a unit with the same checksum but a different unit key is not a match
+        self.assertEqual(ret, set([rpm.as_named_tuple]))
+
+    @mock.patch('os.path.isfile', autospec=True)
+    def test_missing_file(self, mock_isfile):
+        mock_isfile.side_effect = lambda path: path == '/a/b'
+        rpms = model_factory.rpm_models(3)
+        search_method = mock.MagicMock(return_value=[
+            _as_unit(rpms[0], '/a/b'), _as_unit(rpms[1], '/c/d'), _as_unit(rpms[2], None)])
+
+        ret = existing.check_repo(set(rpm.as_named_tuple for rpm in rpms), search_method)
+
+        # only the unit whose file exists counts as already being in the repo
+        self.assertEqual(ret, set(rpm.as_named_tuple for rpm in rpms[1:]))
+
+    @mock.patch('os.path.isfile', autospec=True)
+    def test_errata_searched_by_unit_key(self, mock_isfile):
+        errata = model_factory.errata_models(2)
+        search_method = mock.MagicMock(return_value=[_as_unit(errata[0])])
+
+        ret = existing.check_repo(set(e.as_named_tuple for e in errata), search_method)
+
+        self.assertEqual(ret, set([errata[1].as_named_tuple]))
+        criteria = search_method.call_args[0][0]
+        self.assertEqual(sorted(criteria.unit_filters['$or']),
+                         sorted(e.unit_key for e in errata))
+        # errata have no files
+        self.assertEqual(mock_isfile.call_count, 0)
+
+
+class TestCheckAllAndAssociate(unittest.TestCase):
+    @mock.patch('os.path.isfile', autospec=True)
+    def test_associates_found(self, mock_isfile):
+        mock_isfile.return_value = True
+        rpms = model_factory.rpm_models(2)
+        rpms[0].metadata['filename'] = 'foo.rpm'
+        conduit = mock.MagicMock()
+        conduit.search_all_units.return_value = [_as_unit(rpms[0], '/a/b')]
+
+        ret = existing.check_all_and_associate(set(rpm.as_named_tuple for rpm in rpms), conduit)
+
+        self.assertEqual(ret, set([rpms[1].as_named_tuple]))
+        criteria = conduit.search_all_units.call_args[0][1]
+        self.assertEqual(sorted(criteria.filters['checksum']['$in']),
+                         sorted(rpm.checksum for rpm in rpms))
+        conduit.init_unit.assert_called_once_with(models.RPM.TYPE, rpms[0].unit_key,
+                                                  rpms[0].metadata, rpms[0].relative_path)
+        conduit.save_unit.assert_called_once_with(conduit.init_unit.return_value)
+        self.assertEqual(conduit.init_unit.return_value.storage_path, '/a/b')
+
+
+class TestFilesExist(unittest.TestCase):
+    @mock.patch('os.path.isfile', autospec=True)
+    def test_order_preserved(self, mock_isfile):
+        paths = ['/path/%d' % i for i in range(50)]
+        mock_isfile.side_effect = lambda path: int(path.rsplit('/', 1)[1]) % 2 == 0
+
+        ret = existing._files_exist(paths + [None])
+
+        self.assertEqual(ret, [i % 2 == 0 for i in range(50)] + [False])
@@ -90,3 +90,76 @@ class TestContentListener(unittest.TestCase):
 
         mock_verify_checksum.assert_called_once()
         self.assertFalse(self.progress_report['content'].success.called)
+
+    @mock.patch('__builtin__.open', autospec=True)
+    @mock.patch('pulp.plugins.util.verification.verify_checksum')
+    @mock.patch('pulp.plugins.util.verification.verify_size')
+    @mock.patch('shutil.move', autospec=True)
+    def test_download_successful_digested(self, mock_move, mock_verify_size,
+                                          mock_verify_checksum, mock_open):
+        self.sync_call_config.get.return_value = True
+        content_listener = listener.ContentListener(self.sync_conduit, self.progress_report,
+                                                    self.sync_call_config, self.metadata_files)
+        self.report.destination = '/tmp/foo.rpm'
+        model = self.report.data
+        model.metadata = {'size': 3}
+        model.unit_key = {'name': 'foo', 'checksumtype': 'sha256', 'checksum': 'abc'}
+        digest_file = mock.MagicMock(complete=True, size=3, checksum_type='sha256')
+        digest_file.hexdigest.return_value = 'abc'
+        content_listener.digests.opened('/tmp/foo.rpm', digest_file)
+
+        content_listener.download_succeeded(self.report)
+
+        # the file was verified without being read again
+        self.assertEqual(mock_open.call_count, 0)
+        self.assertEqual(mock_verify_size.call_count, 0)
+        self.assertEqual(mock_verify_checksum.call_count, 0)
+        self.progress_report['content'].success.assert_called_once_with(model)
+        self.assertTrue(content_listener.digests.pop('/tmp/foo.rpm') is None)
+
+    @mock.patch('shutil.move', autospec=True)
+    def test_download_successful_wrong_digest(self, mock_move):
+        self.sync_call_config.get.return_value = True
+        content_listener = listener.ContentListener(self.sync_conduit, self.progress_report,
+                                                    self.sync_call_config, self.metadata_files)
+        self.report.destination = '/tmp/foo.rpm'
+        model = self.report.data
+        model.metadata = {'size': 3}
+        model.unit_key = {'name': 'foo', 'checksumtype': 'sha256', 'checksum': 'abc'}
+        digest_file = mock.MagicMock(complete=True, size=3, checksum_type='sha256')
+        digest_file.hexdigest.return_value = 'def'
+        content_listener.digests.opened('/tmp/foo.rpm', digest_file)
+
+        content_listener.download_succeeded(self.report)
+
+        self.assertEqual(self.progress_report['content'].success.call_count, 0)
+        self.progress_report['content'].failure.assert_called_once()
+        self.assertEqual(mock_move.call_count, 0)
+
+    @mock.patch('shutil.move', autospec=True)
+    def test_download_successful_saved(self, mock_move):
+        self.sync_call_config.get.return_value = False
+        content_listener = listener.ContentListener(self.sync_conduit, self.progress_report,
+                                                    self.sync_call_config, self.metadata_files)
+
+        content_listener.download_succeeded(self.report)
+
+        self.sync_conduit.save_unit.assert_called_once_with(
+            self.sync_conduit.init_unit.return_value)
+        self.progress_report['content'].success.assert_called_once_with(self.report.data)
+
+    @mock.patch('shutil.move', autospec=True)
+    def test_progress_throttled(self, mock_move):
+        self.sync_call_config.get.return_value = False
+        content_listener = listener.ContentListener(self.sync_conduit, self.progress_report,
+                                                    self.sync_call_config, self.metadata_files)
+
+        for i in range(5):
+            content_listener.download_succeeded(self.report)
+        content_listener.download_failed(self.report)
+
+        self.sync_conduit.set_progress.assert_called_once_with(self.progress_report)
+
+        content_listener.flush()
+
+        self.assertEqual(self.sync_conduit.set_progress.call_count, 2)
@@ -48,6 +48,17 @@ class TestRemoveMissing(TestPurgeBase):
         mock_get_existing.assert_called_once_with(models.RPM, self.conduit.get_units)
         self.conduit.remove_unit.assert_called_once_with(mock_get_existing.return_value[0])
 
+    @mock.patch.object(purge, 'get_remote_units', autospec=True)
+    @mock.patch.object(purge, 'remove_missing_units', autospec=True)
+    def test_remove_missing_rpms_known_remote_units(self, mock_remove, mock_get_remote_units):
+        remote_named_tuples = set(model.as_named_tuple for model in model_factory.rpm_models(2))
+
+        purge.remove_missing_rpms(self.metadata_files, self.conduit, remote_named_tuples)
+
+        # the metadata must not be parsed again
+        self.assertEqual(mock_get_remote_units.call_count, 0)
+        mock_remove.assert_called_once_with(self.conduit, models.RPM, remote_named_tuples)
+
     @mock.patch.object(purge, 'get_remote_units', autospec=True)
     @mock.patch.object(purge, 'remove_missing_units', autospec=True)
     def test_remove_missing_rpms(self, mock_remove, mock_get_remote_units):
@@ -173,76 +184,59 @@ class TestRemoveOldVersions(TestPurgeBase):
         self.srpms.extend(model_factory.srpm_units(2, False))
         self.drpms = model_factory.drpm_units(3, True)
         self.drpms.extend(model_factory.drpm_units(2, False))
-
-    def test_rpm_one(self):
+        self.units = {models.RPM.TYPE: self.rpms, models.SRPM.TYPE: self.srpms,
+                      models.DRPM.TYPE: self.drpms}
         self.conduit.get_units = mock.MagicMock(
             spec_set=self.conduit.get_units,
-            side_effect=lambda criteria: self.rpms if models.RPM.TYPE in criteria.type_ids else [])
+            side_effect=lambda criteria: self.units[criteria.type_ids[0]])
         self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
 
+    def assert_removed(self, units):
+        for unit in units:
+            self.conduit.remove_unit.assert_any_call(unit)
+
+    def test_rpm_one(self):
         purge.remove_old_versions(1, self.conduit)
 
-        self.conduit.remove_unit.assert_any_call(self.rpms[0])
-        self.conduit.remove_unit.assert_any_call(self.rpms[1])
-        self.assertEqual(self.conduit.remove_unit.call_count, 2)
+        self.assert_removed(self.rpms[:2])
 
     def test_rpm_two(self):
-        self.conduit.get_units = mock.MagicMock(
-            spec_set=self.conduit.get_units,
-            side_effect=lambda criteria: self.rpms if models.RPM.TYPE in criteria.type_ids else [])
-        self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
-
         purge.remove_old_versions(2, self.conduit)
 
-        self.conduit.remove_unit.assert_called_once_with(self.rpms[0])
+        self.assert_removed(self.rpms[:1])
 
     def test_srpm_one(self):
-        self.conduit.get_units = mock.MagicMock(
-            spec_set=self.conduit.get_units,
-            side_effect=lambda criteria: self.srpms if models.SRPM.TYPE in criteria.type_ids else []
-        )
-        self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
-
         purge.remove_old_versions(1, self.conduit)
 
-        self.conduit.remove_unit.assert_any_call(self.srpms[0])
-        self.conduit.remove_unit.assert_any_call(self.srpms[1])
-        self.assertEqual(self.conduit.remove_unit.call_count, 2)
+        self.assert_removed(self.srpms[:2])
 
     def test_srpm_two(self):
-        self.conduit.get_units = mock.MagicMock(
-            spec_set=self.conduit.get_units,
-            side_effect=lambda criteria: self.srpms if models.SRPM.TYPE in criteria.type_ids else []
-        )
-        self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
-
         purge.remove_old_versions(2, self.conduit)
 
-        self.conduit.remove_unit.assert_called_once_with(self.srpms[0])
+        self.assert_removed(self.srpms[:1])
 
     def test_drpm_one(self):
-        self.conduit.get_units = mock.MagicMock(
-            spec_set=self.conduit.get_units,
-            side_effect=lambda criteria: self.drpms if models.DRPM.TYPE in criteria.type_ids else []
-        )
-        self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
-
         purge.remove_old_versions(1, self.conduit)
 
-        self.conduit.remove_unit.assert_any_call(self.drpms[0])
-        self.conduit.remove_unit.assert_any_call(self.drpms[1])
-        self.assertEqual(self.conduit.remove_unit.call_count, 2)
+        self.assert_removed(self.drpms[:2])
 
     def test_drpm_two(self):
-        self.conduit.get_units = mock.MagicMock(
-            spec_set=self.conduit.get_units,
-            side_effect=lambda criteria: self.drpms if models.DRPM.TYPE in criteria.type_ids else []
-        )
-        self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
-
         purge.remove_old_versions(2, self.conduit)
 
-        self.conduit.remove_unit.assert_called_once_with(self.drpms[0])
+        self.assert_removed(self.drpms[:1])
+
+    def test_each_type(self):
+        purge.remove_old_versions(1, self.conduit)
+
+        # two old versions of each type
+        self.assertEqual(self.conduit.remove_unit.call_count, 6)
+
+    def test_newest_seen_first(self):
+        self.rpms[:3] = reversed(self.rpms[:3])
+
+        purge.remove_old_versions(1, self.conduit)
+
+        self.assert_removed(self.rpms[1:3])
 
 
 class TestPurgeUnwantedUnits(TestPurgeBase):
@@ -267,14 +261,18 @@ class TestPurgeUnwantedUnits(TestPurgeBase):
                                  mock_remove_environments):
         self.config.plugin_config[importer_constants.KEY_UNITS_REMOVE_MISSING] = True
 
-        purge.purge_unwanted_units(self.metadata_files, self.conduit, self.config)
+        remote_rpms = set(model.as_named_tuple for model in model_factory.rpm_models(2))
+
+        purge.purge_unwanted_units(self.metadata_files, self.conduit, self.config,
+                                   {models.RPM.TYPE: remote_rpms})
 
-        mock_remove_rpms.assert_called_once_with(self.metadata_files, self.conduit)
-        mock_remove_drpms.assert_called_once_with(self.metadata_files, self.conduit)
-        mock_remove_errata.assert_called_once_with(self.metadata_files, self.conduit)
-        mock_remove_groups.assert_called_once_with(self.metadata_files, self.conduit)
-        mock_remove_categories.assert_called_once_with(self.metadata_files, self.conduit)
-        mock_remove_environments.assert_called_once_with(self.metadata_files, self.conduit)
+        mock_remove_rpms.assert_called_once_with(self.metadata_files, self.conduit, remote_rpms)
+        mock_remove_drpms.assert_called_once_with(self.metadata_files, self.conduit, None)
+        mock_remove_errata.assert_called_once_with(self.metadata_files, self.conduit, None)
+        mock_remove_groups.assert_called_once_with(self.metadata_files, self.conduit, None)
+        mock_remove_categories.assert_called_once_with(self.metadata_files, self.conduit, None)
+        mock_remove_environments.assert_called_once_with(self.metadata_files, self.conduit,
+                                                         None)
 
     @mock.patch.object(purge, 'remove_old_versions', autospec=True)
     def test_retain_old_none(self, mock_remove_old_versions):
@@ -1,6 +1,8 @@
 from cStringIO import StringIO
 from copy import deepcopy
 import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -15,6 +17,7 @@ from pulp.server.exceptions import PulpCodedException
 
 from pulp_rpm.common import constants, ids
 from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers.yum import purge
 from pulp_rpm.plugins.importers.yum.existing import check_all_and_associate
 from pulp_rpm.plugins.importers.yum.repomd import metadata, group, updateinfo, packages, presto, \
     primary
@@ -108,10 +111,11 @@ class TestRun(BaseSyncTest):
 
         mock_rmtree.assert_called_once_with(mock_mkdtemp.return_value, ignore_errors=True)
 
+    @mock.patch('pulp_rpm.plugins.importers.yum.purge.purge_unwanted_units', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.parse.treeinfo.sync', autospec=True)
     @mock.patch('shutil.rmtree', autospec=True)
     @mock.patch('tempfile.mkdtemp', autospec=True)
-    def test_calls_workflow(self, mock_mkdtemp, mock_rmtree, mock_treeinfo_sync):
+    def test_calls_workflow(self, mock_mkdtemp, mock_rmtree, mock_treeinfo_sync, mock_purge):
         report = self.reposync.run()
 
         self.assertTrue(report.success_flag)
@@ -125,6 +129,7 @@ class TestRun(BaseSyncTest):
                            group.ENVIRONMENT_TAG),
                  mock.call(self.metadata_files, group.process_category_element, group.CATEGORY_TAG)]
         self.reposync.get_comps_file_units.assert_has_calls(calls, any_order=True)
+        mock_purge.assert_called_once_with(self.metadata_files, self.conduit, self.config, None)
 
         mock_treeinfo_sync.assert_called_once_with(self.conduit, self.url,
                                                    mock_mkdtemp.return_value,
@@ -260,7 +265,7 @@ class TestGetMetadata(BaseSyncTest):
         mock_metadata_instane.download_repomd.assert_called_once_with()
         mock_metadata_instane.parse_repomd.assert_called_once_with()
         mock_metadata_instane.download_metadata_files.assert_called_once_with()
-        mock_metadata_instane.generate_dbs.assert_called_once_with()
+        mock_metadata_instane.generate_dbs.assert_called_once_with(wait=False)
         self.reposync.import_unknown_metadata_files.assert_called_once_with(mock_metadata_instane)
 
 
@@ -383,8 +388,7 @@ class TestUpdateContent(BaseSyncTest):
                 spec_set=RepoSync._decide_what_to_download)
     @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync.download',
                 spec_set=RepoSync.download)
-    @mock.patch('pulp_rpm.plugins.importers.yum.purge.purge_unwanted_units', autospec=True)
-    def test_workflow(self, mock_purge, mock_download, mock_decide):
+    def test_workflow(self, mock_download, mock_decide):
         rpms = set([1, 2, 3])
         drpms = set([4, 5, 6])
         mock_decide.return_value = (rpms, drpms)
@@ -393,7 +397,19 @@ class TestUpdateContent(BaseSyncTest):
 
         mock_decide.assert_called_once_with(self.metadata_files)
         mock_download.assert_called_once_with(self.metadata_files, rpms, drpms)
-        mock_purge.assert_called_once_with(self.metadata_files, self.conduit, self.config)
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync._decide_what_to_download',
+                spec_set=RepoSync._decide_what_to_download)
+    @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync.download',
+                spec_set=RepoSync.download)
+    def test_closes_dbs_on_exception(self, mock_download, mock_decide):
+        mock_decide.return_value = (set(), set())
+        mock_download.side_effect = ValueError
+        self.metadata_files.close_dbs = mock.MagicMock(spec_set=self.metadata_files.close_dbs)
+
+        self.assertRaises(ValueError, self.reposync.update_content, self.metadata_files)
+
+        self.metadata_files.close_dbs.assert_called_once_with()
 
 
 class TestDecideWhatToDownload(BaseSyncTest):
@@ -428,12 +444,22 @@ class TestDecideWhatToDownload(BaseSyncTest):
 
 
 class TestDecideRPMsToDownload(BaseSyncTest):
+    def setUp(self):
+        super(TestDecideRPMsToDownload, self).setUp()
+        self.reposync.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.reposync.rpm_index is not None:
+            self.reposync.rpm_index.close()
+        shutil.rmtree(self.reposync.tmp_dir, ignore_errors=True)
+
     def test_skip_rpms(self):
         self.config.override_config[constants.CONFIG_SKIP] = [models.RPM.TYPE]
 
         ret = self.reposync._decide_rpms_to_download(self.metadata_files)
 
         self.assertEqual(ret, (set(), 0, 0))
+        self.assertTrue(self.reposync.rpm_index is None)
 
     @mock.patch('__builtin__.open', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.package_list_generator',
@@ -456,11 +482,39 @@ class TestDecideRPMsToDownload(BaseSyncTest):
 
         self.assertEqual(ret, (set([model.as_named_tuple]), 1, 1024))
         mock_open.assert_called_once_with('/path/to/primary', 'r')
-        mock_generator.assert_called_once_with(primary_file, primary.PACKAGE_TAG,
-                                               primary.process_package_element)
-        mock_identify.assert_called_once_with(mock_generator.return_value)
+        mock_generator.assert_called_once_with(primary_file, primary.PACKAGE_TAG)
+        self.assertEqual(mock_identify.call_count, 1)
+        self.assertTrue(isinstance(self.reposync.rpm_index, packages.PackageModelIndex))
+        self.assertTrue(self.reposync.rpm_index.process_func is primary.process_package_element)
         self.assertTrue(primary_file.closed)
 
+    @mock.patch('__builtin__.open', autospec=True)
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.package_list_generator',
+                autospec=True)
+    @mock.patch('pulp_rpm.plugins.importers.yum.existing.check_all_and_associate',
+                autospec=True)
+    @mock.patch('pulp_rpm.plugins.importers.yum.existing.check_repo', autospec=True)
+    def test_populates_index(self, mock_check_repo, mock_check_all, mock_generator, mock_open):
+        mock_open.return_value = StringIO()
+        self.metadata_files.metadata[primary.METADATA_FILE_NAME] = \
+            {'local_path': '/path/to/primary'}
+        elements = list(packages.package_list_generator(StringIO(TWO_PACKAGES_PRIMARY_XML),
+                                                        primary.PACKAGE_TAG))
+        mock_generator.return_value = iter(elements)
+        mock_check_repo.side_effect = lambda wanted, search: set(wanted)
+        mock_check_all.side_effect = lambda wanted, conduit: set(wanted)
+
+        to_download, count, size = self.reposync._decide_rpms_to_download(self.metadata_files)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(size, 3072)
+        full_models = list(self.reposync.rpm_index.models(to_download))
+        self.assertEqual(set(m.name for m in full_models), set(['foo', 'bar']))
+        for model in full_models:
+            # these are only populated by the full parser
+            self.assertTrue(model.raw_xml)
+            self.assertEqual(model.metadata['filename'], '%s-1.0-1.x86_64.rpm' % model.name)
+
     @mock.patch('__builtin__.open', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.package_list_generator',
                 autospec=True)
@@ -478,6 +532,53 @@ class TestDecideRPMsToDownload(BaseSyncTest):
         self.assertTrue(primary_file.closed)
 
 
+TWO_PACKAGES_PRIMARY_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common"
+xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="2">
+<package type="rpm">
+  <name>foo</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="1.0" rel="1"/>
+  <checksum type="sha256" pkgid="YES">hash-foo</checksum>
+  <size package="1024" installed="2048" archive="2048"/>
+  <location href="Packages/foo-1.0-1.x86_64.rpm"/>
+</package>
+<package type="rpm">
+  <name>bar</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="1.0" rel="1"/>
+  <checksum type="sha256" pkgid="YES">hash-bar</checksum>
+  <size package="2048" installed="4096" archive="4096"/>
+  <location href="Packages/bar-1.0-1.x86_64.rpm"/>
+</package>
+</metadata>
+"""
+
+
+class TestRecordRemoteKeys(BaseSyncTest):
+    def test_not_collecting(self):
+        models_generator = iter(model_factory.rpm_models(2))
+
+        ret = self.reposync._record_remote_keys(models_generator)
+
+        self.assertTrue(ret is models_generator)
+        self.assertTrue(self.reposync.remote_unit_keys is None)
+
+    def test_collecting(self):
+        self.config.override_config[importer_constants.KEY_UNITS_REMOVE_MISSING] = True
+        reposync = RepoSync(self.repo, self.conduit, self.config)
+        rpms = model_factory.rpm_models(2)
+        drpms = model_factory.drpm_models(1)
+
+        ret = list(reposync._record_remote_keys(iter(rpms + drpms)))
+
+        self.assertEqual(ret, rpms + drpms)
+        self.assertEqual(reposync.remote_unit_keys, {
+            models.RPM.TYPE: set(model.as_named_tuple for model in rpms),
+            models.DRPM.TYPE: set([drpms[0].as_named_tuple]),
+        })
+
+
 class TestDecideDRPMsToDownload(BaseSyncTest):
     def test_skip_drpms(self):
         self.config.override_config[constants.CONFIG_SKIP] = [models.DRPM.TYPE]
@@ -542,6 +643,8 @@ class TestDownload(BaseSyncTest):
         super(TestDownload, self).setUp()
         # nothing in these tests should actually attempt to write anything
         self.reposync.tmp_dir = '/idontexist/'
+        self.metadata_files.prefetch_repodata = mock.MagicMock(
+            spec_set=self.metadata_files.prefetch_repodata)
 
     @mock.patch.object(packages, 'package_list_generator', autospec=True)
     def test_none_to_download(self, mock_package_list_generator):
@@ -610,6 +713,41 @@ class TestDownload(BaseSyncTest):
                          os.path.join(self.reposync.tmp_dir, self.RELATIVEPATH))
         self.assertTrue(requests[1].data is rpms[1])
         self.assertTrue(file_handle.closed)
+        # the repodata for the RPMs being downloaded was read ahead
+        self.metadata_files.prefetch_repodata.assert_called_once_with(tuple(rpms[:2]))
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.alternate.ContentContainer')
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.nectar_factory.create_downloader',
+                autospec=True)
+    @mock.patch.object(packages, 'package_list_generator', autospec=True)
+    def test_rpms_from_index(self, mock_package_list_generator, mock_create_downloader,
+                             mock_container):
+        """
+        test that RPMs are read back from the index instead of re-parsing primary
+        """
+        self.metadata_files.get_metadata_file_handle = mock.MagicMock(
+            spec_set=self.metadata_files.get_metadata_file_handle,
+            return_value=None,  # None means it will skip DRPMs
+        )
+        rpms = model_factory.rpm_models(3)
+        for rpm in rpms:
+            rpm.metadata['relativepath'] = self.RELATIVEPATH
+            rpm.metadata['filename'] = self.RELATIVEPATH
+        self.reposync.rpm_index = mock.MagicMock(spec_set=packages.PackageModelIndex)
+        self.reposync.rpm_index.models.return_value = iter(rpms[:2])
+        mock_create_downloader.return_value = self.downloader
+
+        fake_container = mock.Mock()
+        fake_container.refresh.return_value = {}
+        mock_container.return_value = fake_container
+
+        to_download = set(m.as_named_tuple for m in rpms[:2])
+        self.reposync.download(self.metadata_files, to_download, set())
+
+        self.assertEqual(mock_package_list_generator.call_count, 0)
+        self.reposync.rpm_index.models.assert_called_once_with(to_download)
+        requests = list(fake_container.download.call_args[0][2])
+        self.assertEqual([r.data for r in requests], rpms[:2])
 
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.alternate.ContentContainer')
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.nectar_factory.create_downloader',
@@ -835,10 +973,8 @@ class TestSaveFilelessUnits(BaseSyncTest):
 
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.'
                 'package_list_generator', autospec=True)
-    @mock.patch('pulp.plugins.conduits.mixins.SearchUnitsMixin.'
-                'find_unit_by_unit_key', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync._concatenate_units', autospec=True)
-    def test_save_erratas_none_existing(self, mock_concat, mock_find_unit, mock_generator):
+    def test_save_erratas_none_existing(self, mock_concat, mock_generator):
         """
         test where no errata already exist, so all should be saved
         """
@@ -846,8 +982,9 @@ class TestSaveFilelessUnits(BaseSyncTest):
         mock_generator.return_value = errata
         self.conduit.init_unit = mock.MagicMock(spec_set=self.conduit.init_unit)
         self.conduit.save_unit = mock.MagicMock(spec_set=self.conduit.save_unit)
-        # all of these units are new, find_unit_by_unit_key will return None
-        mock_find_unit.return_value = None
+        # all of these units are new, so the search finds nothing
+        self.conduit.search_all_units = mock.MagicMock(spec_set=self.conduit.search_all_units,
+                                                       return_value=[])
         file_handle = StringIO()
 
         # errata are saved with the "additive=True" flag
@@ -862,13 +999,17 @@ class TestSaveFilelessUnits(BaseSyncTest):
             self.conduit.init_unit.assert_any_call(model.TYPE, model.unit_key, model.metadata, None)
         self.conduit.save_unit.assert_any_call(self.conduit.init_unit.return_value)
         self.assertEqual(self.conduit.save_unit.call_count, 3)
+        # existing errata are looked up with one search for the whole batch
+        self.assertEqual(self.conduit.search_all_units.call_count, 1)
+        unit_type, criteria = self.conduit.search_all_units.call_args[0]
+        self.assertEqual(unit_type, models.Errata.TYPE)
+        self.assertEqual(criteria.filters, {'$or': [model.unit_key for model in errata]})
+        self.assertEqual(mock_concat.call_count, 0)
 
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.'
                 'package_list_generator', autospec=True)
-    @mock.patch('pulp.plugins.conduits.mixins.SearchUnitsMixin.'
-                'find_unit_by_unit_key', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync._concatenate_units', autospec=True)
-    def test_save_erratas_some_existing(self, mock_concat, mock_find_unit, mock_generator):
+    def test_save_erratas_some_existing(self, mock_concat, mock_generator):
         """
         test where some errata already exist. When "additive_type" is set, we
         will always init and save a unit since it may have been modified.
@@ -877,16 +1018,12 @@ class TestSaveFilelessUnits(BaseSyncTest):
         mock_generator.return_value = errata
         self.conduit.init_unit = mock.MagicMock(spec_set=self.conduit.init_unit)
         self.conduit.save_unit = mock.MagicMock(spec_set=self.conduit.save_unit)
-        # all of these units are new, find_unit_by_unit_key will return None
-        mock_find_unit.return_value = None
         file_handle = StringIO()
 
-        find_unit_retvals = [mock.Mock(), None, mock.Mock()]
-
-        def _find_unit_return(*args):
-            return find_unit_retvals.pop()
-
-        mock_find_unit.side_effect = _find_unit_return
+        # the first and last errata already exist
+        self.conduit.search_all_units = mock.MagicMock(
+            spec_set=self.conduit.search_all_units,
+            return_value=[Unit(e.TYPE, e.unit_key, e.metadata, None) for e in errata[::2]])
 
         concat_unit_retvals = ["fake-unit-b", "fake-unit-a"]
 
@@ -916,9 +1053,7 @@ class TestSaveFilelessUnits(BaseSyncTest):
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.'
                 'package_list_generator', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync._concatenate_units', autospec=True)
-    @mock.patch('pulp.plugins.conduits.mixins.SearchUnitsMixin.'
-                'find_unit_by_unit_key', autospec=True)
-    def test_save_erratas_update_pkglist(self, mock_find_unit, mock_concat, mock_generator):
+    def test_save_erratas_update_pkglist(self, mock_concat, mock_generator):
         """
         test that we call _concatenate_units when we find an existing errata
         """
@@ -926,7 +1061,9 @@ class TestSaveFilelessUnits(BaseSyncTest):
         mock_generator.return_value = errata
         self.conduit.init_unit = mock.MagicMock(spec_set=self.conduit.init_unit)
         self.conduit.save_unit = mock.MagicMock(spec_set=self.conduit.save_unit)
-        mock_find_unit.return_value = "fake unit"
+        self.conduit.search_all_units = mock.MagicMock(
+            spec_set=self.conduit.search_all_units,
+            return_value=[Unit(e.TYPE, e.unit_key, e.metadata, None) for e in errata])
         file_handle = StringIO()
 
         self.reposync.save_fileless_units(file_handle, updateinfo.PACKAGE_TAG,
@@ -934,6 +1071,29 @@ class TestSaveFilelessUnits(BaseSyncTest):
 
         self.assertEqual(mock_concat.call_count, 3)
 
+    @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.'
+                'package_list_generator', autospec=True)
+    def test_save_erratas_duplicate_in_file(self, mock_generator):
+        """
+        test that an erratum listed twice in the same file has its package lists merged
+        """
+        erratum = model_factory.errata_models(1)[0]
+        duplicate = deepcopy(erratum)
+        duplicate.metadata['pkglist'][0]['name'] = 'other-collection'
+        mock_generator.return_value = (erratum, duplicate)
+        self.conduit.init_unit = mock.MagicMock(spec_set=self.conduit.init_unit,
+                                                side_effect=Unit)
+        self.conduit.save_unit = mock.MagicMock(spec_set=self.conduit.save_unit)
+        self.conduit.search_all_units = mock.MagicMock(spec_set=self.conduit.search_all_units,
+                                                       return_value=[])
+
+        self.reposync.save_fileless_units(StringIO(), updateinfo.PACKAGE_TAG,
+                                          updateinfo.process_package_element, additive_type=True)
+
+        saved = self.conduit.save_unit.call_args[0][0]
+        self.assertEqual([p['name'] for p in saved.metadata['pkglist']],
+                         [erratum.metadata['pkglist'][0]['name'], 'other-collection'])
+
     @mock.patch('pulp_rpm.plugins.importers.yum.existing.check_repo', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.package_list_generator',
                 autospec=True)
@@ -965,12 +1125,9 @@ class TestSaveFilelessUnits(BaseSyncTest):
     @mock.patch('pulp_rpm.plugins.importers.yum.existing.check_repo', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.repomd.packages.'
                 'package_list_generator', autospec=True)
-    @mock.patch('pulp.plugins.conduits.mixins.SearchUnitsMixin.'
-                'find_unit_by_unit_key', autospec=True)
     @mock.patch('pulp_rpm.plugins.importers.yum.sync.RepoSync._concatenate_units',
                 autospec=True)
-    def test_save_erratas_all_existing(self, mock_concat, mock_find_unit, mock_generator,
-                                       mock_check_repo):
+    def test_save_erratas_all_existing(self, mock_concat, mock_generator, mock_check_repo):
         """
         test where all errata already exist
         """
@@ -979,6 +1136,9 @@ class TestSaveFilelessUnits(BaseSyncTest):
         mock_check_repo.return_value = []
         self.conduit.init_unit = mock.MagicMock(spec_set=self.conduit.init_unit)
         self.conduit.save_unit = mock.MagicMock(spec_set=self.conduit.save_unit)
+        self.conduit.search_all_units = mock.MagicMock(
+            spec_set=self.conduit.search_all_units,
+            return_value=[Unit(e.TYPE, e.unit_key, e.metadata, None) for e in errata])
         file_handle = StringIO()
 
         self.reposync.save_fileless_units(file_handle, updateinfo.PACKAGE_TAG,
@@ -1188,6 +1348,32 @@ class TestIdentifyWantedVersions(BaseSyncTest):
         for size in result.values():
             self.assertEqual(size, 1024)
 
+    def test_same_versions_as_purge(self):
+        """
+        The sync and the purge of old versions must agree on which versions are
+        the newest, or the purge could remove versions that the sync just kept.
+        """
+        self.config.override_config[importer_constants.KEY_UNITS_RETAIN_OLD_COUNT] = 1
+        rpms = [models.RPM('foo', '0', version, '1', 'x86_64', 'sha256', 'hash-' + version,
+                           {'size': 1024})
+                for version in ('2.10', '2.a', '2.9', '10', '2.1')]
+        units = []
+        for rpm in rpms:
+            unit = Unit(models.RPM.TYPE, rpm.unit_key, rpm.metadata, '')
+            unit.id = rpm.version
+            units.append(unit)
+        self.conduit.get_units = mock.MagicMock(
+            spec_set=self.conduit.get_units,
+            side_effect=lambda criteria: units if criteria.type_ids == [models.RPM.TYPE] else [])
+        self.conduit.remove_unit = mock.MagicMock(spec_set=self.conduit.remove_unit)
+
+        wanted = self.reposync._identify_wanted_versions(rpms)
+        purge.remove_old_versions(2, self.conduit)
+
+        self.assertEqual(sorted(named_tuple.version for named_tuple in wanted), ['10', '2.10'])
+        removed = [c[0][0].id for c in self.conduit.remove_unit.call_args_list]
+        self.assertEqual(sorted(removed), ['2.1', '2.9', '2.a'])
+
 
 class TestFilteredUnitGenerator(BaseSyncTest):
     def test_without_to_download(self):
@@ -257,6 +257,134 @@ class UploadErratumTests(unittest.TestCase):
         self.assertEqual(2, mock_conduit.get_units.call_count)  # once each for RPM and SRPM
         self.assertEqual(4, mock_conduit.link_unit.call_count)  # twice each for RPM and SRPM
 
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload.manager_factory')
+    def test_link_all_errata_to_rpms(self, mock_factory):
+        # Setup
+        sample_errata_file = os.path.join(DATA_DIR, 'RHBA-2010-0836.erratum.xml')
+        with open(sample_errata_file) as f:
+            errata = packages.package_list_generator(f,
+                                                     updateinfo.PACKAGE_TAG,
+                                                     updateinfo.process_package_element)
+            errata = list(errata)[0]
+        errata_unit = Unit(models.Errata.TYPE, errata.unit_key, errata.clean_metadata, None)
+        errata_unit.id = 'erratum'
+        other_unit = Unit(models.Errata.TYPE, {'id': 'other'}, {}, None)
+        other_unit.id = 'other'
+
+        search_dict = errata.rpm_search_dicts[0]
+        rpm_unit = Unit(models.RPM.TYPE, dict(search_dict), {}, None)
+        rpm_unit.id = 'rpm'
+        # same name, version, release and arch, but another epoch
+        other_epoch_unit = Unit(models.RPM.TYPE, dict(rpm_unit.unit_key, epoch='99'), {}, None)
+        other_epoch_unit.id = 'other-epoch'
+        mock_conduit = mock.MagicMock()
+        mock_conduit.get_units.side_effect = [[rpm_unit, other_epoch_unit], []]
+        mock_link = mock_factory.content_manager.return_value.link_referenced_content_units
+
+        # Test
+        failures = upload._link_all_errata_to_rpms(
+            mock_conduit, {0: (errata, errata_unit), 1: (models.Errata('other', {}), other_unit)})
+
+        # Verify
+        self.assertEqual(failures, {})
+        # the RPMs of all errata are searched for at once for each type
+        self.assertEqual(2, mock_conduit.get_units.call_count)
+        self.assertEqual(mock_link.call_args_list, [
+            mock.call(models.Errata.TYPE, 'erratum', models.RPM.TYPE, ['rpm']),
+            mock.call(models.RPM.TYPE, 'rpm', models.Errata.TYPE, ['erratum']),
+        ])
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload.manager_factory')
+    def test_link_all_errata_to_rpms_failure(self, mock_factory):
+        errata = mock.MagicMock(rpm_search_dicts=[
+            {'name': 'foo', 'epoch': '0', 'version': '1', 'release': '1', 'arch': 'noarch'}])
+        errata_unit = Unit(models.Errata.TYPE, {'id': 'erratum'}, {}, None)
+        rpm_unit = Unit(models.RPM.TYPE, dict(errata.rpm_search_dicts[0]), {}, None)
+        mock_conduit = mock.MagicMock()
+        mock_conduit.get_units.side_effect = [[rpm_unit], []]
+        mock_link = mock_factory.content_manager.return_value.link_referenced_content_units
+        mock_link.side_effect = ValueError()
+
+        failures = upload._link_all_errata_to_rpms(mock_conduit, {3: (errata, errata_unit)})
+
+        self.assertEqual(failures.keys(), [3])
+        self.assertFalse(failures[3]['success_flag'])
+
+
+class UploadUnitsTests(unittest.TestCase):
+    def setUp(self):
+        super(UploadUnitsTests, self).setUp()
+        self.conduit = mock.MagicMock()
+        self.config = PluginCallConfiguration({}, {})
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._store_package')
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._extract_package')
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._handle_group_category')
+    def test_reports_in_order(self, mock_group, mock_extract, mock_store):
+        mock_extract.side_effect = ['rpm-model', upload.PackageMetadataError()]
+        mock_group.side_effect = upload.ModelInstantiationError()
+        uploads = [
+            {'type_id': models.RPM.TYPE, 'unit_key': {}, 'metadata': {}, 'file_path': 'a'},
+            {'type_id': models.PackageGroup.TYPE, 'unit_key': {}, 'metadata': {},
+             'file_path': None},
+            {'type_id': 'foo', 'unit_key': {}, 'metadata': {}, 'file_path': None},
+            {'type_id': models.SRPM.TYPE, 'unit_key': {}, 'metadata': {}, 'file_path': 'b'},
+        ]
+
+        reports = upload.upload_units(None, uploads, self.conduit, self.config)
+
+        self.assertEqual([r['success_flag'] for r in reports], [True, False, False, False])
+        self.assertEqual(reports[1]['details']['errors'],
+                         ['metadata for the uploaded file was invalid'])
+        self.assertEqual(reports[3]['details']['errors'],
+                         ['metadata for the given package could not be extracted'])
+        self.assertEqual(mock_extract.call_args_list, [mock.call(models.RPM.TYPE, {}, {}, 'a'),
+                                                       mock.call(models.SRPM.TYPE, {}, {}, 'b')])
+        mock_store.assert_called_once_with('rpm-model', 'a', self.conduit)
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._link_all_errata_to_rpms')
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._link_errata_to_rpms')
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._store_package')
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._extract_package')
+    def test_errata_linked_after_packages(self, mock_extract, mock_store, mock_link,
+                                          mock_link_all):
+        saved_unit = Unit(models.Errata.TYPE, {'id': 'erratum'}, {}, None)
+        self.conduit.save_unit.return_value = saved_unit
+
+        def link_all(conduit, errata):
+            # packages are stored before errata are linked to them
+            self.assertEqual(1, mock_store.call_count)
+            return {0: upload._fail_report('oops')}
+        mock_link_all.side_effect = link_all
+        uploads = [
+            {'type_id': models.Errata.TYPE, 'unit_key': {'id': 'erratum'}, 'metadata': {},
+             'file_path': None},
+            {'type_id': models.RPM.TYPE, 'unit_key': {}, 'metadata': {}, 'file_path': 'a'},
+        ]
+
+        reports = upload.upload_units(None, uploads, self.conduit, self.config)
+
+        self.assertEqual(0, mock_link.call_count)
+        mock_link_all.assert_called_once()
+        errata = mock_link_all.call_args[0][1]
+        self.assertEqual(errata.keys(), [0])
+        self.assertTrue(isinstance(errata[0][0], models.Errata))
+        self.assertTrue(errata[0][1] is saved_unit)
+        self.assertFalse(reports[0]['success_flag'])
+        self.assertTrue(reports[1]['success_flag'])
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.upload._link_all_errata_to_rpms')
+    def test_errata_no_link(self, mock_link_all):
+        config = PluginCallConfiguration({}, {},
+                                         override_config={upload.CONFIG_SKIP_ERRATUM_LINK: True})
+        uploads = [{'type_id': models.Errata.TYPE, 'unit_key': {'id': 'erratum'},
+                    'metadata': {}, 'file_path': None}]
+
+        reports = upload.upload_units(None, uploads, self.conduit, config)
+
+        self.assertEqual(0, mock_link_all.call_count)
+        self.assertTrue(reports[0]['success_flag'])
+
 
 class UploadYumRepoMetadataFileTests(unittest.TestCase):
     def setUp(self):
@@ -459,6 +587,59 @@ class UploadPackageTests(unittest.TestCase):
         mock_conduit.save_unit.assert_called_once()
         saved_unit = mock_conduit.save_unit.call_args[0][0]
         self.assertEqual(inited_unit, saved_unit)
+        for key in ('repodata', 'provides', 'requires'):
+            self.assertTrue(key in saved_unit.metadata)
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.parse.rpm.get_package_metadata')
+    def test_handle_package_reuses_checksum(self, mock_get_metadata):
+        mock_get_metadata.return_value = {'repodata': {}, 'provides': [], 'requires': []}
+        mock_conduit = mock.MagicMock()
+        mock_conduit.init_unit.return_value = Unit(models.RPM.TYPE, {}, {},
+                                                   self.upload_dest_filename)
+
+        upload._handle_package(models.RPM.TYPE, {}, {}, self.upload_src_filename,
+                               mock_conduit, PluginCallConfiguration({}, {}))
+
+        # the checksum calculated with the unit key is not calculated again
+        mock_get_metadata.assert_called_once_with(
+            self.upload_src_filename, sumtype='sha256',
+            checksum='e837a635cc99f967a70f34b268baa52e0f412c1502e08e924ff5b09f1f9573f2',
+            location=mock.ANY)
+        # the repodata refers to the file where it is stored, not where it was uploaded
+        location = mock_get_metadata.call_args[1]['location']
+        self.assertTrue(location.endswith('/walrus-5.21-1.noarch.rpm'))
+        self.assertEqual(location, mock_conduit.init_unit.call_args[0][3])
+        saved_unit = mock_conduit.save_unit.call_args[0][0]
+        self.assertEqual(saved_unit.metadata['provides'], [])
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.parse.rpm.get_package_metadata')
+    def test_handle_package_user_checksum_type(self, mock_get_metadata):
+        mock_get_metadata.return_value = {'repodata': {}, 'provides': [], 'requires': []}
+        mock_conduit = mock.MagicMock()
+        mock_conduit.init_unit.return_value = Unit(models.RPM.TYPE, {}, {},
+                                                   self.upload_dest_filename)
+
+        upload._handle_package(models.RPM.TYPE, {'checksumtype': 'sha1', 'checksum': 'abc'}, {},
+                               self.upload_src_filename, mock_conduit,
+                               PluginCallConfiguration({}, {}))
+
+        # a checksum of another type has to be calculated for the repodata
+        mock_get_metadata.assert_called_once_with(self.upload_src_filename, sumtype='sha1',
+                                                  checksum=None, location=mock.ANY)
+
+    @mock.patch('pulp_rpm.plugins.importers.yum.parse.rpm.get_package_metadata')
+    def test_handle_package_metadata_error(self, mock_get_metadata):
+        mock_get_metadata.return_value = {}
+        mock_conduit = mock.MagicMock()
+        mock_conduit.init_unit.return_value = Unit(models.RPM.TYPE, {}, {},
+                                                   self.upload_dest_filename)
+
+        self.assertRaises(upload.PackageMetadataError, upload._handle_package, models.RPM.TYPE,
+                          {}, {}, self.upload_src_filename, mock_conduit,
+                          PluginCallConfiguration({}, {}))
+        # the file is not stored when its data could not be extracted
+        self.assertEqual(mock_conduit.init_unit.call_count, 0)
+        self.assertEqual(mock_conduit.save_unit.call_count, 0)
 
     @mock.patch('pulp_rpm.plugins.importers.yum.upload._generate_rpm_data')
     def test_handle_metadata_error(self, mock_generate):
@@ -0,0 +1,79 @@
+import unittest
+
+from pulp_rpm.plugins.db import models
+from pulp_rpm.plugins.importers.yum import versions
+import model_factory
+
+
+class TestNewestVersions(unittest.TestCase):
+    def test_keep_all(self):
+        newest = versions.NewestVersions()
+
+        for version in range(5):
+            self.assertTrue(newest.add('foo', (version,), version) is None)
+
+        self.assertEqual(sorted(newest.items()), range(5))
+
+    def test_evicts_oldest(self):
+        newest = versions.NewestVersions(2)
+
+        self.assertTrue(newest.add('foo', (2,), 'foo-2') is None)
+        self.assertTrue(newest.add('foo', (1,), 'foo-1') is None)
+        self.assertEqual(newest.add('foo', (3,), 'foo-3'), 'foo-1')
+        self.assertEqual(newest.add('foo', (0,), 'foo-0'), 'foo-0')
+
+        self.assertEqual(sorted(newest.items()), ['foo-2', 'foo-3'])
+
+    def test_packages_independent(self):
+        newest = versions.NewestVersions(1)
+
+        newest.add('foo', (1,), 'foo-1')
+        newest.add('bar', (0,), 'bar-0')
+        self.assertEqual(newest.add('bar', (2,), 'bar-2'), 'bar-0')
+
+        self.assertEqual(sorted(newest.items()), ['bar-2', 'foo-1'])
+
+    def test_same_version_replaces(self):
+        newest = versions.NewestVersions(2)
+
+        newest.add('foo', (1,), 'foo-1')
+        newest.add('foo', (2,), 'foo-2')
+        self.assertTrue(newest.add('foo', (1,), 'foo-1 again') is None)
+        self.assertEqual(newest.add('foo', (3,), 'foo-3'), 'foo-1 again')
+
+        self.assertEqual(sorted(newest.items()), ['foo-2', 'foo-3'])
+
+    def test_many_versions(self):
+        newest = versions.NewestVersions(3)
+        evicted = []
+
+        for version in (5, 9, 1, 7, 3, 8, 2, 6, 4, 0):
+            old = newest.add('foo', (version,), version)
+            if old is not None:
+                evicted.append(old)
+
+        self.assertEqual(sorted(newest.items()), [7, 8, 9])
+        self.assertEqual(sorted(evicted), range(7))
+
+
+class TestUnitKeyFunctions(unittest.TestCase):
+    def test_rpm_key_without_version(self):
+        rpm = model_factory.rpm_models(1)[0]
+        other_version = models.RPM(rpm.name, '1', '0.1', '2', rpm.arch, 'md5', 'abc', {})
+
+        self.assertEqual(versions.key_without_version(models.RPM, rpm.unit_key),
+                         (rpm.name, rpm.arch))
+        self.assertEqual(versions.key_without_version(models.RPM, rpm.unit_key),
+                         versions.key_without_version(models.RPM, other_version.unit_key))
+
+    def test_drpm_key_without_version(self):
+        drpm = model_factory.drpm_models(1)[0]
+
+        self.assertEqual(versions.key_without_version(models.DRPM, drpm.unit_key),
+                         (drpm.filename,))
+
+    def test_version_key(self):
+        older = {'name': 'foo', 'epoch': '0', 'version': '1.9', 'release': '1'}
+        newer = {'name': 'foo', 'epoch': '0', 'version': '1.10', 'release': '1'}
+
+        self.assertTrue(versions.version_key(newer) > versions.version_key(older))
@@ -1,13 +1,18 @@
 from copy import deepcopy
+import datetime
 import os
 import shutil
 import tempfile
 
+from pulp.common import dateutils
 from pulp.plugins.model import Consumer, Unit
+from pulp.server.exceptions import InvalidValue, MissingResource
 import mock
 
+from pulp_rpm.common import rpm_profile
 from pulp_rpm.common.ids import TYPE_ID_ERRATA, TYPE_ID_RPM
 from pulp_rpm.devel import rpm_support_base
+from pulp_rpm.plugins.profilers import yum
 from pulp_rpm.plugins.profilers.yum import entry_point, YumProfiler
 from pulp_rpm.yum_plugin import updateinfo
 import profiler_mocks
@@ -556,3 +561,321 @@ class TestYumProfilerRPM(rpm_support_base.PulpRPMTests):
              'arch': 'x86_64', 'vendor': 'Red Hat, Inc.'},
         ]
         self.assertEqual(new_profile, expected_profile)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers.consumer_profile_manager')
+    def test_update_profile_delta(self, mock_profile_manager):
+        """
+        Test that a delta is applied to the stored profile, and the result sorted.
+        """
+        package_a = {'name': 'Package A', 'epoch': 0, 'version': '1.0.1', 'release': '2.el6',
+                     'arch': 'x86_64', 'vendor': 'Red Hat, Inc.'}
+        package_b = {'name': 'Package B', 'epoch': 0, 'version': '2.3.9', 'release': '1.el6',
+                     'arch': 'x86_64', 'vendor': 'Red Hat, Inc.'}
+        package_c = {'name': 'Package C', 'epoch': 0, 'version': '1.0.0', 'release': '1.el6',
+                     'arch': 'x86_64', 'vendor': 'Red Hat, Inc.'}
+        stored_profile = [package_a, package_b]
+        mock_profile_manager.return_value.get_profile.return_value = {'profile': stored_profile}
+        delta = rpm_profile.create_delta(stored_profile, [package_c, package_a])
+        consumer = Consumer('consumer-1', {})
+
+        new_profile = YumProfiler.update_profile(consumer, TYPE_ID_RPM, delta, 'config')
+
+        self.assertEqual(new_profile, [package_a, package_c])
+        mock_profile_manager.return_value.get_profile.assert_called_once_with('consumer-1',
+                                                                              TYPE_ID_RPM)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers.consumer_profile_manager')
+    def test_update_profile_delta_mismatch(self, mock_profile_manager):
+        """
+        Test that a delta that is not based on the stored profile is rejected.
+        """
+        package_a = {'name': 'Package A', 'epoch': 0, 'version': '1.0.1', 'release': '2.el6',
+                     'arch': 'x86_64', 'vendor': 'Red Hat, Inc.'}
+        mock_profile_manager.return_value.get_profile.return_value = {'profile': []}
+        delta = rpm_profile.create_delta([package_a], [])
+
+        self.assertRaises(InvalidValue, YumProfiler.update_profile, {'id': 'consumer-1'},
+                          TYPE_ID_RPM, delta, 'config')
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers.consumer_profile_manager')
+    def test_update_profile_delta_no_profile(self, mock_profile_manager):
+        """
+        Test that a delta is rejected if the consumer has no stored profile.
+        """
+        mock_profile_manager.return_value.get_profile.side_effect = MissingResource(
+            profile='consumer-1')
+        delta = rpm_profile.create_delta([], [])
+
+        self.assertRaises(InvalidValue, YumProfiler.update_profile, {'id': 'consumer-1'},
+                          TYPE_ID_RPM, delta, 'config')
+
+
+class TestApplicabilityIndexCache(rpm_support_base.PulpRPMTests):
+    """
+    Test that the applicability index of a repository is reused while its content is unchanged.
+    """
+
+    def setUp(self):
+        super(TestApplicabilityIndexCache, self).setUp()
+        yum._index_cache.clear()
+        rpm_key = {'name': 'emoticons', 'epoch': '0', 'version': '0.1', 'release': '2',
+                   'arch': 'x86_64', 'checksum': 'abc', 'checksumtype': 'sha256'}
+        self.rpm_unit = Unit(TYPE_ID_RPM, rpm_key, {}, '')
+        self.rpm_unit.id = 'rpm_unit_id'
+        self.conduit = profiler_mocks.get_profiler_conduit(repo_units=[self.rpm_unit])
+        self.profile = [{'name': 'emoticons', 'epoch': 0, 'version': '0.0.1', 'release': '1',
+                         'arch': 'x86_64', 'vendor': 'Test Vendor'}]
+
+    def tearDown(self):
+        super(TestApplicabilityIndexCache, self).tearDown()
+        yum._index_cache.clear()
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_reused_for_unchanged_repo(self, mock_managers):
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {
+            'id': 'repo1', 'last_unit_added': 'yesterday', 'last_unit_removed': None}
+
+        for i in range(3):
+            ret = YumProfiler.calculate_applicable_units(self.profile, 'repo1', None,
+                                                         self.conduit)
+            self.assertEqual(ret, {TYPE_ID_RPM: ['rpm_unit_id'], TYPE_ID_ERRATA: []})
+
+        # one query for RPMs and one for errata
+        self.assertEqual(self.conduit.get_repo_units.call_count, 2)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_rebuilt_for_changed_repo(self, mock_managers):
+        find_by_id = mock_managers.repo_query_manager.return_value.find_by_id
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': 'yesterday'}
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, self.conduit)
+
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': 'today'}
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, self.conduit)
+
+        self.assertEqual(self.conduit.get_repo_units.call_count, 4)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_rebuilt_when_errata_updated(self, mock_managers):
+        """
+        Errata are updated in place by syncs of other repositories they are in.
+        """
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {
+            'id': 'repo1', 'last_unit_added': 'yesterday'}
+        erratum = Unit(TYPE_ID_ERRATA, {'id': 'RHEA-1'}, {'_last_updated': 1}, '')
+        self.conduit.get_units.side_effect = lambda repo_id, criteria: [erratum]
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, self.conduit)
+
+        erratum.metadata['_last_updated'] = 2
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, self.conduit)
+
+        self.assertEqual(self.conduit.get_repo_units.call_count, 4)
+        criteria = self.conduit.get_units.call_args[0][1]
+        self.assertEqual(criteria.type_ids, [TYPE_ID_ERRATA])
+        self.assertEqual(criteria.unit_sort, [('_last_updated', -1)])
+        self.assertEqual(criteria.limit, 1)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_not_cached_without_content_version(self, mock_managers):
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {'id': 'repo1'}
+
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, self.conduit)
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, self.conduit)
+
+        self.assertEqual(self.conduit.get_repo_units.call_count, 4)
+        self.assertEqual(len(yum._index_cache), 0)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.MAX_CACHED_INDEXES', 2)
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_least_recently_used_evicted(self, mock_managers):
+        mock_managers.repo_query_manager.return_value.find_by_id.return_value = {
+            'last_unit_added': 'yesterday'}
+
+        for repo_id in ('repo1', 'repo2', 'repo1', 'repo3'):
+            YumProfiler.calculate_applicable_units(self.profile, repo_id, None, self.conduit)
+
+        self.assertEqual(yum._index_cache.keys(), ['repo1', 'repo3'])
+
+
+class TestIncrementalApplicability(rpm_support_base.PulpRPMTests):
+    """
+    Test that applicability is only recalculated for what changed.
+    """
+
+    def setUp(self):
+        super(TestIncrementalApplicability, self).setUp()
+        yum._index_cache.clear()
+        self.old_unit = self._rpm_unit('emoticons', '0.1', 'old_id')
+        self.profile = [{'name': 'emoticons', 'epoch': 0, 'version': '0.0.1', 'release': '1',
+                         'arch': 'x86_64', 'vendor': 'Test Vendor'},
+                        {'name': 'patb', 'epoch': 0, 'version': '0.1', 'release': '1',
+                         'arch': 'x86_64', 'vendor': 'Test Vendor'}]
+        self.yesterday = datetime.datetime(2015, 1, 1)
+        self.today = datetime.datetime(2015, 1, 2)
+
+    def tearDown(self):
+        super(TestIncrementalApplicability, self).tearDown()
+        yum._index_cache.clear()
+
+    @staticmethod
+    def _rpm_unit(name, version, unit_id):
+        rpm_key = {'name': name, 'epoch': '0', 'version': version, 'release': '2',
+                   'arch': 'x86_64', 'checksum': unit_id, 'checksumtype': 'sha256'}
+        unit = Unit(TYPE_ID_RPM, rpm_key, {}, '')
+        unit.id = unit_id
+        return unit
+
+    def test_index_extended(self):
+        index = yum.ApplicabilityIndex(
+            profiler_mocks.get_profiler_conduit(repo_units=[self.old_unit]).get_repo_units(
+                'repo1', TYPE_ID_RPM), [])
+        new_unit = self._rpm_unit('patb', '0.2', 'new_id')
+
+        extended = index.extended([self.old_unit, new_unit], [])
+
+        # the original index is unchanged
+        self.assertEqual(index.rpms.keys(), ['emoticons x86_64'])
+        self.assertEqual(sorted(extended.rpms.keys()), ['emoticons x86_64', 'patb x86_64'])
+        self.assertEqual(extended.generation, 1)
+        # units already in the index are not added again
+        self.assertEqual(extended.keys_changed_since(0), set(['patb x86_64']))
+        self.assertEqual(extended.keys_changed_since(1), set())
+
+    def test_errata_package_added_later(self):
+        erratum = Unit(TYPE_ID_ERRATA, {'id': 'RHEA-1'},
+                       {'pkglist': [{'packages': [{'name': 'patb', 'epoch': '0',
+                                                   'version': '0.2', 'release': '2',
+                                                   'arch': 'x86_64'}]}]}, '')
+        erratum.id = 'erratum_id'
+        index = yum.ApplicabilityIndex([], [erratum])
+        lookup = YumProfiler._form_lookup_table(self.profile)
+        self.assertEqual(index.applicable_units(lookup),
+                         {TYPE_ID_RPM: [], TYPE_ID_ERRATA: []})
+
+        extended = index.extended([self._rpm_unit('patb', '0.2', 'new_id')], [])
+
+        self.assertEqual(extended.applicable_units(lookup),
+                         {TYPE_ID_RPM: ['new_id'], TYPE_ID_ERRATA: ['erratum_id']})
+
+    def test_update_changed_profile_entries(self):
+        index = yum.ApplicabilityIndex(
+            [self.old_unit, self._rpm_unit('patb', '0.2', 'new_id')], [])
+        lookup = YumProfiler._form_lookup_table(self.profile)
+        applicability = index.calculate(lookup)
+        self.assertEqual(index.units(applicability),
+                         {TYPE_ID_RPM: ['old_id', 'new_id'], TYPE_ID_ERRATA: []})
+
+        # the newer patb was installed
+        self.profile[1]['version'] = '0.2'
+        self.profile[1]['release'] = '2'
+        lookup = YumProfiler._form_lookup_table(self.profile)
+        with mock.patch.object(index, 'newest', wraps=index.newest) as newest:
+            applicability = index.update(applicability, lookup, set(['patb x86_64']))
+
+        self.assertEqual(index.units(applicability),
+                         {TYPE_ID_RPM: ['old_id'], TYPE_ID_ERRATA: []})
+        # only the changed entry was looked at
+        newest.get.assert_called_once_with('patb x86_64')
+
+    def test_result_reused_for_same_profile(self):
+        index = yum.ApplicabilityIndex([self.old_unit], [])
+        lookup = YumProfiler._form_lookup_table(self.profile)
+        index.applicable_units(lookup, profile_hash='abc')
+
+        with mock.patch.object(index, 'calculate') as calculate:
+            ret = index.applicable_units(lookup, profile_hash='abc')
+
+        self.assertEqual(ret, {TYPE_ID_RPM: ['old_id'], TYPE_ID_ERRATA: []})
+        self.assertEqual(calculate.call_count, 0)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_units_added_to_repo(self, mock_managers):
+        new_unit = self._rpm_unit('patb', '0.2', 'new_id')
+        conduit = profiler_mocks.get_profiler_conduit(existing_units=[new_unit],
+                                                      repo_units=[self.old_unit])
+        find_by_id = mock_managers.repo_query_manager.return_value.find_by_id
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.yesterday,
+                                   'last_unit_removed': None}
+        ret = YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+        self.assertEqual(ret, {TYPE_ID_RPM: ['old_id'], TYPE_ID_ERRATA: []})
+
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.today,
+                                   'last_unit_removed': None}
+        with mock.patch.object(yum.ApplicabilityIndex, 'calculate',
+                               autospec=True, side_effect=yum.ApplicabilityIndex.calculate) \
+                as calculate:
+            ret = YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+
+        self.assertEqual(ret, {TYPE_ID_RPM: ['old_id', 'new_id'], TYPE_ID_ERRATA: []})
+        # the repository was not queried for all of its units again
+        self.assertEqual(conduit.get_repo_units.call_count, 2)
+        # one query for the errata version each time, and one for each type of added units
+        self.assertEqual(conduit.get_units.call_count, 4)
+        criteria = conduit.get_units.call_args_list[2][0][1]
+        since = dateutils.format_iso8601_datetime(
+            self.yesterday - datetime.timedelta(seconds=yum.ADDED_UNITS_MARGIN))
+        self.assertEqual(criteria.association_filters, {'created': {'$gte': since}})
+        # applicability was only recalculated for the package that a unit was added for
+        calculate.assert_called_once_with(mock.ANY, mock.ANY, set(['patb x86_64']))
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_rebuilt_when_units_removed(self, mock_managers):
+        conduit = profiler_mocks.get_profiler_conduit(repo_units=[self.old_unit])
+        find_by_id = mock_managers.repo_query_manager.return_value.find_by_id
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.yesterday,
+                                   'last_unit_removed': None}
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.today,
+                                   'last_unit_removed': self.today}
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+
+        self.assertEqual(conduit.get_repo_units.call_count, 4)
+        # only the errata version was queried
+        self.assertEqual(conduit.get_units.call_count, 2)
+
+    @mock.patch.object(YumProfiler, '_get_added_units', side_effect=Exception())
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_rebuilt_when_added_units_not_found(self, mock_managers, mock_get_added_units):
+        conduit = profiler_mocks.get_profiler_conduit(repo_units=[self.old_unit])
+        find_by_id = mock_managers.repo_query_manager.return_value.find_by_id
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.yesterday}
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.today}
+        ret = YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+
+        self.assertEqual(ret, {TYPE_ID_RPM: ['old_id'], TYPE_ID_ERRATA: []})
+        self.assertEqual(conduit.get_repo_units.call_count, 4)
+
+    @mock.patch('pulp_rpm.plugins.profilers.yum.managers')
+    def test_errata_updated_with_units_added(self, mock_managers):
+        erratum = Unit(TYPE_ID_ERRATA, {'id': 'RHEA-1'}, {'_last_updated': 1, 'pkglist': []}, '')
+        erratum.id = 'erratum_id'
+        new_erratum = Unit(TYPE_ID_ERRATA, {'id': 'RHEA-2'}, {'pkglist': []}, '')
+        new_erratum.id = 'new_erratum_id'
+        updated = []
+
+        def get_units(repo_id, criteria):
+            if criteria.unit_filters:
+                self.assertEqual(criteria.unit_filters, {'_last_updated': {'$gt': 1}})
+                return updated
+            return [erratum]
+        conduit = profiler_mocks.get_profiler_conduit(repo_units=[self.old_unit, erratum])
+        conduit.get_units.side_effect = get_units
+        find_by_id = mock_managers.repo_query_manager.return_value.find_by_id
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.yesterday}
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+
+        # a new erratum was added, so the index is extended with it
+        find_by_id.return_value = {'id': 'repo1', 'last_unit_added': self.today}
+        erratum.metadata['_last_updated'] = 2
+        updated.append(new_erratum)
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+        self.assertEqual(conduit.get_repo_units.call_count, 2)
+        self.assertTrue('new_erratum_id' in yum._index_cache['repo1'][1].positions)
+
+        # an erratum in the index was updated in place, so the index is built again
+        yum._index_cache['repo1'] = ((self.yesterday, None, 1), yum._index_cache['repo1'][1])
+        updated.append(erratum)
+        YumProfiler.calculate_applicable_units(self.profile, 'repo1', None, conduit)
+        self.assertEqual(conduit.get_repo_units.call_count, 4)
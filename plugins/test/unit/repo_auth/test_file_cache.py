@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp_rpm.repo_auth import file_cache
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'listing')
+        self.load = mock.MagicMock(side_effect=lambda path: open(path).read())
+        self.cache = file_cache.FileCache(self.load)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, contents):
+        f = open(self.filename, 'w')
+        f.write(contents)
+        f.close()
+
+    def test_get_cached(self):
+        self.write('foo')
+
+        self.assertEqual(self.cache.get(self.filename), 'foo')
+        self.assertEqual(self.cache.get(self.filename), 'foo')
+
+        self.load.assert_called_once_with(self.filename)
+
+    def test_get_changed(self):
+        self.write('foo')
+        self.cache.get(self.filename)
+
+        self.write('foobar')
+
+        self.assertEqual(self.cache.get(self.filename), 'foobar')
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_get_changed_mtime(self):
+        self.write('foo')
+        self.cache.get(self.filename)
+
+        # same size, but a different modification time
+        self.write('bar')
+        stat = os.stat(self.filename)
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime + 10))
+
+        self.assertEqual(self.cache.get(self.filename), 'bar')
+
+    def test_get_missing(self):
+        self.assertTrue(self.cache.get(self.filename) is None)
+        self.assertEqual(self.load.call_count, 0)
+
+    def test_get_deleted(self):
+        self.write('foo')
+        self.cache.get(self.filename)
+
+        os.remove(self.filename)
+
+        self.assertTrue(self.cache.get(self.filename) is None)
+
+    def test_invalidate(self):
+        self.write('foo')
+        self.cache.get(self.filename)
+
+        self.cache.invalidate(self.filename)
+        self.cache.get(self.filename)
+
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_invalidate_all(self):
+        self.write('foo')
+        self.cache.get(self.filename)
+
+        self.cache.invalidate()
+        self.cache.get(self.filename)
+
+        self.assertEqual(self.load.call_count, 2)
+
+
+class TestReadConfig(unittest.TestCase):
+    def setUp(self):
+        file_cache.clear()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        file_cache.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_read_config(self):
+        filename = os.path.join(self.tmp_dir, 'repo_auth.conf')
+        f = open(filename, 'w')
+        f.write('[main]\nenabled: true\n')
+        f.close()
+
+        config = file_cache.read_config(filename)
+
+        self.assertTrue(config.getboolean('main', 'enabled'))
+        self.assertTrue(file_cache.read_config(filename) is config)
+
+    def test_read_config_missing(self):
+        config = file_cache.read_config(os.path.join(self.tmp_dir, 'missing.conf'))
+
+        self.assertEqual(config.sections(), [])
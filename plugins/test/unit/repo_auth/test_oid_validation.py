@@ -10,6 +10,7 @@
 from ConfigParser import SafeConfigParser
 import shutil
 import os
+import time
 import unittest
 import urlparse
 
@@ -51,6 +52,10 @@ class TestOidValidation(unittest.TestCase):
     def setUp(self):
         self.config = SafeConfigParser()
         self.config.read(CONFIG_FILENAME)
+        oid_validation.clear_cert_caches()
+
+    def tearDown(self):
+        oid_validation.clear_cert_caches()
 
     def print_debug(self):
         valid_ca = X509.load_cert_string(VALID_CA)
@@ -651,6 +656,129 @@ class TestOidValidation(unittest.TestCase):
         self.assertTrue(response_y)
         self.assertTrue(response_xx)
 
+
+class TestLRUCache(unittest.TestCase):
+    def test_get(self):
+        cache = oid_validation.LRUCache(2)
+        cache.put('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertTrue(cache.get('b') is None)
+
+    def test_discards_least_recently_used(self):
+        cache = oid_validation.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+
+        cache.put('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertTrue(cache.get('b') is None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_clear(self):
+        cache = oid_validation.LRUCache(2)
+        cache.put('a', 1)
+
+        cache.clear()
+
+        self.assertTrue(cache.get('a') is None)
+
+
+@mock.patch('pulp_rpm.repo_auth.oid_validation.X509.load_cert_string')
+@mock.patch('pulp_rpm.repo_auth.oid_validation._not_after')
+@mock.patch('pulp_rpm.repo_auth.oid_validation.RepoCertUtils.get_ca_chain', return_value=[])
+@mock.patch('pulp_rpm.repo_auth.oid_validation.RepoCertUtils.validate_certificate_pem',
+            return_value=True)
+class TestVerifyCertificate(unittest.TestCase):
+    def setUp(self):
+        oid_validation.clear_cert_caches()
+        self.validator = oid_validation.OidValidator(SafeConfigParser())
+        self.log_func = mock.MagicMock()
+
+    def tearDown(self):
+        oid_validation.clear_cert_caches()
+
+    def test_cached(self, mock_validate, mock_get_ca_chain, mock_not_after, mock_load_cert):
+        mock_not_after.return_value = time.time() + 3600
+
+        for i in range(3):
+            self.assertTrue(self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA,
+                                                               self.log_func))
+
+        mock_validate.assert_called_once_with(FULL_CLIENT_CERT, VALID_CA, log_func=self.log_func)
+
+    def test_other_ca(self, mock_validate, mock_get_ca_chain, mock_not_after, mock_load_cert):
+        mock_not_after.return_value = time.time() + 3600
+
+        self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA, self.log_func)
+        self.validator._verify_certificate(FULL_CLIENT_CERT, INVALID_CA, self.log_func)
+
+        self.assertEqual(mock_validate.call_count, 2)
+
+    def test_failure_not_cached(self, mock_validate, mock_get_ca_chain, mock_not_after,
+                                mock_load_cert):
+        mock_validate.return_value = False
+
+        for i in range(2):
+            self.assertFalse(self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA,
+                                                                self.log_func))
+
+        self.assertEqual(mock_validate.call_count, 2)
+
+    def test_expired(self, mock_validate, mock_get_ca_chain, mock_not_after, mock_load_cert):
+        """
+        Test that a certificate is verified again once it, or its CA, has expired.
+        """
+        mock_get_ca_chain.return_value = [mock.MagicMock()]
+        # the CA expires before the client certificate
+        mock_not_after.side_effect = lambda cert: time.time() + (
+            -1 if cert is mock_get_ca_chain.return_value[0] else 3600)
+
+        self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA, self.log_func)
+        self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA, self.log_func)
+
+        self.assertEqual(mock_validate.call_count, 2)
+
+    @mock.patch('pulp_rpm.repo_auth.oid_validation.time.time')
+    def test_max_age(self, mock_time, mock_validate, mock_get_ca_chain, mock_not_after,
+                     mock_load_cert):
+        mock_not_after.return_value = 10000
+        mock_time.return_value = 1000
+
+        self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA, self.log_func)
+        mock_time.return_value += oid_validation.VERIFIED_CERT_MAX_AGE - 1
+        self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA, self.log_func)
+        self.assertEqual(mock_validate.call_count, 1)
+
+        mock_time.return_value += 1
+        self.validator._verify_certificate(FULL_CLIENT_CERT, VALID_CA, self.log_func)
+        self.assertEqual(mock_validate.call_count, 2)
+
+
+class TestCheckExtensions(unittest.TestCase):
+    def setUp(self):
+        oid_validation.clear_cert_caches()
+        self.validator = oid_validation.OidValidator(SafeConfigParser())
+
+    def tearDown(self):
+        oid_validation.clear_cert_caches()
+
+    @mock.patch('pulp_rpm.repo_auth.oid_validation.certificate.create_from_pem')
+    def test_parsed_once(self, mock_create):
+        mock_create.return_value.check_path.return_value = True
+
+        for i in range(2):
+            valid = self.validator._check_extensions(
+                FULL_CLIENT_CERT, '/pulp/repos/repos/pulp/pulp/fedora-14/x86_64/', mock.MagicMock())
+            self.assertTrue(valid)
+
+        mock_create.assert_called_once_with(FULL_CLIENT_CERT)
+        mock_create.return_value.check_path.assert_called_with('/repos/pulp/pulp/fedora-14/x86_64/')
+        self.assertEqual(mock_create.return_value.check_path.call_count, 2)
+
+
 # -- test data ---------------------------------------------------------------------
 
 ANYCERT = """
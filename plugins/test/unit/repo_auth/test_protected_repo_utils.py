@@ -3,7 +3,8 @@ import os
 import shutil
 import unittest
 
-from pulp_rpm.repo_auth.protected_repo_utils import ProtectedRepoListingFile, ProtectedRepoUtils
+from pulp_rpm.repo_auth.protected_repo_utils import (ProtectedPathTrie, ProtectedRepoListingFile,
+                                                     ProtectedRepoUtils)
 
 
 # -- constants -----------------------------------------------------------------------
@@ -14,17 +15,20 @@ DATA_DIR = os.path.abspath(os.path.dirname(__file__)) + '/../../data'
 CONFIG = SafeConfigParser()
 CONFIG.read([os.path.join(DATA_DIR, 'test-override-pulp.conf'),
              os.path.join(DATA_DIR, 'test-override-repoauth.conf')])
+LISTING_FILE = CONFIG.get('repos', 'protected_repo_listing_file')
 
 
 class TestProtectedRepoUtils(unittest.TestCase):
     def setUp(self):
-        if os.path.exists(TEST_FILE):
-            os.remove(TEST_FILE)
+        for filename in (TEST_FILE, LISTING_FILE):
+            if os.path.exists(filename):
+                os.remove(filename)
         self.utils = ProtectedRepoUtils(CONFIG)
 
     def tearDown(self):
-        if os.path.exists(TEST_FILE):
-            os.remove(TEST_FILE)
+        for filename in (TEST_FILE, LISTING_FILE):
+            if os.path.exists(filename):
+                os.remove(filename)
         global_cert_location = CONFIG.get('repos', 'global_cert_location')
         if os.path.exists(global_cert_location):
             shutil.rmtree(global_cert_location)
@@ -66,6 +70,62 @@ class TestProtectedRepoUtils(unittest.TestCase):
 
         self.assertEqual(0, len(listings))
 
+    def test_read_protected_repo_listings_cached(self):
+        self.utils.add_protected_repo('path-1', 'prot-repo-1')
+
+        listings = self.utils.read_protected_repo_listings()
+
+        self.assertTrue(self.utils.read_protected_repo_listings() is listings)
+
+    def test_read_protected_repo_listings_changed(self):
+        """
+        Tests that listings written by another process are read again.
+        """
+        self.utils.add_protected_repo('path-1', 'prot-repo-1')
+        self.utils.read_protected_repo_listings()
+
+        f = ProtectedRepoListingFile(LISTING_FILE)
+        f.load()
+        f.add_protected_repo_path('path-2', 'prot-repo-2')
+        f.save()
+
+        listings = self.utils.read_protected_repo_listings()
+
+        self.assertEqual(listings, {'path-1': 'prot-repo-1', 'path-2': 'prot-repo-2'})
+
+    def test_find_protected_repo(self):
+        self.utils.add_protected_repo('/repos/pulp/pulp/fedora-14/x86_64', 'prot-repo-1')
+
+        repo_id = self.utils.find_protected_repo('/repos//pulp/pulp/fedora-14/x86_64/Packages/')
+
+        self.assertEqual(repo_id, 'prot-repo-1')
+        self.assertTrue(self.utils.find_protected_repo('/repos/pulp/pulp/fedora-13') is None)
+
+
+class TestProtectedPathTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = ProtectedPathTrie({'/pulp/fedora-14': 'repo-1',
+                                       'pulp/fedora-14/x86_64/': 'repo-2',
+                                       '//pulp/fedora-13/x86_64': 'repo-3'})
+
+    def test_find_longest(self):
+        self.assertEqual(self.trie.find('/pulp/fedora-14/x86_64/repodata/repomd.xml'), 'repo-2')
+        self.assertEqual(self.trie.find('/pulp/fedora-14/i386/repodata/repomd.xml'), 'repo-1')
+
+    def test_find_not_at_start(self):
+        self.assertEqual(self.trie.find('/repos/pulp/fedora-13/x86_64/foo.rpm'), 'repo-3')
+
+    def test_find_whole_components(self):
+        self.assertTrue(self.trie.find('/pulp/fedora-13/x86_64-debug/foo.rpm') is None)
+        self.assertTrue(self.trie.find('/mypulp/fedora-14/foo.rpm') is None)
+
+    def test_find_unprotected(self):
+        self.assertTrue(self.trie.find('/pulp/fedora-13/i386/') is None)
+        self.assertTrue(self.trie.find('') is None)
+
+    def test_find_empty(self):
+        self.assertTrue(ProtectedPathTrie({}).find('/pulp/fedora-14/') is None)
+
 
 class TestProtectedRepoListingFile(unittest.TestCase):
     def setUp(self):
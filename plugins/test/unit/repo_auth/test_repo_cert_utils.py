@@ -4,6 +4,7 @@ import os
 import unittest
 
 from M2Crypto import X509
+import mock
 
 from pulp_rpm.repo_auth import repo_cert_utils
 
@@ -206,6 +207,18 @@ class TestCertStorage(unittest.TestCase):
         self.assertTrue(not os.path.exists(
             os.path.join(self.utils._global_cert_directory(), 'pulp-global-repo.ca')))
 
+    def test_write_read_rewritten_bundle(self):
+        """
+        Tests that a bundle rewritten with contents of the same size is not read from
+        the cache.
+        """
+        self.utils.write_global_repo_cert_bundle({'ca': 'FOO'})
+        self.assertEqual(self.utils.read_global_cert_bundle(['ca']), {'ca': 'FOO'})
+
+        self.utils.write_global_repo_cert_bundle({'ca': 'BAR'})
+
+        self.assertEqual(self.utils.read_global_cert_bundle(['ca']), {'ca': 'BAR'})
+
     def test_remove_bundle_item(self):
         """
         Tests that specifying None as the content of an item in the bundle removes
@@ -342,6 +355,10 @@ class TestCertStorage(unittest.TestCase):
 class TestCertVerify(unittest.TestCase):
     def setUp(self):
         self.utils = repo_cert_utils.RepoCertUtils(CONFIG)
+        repo_cert_utils._ca_chains.clear()
+
+    def tearDown(self):
+        repo_cert_utils._ca_chains.clear()
 
     def test_valid(self):
         """
@@ -438,6 +455,28 @@ class TestCertVerify(unittest.TestCase):
         parsed_certs = self.utils.get_certs_from_string(many_certs)
         self.assertTrue(len(parsed_certs), self.utils.max_num_certs_in_chain)
 
+    def test_get_ca_chain(self):
+        ca_chain_path = os.path.join(CA_CHAIN_TEST_DATA, "certs/ca_chain")
+        data = open(ca_chain_path).read()
+
+        with mock.patch.object(self.utils, 'get_certs_from_string',
+                               wraps=self.utils.get_certs_from_string) as mock_get_certs:
+            certs = self.utils.get_ca_chain(data)
+            self.assertTrue(self.utils.get_ca_chain(data) is certs)
+
+        self.assertEquals(len(certs), 3)
+        self.assertEqual(mock_get_certs.call_count, 1)
+
+    @mock.patch('pulp_rpm.repo_auth.repo_cert_utils.MAX_CACHED_CA_CHAINS', 2)
+    def test_get_ca_chain_bounded(self):
+        root_ca_path = os.path.join(CA_CHAIN_TEST_DATA, "certs/ROOT_CA/root_ca.pem")
+        data = open(root_ca_path).read()
+
+        for count in range(3):
+            self.utils.get_ca_chain(data * (count + 1))
+
+        self.assertEqual(len(repo_cert_utils._ca_chains), 1)
+
     def test_validate_certificate_pem_with_ca_chain(self):
         ca_chain_path = os.path.join(CA_CHAIN_TEST_DATA, "certs/ca_chain")
         test_cert_path = os.path.join(CA_CHAIN_TEST_DATA, "certs/test_cert.pem")
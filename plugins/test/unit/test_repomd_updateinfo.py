@@ -3,6 +3,8 @@
 import os
 import unittest
 
+from pulp.plugins.model import Unit
+
 from pulp_rpm.plugins.db import models
 from pulp_rpm.plugins.importers.yum.repomd import packages, updateinfo
 
@@ -37,3 +39,39 @@ class TestProcessErratumElement(unittest.TestCase):
             self.assertTrue(model.name.startswith('NetworkManager'))
             self.assertEqual(model.version, '0.8.1')
             self.assertEqual(model.release, '5.el6_0.1')
+
+
+class TestAddRepodata(unittest.TestCase):
+    def _erratum_unit(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               '../data/RHBA-2010-0836.erratum.xml')) as f:
+            erratum = list(packages.package_list_generator(f, updateinfo.PACKAGE_TAG,
+                                                           updateinfo.process_package_element))[0]
+        return Unit(erratum.TYPE, erratum.unit_key, erratum.metadata, None)
+
+    def test_snippet_stored(self):
+        unit = self._erratum_unit()
+
+        updateinfo.add_repodata(unit)
+
+        snippet = unit.metadata['repodata']['updateinfo']
+        self.assertTrue(isinstance(snippet, unicode))
+        self.assertTrue(snippet.startswith(u'<update '))
+        self.assertTrue(u'<id>RHBA-2010:0836</id>' in snippet)
+
+    def test_snippet_replaced(self):
+        unit = self._erratum_unit()
+        unit.metadata['repodata'] = {'updateinfo': u'<update>stale</update>'}
+
+        updateinfo.add_repodata(unit)
+
+        self.assertTrue(u'stale' not in unit.metadata['repodata']['updateinfo'])
+
+    def test_invalid_erratum(self):
+        unit = Unit(models.Errata.TYPE, {'id': 'foo'},
+                    {'repodata': {'updateinfo': u'<update>stale</update>'}}, None)
+
+        updateinfo.add_repodata(unit)
+
+        # nothing stale is left behind for the distributor to publish
+        self.assertEqual(unit.metadata['repodata'], {})
@@ -0,0 +1,67 @@
+"""
+Tests for the pulp_rpm.yum_plugin.updateinfo_xml module.
+"""
+import unittest
+
+from pulp_rpm.yum_plugin import updateinfo_xml
+
+
+class RenderErratumTests(unittest.TestCase):
+    """
+    Tests for the render_erratum() function.
+    """
+
+    def test_render(self):
+        metadata = {
+            'from': 'security@example.com',
+            'status': 'final',
+            'type': 'security',
+            'version': '1',
+            'issued': '2014-05-27',
+            'updated': '2014-05-28',
+            'reboot_suggested': False,
+            'title': u'Fix for <b> & "c"',
+            'pushcount': 2,
+            'severity': '',
+            'description': None,
+            'references': [{'id': None, 'title': None, 'type': 'self',
+                            'href': 'http://example.com/?a=1&b="2"\n'}],
+            'pkglist': [{'name': u'coll\xe9ction', 'short': 'c1', 'packages': [
+                {'name': 'foo', 'version': '1.0', 'release': '1', 'epoch': None,
+                 'arch': 'noarch', 'src': None, 'filename': 'foo-1.0-1.noarch.rpm',
+                 'sum': ('sha256', 'abc')},
+                {'name': 'bar', 'version': '2.0', 'release': '1', 'epoch': '1',
+                 'arch': 'x86_64', 'filename': None, 'reboot_suggested': True}]}],
+        }
+
+        ret = updateinfo_xml.render_erratum('RHSA-2014:0042', metadata)
+
+        expected = (
+            '<update from="security@example.com" status="final" type="security" version="1">'
+            '<id>RHSA-2014:0042</id>'
+            '<issued date="2014-05-27" />'
+            '<reboot_suggested>False</reboot_suggested>'
+            '<title>Fix for &lt;b&gt; &amp; "c"</title>'
+            '<pushcount>2</pushcount>'
+            '<description />'
+            '<updated date="2014-05-28" />'
+            '<references><reference href=\'http://example.com/?a=1&amp;b="2"&#10;\' '
+            'id="" title="" type="self" /></references>'
+            '<pkglist><collection short="c1"><name>coll\xc3\xa9ction</name>'
+            '<package arch="noarch" epoch="0" name="foo" release="1" src="" version="1.0">'
+            '<filename>foo-1.0-1.noarch.rpm</filename><sum type="sha256">abc</sum>'
+            '<reboot_suggested>False</reboot_suggested></package>'
+            '<package arch="x86_64" epoch="1" name="bar" release="1" src="" version="2.0">'
+            '<filename /><reboot_suggested>True</reboot_suggested></package>'
+            '</collection></pkglist>'
+            '</update>')
+        self.assertEqual(ret, expected)
+
+    def test_no_references(self):
+        metadata = {'status': 'final', 'type': 'bugfix', 'version': '1', 'issued': '2014-05-27',
+                    'reboot_suggested': False, 'references': []}
+
+        ret = updateinfo_xml.render_erratum('RHBA-2014:0001', metadata)
+
+        self.assertTrue('<references />' in ret)
+        self.assertTrue('<pkglist' not in ret)
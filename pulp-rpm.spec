@@ -268,6 +268,7 @@ Group: Development/Languages
 Requires: yum
 Requires: python-rhsm >= 1.8.0
 Requires: python-pulp-bindings = %{pulp_version}
+Requires: python-pulp-rpm-common = %{pulp_version}
 
 %description yumplugins
 A collection of yum plugins supplementing Pulp consumer operations.